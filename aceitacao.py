@@ -0,0 +1,198 @@
+"""Critérios de aceitação dos CPs: como os valores espúrios de um ensaio são excluídos.
+
+Cada produto escolhe o critério em CONFIG_LIMITES (``criterio_aceitacao`` e, para
+os testes estatísticos, ``alfa_aceitacao``):
+
+    * simples:   uma passada contra a média inicial (regra das planilhas, padrão)
+    * iterativo: exclui só o CP fora da faixa mais afastado da média, recalcula a
+                 média dos restantes e repete até nenhum ficar fora da faixa
+    * grubbs:    teste de Grubbs bilateral, um CP por vez, enquanto houver ≥ 3 CPs
+    * dixon:     teste Q de Dixon (r10) bilateral, aplicado uma vez ao CP mais extremo
+
+Nos critérios simples e iterativo, a faixa de aceitação é a do ensaio (absoluta em
+MPa ou mm/m, percentual sobre a média etc.), passada como uma função
+``dentro(valores, centro)``. Grubbs e Dixon substituem a faixa pelo teste.
+
+Tudo é vetorizado: ``aceitar`` recebe uma matriz (lotes x CPs) e processa todos os
+lotes de uma vez, então o reprocessamento em bloco do histórico custa praticamente
+o mesmo com exclusão iterativa ou com a regra de uma passada. Um lote isolado (a
+calculadora) é uma matriz de uma linha.
+"""
+from typing import Callable, Dict, List, NamedTuple, Sequence
+
+import numpy as np
+
+CRITERIO_PADRAO = "simples"
+ALFA_PADRAO = 0.05
+CRITERIOS = ("simples", "iterativo", "grubbs", "dixon")
+
+# ======================== 1. VALORES CRÍTICOS (PRÉ-CALCULADOS) ========================
+
+# Grubbs bilateral, G = (n-1)/√n · √(t² / (n-2+t²)), t = quantil superior α/(2n) da t de
+# Student com n-2 graus de liberdade. Índice = n (3..13; 13 = máximo de CPs de um ensaio)
+_GRUBBS = {
+    0.10: [1.1531, 1.4625, 1.6714, 1.8221, 1.9381, 2.0317, 2.1096, 2.1761, 2.2339, 2.2850, 2.3305],
+    0.05: [1.1543, 1.4812, 1.7150, 1.8871, 2.0200, 2.1266, 2.2150, 2.2900, 2.3547, 2.4116, 2.4620],
+    0.01: [1.1547, 1.4962, 1.7637, 1.9728, 2.1391, 2.2744, 2.3868, 2.4821, 2.5641, 2.6357, 2.6990],
+}
+# Dixon r10 (Q) bilateral, Rorabacher (1991), n = 3..13
+_DIXON = {
+    0.10: [0.941, 0.765, 0.642, 0.560, 0.507, 0.468, 0.437, 0.412, 0.392, 0.376, 0.361],
+    0.05: [0.970, 0.829, 0.710, 0.625, 0.568, 0.526, 0.493, 0.466, 0.444, 0.426, 0.410],
+    0.01: [0.994, 0.926, 0.821, 0.740, 0.680, 0.634, 0.598, 0.568, 0.542, 0.522, 0.503],
+}
+N_MIN, N_MAX = 3, 13
+
+def _tabela(valores: Sequence[float]) -> np.ndarray:
+    """Vetor indexado por n (inf onde o teste não se aplica: n < 3 nunca exclui)."""
+    tabela = np.full(N_MAX + 1, np.inf)
+    tabela[N_MIN:] = valores
+    return tabela
+
+GRUBBS_CRITICO: Dict[float, np.ndarray] = {alfa: _tabela(v) for alfa, v in _GRUBBS.items()}
+DIXON_CRITICO: Dict[float, np.ndarray] = {alfa: _tabela(v) for alfa, v in _DIXON.items()}
+
+def _critico(tabelas: Dict[float, np.ndarray], alfa: float) -> np.ndarray:
+    if alfa not in tabelas:
+        raise ValueError(f"Nível de significância sem tabela: {alfa} (use {', '.join(map(str, sorted(tabelas)))}).")
+    return tabelas[alfa]
+
+# ======================== 2. CRITÉRIOS (VETORIZADOS) ========================
+
+class Aceite(NamedTuple):
+    """Resultado do critério para um lote."""
+    mantidos: List[bool]     # por posição; False também nas posições que não participam
+    excluidos: List[bool]    # participava e não ficou
+    media_inicial: float     # média dos CPs participantes, antes de qualquer exclusão
+    centro: float            # média de referência final (igual à inicial no critério simples)
+    iteracoes: int
+
+class Aceites(NamedTuple):
+    """Resultado do critério para vários lotes (linhas da matriz)."""
+    mantidos: np.ndarray       # bool (lotes x CPs)
+    excluidos: np.ndarray      # bool (lotes x CPs)
+    media_inicial: np.ndarray  # (lotes,)
+    centro: np.ndarray         # (lotes,)
+    iteracoes: np.ndarray      # (lotes,)
+
+    def linha(self, i: int) -> Aceite:
+        return Aceite(self.mantidos[i].tolist(), self.excluidos[i].tolist(), float(self.media_inicial[i]),
+                      float(self.centro[i]), int(self.iteracoes[i]))
+
+    def linhas(self) -> List[Aceite]:
+        """Todas as linhas, convertidas de uma vez (bem mais rápido que ``linha`` em laço)."""
+        return [Aceite(*campos) for campos in zip(self.mantidos.tolist(), self.excluidos.tolist(),
+                                                   self.media_inicial.tolist(), self.centro.tolist(),
+                                                   self.iteracoes.tolist())]
+
+def _media(v: np.ndarray, mascara: np.ndarray) -> np.ndarray:
+    """Média por linha dos valores marcados (NaN se nenhum).
+
+    A soma é acumulada na ordem dos CPs (cumsum), como a soma das planilhas e das
+    versões anteriores das regras: o critério simples reproduz os mesmos números.
+    """
+    n = mascara.sum(axis=1)
+    soma = np.cumsum(np.where(mascara, v, 0.0), axis=1)[:, -1] if v.shape[1] else np.zeros(len(v))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(n > 0, soma / np.maximum(n, 1), np.nan)
+
+def _faixa(v, participa, dentro, centro):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return participa & dentro(v, centro[:, None])
+
+def _simples(v, participa, dentro, alfa):
+    media = _media(v, participa)
+    return _faixa(v, participa, dentro, media), media, np.ones(len(v), dtype=int)
+
+def _iterativo(v, participa, dentro, alfa):
+    # Um CP por passada: um único valor espúrio desloca a média inicial e, excluído
+    # sozinho, devolve à faixa os CPs que a primeira média deixava de fora
+    mantidos = participa.copy()
+    iteracoes = np.ones(len(v), dtype=int)
+    linhas = np.arange(len(v))
+    for _ in range(v.shape[1]):
+        centro = _media(v, mantidos)
+        fora = mantidos & ~_faixa(v, mantidos, dentro, centro)
+        exclui = fora.any(axis=1)
+        if not exclui.any():
+            return mantidos, centro, iteracoes
+        with np.errstate(invalid="ignore"):
+            pior = np.argmax(np.where(fora, np.abs(v - centro[:, None]), -1.0), axis=1)
+        mantidos[linhas[exclui], pior[exclui]] = False
+        iteracoes += exclui
+    return mantidos, _media(v, mantidos), iteracoes
+
+def _grubbs(v, participa, dentro, alfa):
+    critico = _critico(GRUBBS_CRITICO, alfa)
+    mantidos = participa.copy()
+    iteracoes = np.zeros(len(v), dtype=int)
+    linhas = np.arange(len(v))
+    for _ in range(max(v.shape[1] - 2, 0)):
+        n = mantidos.sum(axis=1)
+        media = _media(v, mantidos)
+        desvio = np.abs(np.where(mantidos, v, np.nan) - media[:, None])
+        with np.errstate(invalid="ignore", divide="ignore"):
+            s = np.sqrt(np.nansum(desvio ** 2, axis=1) / (n - 1))
+            suspeito = np.argmax(np.where(mantidos, desvio, -1.0), axis=1)
+            g = desvio[linhas, suspeito] / s
+        exclui = (n >= N_MIN) & (s > 0) & (g > critico[np.minimum(n, N_MAX)])
+        if not exclui.any():
+            break
+        mantidos[linhas[exclui], suspeito[exclui]] = False
+        iteracoes += exclui
+    return mantidos, _media(v, mantidos), iteracoes
+
+def _dixon(v, participa, dentro, alfa):
+    critico = _critico(DIXON_CRITICO, alfa)
+    mantidos = participa.copy()
+    if v.shape[1] < N_MIN:
+        return mantidos, _media(v, mantidos), np.zeros(len(v), dtype=int)
+    n = participa.sum(axis=1)
+    linhas = np.arange(len(v))
+    # Ordena com os não participantes no fim (+inf); os n primeiros são os valores do lote
+    ordem = np.argsort(np.where(participa, v, np.inf), axis=1, kind="stable")
+    x = np.take_along_axis(np.where(participa, v, np.inf), ordem, axis=1)
+    ultimo = np.maximum(n - 1, 0)
+    menor, maior = x[:, 0], x[linhas, ultimo]
+    amplitude = maior - menor
+    with np.errstate(invalid="ignore", divide="ignore"):
+        q_baixo = (x[:, 1] - menor) / amplitude
+        q_alto = (maior - x[linhas, np.maximum(n - 2, 0)]) / amplitude
+    alto = q_alto > q_baixo
+    q = np.where(alto, q_alto, q_baixo)
+    exclui = (n >= N_MIN) & (amplitude > 0) & (q > critico[np.minimum(n, N_MAX)])
+    suspeito = ordem[linhas, np.where(alto, ultimo, 0)]
+    mantidos[linhas[exclui], suspeito[exclui]] = False
+    return mantidos, _media(v, mantidos), exclui.astype(int)
+
+_CRITERIOS: Dict[str, Callable] = {"simples": _simples, "iterativo": _iterativo, "grubbs": _grubbs, "dixon": _dixon}
+
+def aceitar(valores, participa, dentro: Callable, criterio: str = CRITERIO_PADRAO,
+            alfa: float = ALFA_PADRAO) -> Aceites:
+    """Aplica o critério a uma matriz de lotes (linhas) x CPs (colunas).
+
+    ``participa`` marca as posições que entram no cálculo (CPs vazios ficam de fora);
+    ``dentro(valores, centro)`` é a faixa do ensaio, usada pelos critérios simples e
+    iterativo (``centro`` chega com forma (lotes, 1)).
+    """
+    if criterio not in _CRITERIOS:
+        raise ValueError(f"Critério de aceitação desconhecido: {criterio} (use {', '.join(CRITERIOS)}).")
+    v = np.asarray(valores, dtype=float).reshape(len(valores), -1)
+    participa = np.asarray(participa, dtype=bool).reshape(v.shape)
+    mantidos, centro, iteracoes = _CRITERIOS[criterio](v, participa, dentro, alfa)
+    return Aceites(mantidos, participa & ~mantidos, _media(v, participa), centro, iteracoes)
+
+def aceitar_lote(valores: Sequence[float], participa: Sequence[bool], dentro: Callable,
+                 criterio: str = CRITERIO_PADRAO, alfa: float = ALFA_PADRAO) -> Aceite:
+    """``aceitar`` para um único lote (a calculadora, a importação linha a linha)."""
+    if criterio != "simples":
+        return aceitar([valores], [participa], dentro, criterio, alfa).linha(0)
+    # Uma passada em um lote: a média em Python (mesma soma, na ordem dos CPs) e só a faixa
+    # com numpy, evitando o custo fixo da versão matricial
+    participantes = [v for v, p in zip(valores, participa) if p]
+    media = sum(participantes) / len(participantes) if participantes else float("nan")
+    with np.errstate(invalid="ignore", divide="ignore"):
+        dentro_faixa = dentro(np.array(valores, dtype=float), media).tolist()
+    mantidos = [bool(d) and bool(p) for d, p in zip(dentro_faixa, participa)]
+    excluidos = [bool(p) and not m for p, m in zip(participa, mantidos)]
+    return Aceite(mantidos, excluidos, media, media, 1)
@@ -0,0 +1,125 @@
+"""Agenda dos corpos de prova (CPs) por idade de cura.
+
+Quando um lote é moldado, cada ensaio da linha que depende de cura gera um item
+na agenda para cada idade (ex: compressão 5x10 aos 1, 3, 7 e 28 dias; leitura final
+da variação dimensional aos 28 dias). Os itens ficam no banco do histórico com um
+índice parcial por data de vencimento só dos itens em aberto, então "o que vence
+hoje ou está atrasado" é uma busca no índice (O(log n) + itens retornados), mesmo
+com centenas de milhares de CPs agendados.
+
+Um item é baixado automaticamente quando o resultado do mesmo lote e requisito é
+gravado (gancho na transação do histórico).
+"""
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Sequence
+
+import ensaios
+import historico
+from ensaios import REQUISITOS
+
+# Idades de ensaio (dias após a moldagem). Ensaios no estado fresco não são agendados.
+IDADES_ENSAIO = {
+    ensaios.ENS_FLEXAO: [28],
+    ensaios.ENS_COMPRESSAO_4X4X16: [1, 3, 7, 28],
+    ensaios.ENS_COMPRESSAO_5X10: [1, 3, 7, 28],
+    ensaios.ENS_CAPILARIDADE: [28],
+    ensaios.ENS_ADERENCIA_AUTO: [28],
+    ensaios.ENS_ADERENCIA_MANUAL: [28],
+    ensaios.ENS_RETRACAO: [28],
+    ensaios.ENS_PERMEABILIDADE: [28],
+    ensaios.ENS_VAR_DIM: [28],   # Leitura "Final (28 dias)"
+    ensaios.ENS_VAR_MASSA: [28],
+}
+
+# Um resultado gravado até esta antecedência baixa o item (ensaio adiantado na véspera)
+ANTECEDENCIA_BAIXA = timedelta(days=1)
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS agenda (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    lote         TEXT NOT NULL,
+    produto      TEXT NOT NULL,
+    requisito    TEXT NOT NULL,
+    ensaio       TEXT NOT NULL,
+    idade_dias   INTEGER NOT NULL,
+    n_cps        INTEGER NOT NULL,
+    moldado_em   TEXT NOT NULL,
+    vence_em     TEXT NOT NULL,
+    concluido_em TEXT,
+    resultado_id INTEGER,
+    UNIQUE (lote, requisito, idade_dias)
+);
+CREATE INDEX IF NOT EXISTS ix_agenda_pendentes ON agenda (vence_em) WHERE concluido_em IS NULL;
+CREATE INDEX IF NOT EXISTS ix_agenda_lote ON agenda (lote, requisito) WHERE concluido_em IS NULL;
+"""
+
+historico.registrar_esquema(_ESQUEMA)
+
+# ======================== 1. REGISTRO DA MOLDAGEM ========================
+
+def itens_do_lote(lote: str, produto: str, moldado_em: date,
+                  requisitos: Optional[Sequence[str]] = None) -> List[Dict]:
+    """Monta os itens da agenda de um lote (um por requisito e idade de cura)."""
+    itens = []
+    for req in requisitos or REQUISITOS.get(produto, []):
+        ensaio = ensaios.identificar_ensaio(produto, req)
+        for idade in IDADES_ENSAIO.get(ensaio, []):
+            itens.append({
+                "lote": lote, "produto": produto, "requisito": req, "ensaio": ensaio,
+                "idade_dias": idade, "n_cps": ensaios.N_CPS[ensaio],
+                "moldado_em": moldado_em.isoformat(),
+                "vence_em": (moldado_em + timedelta(days=idade)).isoformat(),
+            })
+    return itens
+
+def moldar(lote: str, produto: str, moldado_em: Optional[date] = None,
+           requisitos: Optional[Sequence[str]] = None, conn=None) -> int:
+    """Registra a moldagem de um lote e agenda os CPs; retorna quantos itens foram criados."""
+    conn = conn or historico.conectar()
+    itens = itens_do_lote(lote, produto, moldado_em or date.today(), requisitos)
+    with conn:
+        cur = conn.executemany(
+            "INSERT OR IGNORE INTO agenda (lote, produto, requisito, ensaio, idade_dias, n_cps, moldado_em, vence_em) "
+            "VALUES (:lote, :produto, :requisito, :ensaio, :idade_dias, :n_cps, :moldado_em, :vence_em)",
+            itens,
+        )
+    return cur.rowcount
+
+# ======================== 2. CONSULTAS ========================
+
+def pendentes(ate: Optional[date] = None, produto: Optional[str] = None, limite: int = 200,
+              conn=None) -> List[Dict]:
+    """Itens em aberto que vencem até a data (padrão: hoje), dos mais atrasados aos mais novos."""
+    conn = conn or historico.conectar()
+    sql = "SELECT * FROM agenda WHERE concluido_em IS NULL AND vence_em <= ?"
+    params: list = [(ate or date.today()).isoformat()]
+    if produto:
+        sql += " AND produto = ?"
+        params.append(produto)
+    sql += " ORDER BY vence_em, id LIMIT ?"
+    params.append(limite)
+    return [dict(r) for r in conn.execute(sql, params)]
+
+def contar_pendentes(ate: Optional[date] = None, conn=None) -> int:
+    conn = conn or historico.conectar()
+    return conn.execute("SELECT COUNT(*) FROM agenda WHERE concluido_em IS NULL AND vence_em <= ?",
+                        ((ate or date.today()).isoformat(),)).fetchone()[0]
+
+def dias_de_atraso(item: Dict, hoje: Optional[date] = None) -> int:
+    return ((hoje or date.today()) - date.fromisoformat(item["vence_em"])).days
+
+# ======================== 3. BAIXA AUTOMÁTICA ========================
+
+def baixar(conn, registro: Dict, id_: int):
+    """Gancho de transação: o resultado gravado baixa o item vencido mais antigo do lote/requisito."""
+    lote = registro.get("lote")
+    if not lote:
+        return
+    gravado = datetime.fromisoformat(registro["criado_em"]).date()
+    conn.execute(
+        "UPDATE agenda SET concluido_em = ?, resultado_id = ? WHERE id = ("
+        "  SELECT id FROM agenda WHERE lote = ? AND requisito = ? AND concluido_em IS NULL AND vence_em <= ?"
+        "  ORDER BY vence_em LIMIT 1)",
+        (registro["criado_em"], id_, lote, registro["requisito"], (gravado + ANTECEDENCIA_BAIXA).isoformat()),
+    )
+
@@ -0,0 +1,299 @@
+"""Espelho colunar (Parquet) do histórico para consultas analíticas.
+
+O histórico em SQLite é ótimo para gravar um resultado por vez, mas perguntas como
+"média mensal da capilaridade do Rejunte nos últimos cinco anos" exigiriam ler a
+tabela inteira. Este módulo espelha os resultados em dois conjuntos Parquet
+particionados por produto e ano (``produto=Rejunte/ano=2023/...``):
+
+    * ``resultados`` — uma linha por cálculo (resultado final, validade, contagens)
+    * ``leituras``   — uma linha por CP (valor calculado, posição, excluído ou não)
+
+As consultas usam ``pyarrow.dataset``: o filtro por produto/ano descarta partições
+inteiras, os demais filtros são empurrados para a leitura dos row groups e só as
+colunas pedidas são lidas. As agregações percorrem o conjunto em lotes de registros
+(memória limitada, independente do tamanho do histórico).
+
+Uso:
+    python analitico.py exportar [--completo]
+    python analitico.py media-mensal Rejunte capilaridade [--desde 2020] [--leituras]
+    python analitico.py reprovados Basecoat aderencia_automatica
+
+A exportação é incremental (só ids novos). Depois de um recálculo do histórico
+(recalculo.py), use ``--completo`` para regravar o espelho.
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import pyarrow as pa
+import pyarrow.acero as ac
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+import ensaios
+import historico
+
+CAMINHO_ANALITICO = os.environ.get(
+    "CALCULADORA_ANALITICO",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "dados", "analitico"),
+)
+
+# Linhas do SQLite lidas por vez na exportação e registros por lote nas consultas
+BLOCO_EXPORTACAO = 50_000
+LOTE_LEITURA = 256 * 1024
+
+ESQUEMA_RESULTADOS = pa.schema([
+    ("id", pa.int64()),
+    ("lote", pa.string()),
+    ("produto", pa.string()),
+    ("ano", pa.int16()),
+    ("mes", pa.int8()),
+    ("ensaio", pa.string()),
+    ("resultado", pa.float64()),
+    ("media_inicial", pa.float64()),
+    ("valido", pa.bool_()),
+    ("n_cps", pa.int16()),
+    ("n_excluidos", pa.int16()),
+    ("operador", pa.string()),
+    ("origem", pa.string()),
+    ("criado_em", pa.timestamp("s")),
+])
+
+ESQUEMA_LEITURAS = pa.schema([
+    ("id", pa.int64()),
+    ("produto", pa.string()),
+    ("ano", pa.int16()),
+    ("mes", pa.int8()),
+    ("ensaio", pa.string()),
+    ("posicao", pa.int16()),
+    ("valor", pa.float64()),
+    ("excluido", pa.bool_()),
+])
+
+_PARTICOES = ds.partitioning(pa.schema([("produto", pa.string()), ("ano", pa.int16())]), flavor="hive")
+
+# ======================== 1. EXPORTAÇÃO ========================
+
+def _marca(destino: str) -> int:
+    """Maior id já exportado (0 se o espelho ainda não existe)."""
+    try:
+        with open(os.path.join(destino, "_marca.json"), encoding="utf-8") as f:
+            return int(json.load(f)["ultimo_id"])
+    except (FileNotFoundError, KeyError, ValueError):
+        return 0
+
+def _gravar_marca(destino: str, ultimo_id: int):
+    caminho = os.path.join(destino, "_marca.json")
+    with open(caminho + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"ultimo_id": ultimo_id, "exportado_em": datetime.now().isoformat(timespec="seconds")}, f)
+    os.replace(caminho + ".tmp", caminho)
+
+def _blocos_sqlite(conn, desde_id: int, tamanho: int) -> Iterator[list]:
+    while True:
+        linhas = conn.execute(
+            "SELECT id, lote, produto, ensaio, valores, excluidos, media_inicial, resultado, valido, "
+            "operador, origem, criado_em, entradas FROM resultados WHERE id > ? ORDER BY id LIMIT ?",
+            (desde_id, tamanho),
+        ).fetchall()
+        if not linhas:
+            return
+        desde_id = linhas[-1][0]
+        yield linhas
+
+# Campo de entrada que diz se o CP foi ensaiado: a calculadora grava as posições não
+# ensaiadas como 0.0 e a regra devolve 0 para elas (ex: retração com ``ini == 0``). O 0
+# calculado de um CP ensaiado (ex: variação nula) continua sendo leitura.
+_CAMPO_DO_CP = {
+    ensaios.ENS_FLEXAO: "cps",
+    ensaios.ENS_COMPRESSAO_4X4X16: "cps",
+    ensaios.ENS_COMPRESSAO_5X10: "cps",
+    ensaios.ENS_ADERENCIA_AUTO: "cps",
+    ensaios.ENS_ADERENCIA_MANUAL: "cps",
+    ensaios.ENS_CAPILARIDADE: "m10",
+    ensaios.ENS_RETRACAO: "ini",
+    ensaios.ENS_PERMEABILIDADE: "ini",
+    ensaios.ENS_VAR_MASSA: "ini",
+}
+
+def _preenchido(ensaio: str, pos: int, valor, entradas: Dict) -> bool:
+    if valor is None or valor == "":
+        return False
+    campo = _CAMPO_DO_CP.get(ensaio)
+    if campo is None:
+        return True
+    leituras = entradas.get(campo)
+    if not isinstance(leituras, list) or pos >= len(leituras):
+        return valor != 0  # Sem as entradas gravadas, 0 nesses ensaios é CP vazio
+    return (leituras[pos] or 0) > 0
+
+def _converter(linhas: list) -> tuple:
+    """Converte um bloco do SQLite nas tabelas Arrow de resultados e de leituras."""
+    res = {nome: [] for nome in ESQUEMA_RESULTADOS.names}
+    lei = {nome: [] for nome in ESQUEMA_LEITURAS.names}
+    for (id_, lote, produto, ensaio, valores, excluidos, media_ini, resultado, valido,
+         operador, origem, criado_em, entradas) in linhas:
+        quando = datetime.fromisoformat(criado_em)
+        valores = json.loads(valores)
+        excluidos = set(json.loads(excluidos))
+        entradas = json.loads(entradas) if entradas else {}
+        preenchidos = [(i, v) for i, v in enumerate(valores) if _preenchido(ensaio, i, v, entradas)]
+        for nome, valor in (("id", id_), ("lote", lote), ("produto", produto), ("ano", quando.year),
+                            ("mes", quando.month), ("ensaio", ensaio), ("resultado", resultado),
+                            ("media_inicial", media_ini), ("valido", bool(valido)),
+                            ("n_cps", len(preenchidos)), ("n_excluidos", len(excluidos)),
+                            ("operador", operador), ("origem", origem), ("criado_em", quando)):
+            res[nome].append(valor)
+        for pos, valor in preenchidos:
+            lei["id"].append(id_)
+            lei["produto"].append(produto)
+            lei["ano"].append(quando.year)
+            lei["mes"].append(quando.month)
+            lei["ensaio"].append(ensaio)
+            lei["posicao"].append(pos)
+            lei["valor"].append(valor)
+            lei["excluido"].append(pos in excluidos)
+    # Ordenados por ensaio: as estatísticas dos row groups permitem pular os outros ensaios
+    return (pa.Table.from_pydict(res, schema=ESQUEMA_RESULTADOS).sort_by("ensaio"),
+            pa.Table.from_pydict(lei, schema=ESQUEMA_LEITURAS).sort_by("ensaio"))
+
+def exportar(destino: Optional[str] = None, completo: bool = False, conn=None) -> Dict:
+    """Acrescenta ao espelho Parquet os resultados gravados desde a última exportação."""
+    destino = destino or CAMINHO_ANALITICO
+    conn = conn or historico.conectar()
+    if completo and os.path.isdir(destino):
+        shutil.rmtree(destino)
+    os.makedirs(destino, exist_ok=True)
+
+    inicio = time.perf_counter()
+    ultimo = _marca(destino)
+    resumo = {"resultados": 0, "leituras": 0, "ultimo_id": ultimo}
+    for linhas in _blocos_sqlite(conn, ultimo, BLOCO_EXPORTACAO):
+        resultados, leituras = _converter(linhas)
+        # Nome dos arquivos pelo primeiro id do bloco: exportações seguintes não sobrescrevem
+        nome = f"parte-{linhas[0][0]}-{{i}}.parquet"
+        for tabela, subdir in ((resultados, "resultados"), (leituras, "leituras")):
+            ds.write_dataset(tabela, os.path.join(destino, subdir), format="parquet",
+                             partitioning=_PARTICOES, basename_template=nome,
+                             existing_data_behavior="overwrite_or_ignore")
+        resumo["resultados"] += resultados.num_rows
+        resumo["leituras"] += leituras.num_rows
+        resumo["ultimo_id"] = linhas[-1][0]
+        _gravar_marca(destino, resumo["ultimo_id"])
+    resumo["segundos"] = time.perf_counter() - inicio
+    return resumo
+
+# ======================== 2. CONSULTAS ========================
+
+def conjunto(nome: str = "resultados", origem: Optional[str] = None) -> ds.Dataset:
+    """Abre um dos conjuntos do espelho ("resultados" ou "leituras")."""
+    esquema = ESQUEMA_RESULTADOS if nome == "resultados" else ESQUEMA_LEITURAS
+    return ds.dataset(os.path.join(origem or CAMINHO_ANALITICO, nome), format="parquet",
+                      partitioning=_PARTICOES, schema=esquema)
+
+def filtro(produto: Optional[str] = None, ensaio: Optional[str] = None,
+           desde_ano: Optional[int] = None, ate_ano: Optional[int] = None, **iguais) -> Optional[ds.Expression]:
+    """Monta a expressão de filtro (produto/ano descartam partições; o resto vai aos row groups)."""
+    expr = None
+    condicoes = [("produto", produto), ("ensaio", ensaio)] + list(iguais.items())
+    for campo, valor in condicoes:
+        if valor is not None:
+            cond = ds.field(campo) == valor
+            expr = cond if expr is None else expr & cond
+    if desde_ano is not None:
+        cond = ds.field("ano") >= desde_ano
+        expr = cond if expr is None else expr & cond
+    if ate_ano is not None:
+        cond = ds.field("ano") <= ate_ano
+        expr = cond if expr is None else expr & cond
+    return expr
+
+def agregar(dados: ds.Dataset, por: Sequence[str], valor: str,
+            filtro_expr: Optional[ds.Expression] = None) -> pa.Table:
+    """Soma/contagem/média de ``valor`` agrupados por ``por``, em fluxo (memória limitada).
+
+    Usa o motor de execução do Arrow (Acero): a varredura lê poucos arquivos por vez,
+    o filtro e a agregação rodam nas threads do Arrow e só as somas por grupo ficam
+    na memória. O resultado vem ordenado pelas chaves do agrupamento.
+    """
+    colunas = list(por) + [valor]
+    if pa.types.is_boolean(dados.schema.field(valor).type):
+        projecao = [ds.field(c) for c in por] + [ds.field(valor).cast(pa.int8())]
+    else:
+        projecao = [ds.field(c) for c in colunas]
+    etapas = [ac.Declaration("scan", ac.ScanNodeOptions(dados, columns=colunas, filter=filtro_expr,
+                                                        batch_size=LOTE_LEITURA, fragment_readahead=1))]
+    if filtro_expr is not None:
+        # O scan só usa o filtro para descartar partições/row groups; aqui ele é aplicado às linhas
+        etapas.append(ac.Declaration("filter", ac.FilterNodeOptions(filtro_expr)))
+    etapas += [
+        ac.Declaration("project", ac.ProjectNodeOptions(projecao, colunas)),
+        ac.Declaration("aggregate", ac.AggregateNodeOptions(
+            [(valor, "hash_sum", None, "soma"), (valor, "hash_count", None, "n")], keys=list(por))),
+    ]
+    tabela = ac.Declaration.from_sequence(etapas).to_table()
+    tabela = tabela.sort_by([(c, "ascending") for c in por])
+    soma = pc.cast(tabela["soma"], pa.float64())
+    return tabela.set_column(tabela.schema.get_field_index("soma"), "soma", soma).append_column(
+        "media", pc.divide(soma, pc.cast(tabela["n"], pa.float64())))
+
+def media_mensal(produto: str, ensaio: str, desde_ano: Optional[int] = None,
+                 por_cp: bool = False, origem: Optional[str] = None) -> pa.Table:
+    """Média mensal do resultado (ou, com ``por_cp``, das leituras de CP não excluídas)."""
+    if por_cp:
+        expr = filtro(produto, ensaio, desde_ano, excluido=False)
+        return agregar(conjunto("leituras", origem), ["ano", "mes"], "valor", expr)
+    expr = filtro(produto, ensaio, desde_ano, valido=True)
+    return agregar(conjunto("resultados", origem), ["ano", "mes"], "resultado", expr)
+
+def fracao_reprovada(produto: str, ensaio: str, desde_ano: Optional[int] = None,
+                     origem: Optional[str] = None) -> Dict:
+    """Fração dos ensaios inválidos (ex: sem o mínimo de CPs), por ano e no total."""
+    tabela = agregar(conjunto("resultados", origem), ["ano"], "valido", filtro(produto, ensaio, desde_ano))
+    total = sum(tabela["n"].to_pylist())
+    validos = sum(tabela["soma"].to_pylist())
+    por_ano = {ano: 1 - media for ano, media in zip(tabela["ano"].to_pylist(), tabela["media"].to_pylist())}
+    return {"ensaios": total, "invalidos": int(total - validos),
+            "fracao": (total - validos) / total if total else None, "por_ano": por_ano}
+
+# ======================== 3. LINHA DE COMANDO ========================
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Espelho Parquet do histórico e consultas analíticas.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p = sub.add_parser("exportar", help="Atualiza o espelho com os resultados novos")
+    p.add_argument("--completo", action="store_true", help="Regrava o espelho inteiro")
+    p = sub.add_parser("media-mensal", help="Média mensal de um ensaio")
+    p.add_argument("produto")
+    p.add_argument("ensaio")
+    p.add_argument("--desde", type=int, help="Primeiro ano considerado")
+    p.add_argument("--leituras", action="store_true", help="Média das leituras de CP, não do resultado")
+    p = sub.add_parser("reprovados", help="Fração de ensaios inválidos")
+    p.add_argument("produto")
+    p.add_argument("ensaio")
+    p.add_argument("--desde", type=int, help="Primeiro ano considerado")
+    args = parser.parse_args(argv)
+
+    inicio = time.perf_counter()
+    if args.comando == "exportar":
+        resumo = exportar(completo=args.completo)
+        print(f"{resumo['resultados']} resultados e {resumo['leituras']} leituras exportados "
+              f"(até id {resumo['ultimo_id']}) em {resumo['segundos']:.1f} s")
+        return
+    if args.comando == "media-mensal":
+        tabela = media_mensal(args.produto, args.ensaio, args.desde, por_cp=args.leituras)
+        for ano, mes, media, n in zip(*(tabela[c].to_pylist() for c in ("ano", "mes", "media", "n"))):
+            print(f"{ano}-{mes:02d}  {media:10.4f}  (n={n})")
+    else:
+        r = fracao_reprovada(args.produto, args.ensaio, args.desde)
+        for ano, fracao in r["por_ano"].items():
+            print(f"{ano}  {fracao:6.1%}")
+        if r["ensaios"]:
+            print(f"Total: {r['invalidos']}/{r['ensaios']} inválidos ({r['fracao']:.1%})")
+    print(f"Consulta em {(time.perf_counter() - inicio) * 1000:.0f} ms")
+
+if __name__ == "__main__":
+    main()
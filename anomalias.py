@@ -0,0 +1,231 @@
+"""Detecção de erros de digitação e valores anômalos nas entradas das calculadoras.
+
+Mantém, para cada (produto, ensaio, campo, posição do CP), a mediana e o MAD
+(desvio absoluto mediano) das últimas leituras válidas. O índice é montado uma
+vez a partir do histórico e atualizado a cada resultado gravado; a conferência
+no envio do formulário é só uma consulta em dicionário e uma conta (O(1)).
+
+Os alertas também ficam no próprio resultado (coluna ``alertas`` do histórico,
+gravada na transação do resultado), venha ele do app ou de uma importação. No app o
+índice é carregado em segundo plano (``aquecer``); nos demais processos (importador,
+recálculo) a primeira gravação o carrega com o histórico anterior a ela. Enquanto o
+índice não está pronto, ``verificar`` aplica só as regras estruturais.
+"""
+import json
+import logging
+import threading
+from bisect import bisect_left, insort
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+import ensaios
+import historico
+
+_log = logging.getLogger(__name__)
+
+# Leituras mantidas por série (janela móvel) e mínimo para começar a avisar
+JANELA = 200
+MIN_AMOSTRAS = 10
+# Escore robusto (Iglewicz-Hoaglin): |0,6745·(x - mediana) / MAD| acima disso é suspeito
+LIMITE_Z = 3.5
+# Fatores testados para sugerir vírgula deslocada (ex: 45.0 digitado no lugar de 4.50)
+FATORES_VIRGULA = (10.0, 100.0, 0.1, 0.01)
+# Histórico lido na carga inicial (mais recentes primeiro)
+MAX_CARGA_INICIAL = 200_000
+# Espera máxima de um ouvinte pela carga inicial em andamento (segundos)
+ESPERA_CARGA = 30.0
+
+Chave = Tuple[str, str, str, Optional[int]]
+
+class _Serie:
+    """Janela das últimas leituras de uma posição, com mediana/MAD já calculados."""
+    __slots__ = ("janela", "ordenados", "estat")
+
+    def __init__(self):
+        self.janela = deque()
+        self.ordenados: List[float] = []
+        self.estat: Tuple[float, float, int] = (0.0, 0.0, 0)  # (mediana, mad, n)
+
+    def adicionar(self, valor: float):
+        self.janela.append(valor)
+        insort(self.ordenados, valor)
+        if len(self.janela) > JANELA:
+            antigo = self.janela.popleft()
+            del self.ordenados[bisect_left(self.ordenados, antigo)]
+        self.estat = self._calcular()
+
+    def _calcular(self) -> Tuple[float, float, int]:
+        o = self.ordenados
+        n = len(o)
+        med = _mediana(o)
+        mad = _mediana(sorted(abs(v - med) for v in o))
+        return med, mad, n
+
+def _mediana(ordenados: List[float]) -> float:
+    n = len(ordenados)
+    if n == 0:
+        return 0.0
+    meio = n // 2
+    return ordenados[meio] if n % 2 else (ordenados[meio - 1] + ordenados[meio]) / 2
+
+def _leituras(entradas: Dict):
+    """Itera (campo, posição, valor) das entradas preenchidas (zeros = campo vazio)."""
+    for campo, valor in entradas.items():
+        if isinstance(valor, (list, tuple)):
+            for pos, v in enumerate(valor):
+                if v:
+                    yield campo, pos, float(v)
+        elif isinstance(valor, (int, float)) and valor:
+            yield campo, None, float(valor)
+
+def _incluir(series: Dict[Chave, _Serie], produto: str, ensaio: str, entradas: Dict):
+    for campo, pos, valor in _leituras(entradas):
+        chave = (produto, ensaio, campo, pos)
+        serie = series.get(chave)
+        if serie is None:
+            serie = series[chave] = _Serie()
+        serie.adicionar(valor)
+
+class IndiceEstatistico:
+    """Índice (produto, ensaio, campo, posição) -> mediana/MAD das leituras válidas."""
+
+    def __init__(self):
+        self._series: Dict[Chave, _Serie] = {}
+        self._lock = threading.Lock()
+        self.pronto = False
+        self.ultimo_id = 0  # Maior id já incluído pela carga inicial
+
+    def atualizar(self, produto: str, ensaio: str, entradas: Dict):
+        """Inclui as leituras de um resultado válido nas séries correspondentes."""
+        with self._lock:
+            _incluir(self._series, produto, ensaio, entradas)
+
+    def estatisticas(self, produto: str, ensaio: str, campo: str, pos: Optional[int]) -> Optional[Tuple[float, float, int]]:
+        serie = self._series.get((produto, ensaio, campo, pos))
+        return serie.estat if serie is not None else None
+
+    def carregar(self, conn=None, ate_id: Optional[int] = None):
+        """Monta o índice a partir dos resultados válidos mais recentes do histórico (até ``ate_id``).
+
+        O índice montado substitui o atual: o que foi incluído antes já está nas linhas lidas.
+        """
+        conn = conn or historico.conectar()
+        linhas = conn.execute(
+            "SELECT id, produto, ensaio, entradas FROM resultados WHERE valido = 1 AND id <= ? "
+            "ORDER BY id DESC LIMIT ?",
+            (ate_id if ate_id is not None else 2 ** 63 - 1, MAX_CARGA_INICIAL),
+        ).fetchall()
+        series: Dict[Chave, _Serie] = {}
+        for _, produto, ensaio, entradas in reversed(linhas):
+            _incluir(series, produto, ensaio, json.loads(entradas))
+        with self._lock:
+            self._series = series
+            self.ultimo_id = linhas[0][0] if linhas else 0
+        self.pronto = True
+
+_indice = IndiceEstatistico()
+_carga_iniciada = threading.Lock()
+_carga_concluida = threading.Event()
+
+def indice() -> IndiceEstatistico:
+    """Índice compartilhado pelo processo (todas as sessões)."""
+    return _indice
+
+def aquecer():
+    """Carrega o índice em segundo plano na primeira chamada (não bloqueia a página)."""
+    if _indice.pronto or not _carga_iniciada.acquire(blocking=False):
+        return
+    def _carregar():
+        try:
+            _indice.carregar(historico.conectar())
+        except Exception:
+            _log.exception("Falha ao montar o índice de anomalias")
+        finally:
+            _carga_concluida.set()
+    threading.Thread(target=_carregar, name="anomalias-carga", daemon=True).start()
+
+def ao_gravar(registro: Dict, id_: int):
+    """Ouvinte do histórico: mantém o índice atualizado a cada resultado válido.
+
+    Com a carga inicial em andamento, espera ela terminar: incluir antes desordenaria
+    as janelas, e um resultado gravado antes da leitura da carga seria contado duas
+    vezes (os ids até ``ultimo_id`` já vieram da carga).
+    """
+    if _carga_iniciada.locked() and not _carga_concluida.wait(ESPERA_CARGA):
+        _log.warning("Carga do índice de anomalias ainda em andamento; resultado %s incluído antes", id_)
+    if registro["valido"] and id_ > _indice.ultimo_id:
+        _indice.atualizar(registro["produto"], registro["ensaio"], json.loads(registro["entradas"]))
+
+def _carregar_antes(conn, id_: int):
+    """Índice pronto antes da conferência de uma gravação.
+
+    Sem ``aquecer`` (importador, recálculo), carrega aqui, na conexão da gravação, só o
+    histórico anterior ao resultado: as linhas da própria importação entram depois, pelo
+    ouvinte. Com a carga em segundo plano em andamento (app), espera ela terminar.
+    """
+    if _indice.pronto:
+        return
+    if not _carga_iniciada.acquire(blocking=False):
+        _carga_concluida.wait(ESPERA_CARGA)
+        return
+    try:
+        _indice.carregar(conn, ate_id=id_ - 1)
+    except Exception:
+        _log.exception("Falha ao montar o índice de anomalias")
+    finally:
+        _carga_concluida.set()
+
+def marcar(conn, registro: Dict, id_: int):
+    """Gancho de transação: grava no resultado os alertas das entradas (JSON; NULL se nenhum)."""
+    _carregar_antes(conn, id_)
+    alertas = verificar(registro["produto"], registro["ensaio"], json.loads(registro["entradas"]))
+    if alertas:
+        conn.execute("UPDATE resultados SET alertas = ? WHERE id = ?", (json.dumps(
+            [{"campo": a["campo"], "posicao": a["posicao"], "valor": a["valor"], "sugestao": a.get("sugestao")}
+             for a in alertas], ensure_ascii=False), id_))
+
+
+# ======================== CONFERÊNCIA NO ENVIO ========================
+
+def _escore(valor: float, mediana: float, mad: float) -> float:
+    # MAD zero (leituras idênticas) usa 1% da mediana como escala mínima
+    escala = max(mad, abs(mediana) * 0.01, 1e-9)
+    return 0.6745 * (valor - mediana) / escala
+
+def _rotulo(campo: str, pos: Optional[int]) -> str:
+    if pos is None:
+        return campo
+    return f"CP {pos + 1}" if campo == "cps" else f"{campo} (CP {pos + 1})"
+
+def verificar(produto: Optional[str], ensaio: str, entradas: Dict) -> List[Dict]:
+    """Confere as entradas antes do cálculo; retorna a lista de alertas (vazia se tudo ok)."""
+    alertas = []
+
+    # Regras estruturais (não dependem do histórico)
+    if ensaio == ensaios.ENS_RETENCAO and entradas.get("massa_ini"):
+        if entradas.get("tara", 0) > entradas["massa_ini"]:
+            alertas.append({"campo": "tara", "posicao": None, "valor": entradas["tara"],
+                            "mensagem": "Tara maior que a massa inicial: tara e massa foram trocadas?"})
+        if entradas.get("massa_fim", 0) > entradas["massa_ini"]:
+            alertas.append({"campo": "massa_fim", "posicao": None, "valor": entradas["massa_fim"],
+                            "mensagem": "Massa final maior que a inicial: leituras trocadas?"})
+
+    if not produto or not _indice.pronto:
+        return alertas  # Sem o histórico carregado só as regras estruturais valem
+    for campo, pos, valor in _leituras(entradas):
+        estat = _indice.estatisticas(produto, ensaio, campo, pos)
+        if estat is None or estat[2] < MIN_AMOSTRAS:
+            continue
+        mediana, mad, _ = estat
+        z = _escore(valor, mediana, mad)
+        if abs(z) <= LIMITE_Z:
+            continue
+        mensagem = (f"{_rotulo(campo, pos)} = {valor:g} está fora do habitual para {produto} "
+                    f"(mediana {mediana:.3g})")
+        sugestao = next((valor / f for f in FATORES_VIRGULA
+                         if abs(_escore(valor / f, mediana, mad)) <= LIMITE_Z), None)
+        if sugestao is not None:
+            mensagem += f" — vírgula deslocada? Seria {sugestao:g}?"
+        alertas.append({"campo": campo, "posicao": pos, "valor": valor, "escore": z,
+                        "sugestao": sugestao, "mensagem": mensagem})
+    return alertas
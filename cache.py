@@ -0,0 +1,114 @@
+"""Cache de resultados compartilhado por todas as sessões (LRU + TTL).
+
+As regras de ensaios.py são determinísticas: as mesmas entradas com os mesmos
+limites produzem o mesmo resultado. Quando vários técnicos ou revisores recalculam
+o mesmo lote, o resultado vem do cache em vez de refazer a regra.
+
+A chave é (ensaio, produto, camadas de limites, regra, instantâneo dos limites usados
+pelo ensaio, entradas normalizadas); as camadas separam os clientes com limites
+próprios (ver ensaios.limites_produto). Se um valor de CONFIG_LIMITES usado pelo
+ensaio mudar, o instantâneo muda: as entradas antigas daquele ensaio/produto/camadas
+são descartadas na primeira consulta seguinte (contadas como invalidações).
+
+Os resultados guardados são compartilhados entre sessões e não devem ser alterados
+por quem os recebe.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Mapping, Optional, Tuple
+
+import ensaios
+
+MAX_ITENS = 4096
+TTL_SEGUNDOS = 15 * 60
+
+def normalizar(valor) -> Hashable:
+    """Converte entradas em uma chave estável (listas -> tuplas, números -> float)."""
+    if isinstance(valor, bool) or valor is None or isinstance(valor, str):
+        return valor
+    if isinstance(valor, (int, float)):
+        return float(valor) + 0.0  # 0 == 0.0 == -0.0
+    if isinstance(valor, (list, tuple)):
+        return tuple(normalizar(v) for v in valor)
+    if isinstance(valor, dict):
+        return tuple(sorted((k, normalizar(v)) for k, v in valor.items()))
+    return repr(valor)
+
+class CacheResultados:
+    """LRU com validade por tempo, limitado em número de itens, seguro entre threads."""
+
+    def __init__(self, max_itens: int = MAX_ITENS, ttl: float = TTL_SEGUNDOS):
+        self.max_itens, self.ttl = max_itens, ttl
+        self._itens: "OrderedDict[Tuple, Tuple[float, Dict]]" = OrderedDict()
+        self._limites: Dict[Tuple, Tuple] = {}  # (ensaio, produto, camadas) -> instantâneo vigente
+        self._lock = threading.Lock()
+        self._contadores = {"acertos": 0, "faltas": 0, "remocoes_lru": 0, "expirados": 0, "invalidados": 0}
+
+    def _conferir_limites(self, grupo: Tuple, instantaneo: Tuple):
+        """Descarta as entradas do grupo calculadas com limites diferentes dos atuais."""
+        anterior = self._limites.get(grupo)
+        if anterior == instantaneo:
+            return
+        self._limites[grupo] = instantaneo
+        if anterior is None:
+            return
+        velhas = [k for k in self._itens if k[0] == grupo and k[1] != instantaneo]
+        for k in velhas:
+            del self._itens[k]
+        self._contadores["invalidados"] += len(velhas)
+
+    def executar(self, ensaio: str, produto: Optional[str], regra: Callable, *args,
+                 limites: Optional[Mapping] = None, **kwargs) -> Dict:
+        """Retorna ``regra(*args, **kwargs)`` do cache ou calcula e guarda (erros não são guardados).
+
+        ``limites``: visão usada pela sessão (com fábrica/cliente); padrão: a do produto.
+        """
+        limites = limites if limites is not None else ensaios.limites_produto(produto)
+        grupo = (ensaio, produto, getattr(limites, "camadas", None))
+        instantaneo = normalizar(ensaios.dependencias(ensaio, produto, limites))
+        chave = (grupo, instantaneo, regra.__name__, normalizar(args), normalizar(kwargs))
+        agora = time.monotonic()
+        with self._lock:
+            self._conferir_limites(grupo, instantaneo)
+            item = self._itens.get(chave)
+            if item is not None:
+                if agora - item[0] <= self.ttl:
+                    self._itens.move_to_end(chave)
+                    self._contadores["acertos"] += 1
+                    return item[1]
+                del self._itens[chave]
+                self._contadores["expirados"] += 1
+            self._contadores["faltas"] += 1
+
+        # Calcula fora do lock: outras sessões não esperam por esta regra
+        resultado = regra(*args, **kwargs)
+
+        with self._lock:
+            self._itens[chave] = (agora, resultado)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+                self._contadores["remocoes_lru"] += 1
+        return resultado
+
+    def limpar(self):
+        with self._lock:
+            self._contadores["invalidados"] += len(self._itens)
+            self._itens.clear()
+            self._limites.clear()
+
+    def estatisticas(self) -> Dict:
+        """Contadores para monitoramento (acertos, faltas, remoções, ocupação)."""
+        with self._lock:
+            stats = dict(self._contadores)
+            stats["itens"] = len(self._itens)
+        consultas = stats["acertos"] + stats["faltas"]
+        stats["taxa_acerto"] = stats["acertos"] / consultas if consultas else None
+        return stats
+
+_cache = CacheResultados()
+
+def resultados() -> CacheResultados:
+    """Cache compartilhado pelo processo (todas as sessões)."""
+    return _cache
@@ -1,132 +1,161 @@
+import json
+import os
 import re
-import unicodedata
+import sqlite3
+import uuid
+from datetime import date
 from functools import partial
+from urllib.parse import urlencode
 from typing import Dict, List, Optional
 
 import streamlit as st
-import streamlit.components.v1 as components
+
+import agenda
+import anomalias
+import cache
+import classificacao
+import consulta
+import ensaios
+import etiquetas
+import eventos
+import ganchos
+import historico
+import indicadores
+import instrumentos
+import lims
+import previsao
+import proficiencia
+import relatorios
+import sessao
+from ensaios import LINHAS_PRODUTOS, REQUISITOS, EntradaIncompleta, slugify
 # ======================== 1. CONFIGURAÇÃO E CONSTANTES ========================
 PAGE_TITLE = "Calculadora de Ensaios Físicos"
 PAGE_ICON = "🧪"
 
 PG_INICIO = "Inicio"
 PG_LINHAS = "Linha de Produtos"
-LINHAS_PRODUTOS = ("Basecoat", "Graute", "Rejunte", "Revestimento")
-
-# --- DEFINIÇÃO DOS ENSAIOS DISPONÍVEIS ---
-REQ_RETENCAO = "RETENÇÃO DE ÁGUA (%) - ABNT NBR 13277"
-REQ_DENSIDADE = "DENSIDADE NO ESTADO FRESCO (kg/m³) - ABNT NBR 13278"
-REQ_FLEXAO = "FLEXÃO 4x4x16 (MPa) - ABNT NBR 13279:2005"
-REQ_COMPRESSAO_PRISMA = "COMPRESSÃO 4x4x16 (MPa) - ABNT NBR 13279:2005"
-REQ_COMPRESSAO_CILINDRICA = "COMPRESSÃO 5x10 (MPa) - ABNT NBR 7215" # Novo para Graute/Rejunte
-REQ_VAR_DIM = "VARIAÇÃO DIMENSIONAL (mm/m) - ABNT NBR 15261"
-REQ_VAR_MASSA = "VARIAÇÃO DE MASSA (%) - ABNT NBR 15261"
-REQ_CAPILARIDADE = "CAPILARIDADE (g/dm²·min^0,5) - ABNT NBR 15259"
-REQ_ADERENCIA_AUTO = "POTENCIAL DE ADERÊNCIA (MPa) - ABNT NBR 15258 - Automática"
-REQ_ADERENCIA_MANUAL = "POTENCIAL DE ADERÊNCIA (MPa) - ABNT NBR 15258 - Manual"
-REQ_PERMEABILIDADE = "PERMEABILIDADE 48h (mL/cm³) - ABNT NBR 16648 anexo C"
-REQ_RETRACAO = "RETRAÇÃO (%) - Baseado na ABNT NBR 15261"
-
-# --- CONFIGURAÇÃO POR PRODUTO (Baseada nas Planilhas) ---
-REQUISITOS = {
-    "Basecoat": [
-        REQ_RETENCAO,
-        REQ_DENSIDADE,
-        REQ_FLEXAO,
-        REQ_COMPRESSAO_PRISMA, # Basecoat usa Prisma
-        REQ_VAR_DIM,
-        REQ_VAR_MASSA,
-        REQ_CAPILARIDADE,
-        REQ_ADERENCIA_AUTO,
-        REQ_PERMEABILIDADE,
-        REQ_RETRACAO
-    ],
-    "Graute": [
-        # Planilha Graute: Foco em Densidade, Expansão e Compressão
-        REQ_DENSIDADE,
-        REQ_COMPRESSAO_CILINDRICA, # NBR 7215 (5x10)
-        REQ_VAR_DIM,               # Expansão
-        REQ_VAR_MASSA
-    ],
-    "Rejunte": [
-        # Planilha Rejunte: Identificado NBR 7215 (Cilíndrica) e NBR 14992 (Retenção)
-        REQ_RETENCAO,
-        REQ_DENSIDADE,
-        REQ_COMPRESSAO_CILINDRICA, # Rejunte na planilha usa 5x10
-        REQ_VAR_DIM,
-        REQ_CAPILARIDADE,
-        REQ_PERMEABILIDADE,
-        REQ_RETRACAO
-    ],
-    "Revestimento": [
-        # Padrão Argamassa Colante/Revestimento
-        REQ_RETENCAO,
-        REQ_DENSIDADE,
-        REQ_FLEXAO,
-        REQ_COMPRESSAO_PRISMA,
-        REQ_ADERENCIA_MANUAL,
-        REQ_ADERENCIA_AUTO,
-        REQ_CAPILARIDADE,
-        REQ_VAR_DIM
-    ]
-}
+PG_PAINEL = "Painel"
+PG_AGENDA = "Agenda"
+PG_MONITOR = "Monitor"
+PG_LOTE = "Lote"
+PG_SIMULACAO = "Simulação"
+PG_HISTORICO = "Histórico"
 
-# --- LIMITES E TOLERÂNCIAS (Extraídos das Planilhas) ---
-
-# --- Medidas feitas em milimetros.
-#=========================================================//=================================================================
-
-CONFIG_LIMITES = {
-    "padrao": {
-        "flexao_var_max": 0.3,
-        "compressao_var_max": 0.5,
-        "variacao_dim_max": 0.20,
-        "compressao_cilindrica_var_pct": 6.0,
-        "aderencia_var_pct": 30.0,
-        "min_cps_aderencia": 6,
-        "capilaridade_var_pct": 20.0,
-        "retracao_var_pct": 20.0,
-        "permeabilidade_var_pct": 30.0,
-        "comprimento_padrao": 250.0 
-    },
-    "Basecoat": {
-        "flexao_var_max": 0.3,
-        "compressao_var_max": 0.5,
-        "variacao_dim_max": 0.20,
-        "aderencia_var_pct": 30.0,
-        "permeabilidade_var_pct": 30.0,
-        "comprimento_padrao": 160.0 
-    },
-    "Graute": {
-        "compressao_cilindrica_var_pct": 6.0,
-        "variacao_dim_max": 0.20,
-        # Calculado com base na planilha (0.18mm diff -> 1.38 mm/m)
-        "comprimento_padrao": 130.43 
-    },
-    "Rejunte": {
-        "compressao_cilindrica_var_pct": 6.0,
-        "variacao_dim_max": 0.20,
-        "comprimento_padrao": 160.0 
-    },
-    "Revestimento": {
-        "flexao_var_max": 0.3,
-        "compressao_var_max": 0.5,
-        "variacao_dim_max": 0.20,
-        "capilaridade_var_pct": 20.0,
-        "aderencia_var_pct": 30.0,
-        "comprimento_padrao": 160.0 
-    }
-}
+# Páginas acessíveis pelo menu lateral
+PAGINAS_MENU = [PG_INICIO, PG_LINHAS, PG_PAINEL, PG_MONITOR, PG_AGENDA, PG_LOTE, PG_HISTORICO, PG_SIMULACAO]
+
+# Vídeo tutorial: arquivo local (servido pelo próprio Streamlit, com suporte a Range) quando existir;
+# com CALCULADORA_OFFLINE=1 o YouTube nunca é usado (rede da fábrica frequentemente sem internet)
+VIDEO_YOUTUBE = "https://www.youtube.com/watch?v=d1xeEk7nRho"
+VIDEO_TUTORIAL = os.environ.get("CALCULADORA_VIDEO", os.path.join("dados", "tutorial.mp4"))
+OFFLINE = os.environ.get("CALCULADORA_OFFLINE") == "1"
+
+# Ensaios, requisitos por linha e limites ficam em ensaios.py (sem dependência do Streamlit)
+
+def limites_sessao() -> ensaios.Limites:
+    """Limites do produto atual com as sobreposições da fábrica e do cliente escolhido."""
+    return ensaios.limites_produto(st.session_state.get("produto", "padrao"),
+                                   cliente=st.session_state.get("cliente") or None)
 
 def obter_config(chave_limite):
     """Retorna o valor do limite para o produto atual selecionado."""
-    produto = st.session_state.get("produto", "padrao")
-    # Se o produto não estiver no dict, usa o padrao
-    config_produto = CONFIG_LIMITES.get(produto, CONFIG_LIMITES["padrao"])
-    return config_produto.get(chave_limite, CONFIG_LIMITES["padrao"][chave_limite])
+    return limites_sessao()[chave_limite]
+
+def requisito_atual() -> Optional[str]:
+    """Retorna o requisito (norma) da calculadora aberta, a partir do ID da página."""
+    pagina = ensaios.PAGINAS_CALCULO.get(st.session_state.get("pagina"))
+    return pagina[1] if pagina and pagina[0] == st.session_state.get("produto") else None
+
+def ensaio_atual() -> Optional[str]:
+    """Retorna a chave técnica do ensaio da calculadora aberta."""
+    requisito = requisito_atual()
+    return ensaios.identificar_ensaio(st.session_state.get("produto"), requisito) if requisito else None
+
+def registrar_resultado(ensaio: str, entradas: Dict, res: Dict) -> Optional[int]:
+    """Grava o cálculo no histórico com o contexto da sessão (lote e operador); retorna o id.
+
+    Só é chamada depois de um cálculo bem-sucedido; formulário vazio ou todo em zero é
+    exibido mas não gravado (não vira resultado no histórico, no LIMS nem na agenda).
+    """
+    produto = st.session_state.get("produto")
+    requisito = requisito_atual()
+    if not produto or not requisito:
+        return None
+    if not ensaios.entradas_preenchidas(ensaio, entradas):
+        st.caption("ℹ️ Entradas obrigatórias em branco: resultado não gravado no histórico.")
+        return None
+    registro = historico.montar_registro(
+        produto, requisito, ensaio, entradas, res,
+        lote=(st.session_state.get("lote") or "").strip() or None,
+        operador=(st.session_state.get("operador") or "").strip() or None,
+        cliente=st.session_state.get("cliente") or None,
+    )
+    try:
+        return historico.salvar_resultado(registro)
+    except sqlite3.Error as e:
+        # Falha no histórico não impede o técnico de ver o resultado
+        st.caption(f"⚠️ Resultado não gravado no histórico: {e}")
+        return None
+
+def calcular_regra(ensaio: str, regra, *args) -> Dict:
+    """Executa a regra pelo cache compartilhado (mesmas entradas e limites = mesmo resultado)."""
+    produto = st.session_state.get("produto")
+    limites = limites_sessao()
+    return cache.resultados().executar(ensaio, produto, regra, *args, limites=limites,
+                                       **ensaios.opcoes_aceitacao(ensaio, produto, limites))
+
+def ui_previsao(res: Dict, id_: Optional[int]):
+    """Previsão aos 28 dias quando o resultado gravado é de idade precoce (idade pela agenda do lote)."""
+    lote = (st.session_state.get("lote") or "").strip()
+    if not id_ or not lote or not res["valido"]:
+        return
+    produto, requisito = st.session_state.get("produto"), requisito_atual()
+    idade = previsao.idade_do_resultado(lote, requisito, id_)
+    if idade is None:
+        return
+    for p in previsao.prever_resultado(produto, requisito, idade, res["resultado"]):
+        st.info(f"🔮 Previsão aos 28 dias a partir de {idade} d — {p.alvo}: **{p.valor:.1f} MPa** "
+                f"(95%: {p.minimo:.1f} a {p.maximo:.1f}; {p.n} lotes)")
+
+def alertar_entradas(ensaio: str, entradas: Dict):
+    """Avisa, antes do cálculo, entradas fora do habitual para o produto (possível erro de digitação)."""
+    for alerta in anomalias.verificar(st.session_state.get("produto"), ensaio, entradas):
+        st.warning(alerta["mensagem"], icon="🔎")
+
+@st.fragment
+def ui_memoria(ensaio: str, res: Dict, titulo: str = "📝 Ver Fórmula e Memória de Cálculo"):
+    """Memória de cálculo sob demanda: montada (e enviada ao navegador) só com o expander aberto.
+
+    Abrir ou fechar reexecuta só este fragmento, então o resultado acima continua na tela.
+    """
+    memoria = res["detalhes"].get("memoria")
+    if not memoria:
+        return
+    painel = st.expander(titulo, key=f"memoria_{ensaio}", on_change="rerun")
+    if not painel.open:
+        return
+    with painel:
+        for descricao, latex in ensaios.memoria_latex(memoria):
+            st.markdown(f"**{descricao}**")
+            st.latex(latex)
+        st.download_button("⬇️ Exportar memória (.md)", data=lambda: ensaios.memoria_markdown(memoria),
+                           file_name=f"memoria_{ensaio}.md", mime="text/markdown", on_click="ignore",
+                           key=f"memoria_exp_{ensaio}")
 
 # ======================== 2. UTILITÁRIOS ========================
 
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _ler_video(caminho: str, modificado_em: float) -> bytes:
+    with open(caminho, "rb") as f:
+        return f.read()
+
+def video_tutorial() -> Optional[bytes]:
+    """Bytes do vídeo local, lidos uma vez por processo (relidos se o arquivo mudar)."""
+    try:
+        return _ler_video(VIDEO_TUTORIAL, os.path.getmtime(VIDEO_TUTORIAL))
+    except OSError:
+        return None
+
 def configurar_pagina():
     """Configura o cabeçalho e estilo global da página."""
     st.set_page_config(page_title=PAGE_TITLE, page_icon=PAGE_ICON, layout="centered")
@@ -140,25 +169,146 @@ def configurar_pagina():
         unsafe_allow_html=True,
     )
 
-def norm(txt: str) -> str:
-    """Normaliza texto para comparação (remove acentos e caracteres especiais)."""
-    s = unicodedata.normalize("NFKD", txt)
-    s = s.encode("ascii", "ignore").decode("ascii").lower()
-    s = re.sub(r"[^a-z0-9]+", " ", s).strip()
-    return s
-
-def slugify(txt: str) -> str:
-    """Cria um slug para IDs de página (ex: Retenção de Água -> retencao-de-agua)."""
-    s = unicodedata.normalize("NFKD", txt)
-    s = s.encode("ascii", "ignore").decode("ascii").lower()
-    s = re.sub(r"[^a-z0-9]+", "-", s).strip("-")
-    return re.sub(r"-+", "-", s)
-
 def navegar_para(page_id: str):
     """Atualiza o estado para trocar de página."""
     st.session_state.pagina = page_id
     # st.rerun() # Opcional: força recarregamento imediato em versões mais novas do Streamlit
 
+def abrir_calculadora(produto: str, requisito: str, lote: Optional[str] = None):
+    """Abre a calculadora do requisito já com produto e lote definidos (usado como callback)."""
+    st.session_state.produto = produto
+    st.session_state.req_por_linha[produto] = requisito
+    if lote:
+        st.session_state.lote = lote
+    navegar_para(f"{produto}::{slugify(requisito)}")
+
+def reabrir_resultado(id_: int):
+    """Abre a calculadora do resultado gravado com as entradas, o lote e o cliente originais (callback)."""
+    r = consulta.resultado(id_)
+    if r is None:
+        st.session_state.hist_msg = f"Resultado {id_} não encontrado."
+        return
+    if r["requisito"] not in REQUISITOS.get(r["produto"], []):
+        st.session_state.hist_msg = f"O requisito {r['requisito']} não existe mais na linha {r['produto']}."
+        return
+    lote = r["lote"] or ""
+    st.session_state.lote = lote
+    st.session_state.cliente = r["cliente"] if r["cliente"] in ensaios.clientes_configurados() else ""
+    estado_calculadoras().preencher(st.session_state, lote, f"{r['produto']}::{slugify(r['requisito'])}",
+                                    campos_das_entradas(r["ensaio"], json.loads(r["entradas"])))
+    abrir_calculadora(r["produto"], r["requisito"], lote)
+
+def link_calculadora(produto: str, requisito: str, lote: Optional[str] = None) -> str:
+    """Link direto (query string) para a calculadora, ex: ?produto=Graute&ensaio=...&lote=..."""
+    params = {"produto": produto, "ensaio": slugify(requisito)}
+    if lote:
+        params["lote"] = lote
+    return "?" + urlencode(params)
+
+def aplicar_link_profundo():
+    """Abre a página indicada na URL (ver link_calculadora) e limpa os parâmetros."""
+    params = st.query_params
+    if not params:
+        return
+    produto, ensaio = params.get("produto"), params.get("ensaio")
+    if produto in REQUISITOS:
+        requisito = next((r for r in REQUISITOS[produto] if slugify(r) == ensaio), None)
+        if requisito:
+            abrir_calculadora(produto, requisito, params.get("lote"))
+        else:
+            st.session_state.produto = produto
+            navegar_para(produto)
+    elif params.get("lote"):
+        st.session_state.lote = params.get("lote")
+    params.clear()
+
+# Widget de cada posição de CP por ensaio (posição 0 = primeiro CP), usado pela leitura de etiquetas
+CAMPO_CP = {
+    ensaios.ENS_FLEXAO: "fx{n}",
+    ensaios.ENS_COMPRESSAO_4X4X16: "c{n}",
+    ensaios.ENS_COMPRESSAO_5X10: "c5x10_{i}",
+    ensaios.ENS_CAPILARIDADE: "c10_{i}",
+    ensaios.ENS_ADERENCIA_AUTO: "ad_au_{n}",
+    ensaios.ENS_ADERENCIA_MANUAL: "ad_man_{n}",
+    ensaios.ENS_RETRACAO: "ri_{i}",
+    ensaios.ENS_PERMEABILIDADE: "p_ini_{i}",
+    ensaios.ENS_VAR_DIM: "vd_ini_{i}",
+    ensaios.ENS_VAR_MASSA: "vmi_{i}",
+}
+
+# Widget de cada entrada gravada no histórico (listas: um campo por CP), usado ao reabrir um resultado
+CAMPOS_ENTRADAS = {
+    ensaios.ENS_RETENCAO: {"tara": "ret_tara", "massa_ini": "ret_ini", "massa_fim": "ret_fim",
+                           "agua_ml_kg": "ret_agua", "rr": "ret_rr", "rt": "ret_rt"},
+    ensaios.ENS_DENSIDADE: {"tara": "dens_tara", "massa_bruta": "dens_bruta", "volume": "dens_volume",
+                            "dt": "dt_input"},
+    ensaios.ENS_FLEXAO: {"cps": "fx{n}"},
+    ensaios.ENS_COMPRESSAO_4X4X16: {"cps": "c{n}"},
+    ensaios.ENS_COMPRESSAO_5X10: {"cps": "c5x10_{i}"},
+    ensaios.ENS_CAPILARIDADE: {"area": "cap_area", "m10": "c10_{i}", "m90": "c90_{i}"},
+    ensaios.ENS_ADERENCIA_AUTO: {"cps": "ad_au_{n}"},
+    ensaios.ENS_ADERENCIA_MANUAL: {"diametro": "ad_man_diametro", "cps": "ad_man_{n}"},
+    ensaios.ENS_RETRACAO: {"ini": "ri_{i}", "fim": "rf_{i}"},
+    ensaios.ENS_PERMEABILIDADE: {"volume": "p_volume", "ini": "p_ini_{i}", "fim": "p_fim_{i}"},
+    ensaios.ENS_VAR_DIM: {"ini": "vd_ini_{i}", "fim": "vd_fim_{i}"},
+    ensaios.ENS_VAR_MASSA: {"ini": "vmi_{i}", "fim": "vmf_{i}"},
+}
+
+def campos_das_entradas(ensaio: str, entradas: Dict) -> Dict:
+    """Valores dos widgets da calculadora a partir das entradas gravadas (campos vazios ficam de fora)."""
+    campos = {}
+    for nome, modelo in CAMPOS_ENTRADAS.get(ensaio, {}).items():
+        valor = entradas.get(nome)
+        for i, v in (enumerate(valor) if isinstance(valor, list) else [(None, valor)]):
+            if isinstance(v, (int, float)) and not isinstance(v, bool):
+                campos[modelo if i is None else modelo.format(i=i, n=i + 1)] = float(v)
+    return campos
+
+# Chaves dos campos das calculadoras (guardadas por lote/página em sessao.py)
+CHAVES_CALCULADORA = re.compile(
+    r"(ret_(tara|ini|fim|agua|rr|rt)|dens_(tara|bruta|volume)|dt_input|fx\d+|c\d+|c5x10_\d+|c(10|90)_\d+|"
+    r"cap_area|ad_(au|man)_\d+|ad_man_diametro|p_(ini|fim)_\d+|p_volume|r[if]_\d+|vd_(ini|fim)_\d+|vm[if]_\d+)$"
+)
+
+# Páginas despejadas da memória da sessão vão para a tabela de rascunhos (CALCULADORA_RASCUNHOS=1)
+RASCUNHOS = os.environ.get("CALCULADORA_RASCUNHOS") == "1"
+
+def estado_calculadoras() -> sessao.EstadoCalculadoras:
+    return sessao.da_sessao(st.session_state, CHAVES_CALCULADORA, sessao=st.session_state.get("id_sessao"),
+                            rascunhos=RASCUNHOS)
+
+def _ao_ler_etiqueta():
+    """Callback do campo de leitura: abre a calculadora do CP e marca a posição a preencher."""
+    codigo = st.session_state.scan
+    st.session_state.scan = ""  # Pronto para a próxima leitura do scanner
+    if not codigo.strip():
+        return
+    item = etiquetas.resolver(codigo)
+    if item is None:
+        st.session_state.scan_msg = ("erro", f"Etiqueta {codigo.strip()} não encontrada.")
+        return
+    abrir_calculadora(item["produto"], item["requisito"], item["lote"])
+    molde = CAMPO_CP.get(item["ensaio"])
+    if molde:
+        chave = molde.format(i=item["posicao"], n=item["posicao"] + 1)
+        st.session_state.cp_foco = chave
+        st.session_state.campo_ativo = chave  # Instrumento conectado grava direto neste CP
+    st.session_state.scan_msg = ("ok", f"📷 {item['lote']} · CP {item['posicao'] + 1}"
+                                       + (f" · {item['idade_dias']} dias" if item["idade_dias"] else ""))
+
+def focar_cp_lido():
+    """Leva o cursor ao campo do CP lido na etiqueta (uma vez, após a página ser montada)."""
+    chave = st.session_state.pop("cp_foco", None)
+    if not chave:
+        return
+    js = f"""
+    <script>
+    const campo = window.parent.document.querySelector('.st-key-{chave} input');
+    if (campo) {{ campo.focus(); campo.select(); }}
+    </script>
+    """
+    html_invisivel(js)
+
 def inicializar_estado():
     """Inicializa variáveis de sessão se não existirem."""
     if "pagina" not in st.session_state:
@@ -167,6 +317,8 @@ def inicializar_estado():
         st.session_state.produto = None
     if "req_por_linha" not in st.session_state:
         st.session_state.req_por_linha = {l: None for l in LINHAS_PRODUTOS}
+    if "id_sessao" not in st.session_state:
+        st.session_state.id_sessao = uuid.uuid4().hex
 
 # ... (após a função inicializar_estado)
 
@@ -178,13 +330,8 @@ def obter_proximo_calculo():
     if not linha or not pag_atual or linha not in REQUISITOS:
         return None
         
-    # Gera a lista de IDs para esta linha de produtos
-    lista_reqs = REQUISITOS[linha]
-    ids_ordenados = []
-    
-    for req in lista_reqs:
-        id_pag = deciding_destino_calculo_wrapper(linha, req) # Usa wrapper para evitar erro de definição
-        ids_ordenados.append(id_pag)
+    # IDs das páginas desta linha de produtos (pré-calculados em ensaios.py)
+    ids_ordenados = ensaios.PAGINAS_POR_LINHA[linha]
         
     # Encontra onde estamos e pega o próximo
     try:
@@ -216,6 +363,12 @@ def inject_hotkeys():
     });
     </script>
     """
+    html_invisivel(js)
+
+def html_invisivel(js: str):
+    """Injeta um script sem ocupar espaço (componentes importados só no primeiro uso)."""
+    import streamlit.components.v1 as components
+
     components.html(js, height=0, width=0)
 
 # Função auxiliar para resolver a ordem de definição do Python
@@ -234,8 +387,8 @@ def ui_sidebar():
     st.sidebar.title("Quartzolit")
     
     # Navegação Rápida
-    if st.session_state.pagina in (PG_INICIO, PG_LINHAS):
-        opcoes = [PG_INICIO, PG_LINHAS]
+    if st.session_state.pagina in PAGINAS_MENU:
+        opcoes = PAGINAS_MENU
         idx = opcoes.index(st.session_state.pagina) if st.session_state.pagina in opcoes else 0
         escolha = st.sidebar.radio(
         "Navegação", 
@@ -250,6 +403,118 @@ def ui_sidebar():
         # Botão de voltar simples se estiver dentro de uma calculadora
         st.sidebar.button("← Voltar para Menu", on_click=partial(navegar_para, PG_LINHAS))
 
+    # Contexto do ensaio: gravado junto com cada cálculo no histórico
+    st.sidebar.divider()
+    st.sidebar.text_input("📷 Etiqueta do CP", key="scan", placeholder="Leia o código de barras/QR",
+                          on_change=_ao_ler_etiqueta)
+    if "scan_msg" in st.session_state:
+        tipo, msg = st.session_state.pop("scan_msg")
+        (st.sidebar.error if tipo == "erro" else st.sidebar.success)(msg)
+    st.sidebar.text_input("Lote", key="lote", placeholder="Ex: 2024-0153")
+    st.sidebar.text_input("Operador", key="operador")
+    clientes = ensaios.clientes_configurados()
+    if clientes:
+        # Só aparece quando algum cliente tem limites próprios (dados/limites.json)
+        st.sidebar.selectbox("Cliente", [""] + clientes, key="cliente",
+                             format_func=lambda c: c or "Nenhum (limites da fábrica)")
+
+    ui_instrumento()
+
+# --- INSTRUMENTOS (BALANÇAS E COMPARADORES) ---
+
+def _campos_ini_fim(prefixo_ini: str, prefixo_fim: str, rotulos: List[str]) -> List[tuple]:
+    """Campos de leitura inicial de todos os CPs, depois os finais (ordem da bancada)."""
+    return ([(f"{prefixo_ini}{i}", f"{r} — Inicial") for i, r in enumerate(rotulos)] +
+            [(f"{prefixo_fim}{i}", f"{r} — Final") for i, r in enumerate(rotulos)])
+
+# Campos de cada calculadora que recebem leituras de instrumento: (chave do widget, rótulo)
+CAMPOS_INSTRUMENTO = {
+    ensaios.ENS_RETENCAO: [("ret_tara", "Tara"), ("ret_ini", "Arg. + Tara Inicial"), ("ret_fim", "Arg. + Tara Final")],
+    ensaios.ENS_DENSIDADE: [("dens_tara", "Tara do Copo"), ("dens_bruta", "Massa (Copo + Amostra)")],
+    ensaios.ENS_PERMEABILIDADE: _campos_ini_fim("p_ini_", "p_fim_", ["CP 1", "CP 2", "CP 3", "Testemunho"]),
+    ensaios.ENS_VAR_MASSA: _campos_ini_fim("vmi_", "vmf_", ["CP 1", "CP 2", "CP 3"]),
+    ensaios.ENS_VAR_DIM: _campos_ini_fim("vd_ini_", "vd_fim_", ["CP 1", "CP 2", "CP 3"]),
+    ensaios.ENS_RETRACAO: _campos_ini_fim("ri_", "rf_", ["CP 1", "CP 2", "CP 3"]),
+}
+
+def _criar_driver(tipo: str):
+    """Monta o driver a partir das opções preenchidas no painel do instrumento."""
+    ss = st.session_state
+    if tipo == "Serial":
+        return instrumentos.DriverSerial(ss.inst_porta, int(ss.inst_baud))
+    if tipo == "USB-HID":
+        return instrumentos.DriverHID(int(ss.inst_vid, 16), int(ss.inst_pid, 16))
+    if tipo == "Arquivo/Pipe":
+        return instrumentos.DriverArquivo(ss.inst_arquivo)
+    return instrumentos.DriverSimulado(nominal=ss.inst_nominal, intervalo=1.0)
+
+def _conectar_instrumento():
+    """Callback do botão Conectar (roda antes da página, para o painel já abrir conectado)."""
+    try:
+        instrumentos.gerenciador().conectar(st.session_state.id_sessao, _criar_driver(st.session_state.inst_tipo))
+    except (RuntimeError, ValueError) as e:
+        st.session_state.inst_erro = str(e)
+
+def ui_instrumento():
+    """Painel lateral para conectar uma balança/comparador à calculadora aberta."""
+    ensaio = ensaio_atual()
+    campos = CAMPOS_INSTRUMENTO.get(ensaio)
+    if ensaio == ensaios.ENS_RETENCAO and st.session_state.get("produto") != "Basecoat":
+        campos = None  # RR/RT são leituras de régua, não de balança
+    if not campos:
+        return
+
+    ger = instrumentos.gerenciador()
+    sessao = st.session_state.id_sessao
+    chaves = [c for c, _ in campos]
+    if st.session_state.get("campo_ativo") not in chaves:
+        st.session_state.campo_ativo = chaves[0]
+
+    # Recolhe as leituras antes de criar os widgets (o campo ativo ainda pode ser alterado)
+    if ger.estado(sessao) is not None:
+        with st.sidebar:
+            _receber_leituras(chaves)
+
+    with st.sidebar.expander("🔌 Instrumento", expanded=ger.estado(sessao) is not None):
+        tipo = st.selectbox("Tipo", ["Serial", "USB-HID", "Arquivo/Pipe", "Simulado"], key="inst_tipo")
+        if tipo == "Serial":
+            st.text_input("Porta", value="/dev/ttyUSB0", key="inst_porta")
+            st.selectbox("Baud rate", [1200, 2400, 4800, 9600, 19200], index=3, key="inst_baud")
+        elif tipo == "USB-HID":
+            st.text_input("Vendor ID (hex)", value="0x0000", key="inst_vid")
+            st.text_input("Product ID (hex)", value="0x0000", key="inst_pid")
+        elif tipo == "Arquivo/Pipe":
+            st.text_input("Caminho", value="/tmp/balanca", key="inst_arquivo")
+        else:
+            st.number_input("Valor nominal", value=100.0, key="inst_nominal")
+
+        c1, c2 = st.columns(2)
+        c1.button("Conectar", key="inst_conectar", on_click=_conectar_instrumento)
+        c2.button("Desconectar", key="inst_desconectar", on_click=partial(ger.desconectar, sessao))
+        if st.session_state.get("inst_erro"):
+            st.error(st.session_state.pop("inst_erro"))
+
+        rotulos = dict(campos)
+        st.selectbox("Campo ativo", chaves, format_func=rotulos.get, key="campo_ativo",
+                     help="A próxima leitura vai para este campo; depois avança para o seguinte.")
+        estado = ger.estado(sessao)
+        st.caption(f"Estado: {estado or 'desconectado'}")
+
+@st.fragment(run_every=0.05)
+def _receber_leituras(chaves: List[str]):
+    """Recolhe as leituras recebidas e as escreve no campo ativo (só reroda a página se chegou algo)."""
+    leituras = instrumentos.gerenciador().coletar(st.session_state.id_sessao)
+    if not leituras:
+        return
+    campo = st.session_state.campo_ativo
+    for leitura in leituras:
+        st.session_state[campo] = leitura.valor
+        idx = chaves.index(campo)
+        if idx + 1 < len(chaves):
+            campo = chaves[idx + 1]
+    st.session_state.campo_ativo = campo
+    st.rerun()
+
 def ui_navegacao_botoes(voltar_label: str, voltar_destino: str, ir_label: Optional[str] = None, ir_callback=None):
     """
     Renderiza barra de navegação. 
@@ -299,7 +564,13 @@ def decidir_destino_calculo(linha: str, requisito: str) -> str:
 def view_inicio():
     st.title("BOAS VINDAS")
     with st.expander("Assista ao vídeo tutorial", expanded=True):
-        st.video("https://www.youtube.com/watch?v=d1xeEk7nRho")
+        video = video_tutorial()
+        if video is not None:
+            st.video(video, format="video/mp4")
+        elif OFFLINE:
+            st.caption(f"Vídeo tutorial indisponível sem internet (copie o arquivo para {VIDEO_TUTORIAL}).")
+        else:
+            st.video(VIDEO_YOUTUBE)
     
     st.info("Utilize o menu lateral ou o botão abaixo para começar.")
     if st.button("Ir para Produtos ⮕", type="primary"):
@@ -345,86 +616,503 @@ def view_selecao_requisito(nome_linha: str):
         ir_callback=acao_ir
     )
 
-def view_generica_construcao(titulo: str, linha: str):
-    st.markdown(f"## {linha} — {titulo}")
-    st.warning("🚧 Página em construção.")
-    st.write(f"ID Técnico: `{slugify(titulo)}`")
-    ui_navegacao_botoes(f"Voltar para {linha}", linha)
+def view_painel():
+    st.title("Painel do Laboratório")
+    _painel_ao_vivo()
+    _painel_consolidado()
+    _painel_lims()
+
+    with st.expander("Memória desta sessão"):
+        stats = estado_calculadoras().estatisticas(st.session_state)
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("Sessão", f"{stats['bytes_sessao'] / 1024:.1f} KB", help=f"{stats['chaves_sessao']} chaves")
+        c2.metric("Páginas guardadas", stats["paginas"], help=f"{stats['bytes_guardados'] / 1024:.1f} KB")
+        c3.metric("Despejadas", stats["despejadas"])
+        c4.metric("Em rascunho", stats["em_rascunho"])
+        st.caption(f"Guardadas: {stats['guardadas']} · Restauradas: {stats['restauradas']} "
+                   f"(do rascunho: {stats['de_rascunho']})")
+
+def _painel_consolidado():
+    """Visão corporativa (todas as fábricas), quando houver um banco consolidado."""
+    import consolidacao  # numpy: só quando o painel é aberto
 
-# --- CALCULADORAS ESPECÍFICAS ---
-
-# ======================== 5. CALCULADORAS GENÉRICAS ========================
-
-def calc_retencao_agua_generica():
-    st.subheader("Retenção de Água (%)")
-    st.caption("Norma: ABNT NBR 13277")
-    
-    with st.form("form_retencao"):
-        col1, col2 = st.columns(2)
-        with col1: rr = st.number_input("RR (mm)", step=1.0, format="%.1f")
-        with col2: rt = st.number_input("RT (mm)", step=1.0, format="%.1f")
-        calcular = st.form_submit_button("Calcular")
+    try:
+        dados = consolidacao.painel()
+    except sqlite3.Error as e:
+        st.error(f"Não foi possível ler o consolidado: {e}")
+        return
+    if dados is None:
+        return
+    with st.expander(f"Consolidado das fábricas ({len(dados['fontes'])} fontes, {dados['consolidado_em']})"):
+        st.dataframe(
+            [{
+                "Produto": s["produto"],
+                "Requisito": s["requisito"],
+                "Fontes": s["fontes"],
+                "Lotes": s["ensaios"],
+                "Válidos (%)": None if s["taxa_validos"] is None else round(s["taxa_validos"] * 100, 1),
+                "Média": s["media"],
+                "Desvio": s["desvio"],
+                "Duplicados": s["duplicados"],
+            } for s in dados["series"]],
+            hide_index=True,
+        )
+        st.caption(" · ".join(f"{f['fonte']}: {f['ensaios']} lotes" for f in dados["fontes"]))
+
+def _painel_lims():
+    """Caixa de saída do LIMS: o que ainda não foi entregue e o último erro."""
+    if not lims.URL_LIMS:
+        return
+    s = lims.situacao()
+    with st.expander(f"Envio ao LIMS ({s['pendentes']} pendentes)"):
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("Pendentes", s["pendentes"], help=f"Mais antigo: {s['mais_antiga'] or '-'}")
+        c2.metric("Enviados", s["enviados"])
+        c3.metric("Rejeitados", s["rejeitadas"], help="Recusados pelo LIMS; python lims.py reenviar devolve à fila")
+        c4.metric("Próxima tentativa", f"{s['espera']:.0f} s" if s["espera"] else "agora")
+        if s["erro"]:
+            st.warning(f"Último erro: {s['erro']}")
+
+@st.fragment(run_every=5)
+def _painel_ao_vivo():
+    """Lê só as tabelas de indicadores (mantidas a cada gravação); atualiza a cada 5 s."""
+    try:
+        dados = indicadores.painel()
+    except sqlite3.Error as e:
+        st.error(f"Não foi possível ler os indicadores: {e}")
+        return
+    if not dados["produtos"]:
+        st.info("Nenhum resultado gravado ainda.")
+        return
+
+    st.subheader("Ensaios por linha de produto")
+    cols = st.columns(len(dados["produtos"]))
+    for col, p in zip(cols, dados["produtos"]):
+        col.metric(p["produto"], p["ensaios"], help=f"{p['validos']} válidos")
+        if p["horas_por_lote"] is not None:
+            col.caption(f"⏱ {p['horas_por_lote']:.1f} h por lote ({p['lotes_concluidos']} concluídos)")
+
+    st.subheader("Situação por requisito")
+    st.dataframe(
+        [{
+            "Produto": r["produto"],
+            "Requisito": r["requisito"],
+            "Ensaios": r["ensaios"],
+            "Válidos (%)": None if r["taxa_validos"] is None else round(r["taxa_validos"] * 100, 1),
+            "Inválidos (%)": None if r["taxa_validos"] is None else round((1 - r["taxa_validos"]) * 100, 1),
+        } for r in dados["requisitos"]],
+        hide_index=True,
+    )
 
-    if calcular:
-        if rt == 0:
-            st.error("Erro: RT não pode ser zero.")
+    st.subheader("CPs mais excluídos")
+    if dados["exclusoes"]:
+        st.dataframe(
+            [{"Produto": e["produto"], "Ensaio": e["ensaio"], "CP": e["posicao"] + 1, "Exclusões": e["excluidos"]}
+             for e in dados["exclusoes"]],
+            hide_index=True,
+        )
+    else:
+        st.caption("Nenhum CP excluído até agora.")
+
+    with st.expander("Cache de cálculos (todas as sessões)"):
+        stats = cache.resultados().estatisticas()
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("Acertos", stats["acertos"])
+        c2.metric("Faltas", stats["faltas"])
+        c3.metric("Taxa de acerto", "-" if stats["taxa_acerto"] is None else f"{stats['taxa_acerto']:.0%}")
+        c4.metric("Itens", stats["itens"])
+        st.caption(f"Remoções LRU: {stats['remocoes_lru']} · Expirados: {stats['expirados']} · "
+                   f"Invalidados por mudança de limites: {stats['invalidados']}")
+
+def view_monitor():
+    st.title("Monitor ao Vivo")
+    c1, c2 = st.columns([2, 1])
+    produto = c1.selectbox("Linha de produto", ["Todas"] + list(LINHAS_PRODUTOS), key="mon_produto")
+    so_reprovados = c2.toggle("Só inválidos", key="mon_reprovados")
+    _monitor_ao_vivo(None if produto == "Todas" else produto, so_reprovados)
+
+def _chave_evento(e: Dict) -> tuple:
+    return (e["lote"] or e["id"], e["requisito"])
+
+@st.fragment(run_every=2)
+def _monitor_ao_vivo(produto: Optional[str], so_reprovados: bool, maximo: int = 50):
+    """Drena a assinatura da sessão no barramento (sem consultar o banco) e mostra as novidades."""
+    ss = st.session_state
+    assinatura = ss.get("mon_assinatura")
+    if ss.get("mon_filtro") != (produto, so_reprovados) or assinatura is None or assinatura.fechada:
+        if assinatura is not None:
+            assinatura.fechar()
+        filtro = eventos.filtro(produto, so_reprovados)
+        assinatura = ss.mon_assinatura = eventos.barramento().assinar(filtro)
+        ss.mon_eventos = eventos.barramento().recentes(maximo, filtro)
+        ss.mon_filtro = (produto, so_reprovados)
+
+    novos = assinatura.coletar()
+    if novos:
+        chaves = {_chave_evento(e) for e in novos}
+        ss.mon_eventos = [e for e in ss.mon_eventos if _chave_evento(e) not in chaves] + novos
+        ss.mon_eventos = ss.mon_eventos[-maximo:]
+    for e in novos:
+        if not e["valido"]:
+            limites = ", ".join(f"{k} = {v}" for k, v in e["limites"].items())
+            st.error(f"🚨 {e['produto']} · lote {e['lote'] or '-'} · {e['requisito']}: ENSAIO INVÁLIDO"
+                     + (f" ({limites})" if limites else ""))
+
+    if not ss.mon_eventos:
+        st.info("Aguardando resultados...")
+        return
+    st.dataframe(
+        [{
+            "Hora": e["criado_em"][11:19],
+            "Produto": e["produto"],
+            "Lote": e["lote"] or "-",
+            "Requisito": e["requisito"],
+            "Resultado": None if e["resultado"] is None else round(e["resultado"], 3),
+            "Situação": "✅ Válido" if e["valido"] else "❌ INVÁLIDO",
+            "CPs excluídos": ", ".join(str(p + 1) for p in e["excluidos"]) or "-",
+            "Operador": e["operador"] or "-",
+        } for e in reversed(ss.mon_eventos)],
+        hide_index=True,
+    )
+    stats = assinatura.estatisticas()
+    st.caption(f"{eventos.barramento().assinantes()} tela(s) conectada(s) · agrupados: {stats['agrupados']} · "
+               f"descartados por atraso: {stats['descartados']}")
+
+def _paginador_historico() -> consulta.Paginador:
+    """Posição e páginas em cache da consulta do histórico desta sessão."""
+    if "hist_paginador" not in st.session_state:
+        st.session_state.hist_paginador = consulta.Paginador()
+    return st.session_state.hist_paginador
+
+def view_historico():
+    st.title("Histórico")
+    c1, c2, c3 = st.columns(3)
+    produto = c1.selectbox("Linha de produto", ["Todas"] + list(LINHAS_PRODUTOS), key="hist_produto")
+    reqs = REQUISITOS.get(produto, [])
+    requisito = c2.selectbox("Requisito", ["Todos"] + reqs, key=f"hist_req_{produto}", disabled=not reqs)
+    situacao = c3.selectbox("Situação", ["Todas", "Válido", "ENSAIO INVÁLIDO"], key="hist_situacao")
+    c4, c5, c6 = st.columns(3)
+    desde = c4.date_input("De", value=None, key="hist_desde", format="DD/MM/YYYY")
+    ate = c5.date_input("Até", value=None, key="hist_ate", format="DD/MM/YYYY")
+    operador = c6.text_input("Operador", key="hist_operador").strip()
+
+    pag = _paginador_historico()
+    pag.filtrar(consulta.Filtros(
+        produto=produto if reqs else None,
+        requisito=requisito if requisito in reqs else None,
+        desde=desde.isoformat() if desde else None,
+        ate=ate.isoformat() if ate else None,
+        valido=None if situacao == "Todas" else situacao == "Válido",
+        operador=operador or None,
+    ))
+    try:
+        pagina = pag.atual()
+    except sqlite3.Error as e:
+        st.error(f"Não foi possível ler o histórico: {e}")
+        return
+    if "hist_msg" in st.session_state:
+        st.warning(st.session_state.pop("hist_msg"))
+    if not pagina.linhas:
+        st.info("Nenhum resultado com estes filtros.")
+        return
+
+    for r in pagina.linhas:
+        c1, c2 = st.columns([5, 1])
+        resultado = "-" if r["resultado"] is None else f"{r['resultado']:.3f}"
+        c1.markdown(f"**{r['criado_em'].replace('T', ' ')}** · {r['produto']} · {r['requisito']}  \n"
+                    f"Lote {r['lote'] or '-'} · {resultado} · "
+                    f"{'Válido' if r['valido'] else '❌ ENSAIO INVÁLIDO'} · "
+                    f"Operador {r['operador'] or '-'}" + (f" · Cliente {r['cliente']}" if r["cliente"] else "")
+                    + (" · 🔎 Entrada fora do habitual" if r["alertas"] else ""))
+        c2.button("Abrir", key=f"hist_{r['id']}", on_click=reabrir_resultado, args=(r["id"],))
+
+    c1, c2, c3 = st.columns([1, 2, 1])
+    c1.button("← Anterior", key="hist_anterior", on_click=pag.voltar, disabled=pag.numero == 0)
+    c2.caption(f"Página {pag.numero + 1}" + ("" if pagina.proxima else " (última)"))
+    c3.button("Próxima →", key="hist_proxima", on_click=pag.avancar, disabled=pagina.proxima is None)
+
+def _entradas_do_lote(ensaio: str) -> Dict:
+    """Entradas do último resultado do ensaio no lote da sessão ({} se não houver)."""
+    lote = (st.session_state.get("lote") or "").strip()
+    linhas = [r for r in historico.listar_por_lote(lote) if r["ensaio"] == ensaio] if lote else []
+    return json.loads(linhas[-1]["entradas"]) if linhas else {}
+
+def view_simulacao():
+    import numpy as np  # numpy e a simulação só quando a página é aberta
+    import simulacao
+
+    st.title("Simulação (e se)")
+    st.caption("Varre um ou dois parâmetros e recalcula o ensaio na grade inteira de uma vez.")
+    c1, c2 = st.columns(2)
+    produtos = list(LINHAS_PRODUTOS)
+    atual = st.session_state.get("produto")
+    produto = c1.selectbox("Linha de produto", produtos, index=produtos.index(atual) if atual in produtos else 0,
+                           key="sim_produto")
+    opcoes = simulacao.ensaios_simulaveis(produto)
+    ensaio = c2.selectbox("Ensaio", opcoes, format_func=lambda e: simulacao.ESPACOS[e]["saidas"]["resultado"],
+                          key="sim_ensaio")
+    espaco = simulacao.ESPACOS[ensaio]
+    limites = ensaios.limites_produto(produto, cliente=st.session_state.get("cliente") or None)
+
+    base = dict(espaco["base"], **_entradas_do_lote(ensaio))
+    entradas = {}
+    with st.expander("Valores fixos (do último ensaio do lote, quando houver)", expanded=True):
+        if ensaio == ensaios.ENS_VAR_DIM:
+            for i, col in enumerate(st.columns(len(base["ini"]))):
+                entradas.setdefault("ini", []).append(col.number_input(
+                    f"CP {i + 1} inicial (mm)", value=float(base["ini"][i] or 0.0), format="%.3f", key=f"sim_ini_{i}"))
+                entradas.setdefault("fim", []).append(col.number_input(
+                    f"CP {i + 1} final (mm)", value=float(base["fim"][i] or 0.0), format="%.3f", key=f"sim_fim_{i}"))
         else:
-            ra = (rr / rt) * 100
-            st.metric("Resultado (Ra)", f"{ra:.2f} %")
-            if ra >= 100: st.warning("Atenção: Retenção calculada acima de 100%.")
+            cols = st.columns(len(espaco["parametros"]))
+            for col, p in zip(cols, espaco["parametros"]):
+                entradas[p.chave] = col.number_input(f"{p.rotulo} ({p.unidade})", value=float(base.get(p.chave) or 0.0),
+                                                     format="%.4f", key=f"sim_base_{ensaio}_{p.chave}")
+
+    rotulos = {p.chave: f"{p.rotulo} ({p.unidade})" for p in espaco["parametros"]}
+    escolhidos = st.multiselect("Parâmetros a variar (1 ou 2)", list(rotulos), default=list(rotulos)[:1],
+                                format_func=rotulos.get, max_selections=2, key=f"sim_eixos_{ensaio}")
+    if not escolhidos:
+        st.info("Escolha ao menos um parâmetro.")
+        return
+    eixos = []
+    for chave, col in zip(escolhidos, st.columns(len(escolhidos))):
+        # Sem key: a faixa sugerida acompanha o valor fixo quando ele muda
+        valor = simulacao.valor_base(ensaio, chave, entradas, limites)
+        minimo = col.number_input(f"{rotulos[chave]} — de", value=valor * 0.8 if valor else 0.0,
+                                  format="%.4f")
+        maximo = col.number_input(f"{rotulos[chave]} — até", value=valor * 1.2 if valor else 1.0,
+                                  format="%.4f")
+        pontos = col.select_slider("Pontos", [50, 100, 200, 400, 1000, 2000], key=f"sim_pontos_{ensaio}_{chave}",
+                                   value=simulacao.PONTOS_CURVA if len(escolhidos) == 1 else simulacao.PONTOS_MAPA)
+        eixos.append((chave, np.linspace(minimo, maximo, pontos)))
+
+    c1, c2, c3 = st.columns(3)
+    saida = c1.selectbox("Saída", list(espaco["saidas"]), format_func=espaco["saidas"].get, key=f"sim_saida_{ensaio}")
+    usar_min = c2.toggle("Mínimo especificado", key=f"sim_usar_min_{ensaio}")
+    espec_min = c2.number_input("Mínimo", value=0.0, key=f"sim_espec_min_{ensaio}", disabled=not usar_min)
+    usar_max = c3.toggle("Máximo especificado", key=f"sim_usar_max_{ensaio}")
+    espec_max = c3.number_input("Máximo", value=0.0, key=f"sim_espec_max_{ensaio}", disabled=not usar_max)
 
-    ui_navegacao_botoes("Voltar", st.session_state.get("produto", PG_LINHAS))
+    try:
+        v = simulacao.varrer(ensaio, produto, entradas, eixos, limites,
+                             (espec_min if usar_min else None, espec_max if usar_max else None))
+    except ValueError as e:
+        st.error(str(e))
+        return
+
+    z = v.saidas[saida]
+    (px, x), *resto = v.eixos
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Pontos avaliados", f"{z.size:,}".replace(",", "."), help=f"{v.segundos * 1000:.0f} ms")
+    c2.metric("Aprovados", f"{v.aprovado.mean():.1%}")
+    if not resto:
+        derivada = simulacao.sensibilidade(x, z, simulacao.valor_base(ensaio, px.chave, entradas, limites))
+        c3.metric("Sensibilidade no valor atual", "-" if derivada is None else f"{derivada:.4g}",
+                  help=f"Variação de {espaco['saidas'][saida]} por unidade de {rotulos[px.chave]}")
+        st.line_chart({rotulos[px.chave]: x, espaco["saidas"][saida]: z, "Aprovado": np.where(v.aprovado, z, np.nan)},
+                      x=rotulos[px.chave])
+        return
+
+    (py, y), = resto
+    st.image(simulacao.colorir(z, v.aprovado), width="stretch",
+             caption=f"{espaco['saidas'][saida]}: de {np.nanmin(z):.4g} (roxo) a {np.nanmax(z):.4g} (amarelo) · "
+                     f"contorno branco = fronteira de aprovação · x: {rotulos[px.chave]} {x[0]:.4g} → {x[-1]:.4g} · "
+                     f"y: {rotulos[py.chave]} {y[0]:.4g} → {y[-1]:.4g}" if np.isfinite(z).any() else "Sem valores válidos")
+    # Curvas de sensibilidade em alguns valores do segundo parâmetro
+    cortes = np.linspace(0, len(y) - 1, 5).astype(int)
+    st.line_chart({rotulos[px.chave]: x, **{f"{rotulos[py.chave]} = {y[i]:.4g}": z[i] for i in cortes}},
+                  x=rotulos[px.chave])
+
+def view_agenda():
+    st.title("Agenda de CPs")
+    ate = st.date_input("Vencendo até", value=date.today(), key="agenda_ate", format="DD/MM/YYYY")
+    try:
+        itens = agenda.pendentes(ate=ate, limite=100)
+        total = agenda.contar_pendentes(ate=ate)
+    except sqlite3.Error as e:
+        st.error(f"Não foi possível ler a agenda: {e}")
+        return
+    if not itens:
+        st.success("Nenhum CP pendente até esta data.")
+        return
+
+    st.caption(f"{total} ensaio(s) pendente(s)" + (" — mostrando os 100 mais atrasados" if total > len(itens) else ""))
+    for item in itens:
+        atraso = agenda.dias_de_atraso(item)
+        situacao = f"🔴 {atraso} dia(s) de atraso" if atraso > 0 else ("🟡 vence hoje" if atraso == 0 else f"vence em {item['vence_em']}")
+        c1, c2 = st.columns([4, 1])
+        c1.markdown(f"**{item['lote']}** · {item['produto']} · {item['requisito']}  \n"
+                    f"{item['idade_dias']} dias · {item['n_cps']} CPs · {situacao} · "
+                    f"[link]({link_calculadora(item['produto'], item['requisito'], item['lote'])})")
+        c2.button("Abrir", key=f"agenda_{item['id']}",
+                  on_click=partial(abrir_calculadora, item["produto"], item["requisito"], item["lote"]))
+
+def ui_moldagem(lote: str):
+    """Registro da moldagem do lote (gera a agenda das idades de cura)."""
+    with st.expander("🗓️ Moldagem / agenda de CPs"):
+        produto = st.selectbox("Linha de Produtos", LINHAS_PRODUTOS, key="molde_produto",
+                               index=LINHAS_PRODUTOS.index(st.session_state.produto)
+                               if st.session_state.produto in LINHAS_PRODUTOS else 0)
+        moldado_em = st.date_input("Data da moldagem", value=date.today(), key="molde_data", format="DD/MM/YYYY")
+        if st.button("Registrar moldagem", key="molde_registrar"):
+            try:
+                n = agenda.moldar(lote, produto, moldado_em)
+                rotulos = etiquetas.gerar(lote, produto)
+            except sqlite3.Error as e:
+                st.error(f"Moldagem não registrada: {e}")
+            else:
+                st.success((f"{n} ensaio(s) agendado(s) para o lote {lote}." if n else "Lote já estava agendado.")
+                           + f" {len(rotulos)} etiqueta(s) de CP.")
+
+def ui_etiquetas(lote: str):
+    """Etiquetas dos CPs do lote (códigos para a impressora e QR, se disponível)."""
+    itens = etiquetas.listar_por_lote(lote)
+    if not itens:
+        return
+    with st.expander(f"🏷️ Etiquetas ({len(itens)} CPs)"):
+        linhas = ["codigo;lote;produto;requisito;idade_dias;cp"] + [
+            f"{e['codigo']};{e['lote']};{e['produto']};{e['requisito']};{e['idade_dias'] or ''};{e['posicao'] + 1}"
+            for e in itens]
+        st.download_button("Baixar CSV para impressão", "\n".join(linhas).encode("utf-8"),
+                           file_name=f"etiquetas_{slugify(lote)}.csv", mime="text/csv", key="etq_csv")
+        st.dataframe(
+            [{"Código": e["codigo"], "Requisito": e["requisito"], "Idade (dias)": e["idade_dias"],
+              "CP": e["posicao"] + 1} for e in itens],
+            hide_index=True,
+        )
+        if st.toggle("Mostrar QR codes", key="etq_qr"):
+            try:
+                cols = st.columns(6)
+                for i, e in enumerate(itens):
+                    cols[i % 6].image(etiquetas.qr_png(e["codigo"]), caption=e["codigo"])
+            except RuntimeError as e:
+                st.warning(str(e))
+
+def view_lote():
+    st.title("Lote")
+    lote = (st.session_state.get("lote") or "").strip()
+    if not lote:
+        st.info("Informe o lote no menu lateral para ver os resultados e a classificação.")
+        return
+
+    ui_moldagem(lote)
+    ui_etiquetas(lote)
+
+    linhas = historico.listar_por_lote(lote)
+    if not linhas:
+        st.warning(f"Nenhum resultado gravado para o lote {lote}.")
+        return
+
+    # Último resultado de cada requisito (recálculos substituem os anteriores)
+    ultimos = {}
+    for r in linhas:
+        ultimos[r["requisito"]] = r
+
+    st.subheader(f"Resultados — {lote}")
+    st.dataframe(
+        [{
+            "Requisito": r["requisito"],
+            "Resultado": None if r["resultado"] is None else round(r["resultado"], 3),
+            "Situação": "Válido" if r["valido"] else "ENSAIO INVÁLIDO",
+            "Limites": r["limites_aplicados"] or "-",
+            "Operador": r["operador"] or "-",
+            "Data": r["criado_em"],
+        } for r in ultimos.values()],
+        hide_index=True,
+    )
 
-def calc_densidade_fresco_generica():
-    st.subheader("Densidade de Massa (Fresco)")
-    st.caption("Norma: ABNT NBR 13278")
+    previsoes = previsao.prever_lote(lote, next(iter(ultimos.values()))["produto"])
+    if previsoes:
+        st.caption("Previsão aos 28 dias (pelo ensaio precoce mais recente; intervalo de 95%):")
+        st.dataframe(
+            [{
+                "Requisito": p.alvo,
+                "A partir de": f"{p.origem} aos {p.idade} d",
+                "Previsto": round(p.valor, 1),
+                "Mínimo": round(p.minimo, 1),
+                "Máximo": round(p.maximo, 1),
+                "Lotes no modelo": p.n,
+            } for p in previsoes],
+            hide_index=True,
+        )
+
+    # Classificação NBR 13281 calculada na hora com os resultados válidos
+    finais = {r["ensaio"]: r["resultado"] for r in ultimos.values() if r["valido"]}
+    classes = classificacao.classificar_lote(finais)
+    st.subheader(f"Classificação — {classificacao.ESPECIFICACAO_NBR13281['versao']}")
+    if any(classes.values()):
+        st.success(f"**{classificacao.designacao(classes)}**")
+        cols = st.columns(len(classes))
+        for col, (prop, classe) in zip(cols, classes.items()):
+            col.metric(prop, classe or "-")
+    else:
+        st.caption("Nenhum ensaio classificável pela NBR 13281 neste lote.")
+
+    ui_proficiencia(lote)
+    ui_certificado(lote)
+
+def ui_proficiencia(lote: str):
+    """Escores do laboratório quando o lote é a amostra de uma rodada de proficiência."""
+    escores = proficiencia.escores_da_amostra(lote)
+    if not escores:
+        return
+    st.subheader("Ensaio de proficiência (ISO 13528)")
+    st.dataframe(
+        [{
+            "Rodada": e["rodada"],
+            "Ensaio": e["ensaio"],
+            "Resultado": round(e["resultado"], 3),
+            "Valor designado": None if e["x_pt"] is None else round(e["x_pt"], 3),
+            "σ_pt": None if e["sigma_pt"] is None else round(e["sigma_pt"], 3),
+            "z": None if e["z"] is None else round(e["z"], 2),
+            "ζ": None if e["zeta"] is None else round(e["zeta"], 2),
+            "Avaliação": e["avaliacao"] or "-",
+            "Cálculo": f"#{e['resultado_id']}" if e["resultado_id"] else "-",
+            "Participantes": e["participantes"],
+        } for e in escores],
+        hide_index=True,
+    )
 
-    with st.form("form_densidade"):
-        col1, col2 = st.columns(2)
-        with col1: massa = st.number_input("Massa (g)", step=0.1)
-        with col2: volume = st.number_input("Volume (cm³)", value=400.0, step=1.0)
-        calcular = st.form_submit_button("Calcular")
+def ui_certificado(lote: str):
+    """Pedido do certificado em PDF (gerado em segundo plano) e download quando pronto."""
+    st.subheader("Certificado")
+    chave = f"certificado_{lote}"
+    if st.button("📄 Gerar certificado (PDF)", key=f"btn_{chave}"):
+        st.session_state[chave] = relatorios.fila().enviar(lote)
+    id_pedido = st.session_state.get(chave)
+    pedido = relatorios.fila().estado(id_pedido) if id_pedido else None
+    if pedido is None:
+        return
+    if pedido["estado"] == "pronto":
+        with open(pedido["arquivo"], "rb") as f:
+            st.download_button(f"⬇️ Baixar certificado ({pedido['paginas']} pág.)", f.read(),
+                               file_name=os.path.basename(pedido["arquivo"]), mime="application/pdf",
+                               on_click="ignore", key=f"baixar_{id_pedido}")
+    elif pedido["estado"] == "erro":
+        st.error(f"Falha ao gerar o certificado: {pedido['erro']}")
+    else:
+        _aguardar_certificado(id_pedido)
 
-    if calcular:
-        if volume == 0:
-            st.error("Volume não pode ser zero.")
-        else:
-            densidade = (massa / volume) * 1000  # g/cm³ -> kg/m³
-            st.metric("Densidade", f"{densidade:.0f} kg/m³")
+@st.fragment(run_every=2)
+def _aguardar_certificado(id_pedido: str):
+    """Consulta a fila a cada 2 s enquanto o PDF é gerado (o resto da página não é refeito)."""
+    pedido = relatorios.fila().estado(id_pedido)
+    if pedido is not None and pedido["estado"] in ("pronto", "erro"):
+        st.rerun()  # Página inteira: mostra o download e encerra a consulta periódica
+    st.info(f"⏳ Certificado {pedido['estado'] if pedido else 'na fila'}...")
 
-    ui_navegacao_botoes("Voltar", st.session_state.get("produto", PG_LINHAS))
+def view_generica_construcao(titulo: str, linha: str):
+    st.markdown(f"## {linha} — {titulo}")
+    st.warning("🚧 Página em construção.")
+    st.write(f"ID Técnico: `{slugify(titulo)}`")
+    ui_navegacao_botoes(f"Voltar para {linha}", linha)
 
-def calc_flexao_generica():
-    # Limite dinâmico
-    limite = obter_config("flexao_var_max")
-    
-    st.subheader("Flexão 4x4x16 (MPa)")
-    st.caption(f"Norma: ABNT NBR 13279 | Regra: Excluir se variação > {limite} MPa da média")
+# --- CALCULADORAS ESPECÍFICAS ---
 
-    with st.form("form_flexao"):
-        c1, c2, c3 = st.columns(3)
-        with c1: cp1 = st.number_input("CP 1", key="fx1", step=0.01, format="%.2f")
-        with c2: cp2 = st.number_input("CP 2", key="fx2", step=0.01, format="%.2f")
-        with c3: cp3 = st.number_input("CP 3", key="fx3", step=0.01, format="%.2f")
-        calcular = st.form_submit_button("Calcular")
+# ======================== 5. CALCULADORAS GENÉRICAS ========================
+# As fórmulas e regras de exclusão ficam em ensaios.py; aqui fica apenas a interface.
 
-    if calcular:
-        valores = [cp1, cp2, cp3]
-        if all(v == 0 for v in valores):
-            st.warning("Preencha os valores.")
-        else:
-            media = sum(valores) / 3
-            st.divider()
-            
-            validos = []
-            for i, val in enumerate(valores):
-                var = media - val # Lógica Excel (Média - Valor)
-                passed = abs(var) <= limite
-                if passed: validos.append(val)
-                
-                cor = "black" if passed else "red"
-                icon = "" if passed else "❌"
-    
 def calc_retencao_agua_generica():
     produto_atual = st.session_state.get("produto")
 
@@ -436,39 +1124,34 @@ def calc_retencao_agua_generica():
         with st.form("form_retencao_basecoat"):
             c1, c2, c3, c4 = st.columns(4)
             with c1:
-                tara = st.number_input("Tara (g)", min_value=0.0, format="%.2f")
+                tara = st.number_input("Tara (g)", min_value=0.0, format="%.2f", key="ret_tara")
             with c2:
-                massa_ini = st.number_input("Arg. + Tara Inicial (g)", min_value=0.0, format="%.2f")
+                massa_ini = st.number_input("Arg. + Tara Inicial (g)", min_value=0.0, format="%.2f", key="ret_ini")
             with c3:
-                massa_fim = st.number_input("Arg. + Tara Final (g)", min_value=0.0, format="%.2f")
+                massa_fim = st.number_input("Arg. + Tara Final (g)", min_value=0.0, format="%.2f", key="ret_fim")
             with c4:
-                agua_ml_kg = st.number_input("Água (mL/Kg)", min_value=0.0, format="%.1f", help="Relação água/pó")
+                agua_ml_kg = st.number_input("Água (mL/Kg)", min_value=0.0, format="%.1f", help="Relação água/pó",
+                                             key="ret_agua")
 
             calcular = st.form_submit_button("Calcular Resultados", type="primary")
 
         if calcular:
-            if massa_ini == 0 or agua_ml_kg == 0:
-                st.warning("⚠️ Preencha os dados corretamente.")
+            entradas = {"tara": tara, "massa_ini": massa_ini, "massa_fim": massa_fim, "agua_ml_kg": agua_ml_kg}
+            alertar_entradas(ensaios.ENS_RETENCAO, entradas)
+            try:
+                res = calcular_regra(ensaios.ENS_RETENCAO, ensaios.regra_retencao_basecoat,
+                                     tara, massa_ini, massa_fim, agua_ml_kg)
+            except EntradaIncompleta as e:
+                st.warning(str(e))
             else:
-                # --- CÁLCULOS ---
-                massa_pasta = massa_ini - tara
-                perda_agua = massa_ini - massa_fim
-                
-                # Fator Água: ml/kg / (1000 + ml/kg)
-                fator_agua = agua_ml_kg / (1000 + agua_ml_kg)
-                
-                # Água total teórica na amostra
-                agua_total_amostra = massa_pasta * fator_agua
-
-                # Evita divisão por zero
-                if agua_total_amostra > 0:
-                    ra = (1 - (perda_agua / agua_total_amostra)) * 100
-                else:
-                    ra = 0
+                d = res["detalhes"]
+                massa_pasta, perda_agua = d["massa_pasta"], d["perda_agua"]
+                fator_agua, agua_total_amostra, ra = d["fator_agua"], d["agua_total_amostra"], d["ra"]
 
                 # --- EXIBIÇÃO DETALHADA ---
+                registrar_resultado(ensaios.ENS_RETENCAO, entradas, res)
                 st.markdown("### 📊 Detalhes do Ensaio")
-                
+
                 # 1. Métricas Intermediárias (Para conferência)
                 col_met1, col_met2, col_met3, col_met4 = st.columns(4)
                 col_met1.metric("Massa da Pasta", f"{massa_pasta:.2f} g")
@@ -480,14 +1163,14 @@ def calc_retencao_agua_generica():
 
                 # 2. Resultado Principal com Validação Lógica
                 col_res, col_extra = st.columns([2, 3])
-                
+
                 with col_res:
                     if ra < 0:
                         st.error(f"❌ Resultado Inválido: {ra:.2f}%")
                         st.caption("A perda de água foi maior que a quantidade total de água calculada. Verifique se o valor de 'mL/Kg' está correto.")
                     else:
                         st.metric("💧 Retenção Obtida", f"{ra:.2f} %")
-                
+
                 with col_extra:
                     # Barra de progresso visual (apenas se for positivo)
                     if 0 <= ra <= 100:
@@ -496,32 +1179,30 @@ def calc_retencao_agua_generica():
                     elif ra > 100:
                         st.warning("Acima de 100% (Ganho de massa?)")
 
-                # 3. Memória de Cálculo (Expansível)
-                with st.expander("📝 Ver Fórmula e Memória de Cálculo"):
-                    st.latex(r"RA = \left( 1 - \frac{M_{perdida}}{M_{pasta} \times F_{água}} \right) \times 100")
-                    st.markdown(f"""
-                    * **Massa Pasta:** {massa_ini} - {tara} = {massa_pasta:.2f} g
-                    * **Fator Água:** {agua_ml_kg} / (1000 + {agua_ml_kg}) = {fator_agua:.4f}
-                    * **Água Total:** {massa_pasta:.2f} * {fator_agua:.4f} = **{agua_total_amostra:.2f} g**
-                    * **Cálculo Final:** (1 - ({perda_agua:.2f} / {agua_total_amostra:.2f})) * 100 = **{ra:.2f}%**
-                    """)
+                # 3. Memória de Cálculo (Expansível, montada só quando aberta)
+                ui_memoria(ensaios.ENS_RETENCAO, res)
 
     # ==================== CASO 2: OUTROS PRODUTOS ====================
     else:
         st.subheader("Retenção de Água (%)")
         st.caption("Norma: ABNT NBR 13277")
-        
+
         with st.form("form_retencao"):
             col1, col2 = st.columns(2)
-            with col1: rr = st.number_input("RR (mm)", step=1.0, format="%.1f")
-            with col2: rt = st.number_input("RT (mm)", step=1.0, format="%.1f")
+            with col1: rr = st.number_input("RR (mm)", step=1.0, format="%.1f", key="ret_rr")
+            with col2: rt = st.number_input("RT (mm)", step=1.0, format="%.1f", key="ret_rt")
             calcular = st.form_submit_button("Calcular")
 
         if calcular:
-            if rt == 0:
-                st.error("Erro: RT não pode ser zero.")
+            entradas = {"rr": rr, "rt": rt}
+            alertar_entradas(ensaios.ENS_RETENCAO, entradas)
+            try:
+                res = calcular_regra(ensaios.ENS_RETENCAO, ensaios.regra_retencao_simples, rr, rt)
+            except ValueError as e:
+                st.error(str(e))
             else:
-                ra = (rr / rt) * 100
+                registrar_resultado(ensaios.ENS_RETENCAO, entradas, res)
+                ra = res["resultado"]
                 st.metric("Resultado (Ra)", f"{ra:.2f} %")
                 st.progress(min(100, int(ra))) # Adicionei barra de progresso aqui também
 
@@ -533,47 +1214,52 @@ def calc_densidade_fresco_generica():
 
     with st.form("form_densidade"):
         col1, col2, col3 = st.columns(3)
-        with col1: 
-            tara = st.number_input("Tara do Copo (g)", min_value=0.0, step=0.1, format="%.2f")
-        with col2: 
-            massa_bruta = st.number_input("Massa (Copo + Amostra) (g)", min_value=0.0, step=0.1, format="%.2f")
-        with col3: 
+        with col1:
+            tara = st.number_input("Tara do Copo (g)", min_value=0.0, step=0.1, format="%.2f", key="dens_tara")
+        with col2:
+            massa_bruta = st.number_input("Massa (Copo + Amostra) (g)", min_value=0.0, step=0.1, format="%.2f", key="dens_bruta")
+        with col3:
             # Volume padrão inicia em 0.0 para forçar preenchimento
-            volume = st.number_input("Volume do Copo (cm³)", value=0.0, min_value=0.0, step=1.0, format="%.2f")
-            
+            volume = st.number_input("Volume do Copo (cm³)", min_value=0.0, step=1.0, format="%.2f", key="dens_volume")
+
         calcular = st.form_submit_button("Calcular")
 
     if calcular:
-        if volume <= 0:
-            st.error("Volume deve ser maior que zero.")
-        elif massa_bruta < tara:
-            st.error("A massa bruta não pode ser menor que a tara.")
+        # Densidade teórica já informada (resultado reaberto do histórico ou cálculo anterior)
+        dt = float(st.session_state.get("dt_input") or 0.0)
+        entradas = {"tara": tara, "massa_bruta": massa_bruta, "volume": volume, "dt": dt}
+        alertar_entradas(ensaios.ENS_DENSIDADE, entradas)
+        try:
+            res = calcular_regra(ensaios.ENS_DENSIDADE, ensaios.regra_densidade, tara, massa_bruta, volume, dt)
+        except ValueError as e:
+            st.error(str(e))
         else:
-            massa_amostra = massa_bruta - tara
-            densidade_g_cm3 = massa_amostra / volume
-            densidade_kg_m3 = densidade_g_cm3 * 1000
+            registrar_resultado(ensaios.ENS_DENSIDADE, entradas, res)
+            d = res["detalhes"]
+            massa_amostra = d["massa_amostra"]
+            densidade_g_cm3 = d["densidade_g_cm3"]
+            densidade_kg_m3 = d["densidade_kg_m3"]
 
             st.divider()
             st.markdown("### Resultados")
-            
+
             # Métricas principais
             c_res1, c_res2, c_res3 = st.columns(3)
             c_res1.metric("Massa Líquida (Amostra)", f"{massa_amostra:.2f} g")
             c_res2.metric("Densidade", f"{densidade_g_cm3:.4f} g/cm³")
             c_res3.metric("Densidade (SI)", f"{densidade_kg_m3:.0f} kg/m³")
 
-            # Detalhamento do cálculo (Memória de Cálculo)
-            st.info(f"**Memória de Cálculo:**\n\n"
-                    f"$$\\text{{Massa Líquida}} = {massa_bruta:.2f} - {tara:.2f} = {massa_amostra:.2f} \\text{{ g}}$$\n\n"
-                    f"$$\\text{{Densidade}} = \\frac{{{massa_amostra:.2f}}}{{{volume:.2f}}} = {densidade_g_cm3:.4f} \\text{{ g/cm³}}$$")
+            # Detalhamento do cálculo (Memória de Cálculo, montada só quando aberta)
+            ui_memoria(ensaios.ENS_DENSIDADE, res, "📝 Memória de Cálculo")
 
             # Cálculo opcional de Teor de Ar Incorporado
             with st.expander("Calcular Teor de Ar Incorporado (Opcional)"):
                 st.caption("Insira a Densidade Teórica para calcular o Teor de Ar.")
                 dt = st.number_input("Densidade Teórica (g/cm³)", min_value=0.0, step=0.0001, format="%.4f", key="dt_input")
-                
+
                 if dt > 0:
-                    teor_ar = ((dt - densidade_g_cm3) / dt) * 100
+                    res_ar = calcular_regra(ensaios.ENS_DENSIDADE, ensaios.regra_densidade, tara, massa_bruta, volume, dt)
+                    teor_ar = res_ar["detalhes"]["teor_ar"]
                     st.metric("Teor de Ar Incorporado", f"{teor_ar:.2f} %")
                     st.latex(r"A = \frac{d_t - d}{d_t} \times 100")
                 elif dt == 0:
@@ -584,7 +1270,7 @@ def calc_densidade_fresco_generica():
 def calc_flexao_generica():
     # Limite dinâmico
     limite = obter_config("flexao_var_max")
-    
+
     st.subheader("Flexão 4x4x16 (MPa)")
     st.caption(f"Norma: ABNT NBR 13279 | Regra: Excluir se variação > {limite} MPa da média")
 
@@ -596,29 +1282,28 @@ def calc_flexao_generica():
         calcular = st.form_submit_button("Calcular")
 
     if calcular:
-        valores = [cp1, cp2, cp3]
-        if all(v == 0 for v in valores):
-            st.warning("Preencha os valores.")
+        entradas = {"cps": [cp1, cp2, cp3]}
+        alertar_entradas(ensaios.ENS_FLEXAO, entradas)
+        try:
+            res = calcular_regra(ensaios.ENS_FLEXAO, ensaios.regra_flexao, [cp1, cp2, cp3], limite)
+        except EntradaIncompleta as e:
+            st.warning(str(e))
         else:
-            media = sum(valores) / 3
+            id_ = registrar_resultado(ensaios.ENS_FLEXAO, entradas, res)
             st.divider()
-            
-            validos = []
-            for i, val in enumerate(valores):
-                var = media - val 
-                passed = abs(var) <= limite
-                if passed: validos.append(val)
-                
+
+            for i, (val, var) in enumerate(zip(res["valores"], res["detalhes"]["variacoes"])):
+                passed = i not in res["excluidos"]
                 cor = "black" if passed else "red"
                 icon = "" if passed else "❌"
                 st.write(f"CP {i+1}: {val:.2f} MPa | Var: :{cor}[{var:.2f}] {icon}")
 
             st.divider()
-            if len(validos) >= 2:
-                media_final = sum(validos) / len(validos)
-                st.success(f"Média Final: {media_final:.2f} MPa ({len(validos)} CPs válidos)")
+            if res["valido"]:
+                st.success(f"Média Final: {res['resultado']:.2f} MPa ({len(res['validos'])} CPs válidos)")
             else:
                 st.error("Ensaio Inválido (Menos de 2 CPs).")
+            ui_previsao(res, id_)
 
     ui_navegacao_botoes("Voltar", st.session_state.get("produto", PG_LINHAS))
 
@@ -628,10 +1313,11 @@ def calc_permeabilidade_generica():
 
     with st.form("form_perm_generica"):
         # Volume padrão 400ml é comum, mas deixamos editável
-        volume_cp = st.number_input("Volume do CP (cm³)", value=400.0, step=1.0)
-        
+        st.session_state.setdefault("p_volume", 400.0)  # Padrão pela sessão: o campo pode vir do histórico
+        volume_cp = st.number_input("Volume do CP (cm³)", step=1.0, key="p_volume")
+
         st.write("Leituras de Massa (g)")
-        
+
         # Cabeçalhos
         cols_labels = st.columns(4)
         labels = ["CP 1", "CP 2", "CP 3", "Testemunho"]
@@ -657,58 +1343,45 @@ def calc_permeabilidade_generica():
         calcular = st.form_submit_button("Calcular")
 
     if calcular:
-        if volume_cp <= 0:
-            st.error("Volume inválido.")
-        elif any(v == 0 for v in inputs_ini):
-            st.warning("Preencha as massas iniciais.")
+        entradas = {"volume": volume_cp, "ini": inputs_ini, "fim": inputs_fim}
+        alertar_entradas(ensaios.ENS_PERMEABILIDADE, entradas)
+        try:
+            res = calcular_regra(ensaios.ENS_PERMEABILIDADE, ensaios.regra_permeabilidade, volume_cp, inputs_ini, inputs_fim)
+        except EntradaIncompleta as e:
+            st.warning(str(e))
+        except ValueError as e:
+            st.error(str(e))
         else:
-            # 1. Correção pelo Testemunho (Índice 3)
-            # Se testemunho perdeu massa (evaporação), somamos essa perda aos CPs
-            m_ini_test = inputs_ini[3]
-            m_fim_test = inputs_fim[3]
-            perda_testemunho = m_ini_test - m_fim_test
-            correcao = perda_testemunho if perda_testemunho > 0 else 0
-            
-            resultados = []
+            registrar_resultado(ensaios.ENS_PERMEABILIDADE, entradas, res)
+            d = res["detalhes"]
             st.divider()
-            st.write(f"**Correção (Testemunho):** {correcao:.2f} g")
-            
+            st.write(f"**Correção (Testemunho):** {d['correcao']:.2f} g")
+
             col_res = st.columns(3)
-            
-            # 2. Calcular CPs 1, 2 e 3
+
+            # Calcular CPs 1, 2 e 3
             for i in range(3):
-                ini = inputs_ini[i]
-                fim = inputs_fim[i]
-                
-                if ini > 0:
-                    agua_abs = fim - ini
-                    agua_total = agua_abs + correcao
-                    perm = agua_total / volume_cp
-                    resultados.append(perm)
-                    
+                if d["absorcoes"][i] is not None:
                     col_res[i].markdown(f"**CP {i+1}**")
-                    col_res[i].markdown(f"Abs: {agua_abs:.2f} g")
-                    col_res[i].info(f"{perm:.2f} mL/cm³")
-                else:
-                    resultados.append(0)
+                    col_res[i].markdown(f"Abs: {d['absorcoes'][i]:.2f} g")
+                    col_res[i].info(f"{res['valores'][i]:.2f} mL/cm³")
 
             # Média
-            media = sum(resultados) / 3
             st.markdown("---")
-            st.success(f"Permeabilidade Média: {media:.2f} mL/cm³")
+            st.success(f"Permeabilidade Média: {res['resultado']:.2f} mL/cm³")
 
     ui_navegacao_botoes("Voltar", st.session_state.get("produto", "Inicio"))
 
 def calc_compressao_4x4x16_generica():
     limite = obter_config("compressao_var_max")
-    
+
     st.subheader("Compressão 4x4x16 (MPa)")
     st.caption(f"Norma: ABNT NBR 13279 | Regra: Excluir se variação > {limite} MPa")
 
     with st.form("form_comp"):
         c1, c2, c3 = st.columns(3)
         # Inputs para 6 CPs
-        with c1: 
+        with c1:
             cp1 = st.number_input("CP 1", key="c1", step=0.1)
             cp4 = st.number_input("CP 4", key="c4", step=0.1)
         with c2:
@@ -720,22 +1393,21 @@ def calc_compressao_4x4x16_generica():
         calcular = st.form_submit_button("Calcular")
 
     if calcular:
-        valores = [cp1, cp2, cp3, cp4, cp5, cp6]
-        media = sum(valores) / 6
-        validos = []
-        
-        st.write(f"**Média Inicial:** {media:.2f} MPa")
-        for val in valores:
-            if abs(val - media) <= limite:
-                validos.append(val)
-            else:
-                st.markdown(f":red[Excluído: {val:.2f}]")
-        
-        if len(validos) >= 4:
-            mf = sum(validos) / len(validos)
-            st.success(f"Resultado: {mf:.2f} MPa ({len(validos)} CPs)")
+        cps = [cp1, cp2, cp3, cp4, cp5, cp6]
+        entradas = {"cps": cps}
+        alertar_entradas(ensaios.ENS_COMPRESSAO_4X4X16, entradas)
+        res = calcular_regra(ensaios.ENS_COMPRESSAO_4X4X16, ensaios.regra_compressao_4x4x16, cps, limite)
+        id_ = registrar_resultado(ensaios.ENS_COMPRESSAO_4X4X16, entradas, res)
+
+        st.write(f"**Média Inicial:** {res['media_inicial']:.2f} MPa")
+        for i in res["excluidos"]:
+            st.markdown(f":red[Excluído: {res['valores'][i]:.2f}]")
+
+        if res["valido"]:
+            st.success(f"Resultado: {res['resultado']:.2f} MPa ({len(res['validos'])} CPs)")
         else:
             st.error("Inválido: Menos de 4 CPs.")
+        ui_previsao(res, id_)
 
     ui_navegacao_botoes("Voltar", st.session_state.get("produto", PG_LINHAS))
 
@@ -745,8 +1417,9 @@ def calc_capilaridade_generica():
     st.caption(f"Norma: ABNT NBR 15259 | Regra: Variação {limite_pct}%")
 
     with st.form("form_cap"):
-        area = st.number_input("Área (cm²)", value=16.0)
-        
+        st.session_state.setdefault("cap_area", 16.0)
+        area = st.number_input("Área (cm²)", key="cap_area")
+
         cols = st.columns(3)
         m10 = []; m90 = []
         for i in range(3):
@@ -754,35 +1427,21 @@ def calc_capilaridade_generica():
                 st.markdown(f"**CP {i+1}**")
                 m10.append(st.number_input(f"10min", key=f"c10_{i}"))
                 m90.append(st.number_input(f"90min", key=f"c90_{i}"))
-        
+
         calcular = st.form_submit_button("Calcular")
 
     if calcular:
-        fator = (90**0.5 - 10**0.5) * (area/100)
-        valores = []
-        for i in range(3):
-            if m10[i] > 0:
-                c = (m90[i] - m10[i]) / fator
-                valores.append(c)
-            else:
-                valores.append(0)
-        
-        media = sum(valores) / 3
-        st.write(f"Média: {media:.2f}")
-        
-        validos = []
-        for v in valores:
-            if media > 0:
-                pct = (v / media) * 100
-                if (100 - limite_pct) <= pct <= (100 + limite_pct):
-                    validos.append(v)
-                else:
-                    st.markdown(f":red[{v:.2f} (Desvio {pct:.1f}%)]")
-            else:
-                validos.append(v)
+        entradas = {"area": area, "m10": m10, "m90": m90}
+        alertar_entradas(ensaios.ENS_CAPILARIDADE, entradas)
+        res = calcular_regra(ensaios.ENS_CAPILARIDADE, ensaios.regra_capilaridade, area, m10, m90, limite_pct)
+        registrar_resultado(ensaios.ENS_CAPILARIDADE, entradas, res)
+        st.write(f"Média: {res['media_inicial']:.2f}")
 
-        if len(validos) >= 2:
-            st.success(f"Aprovado: {sum(validos)/len(validos):.2f}")
+        for i in res["excluidos"]:
+            st.markdown(f":red[{res['valores'][i]:.2f} (Desvio {res['detalhes']['desvios_pct'][i]:.1f}%)]")
+
+        if res["valido"]:
+            st.success(f"Aprovado: {res['resultado']:.2f}")
         else:
             st.error("Repetir ensaio")
 
@@ -792,7 +1451,7 @@ def calc_retracao_generica():
     limite_pct = obter_config("retracao_var_pct")
     st.subheader("Retração (%)")
     st.caption(f"Norma: ABNT NBR 15261 | Regra: {limite_pct}% da média")
-    
+
     with st.form("form_ret"):
         st.write("Leituras (Inicial e Final)")
         vals = []
@@ -802,90 +1461,76 @@ def calc_retracao_generica():
             fim = c2.number_input(f"CP{i+1} Fin", key=f"rf_{i}", format="%.3f")
             vals.append((ini, fim))
         calcular = st.form_submit_button("Calcular")
-        
+
     if calcular:
-        res = []
-        for ini, fim in vals:
-            if ini > 0: res.append(((fim-ini)/ini)*100)
-            else: res.append(0)
-            
-        media = sum(res)/3
-        validos = [r for r in res if abs((r - media)/media if media else 0) <= (limite_pct/100)]
-        
-        if len(validos) >= 2:
-            st.success(f"Retração: {sum(validos)/len(validos):.3f}%")
+        entradas = {"ini": [v[0] for v in vals], "fim": [v[1] for v in vals]}
+        alertar_entradas(ensaios.ENS_RETRACAO, entradas)
+        res = calcular_regra(ensaios.ENS_RETRACAO, ensaios.regra_retracao, vals, limite_pct)
+        registrar_resultado(ensaios.ENS_RETRACAO, entradas, res)
+
+        if res["valido"]:
+            st.success(f"Retração: {res['resultado']:.3f}%")
         else:
             st.error("Inválido")
-            
+
     ui_navegacao_botoes("Voltar", st.session_state.get("produto", PG_LINHAS))
 
 def calc_aderencia_automatica_generica():
     # Pega configurações do dicionário
     limite_pct = obter_config("aderencia_var_pct") # Padrão 30%
     min_cps = obter_config("min_cps_aderencia")    # Padrão 6 ou 8
-    
+
     st.subheader("Potencial de Aderência (MPa) — Automática")
     st.caption(f"Norma: ABNT NBR 15258 | Regra: Variação {limite_pct}% | Mínimo {min_cps} CPs válidos")
 
     with st.form("form_aderencia_auto"):
         st.write("Leituras das 13 Chapinhas (MPa)")
-        
+
         # Cria 3 colunas para organizar os 13 inputs
         c1, c2, c3 = st.columns(3)
         valores_input = []
-        
+
         for i in range(1, 14):
             if i <= 5: col = c1
             elif i <= 9: col = c2
             else: col = c3
-            
+
             with col:
                 val = st.number_input(f"CP {i}", key=f"ad_au_{i}", step=0.01, format="%.2f")
                 valores_input.append(val)
-                
+
         calcular = st.form_submit_button("Calcular Aderência")
 
     if calcular:
-        # Filtra zeros
-        validos_iniciais = [v for v in valores_input if v > 0]
-        
-        if not validos_iniciais:
-            st.warning("Preencha os valores.")
+        entradas = {"cps": valores_input}
+        alertar_entradas(ensaios.ENS_ADERENCIA_AUTO, entradas)
+        try:
+            res = calcular_regra(ensaios.ENS_ADERENCIA_AUTO, ensaios.regra_aderencia, valores_input, limite_pct, min_cps)
+        except EntradaIncompleta as e:
+            st.warning(str(e))
         else:
-            media_ini = sum(validos_iniciais) / len(validos_iniciais)
-            
-            # Limites
-            limite_inf = media_ini * (1 - (limite_pct/100))
-            limite_sup = media_ini * (1 + (limite_pct/100))
-            
-            validos_finais = []
-            
+            registrar_resultado(ensaios.ENS_ADERENCIA_AUTO, entradas, res)
+            d = res["detalhes"]
             st.divider()
-            st.write(f"**Média Inicial:** {media_ini:.2f} MPa")
-            st.caption(f"Intervalo aceito: {limite_inf:.2f} a {limite_sup:.2f}")
-            
+            st.write(f"**Média Inicial:** {res['media_inicial']:.2f} MPa")
+            st.caption(f"Intervalo aceito: {d['limite_inf']:.2f} a {d['limite_sup']:.2f}")
+
             cols_res = st.columns(4)
             for i, val in enumerate(valores_input):
                 if val == 0: continue
-                
-                status = "✔"
-                cor = "green"
-                
-                if val < limite_inf or val > limite_sup:
-                    status = "❌"
-                    cor = "red"
-                else:
-                    validos_finais.append(val)
-                
+
+                excluido = i in res["excluidos"]
+                status = "❌" if excluido else "✔"
+                cor = "red" if excluido else "green"
+
                 # Exibe resultado compactado
                 cols_res[i % 4].markdown(f"**CP {i+1}:** :{cor}[{val:.2f} {status}]")
 
             st.divider()
-            
-            qtd = len(validos_finais)
-            if qtd >= min_cps:
-                media_final = sum(validos_finais) / qtd
-                st.success(f"APROVADO: {media_final:.2f} MPa ({qtd} CPs válidos)")
+
+            qtd = len(res["validos"])
+            if res["valido"]:
+                st.success(f"APROVADO: {res['resultado']:.2f} MPa ({qtd} CPs válidos)")
             else:
                 st.error(f"INVÁLIDO: Apenas {qtd} CPs válidos (Mínimo requerido: {min_cps})")
                 st.caption("Repetir ensaio.")
@@ -893,19 +1538,18 @@ def calc_aderencia_automatica_generica():
     ui_navegacao_botoes("Voltar", st.session_state.get("produto", PG_LINHAS))
 
 def calc_aderencia_manual_generica():
-    import math
-    
     # Configurações
     limite_pct = obter_config("aderencia_var_pct")
     min_cps = obter_config("min_cps_aderencia")
-    
+
     st.subheader("Potencial de Aderência (Manual) — kN para MPa")
     st.caption(f"Norma: ABNT NBR 15258 | Regra: Variação {limite_pct}% | Mínimo {min_cps} CPs")
 
     with st.form("form_aderencia_man"):
-        diametro = st.number_input("Diâmetro Pastilha (mm)", value=50.0)
+        st.session_state.setdefault("ad_man_diametro", 50.0)
+        diametro = st.number_input("Diâmetro Pastilha (mm)", key="ad_man_diametro")
         st.write("Leituras de Carga (kN)")
-        
+
         c1, c2, c3 = st.columns(3)
         kn_inputs = []
         for i in range(1, 14):
@@ -915,57 +1559,41 @@ def calc_aderencia_manual_generica():
             with col:
                 val = st.number_input(f"CP {i} (kN)", key=f"ad_man_{i}", step=0.001, format="%.3f")
                 kn_inputs.append(val)
-                
+
         calcular = st.form_submit_button("Calcular e Converter")
 
     if calcular:
-        if diametro <= 0:
-            st.error("Diâmetro inválido.")
+        entradas = {"diametro": diametro, "cps": kn_inputs}
+        alertar_entradas(ensaios.ENS_ADERENCIA_MANUAL, entradas)
+        try:
+            res = calcular_regra(ensaios.ENS_ADERENCIA_MANUAL, ensaios.regra_aderencia_manual,
+                                 kn_inputs, diametro, limite_pct, min_cps)
+        except EntradaIncompleta as e:
+            st.warning(str(e))
+        except ValueError as e:
+            st.error(str(e))
         else:
-            # Área em mm²
-            area = math.pi * ((diametro/2)**2)
-            
-            mpa_values = []
-            for kn in kn_inputs:
-                if kn > 0:
-                    # (kN * 1000) / mm² = MPa
-                    mpa_values.append( (kn * 1000) / area )
-                else:
-                    mpa_values.append(0)
-            
-            # Lógica igual à automática daqui pra frente
-            validos_ini = [v for v in mpa_values if v > 0]
-            
-            if not validos_ini:
-                st.warning("Sem dados.")
+            registrar_resultado(ensaios.ENS_ADERENCIA_MANUAL, entradas, res)
+            st.divider()
+            st.write(f"**Média Inicial:** {res['media_inicial']:.2f} MPa")
+
+            cols = st.columns(3)
+            for i, (kn, mpa) in enumerate(zip(kn_inputs, res["valores"])):
+                if kn == 0: continue
+
+                is_ok = i not in res["excluidos"]
+                cor = "green" if is_ok else "red"
+                icon = "✔" if is_ok else "❌"
+
+                with cols[i%3]:
+                    st.markdown(f"**CP {i+1}:** {kn:.3f} kN ➝ :{cor}[{mpa:.2f} MPa {icon}]")
+
+            st.divider()
+            qtd = len(res["validos"])
+            if res["valido"]:
+                st.success(f"Média Final: {res['resultado']:.2f} MPa ({qtd} CPs válidos)")
             else:
-                media_ini = sum(validos_ini) / len(validos_ini)
-                limite_inf = media_ini * (1 - (limite_pct/100))
-                limite_sup = media_ini * (1 + (limite_pct/100))
-                
-                validos_finais = []
-                st.divider()
-                st.write(f"**Média Inicial:** {media_ini:.2f} MPa")
-                
-                cols = st.columns(3)
-                for i, (kn, mpa) in enumerate(zip(kn_inputs, mpa_values)):
-                    if kn == 0: continue
-                    
-                    is_ok = limite_inf <= mpa <= limite_sup
-                    if is_ok: validos_finais.append(mpa)
-                    
-                    cor = "green" if is_ok else "red"
-                    icon = "✔" if is_ok else "❌"
-                    
-                    with cols[i%3]:
-                        st.markdown(f"**CP {i+1}:** {kn:.3f} kN ➝ :{cor}[{mpa:.2f} MPa {icon}]")
-                
-                st.divider()
-                qtd = len(validos_finais)
-                if qtd >= min_cps:
-                    st.success(f"Média Final: {sum(validos_finais)/qtd:.2f} MPa ({qtd} CPs válidos)")
-                else:
-                    st.error(f"Inválido: {qtd} CPs (Mínimo {min_cps})")
+                st.error(f"Inválido: {qtd} CPs (Mínimo {min_cps})")
 
     ui_navegacao_botoes("Voltar", st.session_state.get("produto", PG_LINHAS))
 
@@ -973,7 +1601,7 @@ def calc_compressao_5x10_generica():
     # Tenta pegar um limite específico, ou usa padrão 6% (comum para NBR 7215)
     limite_pct = obter_config("compressao_cilindrica_var_pct")
     if not limite_pct: limite_pct = 6.0 # Fallback se não configurado
-    
+
     st.subheader("Compressão 5x10 cm (MPa)")
     st.caption(f"Norma: ABNT NBR 7215 | Geometria: Cilíndrica (Ø5x10) | Regra: Variação {limite_pct}%")
 
@@ -989,44 +1617,36 @@ def calc_compressao_5x10_generica():
             with col:
                 val = st.number_input(f"CP {i+1}", key=f"c5x10_{i}", step=0.1, format="%.1f")
                 valores.append(val)
-                
+
         calcular = st.form_submit_button("Calcular")
 
     if calcular:
-        validos_ini = [v for v in valores if v > 0]
-        if not validos_ini:
-            st.warning("Preencha os valores.")
+        entradas = {"cps": valores}
+        alertar_entradas(ensaios.ENS_COMPRESSAO_5X10, entradas)
+        try:
+            res = calcular_regra(ensaios.ENS_COMPRESSAO_5X10, ensaios.regra_compressao_5x10, valores, limite_pct)
+        except EntradaIncompleta as e:
+            st.warning(str(e))
         else:
-            media = sum(validos_ini) / len(validos_ini)
-            
-            # Limites percentuais (diferente da 4x4x16 que é absoluto)
-            lim_inf = media * (1 - (limite_pct/100))
-            lim_sup = media * (1 + (limite_pct/100))
-            
-            validos_finais = []
+            id_ = registrar_resultado(ensaios.ENS_COMPRESSAO_5X10, entradas, res)
             st.divider()
-            st.write(f"**Média Inicial:** {media:.2f} MPa")
-            
+            st.write(f"**Média Inicial:** {res['media_inicial']:.2f} MPa")
+
             cols = st.columns(3)
             for i, val in enumerate(valores):
                 if val == 0: continue
-                
-                status = "✔"
-                cor = "green"
-                if val < lim_inf or val > lim_sup:
-                    status = "❌"
-                    cor = "red"
-                else:
-                    validos_finais.append(val)
-                
+
+                excluido = i in res["excluidos"]
+                status = "❌" if excluido else "✔"
+                cor = "red" if excluido else "green"
                 cols[i%3].markdown(f"**CP {i+1}:** :{cor}[{val:.2f} MPa {status}]")
-                
+
             st.divider()
-            if len(validos_finais) >= 2: # Mínimo 2 CPs válidos
-                mf = sum(validos_finais) / len(validos_finais)
-                st.success(f"Resultado Final: {mf:.2f} MPa ({len(validos_finais)} CPs)")
+            if res["valido"]: # Mínimo 2 CPs válidos
+                st.success(f"Resultado Final: {res['resultado']:.2f} MPa ({len(res['validos'])} CPs)")
             else:
                 st.error("Ensaio Inválido (Menos de 2 CPs válidos).")
+            ui_previsao(res, id_)
 
     ui_navegacao_botoes("Voltar", st.session_state.get("produto", PG_LINHAS))
 
@@ -1034,9 +1654,9 @@ def calc_variacao_dimensional_generica():
     # Busca configurações
     limite = obter_config("variacao_dim_max")
     if not limite: limite = 0.20
-    
+
     # Pega o comprimento padrão automaticamente (ex: 130.43 para Graute)
-    comp_padrao = obter_config("comprimento_padrao") 
+    comp_padrao = obter_config("comprimento_padrao")
     if not comp_padrao: comp_padrao = 250.0
 
     st.subheader("Variação Dimensional (mm/m)")
@@ -1045,12 +1665,12 @@ def calc_variacao_dimensional_generica():
 
     with st.form("form_var_dim"):
         st.write("Leituras do Comparador (mm)")
-        
+
         # Layout igual à planilha: 3 CPs lado a lado
         c1, c2, c3 = st.columns(3)
         cols = [c1, c2, c3]
-        inputs = [] 
-        
+        inputs = []
+
         for i, col in enumerate(cols):
             with col:
                 st.markdown(f"**CP {i+1}**")
@@ -1058,70 +1678,54 @@ def calc_variacao_dimensional_generica():
                 ini = st.number_input(f"Inicial", key=f"vd_ini_{i}", format="%.3f")
                 fim = st.number_input(f"Final (28 dias)", key=f"vd_fim_{i}", format="%.3f")
                 inputs.append((ini, fim))
-            
+
         calcular = st.form_submit_button("Calcular Resultados")
 
     if calcular:
-        valores_calculados = []
-        
-        # --- CÁLCULO ---
-        for ini, fim in inputs:
-            # Lógica para detectar se o campo foi preenchido
-            # Se ambos forem 0, consideramos vazio. Se tiver valor, calculamos.
-            if ini == 0 and fim == 0:
-                valores_calculados.append(None)
-            else:
-                delta_l = fim - ini
-                # Fórmula: (Diferença / Base) * 1000
-                res_mm_m = (delta_l / comp_padrao) * 1000
-                valores_calculados.append(res_mm_m)
-
-        valores_validos = [v for v in valores_calculados if v is not None]
-
-        if not valores_validos:
-            st.warning("Preencha as leituras de pelo menos um CP.")
+        entradas = {"ini": [v[0] for v in inputs], "fim": [v[1] for v in inputs]}
+        alertar_entradas(ensaios.ENS_VAR_DIM, entradas)
+        try:
+            res = calcular_regra(ensaios.ENS_VAR_DIM, ensaios.regra_variacao_dimensional, inputs, comp_padrao, limite)
+        except EntradaIncompleta as e:
+            st.warning(str(e))
         else:
-            # Média Inicial
-            media_inicial = sum(valores_validos) / len(valores_validos)
-            
+            registrar_resultado(ensaios.ENS_VAR_DIM, entradas, res)
+            media_inicial = res["media_inicial"]
+
             st.divider()
             # Mostra a média amarela grande igual à planilha
             st.metric("Variação Dimensional Média", f"{media_inicial:.2f} mm/m")
-            
+
             st.write("--- Detalhamento ---")
-            
+
             # Verificação de Desvios
-            cps_finais = []
             cols_res = st.columns(3)
-            
-            for i, val in enumerate(valores_calculados):
+
+            for i, val in enumerate(res["valores"]):
                 if val is None:
                     cols_res[i].info(f"CP {i+1}: -")
                     continue
-                
+
                 # Desvio Absoluto (Coluna J da planilha)
-                desvio_abs = abs(val - media_inicial)
-                
+                desvio_abs = res["detalhes"]["desvios"][i]
+
                 # Regra: Variação maior que 0,20 mm/m, excluir
-                aprovado = desvio_abs <= limite
-                
+                aprovado = i not in res["excluidos"]
+
                 cor = "green" if aprovado else "red"
                 icon = "✔" if aprovado else "❌"
-                
+
                 # Exibe igual à planilha: Resultado e Desvio
                 with cols_res[i]:
                     st.markdown(f"**CP {i+1}**")
                     st.markdown(f"Variação: :{cor}[{val:.2f}]")
                     st.caption(f"Desvio: {desvio_abs:.2f} {icon}")
-                
-                if aprovado:
-                    cps_finais.append(val)
 
             st.divider()
-            
+
             # Validação Final (Mínimo 2 CPs)
-            if len(cps_finais) >= 2:
-                media_final = sum(cps_finais) / len(cps_finais)
+            if res["valido"]:
+                media_final = res["resultado"]
                 if abs(media_final - media_inicial) > 0.001:
                     st.warning(f"Após exclusão de outliers, a nova média é: {media_final:.2f} mm/m")
                 else:
@@ -1146,96 +1750,82 @@ def calc_variacao_massa_generica():
                 ini = st.number_input("Inicial", key=f"vmi_{i}", format="%.2f")
                 fin = st.number_input("Final", key=f"vmf_{i}", format="%.2f")
                 dados.append((ini, fin))
-        
+
         if st.form_submit_button("Calcular"):
-            resultados = []
-            for ini, fin in dados:
-                if ini > 0:
-                    # Cálculo: ((Final - Inicial) / Inicial) * 100
-                    var_pct = ((fin - ini) / ini) * 100
-                    resultados.append(var_pct)
-                else:
-                    resultados.append(0.0)
-            
-            media = sum(resultados) / 3
+            entradas = {"ini": [d[0] for d in dados], "fim": [d[1] for d in dados]}
+            alertar_entradas(ensaios.ENS_VAR_MASSA, entradas)
+            res = calcular_regra(ensaios.ENS_VAR_MASSA, ensaios.regra_variacao_massa, dados)
+            registrar_resultado(ensaios.ENS_VAR_MASSA, entradas, res)
+
             st.divider()
-            st.write(f"**Média:** {media:.2f}%")
-            
+            st.write(f"**Média:** {res['resultado']:.2f}%")
+
             # Mostra valores individuais
             c_res = st.columns(3)
-            for i, r in enumerate(resultados):
+            for i, r in enumerate(res["valores"]):
                 c_res[i].metric(f"CP {i+1}", f"{r:.2f}%")
-                
+
             st.success("Cálculo concluído.")
 
     ui_navegacao_botoes("Voltar", st.session_state.get("produto", PG_LINHAS))
 
+# Calculadora responsável por cada ensaio (ver ensaios.identificar_ensaio)
+CALCULADORAS = {
+    ensaios.ENS_FLEXAO: calc_flexao_generica,
+    ensaios.ENS_COMPRESSAO_4X4X16: calc_compressao_4x4x16_generica,
+    ensaios.ENS_COMPRESSAO_5X10: calc_compressao_5x10_generica,
+    ensaios.ENS_RETENCAO: calc_retencao_agua_generica,
+    ensaios.ENS_DENSIDADE: calc_densidade_fresco_generica,
+    ensaios.ENS_CAPILARIDADE: calc_capilaridade_generica,
+    ensaios.ENS_ADERENCIA_AUTO: calc_aderencia_automatica_generica,
+    ensaios.ENS_ADERENCIA_MANUAL: calc_aderencia_manual_generica,
+    ensaios.ENS_RETRACAO: calc_retracao_generica,
+    ensaios.ENS_PERMEABILIDADE: calc_permeabilidade_generica,
+    ensaios.ENS_VAR_DIM: calc_variacao_dimensional_generica,
+    ensaios.ENS_VAR_MASSA: calc_variacao_massa_generica,
+}
+
 
 # ======================== 6. CONTROLADOR PRINCIPAL (ROUTER) ========================
 
 def main():
+    ganchos.registrar() # Indicadores, agenda, previsão e LIMS a cada resultado gravado
     configurar_pagina()
     inicializar_estado()
+    aplicar_link_profundo()
+    # Campos da calculadora por lote/página: guarda os da página anterior e devolve os desta
+    estado_calculadoras().entrar(st.session_state, (st.session_state.get("lote") or "").strip(),
+                                 st.session_state.pagina)
+    anomalias.aquecer() # Índice de anomalias carregado em segundo plano na 1ª sessão
+    etiquetas.aquecer()
+    eventos.iniciar_sse() # Só com CALCULADORA_SSE_PORTA definida
+    lims.iniciar() # Remetente da caixa de saída; só com CALCULADORA_LIMS_URL definida
 
     # 1. Roteamento Básico (Páginas Estáticas)
     rotas = {
         PG_INICIO: view_inicio,
         PG_LINHAS: view_selecao_linhas,
+        PG_PAINEL: view_painel,
+        PG_MONITOR: view_monitor,
+        PG_AGENDA: view_agenda,
+        PG_LOTE: view_lote,
+        PG_HISTORICO: view_historico,
+        PG_SIMULACAO: view_simulacao,
     }
 
     # 2. Roteamento Dinâmico (Mapeia Produto + Ensaio -> Calculadora Genérica)
-    for linha, reqs in REQUISITOS.items():
+    for linha in REQUISITOS:
         # Rota para o menu de seleção de requisitos deste produto
         rotas[linha] = partial(view_selecao_requisito, linha)
-        
-        for req in reqs:
-            # Gera ID único (ex: "Basecoat::flexao-mpa...") e normaliza nome para busca
-            page_id = f"{linha}::{slugify(req)}"
-            nome_normalizado = norm(req)
-
-            # --- MAPEAMENTO INTELIGENTE DAS CALCULADORAS ---
-
-            if "flexao" in nome_normalizado:
-                rotas[page_id] = calc_flexao_generica
-                
-            elif "compressao" in nome_normalizado:
-                # Prioriza detecção de Graute ou NBR 7215 (Cilíndrico 5x10)
-                if "5x10" in nome_normalizado or "7215" in nome_normalizado or linha == "Graute":
-                    rotas[page_id] = calc_compressao_5x10_generica
-                # Caso contrário, assume Prismático (4x4x16) padrão
-                else:
-                    rotas[page_id] = calc_compressao_4x4x16_generica
-            
-            elif "retencao" in nome_normalizado:
-                rotas[page_id] = calc_retencao_agua_generica
-                
-            elif "densidade" in nome_normalizado and "fresco" in nome_normalizado:
-                rotas[page_id] = calc_densidade_fresco_generica
-                
-            elif "capilaridade" in nome_normalizado:
-                rotas[page_id] = calc_capilaridade_generica
-                
-            elif "aderencia" in nome_normalizado:
-                if "manual" in nome_normalizado:
-                    rotas[page_id] = calc_aderencia_manual_generica
-                else:
-                    rotas[page_id] = calc_aderencia_automatica_generica
-            
-            elif "retracao" in nome_normalizado:
-                rotas[page_id] = calc_retracao_generica
-                
-            elif "permeabilidade" in nome_normalizado:
-                rotas[page_id] = calc_permeabilidade_generica
-
-            elif "dimensional" in nome_normalizado:
-                rotas[page_id] = calc_variacao_dimensional_generica
-                
-            elif "massa" in nome_normalizado and "variacao" in nome_normalizado:
-                rotas[page_id] = calc_variacao_massa_generica
-
-            # Fallback: Se o requisito existe mas não tem calculadora definida
-            elif page_id not in rotas:
-                rotas[page_id] = partial(view_generica_construcao, req, linha)
+
+    # IDs únicos (ex: "Basecoat::flexao-mpa...") e ensaios já identificados na importação de ensaios.py
+    for page_id, (linha, req, ensaio) in ensaios.PAGINAS_CALCULO.items():
+        if ensaio in CALCULADORAS:
+            rotas[page_id] = CALCULADORAS[ensaio]
+
+        # Fallback: Se o requisito existe mas não tem calculadora definida
+        elif page_id not in rotas:
+            rotas[page_id] = partial(view_generica_construcao, req, linha)
 
     # 3. Execução da Interface
     ui_sidebar() # Exibe o menu lateral
@@ -1246,6 +1836,7 @@ def main():
     # Renderiza a página atual ou mostra erro 404
     if funcao_renderizacao:
         funcao_renderizacao()
+        focar_cp_lido()
     else:
         st.error(f"Erro 404: Página '{pagina_atual}' não encontrada.")
         if st.button("Voltar ao Início"):
@@ -0,0 +1,433 @@
+"""Teste de carga: N técnicos simultâneos percorrendo fluxos reais da calculadora.
+
+Cada técnico simulado abre uma calculadora pelo link profundo (ver
+``link_calculadora``), preenche o formulário com leituras plausíveis, calcula,
+espera um tempo de "pensar" e segue pelo botão "Próximo Ensaio", como no
+laboratório. Fluxos:
+
+    * basecoat:  Basecoat, da retenção de água até a retração (todos os requisitos)
+    * aderencia: Revestimento, aderência manual (um lote após o outro)
+    * misto:     metade dos técnicos em cada fluxo
+
+Dois modos de execução:
+
+    * servidor: sobe ``streamlit run calculadora.py`` (banco temporário) e conecta
+      N clientes websocket, como navegadores. Mede a latência de cada rerun (envio
+      até o fim do script), a CPU e a memória (RSS) do processo do servidor.
+    * apptest:  cada técnico roda em um processo próprio com ``AppTest`` (o AppTest
+      não pode rodar em threads no mesmo processo). Mede a latência e o tamanho do
+      ``st.session_state`` de cada sessão ao longo do fluxo.
+
+A carga é repetida para cada N pedido (servidor novo a cada N), para comparar:
+
+    python carga.py --sessoes 1 5 10 20 --fluxo misto --pensar 1 3
+    python carga.py --modo apptest --sessoes 1 4 --json carga.json
+
+Modo ``partida``: tempo de importação (``-X importtime``), tempo até o servidor
+responder e, para N sessões novas abertas uma após a outra, o tempo até a primeira
+pintura (primeiro elemento recebido) e até a página ficar interativa (fim do
+script). A primeira sessão é a partida a frio:
+
+    python carga.py --modo partida --sessoes 10 --json partida.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlencode
+
+import ensaios
+import sessao
+from ensaios import REQUISITOS, slugify
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "calculadora.py")
+
+# Fluxo -> (produto, requisitos percorridos em ordem)
+FLUXOS = {
+    "basecoat": ("Basecoat", REQUISITOS["Basecoat"]),
+    "aderencia": ("Revestimento", [ensaios.REQ_ADERENCIA_MANUAL]),
+}
+
+# Leituras típicas por ensaio, na ordem dos campos do formulário
+LEITURAS = {
+    ensaios.ENS_RETENCAO: [510.0, 900.0, 880.0, 200.0],
+    ensaios.ENS_DENSIDADE: [100.0, 900.0, 400.0],
+    ensaios.ENS_FLEXAO: [4.5, 4.6, 5.2],
+    ensaios.ENS_COMPRESSAO_4X4X16: [10.0, 10.2, 10.1, 12.0, 9.9, 10.0],
+    ensaios.ENS_COMPRESSAO_5X10: [30.0, 31.0, 29.5, 40.0],
+    ensaios.ENS_CAPILARIDADE: [16.0, 10.0, 30.0, 10.0, 31.0, 10.0, 60.0],
+    ensaios.ENS_RETRACAO: [100.0, 99.9, 100.0, 99.8, 100.0, 99.95],
+    ensaios.ENS_ADERENCIA_AUTO: [0.5, 0.52, 0.48, 0.9, 0.51, 0.5, 0.49, 0.2, 0.5],
+    ensaios.ENS_ADERENCIA_MANUAL: [50.0, 1.0, 1.1, 0.9, 2.0, 1.0, 1.0, 1.0, 0.1],
+    ensaios.ENS_PERMEABILIDADE: [400.0, 500.0, 510.0, 505.0, 300.0, 520.0, 530.0, 515.0, 299.0],
+    ensaios.ENS_VAR_DIM: [1.0, 1.18, 1.0, 1.2, 1.0, 1.5],
+    ensaios.ENS_VAR_MASSA: [100.0, 101.0, 100.0, 99.0, 200.0, 202.0],
+}
+
+def fluxo_do_tecnico(fluxo: str, indice: int) -> str:
+    if fluxo == "misto":
+        return ("basecoat", "aderencia")[indice % 2]
+    return fluxo
+
+def leituras(produto: str, requisito: str, rng: random.Random) -> List[float]:
+    """Leituras do ensaio com pequena variação (cada técnico digita valores próprios)."""
+    base = LEITURAS.get(ensaios.identificar_ensaio(produto, requisito), [])
+    return [round(v * (1 + rng.uniform(-0.02, 0.02)), 3) if v else v for v in base]
+
+def percentis(valores: Sequence[float]) -> Dict[str, Optional[float]]:
+    """p50/p90/p99 e máximo em milissegundos."""
+    if not valores:
+        return {"p50": None, "p90": None, "p99": None, "max": None}
+    ordenados = sorted(valores)
+    def p(q):
+        return round(ordenados[min(len(ordenados) - 1, int(q * len(ordenados)))] * 1000, 1)
+    return {"p50": p(0.50), "p90": p(0.90), "p99": p(0.99), "max": round(ordenados[-1] * 1000, 1)}
+
+# ======================== 1. MODO SERVIDOR (WEBSOCKET) ========================
+
+class SessaoWebsocket:
+    """Cliente mínimo do protocolo do Streamlit (BackMsg/ForwardMsg), como o navegador."""
+
+    def __init__(self, ws, tempo_limite: float = 60.0):
+        self.ws, self.tempo_limite = ws, tempo_limite
+        self.valores: Dict[str, object] = {}  # id do widget -> WidgetState enviado nos reruns
+        self.elementos: List[Tuple[Tuple[int, ...], object]] = []
+        self.primeira_pintura: Optional[float] = None  # s até o primeiro elemento do último rerun
+
+    async def rerun(self, query: str = "", gatilho: Optional[str] = None) -> float:
+        """Envia um rerun e espera o fim do script; retorna a latência em segundos."""
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        msg = BackMsg()
+        msg.rerun_script.query_string = query
+        for estado in self.valores.values():
+            msg.rerun_script.widget_states.widgets.append(estado)
+        if gatilho:
+            msg.rerun_script.widget_states.widgets.add(id=gatilho, trigger_value=True)
+
+        inicio = time.perf_counter()
+        self.primeira_pintura = None
+        await self.ws.send(msg.SerializeToString())
+        while True:
+            fwd = ForwardMsg()
+            fwd.ParseFromString(await asyncio.wait_for(self.ws.recv(), self.tempo_limite))
+            tipo = fwd.WhichOneof("type")
+            if tipo == "new_session":
+                self.elementos = []
+            elif tipo == "delta" and fwd.delta.WhichOneof("type") == "new_element":
+                if self.primeira_pintura is None:
+                    self.primeira_pintura = time.perf_counter() - inicio
+                self.elementos.append((tuple(fwd.metadata.delta_path), fwd.delta.new_element))
+            elif tipo == "script_finished" and fwd.script_finished in (
+                    ForwardMsg.FINISHED_SUCCESSFULLY, ForwardMsg.FINISHED_WITH_COMPILE_ERROR):
+                return time.perf_counter() - inicio
+
+    def _widgets(self, tipo: str) -> list:
+        return [el for _, el in sorted(self.elementos, key=lambda e: e[0]) if el.WhichOneof("type") == tipo]
+
+    def preencher(self, valores: Sequence[float]) -> Optional[str]:
+        """Preenche os campos do formulário (ordem da página); retorna o id do botão de envio."""
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        campos = [el.number_input for el in self._widgets("number_input") if el.number_input.form_id]
+        for campo, valor in zip(campos, valores):
+            estado = WidgetState(id=campo.id)
+            if campo.data_type == campo.INT:
+                estado.int_value = int(valor)
+            else:
+                estado.double_value = float(valor)
+            self.valores[campo.id] = estado
+        form = campos[0].form_id if campos else None
+        return next((el.button.id for el in self._widgets("button")
+                     if el.button.is_form_submitter and el.button.form_id == form), None)
+
+    def botao(self, chave: str) -> Optional[str]:
+        return next((el.button.id for el in self._widgets("button") if el.button.id.endswith(f"-{chave}")), None)
+
+async def _tecnico_ws(url: str, fluxo: str, indice: int, pensar: Tuple[float, float],
+                      rodadas: int, semente: int) -> List[Tuple[str, float]]:
+    import websockets
+
+    rng = random.Random(semente + indice)
+    produto, requisitos = FLUXOS[fluxo]
+    medidas: List[Tuple[str, float]] = []
+    await asyncio.sleep(rng.uniform(0, pensar[1]))  # chegadas espalhadas
+    async with websockets.connect(url, subprotocols=["streamlit"], max_size=None) as ws:
+        sessao = SessaoWebsocket(ws)
+        medidas.append(("abrir", await sessao.rerun()))
+        for rodada in range(rodadas):
+            lote = f"CARGA-{indice}-{rodada}"
+            query = urlencode({"produto": produto, "ensaio": slugify(requisitos[0]), "lote": lote})
+            medidas.append(("link", await sessao.rerun(query)))
+            for n, req in enumerate(requisitos):
+                await asyncio.sleep(rng.uniform(*pensar))
+                enviar = sessao.preencher(leituras(produto, req, rng))
+                if enviar:
+                    medidas.append(("calcular", await sessao.rerun(gatilho=enviar)))
+                proximo = sessao.botao("btn_prox_auto")
+                if n + 1 < len(requisitos) and proximo:
+                    await asyncio.sleep(rng.uniform(*pensar))
+                    medidas.append(("proximo", await sessao.rerun(gatilho=proximo)))
+    return medidas
+
+def _porta_livre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _proc(pid: int) -> Tuple[float, int]:
+    """(segundos de CPU, RSS em bytes) do processo, lidos de /proc (Linux)."""
+    with open(f"/proc/{pid}/stat") as f:
+        campos = f.read().rsplit(")", 1)[1].split()
+    cpu = (int(campos[11]) + int(campos[12])) / os.sysconf("SC_CLK_TCK")
+    with open(f"/proc/{pid}/statm") as f:
+        rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    return cpu, rss
+
+def _subir_servidor(banco: str, porta: int, espera: float = 60.0) -> subprocess.Popen:
+    env = dict(os.environ, CALCULADORA_BANCO=banco)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", APP, "--server.headless", "true",
+         "--server.address", "127.0.0.1", "--server.port", str(porta),
+         "--server.fileWatcherType", "none", "--browser.gatherUsageStats", "false"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    limite = time.monotonic() + espera
+    while time.monotonic() < limite:
+        if proc.poll() is not None:
+            raise RuntimeError("O servidor Streamlit encerrou ao iniciar.")
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{porta}/_stcore/health", timeout=1).read()
+            return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("O servidor Streamlit não respondeu a tempo.")
+
+def rodada_servidor(n: int, fluxo: str, pensar: Tuple[float, float], rodadas: int = 1,
+                    semente: int = 0) -> Dict:
+    """Sobe um servidor novo, roda N técnicos simultâneos e mede latência, CPU e memória."""
+    porta = _porta_livre()
+    with tempfile.TemporaryDirectory() as pasta:
+        proc = _subir_servidor(os.path.join(pasta, "carga.db"), porta)
+        try:
+            url = f"ws://127.0.0.1:{porta}/_stcore/stream"
+            # Aquecimento: a primeira sessão importa os módulos e compila o script
+            asyncio.run(_tecnico_ws(url, "aderencia", -1, (0, 0), 1, semente))
+            cpu_ini, rss_ini = _proc(proc.pid)
+            inicio = time.perf_counter()
+
+            async def _todos():
+                return await asyncio.gather(*(
+                    _tecnico_ws(url, fluxo_do_tecnico(fluxo, i), i, pensar, rodadas, semente) for i in range(n)))
+            por_tecnico = asyncio.run(_todos())
+
+            duracao = time.perf_counter() - inicio
+            cpu_fim, rss_fim = _proc(proc.pid)
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+    return _resumo(n, por_tecnico, duracao, {
+        "cpu_pct": round(100 * (cpu_fim - cpu_ini) / duracao, 1),
+        "rss_mb": round(rss_fim / 2**20, 1),
+        "rss_por_sessao_kb": round((rss_fim - rss_ini) / n / 1024, 1),
+    })
+
+# ======================== 2. MODO APPTEST (UM PROCESSO POR TÉCNICO) ========================
+
+def _tecnico_apptest(fluxo: str, indice: int, pensar: Tuple[float, float], rodadas: int,
+                     semente: int, banco: str) -> Dict:
+    """Executado em processo próprio: uma sessão AppTest percorrendo o fluxo."""
+    os.environ["CALCULADORA_BANCO"] = banco
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(semente + indice)
+    produto, requisitos = FLUXOS[fluxo]
+    medidas: List[Tuple[str, float]] = []
+    estado: List[int] = []
+    at = AppTest.from_file(APP, default_timeout=60)
+
+    def rodar(etapa, elemento=None):
+        inicio = time.perf_counter()
+        (elemento.run() if elemento is not None else at.run())
+        medidas.append((etapa, time.perf_counter() - inicio))
+        estado.append(sessao.tamanho_estado(at.session_state.to_dict()))
+
+    time.sleep(rng.uniform(0, pensar[1]))
+    rodar("abrir")
+    for rodada in range(rodadas):
+        at.query_params.update({"produto": produto, "ensaio": slugify(requisitos[0]),
+                                "lote": f"CARGA-{indice}-{rodada}"})
+        rodar("link")
+        for n, req in enumerate(requisitos):
+            time.sleep(rng.uniform(*pensar))
+            campos = [c for c in at.number_input if c.proto.form_id]
+            for campo, valor in zip(campos, leituras(produto, req, rng)):
+                campo.set_value(valor)
+            enviar = next((b for b in at.button if b.proto.is_form_submitter), None)
+            if enviar is not None:
+                rodar("calcular", enviar.click())
+            if n + 1 < len(requisitos) and at.button(key="btn_prox_auto") is not None:
+                time.sleep(rng.uniform(*pensar))
+                rodar("proximo", at.button(key="btn_prox_auto").click())
+    return {"medidas": medidas, "estado": estado, "chaves": len(at.session_state.to_dict())}
+
+def rodada_apptest(n: int, fluxo: str, pensar: Tuple[float, float], rodadas: int = 1,
+                   semente: int = 0) -> Dict:
+    """N sessões AppTest em N processos disputando a mesma CPU e o mesmo banco."""
+    with tempfile.TemporaryDirectory() as pasta:
+        banco = os.path.join(pasta, "carga.db")
+        inicio = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=n) as pool:
+            futuros = [pool.submit(_tecnico_apptest, fluxo_do_tecnico(fluxo, i), i, pensar, rodadas, semente, banco)
+                       for i in range(n)]
+            sessoes = [f.result() for f in futuros]
+        duracao = time.perf_counter() - inicio
+    finais = [s["estado"][-1] for s in sessoes if s["estado"]]
+    crescimento = [s["estado"][-1] - s["estado"][0] for s in sessoes if s["estado"]]
+    return _resumo(n, [s["medidas"] for s in sessoes], duracao, {
+        "estado_kb_medio": round(statistics.mean(finais) / 1024, 1) if finais else None,
+        "estado_kb_max": round(max(finais) / 1024, 1) if finais else None,
+        "crescimento_estado_kb": round(statistics.mean(crescimento) / 1024, 1) if crescimento else None,
+        "chaves_estado": max((s["chaves"] for s in sessoes), default=0),
+    })
+
+# ======================== 3. PARTIDA (TEMPO ATÉ INTERATIVO) ========================
+
+def medir_importacao() -> Dict:
+    """Importa o Streamlit e o app em um interpretador novo (``-X importtime``), em ms."""
+    codigo = f"import sys; sys.path.insert(0, {os.path.dirname(APP)!r}); import streamlit; import calculadora"
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", codigo],
+                          capture_output=True, text=True, env=dict(os.environ, CALCULADORA_BANCO=os.devnull))
+    cumulativo, filhos, diretos = {}, [], []
+    for linha in proc.stderr.splitlines():
+        if not linha.startswith("import time:") or "cumulative" in linha:
+            continue
+        _, acumulado, nome = linha.split("|")
+        modulo, ms = nome.strip(), int(acumulado) / 1000
+        cumulativo[modulo] = ms
+        # -X importtime lista os filhos antes do pai: os do app são os que precedem "calculadora"
+        if nome.startswith("   ") and not nome.startswith("    "):
+            filhos.append((modulo, ms))
+        elif not nome.startswith("  "):
+            diretos, filhos = (filhos if modulo == "calculadora" else diretos), []
+    return {
+        "streamlit_ms": round(cumulativo.get("streamlit", 0), 1),
+        "app_ms": round(cumulativo.get("calculadora", 0), 1),
+        "mais_lentos": [(m, round(ms, 1)) for m, ms in sorted(diretos, key=lambda d: -d[1])[:5]],
+    }
+
+async def _sessao_nova(url: str) -> Tuple[float, float, float]:
+    """Abre uma sessão como um navegador novo: (conexão, primeira pintura, interativo), em s."""
+    import websockets
+
+    inicio = time.perf_counter()
+    async with websockets.connect(url, subprotocols=["streamlit"], max_size=None) as ws:
+        conexao = time.perf_counter() - inicio
+        sessao = SessaoWebsocket(ws)
+        total = await sessao.rerun()
+    return conexao, conexao + (sessao.primeira_pintura or total), conexao + total
+
+def rodada_partida(n: int, fluxo: str = "", pensar: Tuple[float, float] = (0, 0), rodadas: int = 1,
+                   semente: int = 0) -> Dict:
+    """Sobe um servidor novo e abre N sessões novas, uma após a outra, na página inicial.
+
+    A primeira sessão paga a importação dos módulos do app (partida a frio); as demais
+    medem o custo de cada técnico que abre o app com o servidor já aquecido.
+    """
+    porta = _porta_livre()
+    importacao = medir_importacao()
+    with tempfile.TemporaryDirectory() as pasta:
+        inicio = time.perf_counter()
+        proc = _subir_servidor(os.path.join(pasta, "carga.db"), porta)
+        pronto = time.perf_counter() - inicio
+        try:
+            url = f"ws://127.0.0.1:{porta}/_stcore/stream"
+            inicio = time.perf_counter()
+            sessoes = [asyncio.run(_sessao_nova(url)) for _ in range(n)]
+            duracao = time.perf_counter() - inicio
+            _, rss = _proc(proc.pid)
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+    medidas = [[("conexao", c), ("primeira_pintura", p), ("interativo", i)] for c, p, i in sessoes]
+    resumo = _resumo(n, [[m for m in s if m[0] == "interativo"] for s in medidas], duracao, {
+        "servidor_pronto_ms": round(pronto * 1000, 1),
+        "fria_ms": round(sessoes[0][2] * 1000, 1),
+        "pintura_ms": percentis([p for _, p, _ in sessoes]),
+        "rss_mb": round(rss / 2**20, 1),
+        "importacao": importacao,
+    })
+    resumo["por_etapa"] = {e: percentis([s for m in medidas for e2, s in m if e2 == e])
+                           for e in ("conexao", "primeira_pintura", "interativo")}
+    return resumo
+
+# ======================== 4. RELATÓRIO ========================
+
+def _resumo(n: int, por_tecnico: Sequence[Sequence[Tuple[str, float]]], duracao: float, extras: Dict) -> Dict:
+    todas = [m for medidas in por_tecnico for m in medidas]
+    etapas = {}
+    for etapa, segundos in todas:
+        etapas.setdefault(etapa, []).append(segundos)
+    return {
+        "sessoes": n, "reruns": len(todas), "duracao_s": round(duracao, 1),
+        "reruns_por_s": round(len(todas) / duracao, 2) if duracao else None,
+        "latencia_ms": percentis([s for _, s in todas]),
+        "por_etapa": {e: percentis(v) for e, v in sorted(etapas.items())},
+        **extras,
+    }
+
+def imprimir(resultados: Sequence[Dict], modo: str):
+    extras = {"servidor": ["cpu_pct", "rss_mb", "rss_por_sessao_kb"],
+              "apptest": ["estado_kb_medio", "estado_kb_max", "crescimento_estado_kb"],
+              "partida": ["servidor_pronto_ms", "fria_ms", "rss_mb"]}[modo]
+    cab = ["sessoes", "reruns", "reruns/s", "p50 ms", "p90 ms", "p99 ms", "max ms"] + extras
+    print("  ".join(f"{c:>10}" for c in cab))
+    for r in resultados:
+        lat = r["latencia_ms"]
+        linha = [r["sessoes"], r["reruns"], r["reruns_por_s"], lat["p50"], lat["p90"], lat["p99"], lat["max"]]
+        linha += [r.get(c) for c in extras]
+        print("  ".join(f"{'-' if v is None else v:>10}" for v in linha))
+    if modo == "partida" and resultados:
+        r = resultados[-1]
+        print(f"primeira pintura (ms): {r['pintura_ms']}")
+        imp = r["importacao"]
+        print(f"importação: streamlit {imp['streamlit_ms']} ms, app {imp['app_ms']} ms; mais lentos: "
+              + ", ".join(f"{m} {ms} ms" for m, ms in imp["mais_lentos"]))
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Teste de carga com N técnicos simultâneos.")
+    parser.add_argument("--sessoes", type=int, nargs="+", default=[1, 5, 10], help="valores de N a testar")
+    parser.add_argument("--fluxo", choices=sorted(FLUXOS) + ["misto"], default="misto")
+    parser.add_argument("--modo", choices=["servidor", "apptest", "partida"], default="servidor",
+                        help="partida: N sessões novas em um servidor recém-iniciado (tempo até interativo)")
+    parser.add_argument("--pensar", type=float, nargs=2, default=[1.0, 3.0], metavar=("MIN", "MAX"),
+                        help="tempo de pensar entre ações, em segundos")
+    parser.add_argument("--rodadas", type=int, default=1, help="lotes por técnico")
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument("--json", help="grava os resultados completos (por etapa) neste arquivo")
+    args = parser.parse_args(argv)
+
+    rodada = {"servidor": rodada_servidor, "apptest": rodada_apptest, "partida": rodada_partida}[args.modo]
+    resultados = []
+    for n in args.sessoes:
+        print(f"N={n}...", file=sys.stderr)
+        resultados.append(rodada(n, args.fluxo, tuple(args.pensar), args.rodadas, args.semente))
+    imprimir(resultados, args.modo)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"modo": args.modo, "fluxo": args.fluxo, "resultados": resultados}, f, indent=1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""Classificação das argamassas segundo a ABNT NBR 13281.
+
+Cada propriedade medida pelo app recebe a sua classe (P, R, D, U, C, A) a partir do
+resultado final do lote. A classificação de um lote isolado é usada na página do
+lote; a reclassificação do histórico inteiro é vetorizada (numpy) para que uma
+revisão da especificação seja aplicada a todos os lotes de uma vez.
+
+Observação: a classe M (densidade no estado endurecido) não é classificada porque
+o app não possui esse ensaio — a densidade medida é no estado fresco (classe D).
+"""
+import argparse
+import time
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, Optional
+
+import ensaios
+import historico
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# ======================== 1. ESPECIFICAÇÃO ========================
+
+# Faixas por classe: (classe, mínimo, máximo). A primeira classe é "≤ máximo", a última
+# é "> mínimo" e as intermediárias são faixas fechadas. As faixas da norma se sobrepõem;
+# nesse caso o lote recebe a classe mais alta que contém o valor.
+ESPECIFICACAO_NBR13281 = {
+    "versao": "NBR 13281:2005",
+    "propriedades": {
+        # Resistência à compressão (MPa)
+        "P": {"ensaios": [ensaios.ENS_COMPRESSAO_4X4X16], "classes": [
+            ("P1", None, 2.0), ("P2", 1.5, 3.0), ("P3", 2.5, 4.5),
+            ("P4", 4.0, 6.5), ("P5", 5.5, 9.0), ("P6", 8.0, None)]},
+        # Resistência à tração na flexão (MPa)
+        "R": {"ensaios": [ensaios.ENS_FLEXAO], "classes": [
+            ("R1", None, 1.5), ("R2", 1.0, 2.0), ("R3", 1.5, 2.7),
+            ("R4", 2.0, 3.5), ("R5", 2.7, 4.5), ("R6", 3.5, None)]},
+        # Densidade de massa no estado fresco (kg/m³)
+        "D": {"ensaios": [ensaios.ENS_DENSIDADE], "classes": [
+            ("D1", None, 1400), ("D2", 1200, 1600), ("D3", 1400, 1800),
+            ("D4", 1600, 2000), ("D5", 1800, 2200), ("D6", 2000, None)]},
+        # Retenção de água (%)
+        "U": {"ensaios": [ensaios.ENS_RETENCAO], "classes": [
+            ("U1", None, 78), ("U2", 72, 85), ("U3", 80, 90),
+            ("U4", 86, 94), ("U5", 91, 97), ("U6", 95, 100)]},
+        # Coeficiente de capilaridade (g/dm²·min^0,5)
+        "C": {"ensaios": [ensaios.ENS_CAPILARIDADE], "classes": [
+            ("C1", None, 1.5), ("C2", 1.0, 2.5), ("C3", 2.0, 4.0),
+            ("C4", 3.0, 7.0), ("C5", 5.0, 12.0), ("C6", 10.0, None)]},
+        # Resistência potencial de aderência à tração (MPa)
+        "A": {"ensaios": [ensaios.ENS_ADERENCIA_AUTO, ensaios.ENS_ADERENCIA_MANUAL], "classes": [
+            ("A1", None, 0.20), ("A2", 0.20, None), ("A3", 0.30, None)]},
+    },
+}
+
+def _limites(classes) -> tuple:
+    """Converte a tabela de classes em vetores (inferior, superior, inferior inclusivo)."""
+    import numpy as np  # só ao classificar: não atrasa a abertura do app
+
+    n = len(classes)
+    inf = np.array([-np.inf if c[1] is None else c[1] for c in classes], dtype=float)
+    sup = np.array([np.inf if c[2] is None else c[2] for c in classes], dtype=float)
+    # "> mínimo" só na última classe quando ela é aberta e a anterior termina no mesmo valor
+    inclusivo = np.ones(n, dtype=bool)
+    if n > 1 and classes[-1][2] is None and classes[-2][2] is not None:
+        inclusivo[-1] = False
+    return inf, sup, inclusivo
+
+def classificar_valores(valores, classes) -> "np.ndarray":
+    """Classifica um vetor de valores; retorna o índice da classe (-1 se nenhuma/NaN)."""
+    import numpy as np
+
+    v = np.asarray(valores, dtype=float)[:, None]
+    inf, sup, inclusivo = _limites(classes)
+    acima = np.where(inclusivo, v >= inf, v > inf)
+    dentro = acima & (v <= sup)
+    # Classe mais alta que contém o valor (varre da última para a primeira)
+    invertido = dentro[:, ::-1]
+    idx = len(classes) - 1 - invertido.argmax(axis=1)
+    return np.where(invertido.any(axis=1), idx, -1)
+
+# ======================== 2. CLASSIFICAÇÃO DE UM LOTE ========================
+
+def classificar_lote(resultados: Dict[str, float], especificacao: Optional[Dict] = None) -> Dict[str, Optional[str]]:
+    """Classifica um lote a partir do resultado final de cada ensaio ({ensaio: valor})."""
+    espec = especificacao or ESPECIFICACAO_NBR13281
+    classes = {}
+    for prop, cfg in espec["propriedades"].items():
+        valor = next((resultados[e] for e in cfg["ensaios"] if resultados.get(e) is not None), None)
+        if valor is None:
+            classes[prop] = None
+            continue
+        idx = int(classificar_valores([valor], cfg["classes"])[0])
+        classes[prop] = cfg["classes"][idx][0] if idx >= 0 else None
+    return classes
+
+def designacao(classes: Dict[str, Optional[str]]) -> str:
+    """Monta a designação da argamassa (ex: P4-R3-D5-U3-C2-A2) com as classes obtidas."""
+    return "-".join(c for c in classes.values() if c)
+
+# ======================== 3. RECLASSIFICAÇÃO DO HISTÓRICO ========================
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS classificacoes (
+    lote          TEXT NOT NULL,
+    versao        TEXT NOT NULL,
+    produto       TEXT NOT NULL,
+    classes       TEXT NOT NULL,
+    calculado_em  TEXT NOT NULL,
+    PRIMARY KEY (lote, versao)
+);
+"""
+
+# Último resultado válido de cada (lote, ensaio)
+_SQL_ULTIMOS = """
+SELECT r.lote, r.produto, r.ensaio, r.resultado
+FROM resultados r
+JOIN (SELECT MAX(id) AS id FROM resultados
+      WHERE lote IS NOT NULL AND valido = 1 AND resultado IS NOT NULL
+      GROUP BY lote, ensaio) u ON u.id = r.id
+"""
+
+def reclassificar_historico(especificacao: Optional[Dict] = None, conn=None) -> Dict:
+    """Reclassifica todos os lotes do histórico com a especificação informada.
+
+    Os resultados são carregados uma vez e cada propriedade é classificada para
+    todos os lotes em uma única operação vetorizada. Grava em ``classificacoes``.
+    """
+    import numpy as np
+
+    espec = especificacao or ESPECIFICACAO_NBR13281
+    conn = conn or historico.conectar()
+    conn.executescript(_ESQUEMA)
+    inicio = time.perf_counter()
+
+    linhas = conn.execute(_SQL_ULTIMOS).fetchall()
+    if not linhas:
+        return {"lotes": 0, "versao": espec["versao"], "segundos": time.perf_counter() - inicio}
+
+    lote_arr, produto_arr, ensaio_arr, valores = (np.array(col, dtype=object) for col in zip(*linhas))
+    valores = valores.astype(float)
+    nomes_lotes, primeira, idx_lote = np.unique(lote_arr, return_index=True, return_inverse=True)
+    produtos = produto_arr[primeira]
+
+    props = list(espec["propriedades"])
+    matriz = np.full((len(nomes_lotes), len(props)), "", dtype=object)
+
+    for j, prop in enumerate(props):
+        cfg = espec["propriedades"][prop]
+        sel = np.isin(ensaio_arr, cfg["ensaios"])
+        if not sel.any():
+            continue
+        idx_classe = classificar_valores(valores[sel], cfg["classes"])
+        rotulos = np.array([c[0] for c in cfg["classes"]] + [""], dtype=object)
+        matriz[idx_lote[sel], j] = rotulos[idx_classe]  # -1 cai no rótulo vazio
+
+    agora = datetime.now().isoformat(timespec="seconds")
+    registros = (
+        (lote, espec["versao"], produtos[i], "-".join(c for c in matriz[i] if c), agora)
+        for i, lote in enumerate(nomes_lotes)
+    )
+    with conn:
+        conn.executemany("INSERT OR REPLACE INTO classificacoes VALUES (?, ?, ?, ?, ?)", registros)
+
+    return {"lotes": len(nomes_lotes), "versao": espec["versao"], "segundos": time.perf_counter() - inicio}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reclassifica todo o histórico segundo a NBR 13281.")
+    parser.parse_args(argv)
+    resumo = reclassificar_historico()
+    print(f"{resumo['lotes']} lotes classificados ({resumo['versao']}) em {resumo['segundos']:.2f} s")
+
+if __name__ == "__main__":
+    main()
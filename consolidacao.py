@@ -0,0 +1,376 @@
+"""Consolidação dos resultados de várias fábricas (visão corporativa da qualidade).
+
+Cada fábrica roda a calculadora com o próprio histórico. A consolidação por linha
+de produto e requisito é um map-reduce:
+
+    * map (pool de processos, uma tarefa por fonte): lê o histórico da fábrica, fica
+      com o último resultado de cada identidade (fábrica, produto, requisito, lote) e
+      resume cada série (produto, requisito) em um ``Resumo`` mesclável — ensaios,
+      válidos, média e M2 (soma dos quadrados dos desvios) dos resultados válidos;
+    * reduce: junta os resumos série a série. Contagens somam e média/variância se
+      combinam pelas fórmulas de Chan, sem reler o histórico nem recalcular as
+      estatísticas a partir dos valores.
+
+Deduplicação: o resumo leva, por série, o hash de 64 bits de cada identidade com a
+data e o valor. A fábrica faz parte da identidade (o mesmo número de lote em duas
+fábricas são lotes diferentes). Uma identidade presente em mais de uma fonte (banco
+copiado, pacote recebido duas vezes, consolidado que volta como fonte) fica só com a
+versão mais recente; a outra é retirada do resumo pelas mesmas fórmulas, ao
+contrário. Por isso a junção não é de custo constante: é linear no número de
+identidades das séries juntadas (busca binária dos hashes de uma fonte nos vetores
+ordenados da outra e intercalação dos vetores), vetorizada e sem tocar os bancos.
+
+Fontes: o banco SQLite de uma fábrica (``FABRICA=caminho.db``; sem o nome, vale o
+nome do arquivo) ou um pacote de exportação (``.resumo.npz``) gerado na própria
+fábrica com ``exportar`` — só o resumo viaja. A junção grava o
+banco consolidado (lido pelo painel) e o pacote do consolidado, que pode entrar
+como fonte em uma junção seguinte (acrescentar uma fábrica sem refazer as outras).
+Resultados sem lote (cálculos avulsos) não entram na consolidação.
+
+Uso:
+    python consolidacao.py exportar --fabrica Jundiai [--banco historico.db] [--saida jundiai.resumo.npz]
+    python consolidacao.py juntar Jundiai=fabrica1.db fabrica2.resumo.npz ... [--workers N] [--saida consolidado.db]
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from itertools import groupby
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+import historico
+
+CAMINHO_CONSOLIDADO = os.environ.get(
+    "CALCULADORA_CONSOLIDADO",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "dados", "consolidado.db"),
+)
+EXTENSAO_PACOTE = ".resumo.npz"
+VERSAO_PACOTE = 2  # 2: fábrica na identidade dos lotes
+
+Serie = Tuple[str, str]  # (produto, requisito)
+
+# ======================== 1. RESUMO MESCLÁVEL ========================
+
+class Resumo(NamedTuple):
+    """Resumo de uma série (produto, requisito) em uma ou mais fontes."""
+    ensaios: int            # identidades (lotes) na série
+    validos: int
+    n: int                  # resultados válidos com valor (entram na média/variância)
+    media: float
+    m2: float               # soma dos quadrados dos desvios; variância = m2 / (n - 1)
+    duplicados: int         # identidades descartadas por estarem em mais de uma fonte
+    ids: np.ndarray         # uint64, ordenado (hash da identidade)
+    quando: np.ndarray      # int64, segundos (data do resultado)
+    valores: np.ndarray     # float64; NaN = inválido ou sem resultado
+    valido: np.ndarray      # bool
+
+    @property
+    def variancia(self) -> Optional[float]:
+        return self.m2 / (self.n - 1) if self.n > 1 else None
+
+    @property
+    def taxa_validos(self) -> Optional[float]:
+        return self.validos / self.ensaios if self.ensaios else None
+
+def _estatisticas(valores: np.ndarray) -> Tuple[int, float, float]:
+    """(n, média, M2) dos valores finitos."""
+    x = valores[np.isfinite(valores)]
+    if not len(x):
+        return 0, float("nan"), 0.0
+    media = float(x.mean())
+    return len(x), media, float(((x - media) ** 2).sum())
+
+def _combinar(a: Tuple[int, float, float], b: Tuple[int, float, float]) -> Tuple[int, float, float]:
+    """Chan et al.: (n, média, M2) da união de dois grupos disjuntos."""
+    (na, ma, m2a), (nb, mb, m2b) = a, b
+    if not na:
+        return b
+    if not nb:
+        return a
+    n = na + nb
+    delta = mb - ma
+    return n, ma + delta * nb / n, m2a + m2b + delta * delta * na * nb / n
+
+def _retirar(total: Tuple[int, float, float], parte: Tuple[int, float, float]) -> Tuple[int, float, float]:
+    """Inverso de ``_combinar``: (n, média, M2) do total sem os elementos de ``parte``."""
+    (n, m, m2), (k, mk, m2k) = total, parte
+    if not k:
+        return total
+    resto = n - k
+    if resto <= 0:
+        return 0, float("nan"), 0.0
+    media = (n * m - k * mk) / resto
+    delta = mk - media
+    # Arredondamento pode deixar um resíduo negativo minúsculo
+    return resto, media, max(m2 - m2k - delta * delta * resto * k / n, 0.0)
+
+def resumir_serie(ids: np.ndarray, quando: np.ndarray, valores: np.ndarray, valido: np.ndarray) -> Resumo:
+    """Resumo de uma série a partir dos resultados (uma identidade por posição)."""
+    ordem = np.argsort(ids, kind="stable")
+    ids, quando, valores, valido = ids[ordem], quando[ordem], valores[ordem], valido[ordem]
+    return Resumo(len(ids), int(valido.sum()), *_estatisticas(valores), 0, ids, quando, valores, valido)
+
+def _sem(r: Resumo, posicoes: np.ndarray) -> Resumo:
+    """Retira identidades do resumo (contagens e estatísticas atualizadas sem reler a série)."""
+    if not len(posicoes):
+        return r
+    n, media, m2 = _retirar((r.n, r.media, r.m2), _estatisticas(r.valores[posicoes]))
+    return Resumo(r.ensaios - len(posicoes), r.validos - int(r.valido[posicoes].sum()), n, media, m2,
+                  r.duplicados + len(posicoes), np.delete(r.ids, posicoes), np.delete(r.quando, posicoes),
+                  np.delete(r.valores, posicoes), np.delete(r.valido, posicoes))
+
+def _repetidos(a: np.ndarray, b: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Posições (em ``a`` e em ``b``) dos hashes presentes nos dois vetores ordenados."""
+    if not len(a) or not len(b):
+        return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+    pos = np.searchsorted(a, b)
+    achou = a[np.minimum(pos, len(a) - 1)] == b
+    return pos[achou], np.flatnonzero(achou)
+
+def juntar(a: Resumo, b: Resumo) -> Resumo:
+    """Une dois resumos da mesma série; identidade repetida fica com o resultado mais recente."""
+    ia, ib = _repetidos(a.ids, b.ids)
+    if len(ia):
+        # Empate (mesmo resultado recebido duas vezes) fica com o que já estava
+        fica_b = b.quando[ib] > a.quando[ia]
+        a, b = _sem(a, ia[fica_b]), _sem(b, ib[~fica_b])
+    n, media, m2 = _combinar((a.n, a.media, a.m2), (b.n, b.media, b.m2))
+    # Intercalação dos vetores já ordenados (sem reordenar a união)
+    onde = np.searchsorted(a.ids, b.ids)
+    return Resumo(a.ensaios + b.ensaios, a.validos + b.validos, n, media, m2, a.duplicados + b.duplicados,
+                  np.insert(a.ids, onde, b.ids), np.insert(a.quando, onde, b.quando),
+                  np.insert(a.valores, onde, b.valores), np.insert(a.valido, onde, b.valido))
+
+def juntar_fontes(resumos: Sequence[Dict[Serie, Resumo]]) -> Dict[Serie, Resumo]:
+    """Reduce: junta os resumos de várias fontes série a série."""
+    saida: Dict[Serie, Resumo] = {}
+    for fonte in resumos:
+        for serie, resumo in fonte.items():
+            saida[serie] = juntar(saida[serie], resumo) if serie in saida else resumo
+    return saida
+
+# ======================== 2. MAP: RESUMO DE UMA FONTE ========================
+
+# Último resultado de cada identidade (produto, requisito, lote) na fábrica
+_SQL_ULTIMOS = """
+SELECT r.produto, r.requisito, r.lote, r.criado_em, r.resultado, r.valido
+FROM resultados r
+JOIN (SELECT MAX(id) AS id FROM resultados WHERE lote IS NOT NULL
+      GROUP BY produto, requisito, lote) u ON u.id = r.id
+ORDER BY r.produto, r.requisito
+"""
+
+def _hash_identidade(fabrica: str, produto: str, requisito: str, lote: str) -> bytes:
+    return hashlib.blake2b(f"{fabrica}\x1f{produto}\x1f{requisito}\x1f{lote}".encode("utf-8"),
+                           digest_size=8).digest()
+
+def resumir_banco(banco: str, fabrica: str) -> Dict[Serie, Resumo]:
+    """Resume o histórico de uma fábrica (uma leitura, uma linha por identidade)."""
+    conn = sqlite3.connect(f"file:{banco}?mode=ro", uri=True)
+    try:
+        linhas = conn.execute(_SQL_ULTIMOS).fetchall()
+    finally:
+        conn.close()
+    resumos = {}
+    for serie, grupo in groupby(linhas, key=lambda l: (l[0], l[1])):
+        _, _, lotes, criados, resultados, validos = zip(*grupo)
+        ids = np.frombuffer(b"".join(_hash_identidade(fabrica, *serie, lote) for lote in lotes), dtype="<u8")
+        quando = np.array(criados, dtype="datetime64[s]").astype(np.int64)
+        valido = np.array(validos, dtype=bool)
+        valores = np.array([np.nan if r is None else r for r in resultados], dtype=float)
+        valores[~valido] = np.nan
+        resumos[serie] = resumir_serie(ids, quando, valores, valido)
+    return resumos
+
+def gravar_pacote(resumos: Dict[Serie, Resumo], caminho: str, fabrica: str) -> str:
+    """Grava o pacote de exportação (vetores de todas as séries + agregados em JSON)."""
+    series = sorted(resumos)
+    meta = {"versao": VERSAO_PACOTE, "fabrica": fabrica, "gerado_em": datetime.now().isoformat(timespec="seconds"),
+            "series": [[*s, *(getattr(resumos[s], c) for c in ("ensaios", "validos", "n", "media", "m2", "duplicados"))]
+                       for s in series]}
+    campos = {c: np.concatenate([getattr(resumos[s], c) for s in series]) if series else np.zeros(0)
+              for c in ("ids", "quando", "valores", "valido")}
+    if not caminho.endswith(EXTENSAO_PACOTE):
+        caminho += EXTENSAO_PACOTE
+    os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+    with open(caminho + ".tmp", "wb") as f:
+        np.savez_compressed(f, meta=np.array(json.dumps(meta, ensure_ascii=False)), **campos)
+    os.replace(caminho + ".tmp", caminho)
+    return caminho
+
+def ler_pacote(caminho: str) -> Dict[Serie, Resumo]:
+    """Lê um pacote de exportação (os agregados vêm prontos; nada é recalculado)."""
+    with np.load(caminho, allow_pickle=False) as arq:
+        meta = json.loads(str(arq["meta"]))
+        if meta.get("versao") != VERSAO_PACOTE:
+            raise ValueError(f"Versão de pacote não suportada em {caminho}: {meta.get('versao')}")
+        cortes = np.cumsum([s[2] for s in meta["series"]])[:-1]
+        vetores = [np.split(arq[c], cortes) for c in ("ids", "quando", "valores", "valido")]
+    return {(produto, requisito): Resumo(ensaios, validos, n, float("nan") if media is None else media, m2,
+                                         duplicados, ids.astype("<u8"), quando.astype(np.int64),
+                                         valores.astype(float), valido.astype(bool))
+            for (produto, requisito, ensaios, validos, n, media, m2, duplicados), ids, quando, valores, valido
+            in zip(meta["series"], *vetores)}
+
+def fabrica_da_fonte(fonte: str) -> Tuple[str, str]:
+    """(fábrica, caminho) de uma fonte ``FABRICA=caminho`` (sem o nome: o nome do arquivo)."""
+    nome, sep, caminho = fonte.partition("=")
+    if sep and nome and not os.path.exists(fonte):
+        return nome, caminho
+    return os.path.basename(fonte).split(".")[0], fonte
+
+def resumir_fonte(fonte: str) -> Tuple[str, Dict[Serie, Resumo], float]:
+    """Tarefa do pool: resumo de uma fonte (banco SQLite ou pacote)."""
+    inicio = time.perf_counter()
+    fabrica, caminho = fabrica_da_fonte(fonte)
+    resumos = ler_pacote(caminho) if caminho.endswith(EXTENSAO_PACOTE) else resumir_banco(caminho, fabrica)
+    return caminho, resumos, time.perf_counter() - inicio
+
+# ======================== 3. REDUCE E BANCO CONSOLIDADO ========================
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS consolidado (
+    produto    TEXT NOT NULL,
+    requisito  TEXT NOT NULL,
+    fontes     INTEGER NOT NULL,
+    ensaios    INTEGER NOT NULL,
+    validos    INTEGER NOT NULL,
+    n          INTEGER NOT NULL,
+    media      REAL,
+    desvio     REAL,
+    m2         REAL NOT NULL,
+    duplicados INTEGER NOT NULL,
+    PRIMARY KEY (produto, requisito)
+);
+CREATE TABLE IF NOT EXISTS consolidado_fonte (
+    fonte      TEXT PRIMARY KEY,
+    series     INTEGER NOT NULL,
+    ensaios    INTEGER NOT NULL,
+    segundos   REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS consolidado_meta (
+    chave      TEXT PRIMARY KEY,
+    valor      TEXT
+);
+"""
+
+def _gravar(resumos: Dict[Serie, Resumo], fontes: List[Dict], fontes_por_serie: Dict[Serie, int], destino: str):
+    """Regrava o banco consolidado (uma transação; o painel nunca vê metade)."""
+    conn = sqlite3.connect(destino)
+    try:
+        conn.executescript(_ESQUEMA)
+        with conn:
+            for tabela in ("consolidado", "consolidado_fonte"):
+                conn.execute(f"DELETE FROM {tabela}")
+            conn.executemany(
+                "INSERT INTO consolidado VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(p, req, fontes_por_serie[(p, req)], r.ensaios, r.validos, r.n, r.media if r.n else None,
+                  None if r.variancia is None else r.variancia ** 0.5, r.m2, r.duplicados)
+                 for (p, req), r in sorted(resumos.items())])
+            conn.executemany("INSERT INTO consolidado_fonte VALUES (:fonte, :series, :ensaios, :segundos)", fontes)
+            conn.execute("INSERT OR REPLACE INTO consolidado_meta VALUES ('consolidado_em', ?)",
+                         (datetime.now().isoformat(timespec="seconds"),))
+    finally:
+        conn.close()
+
+def consolidar(fontes: Sequence[str], destino: Optional[str] = None, workers: Optional[int] = None,
+               progresso=None) -> Dict:
+    """Resume as fontes em paralelo e junta os resumos à medida que chegam.
+
+    Grava o banco consolidado em ``destino`` e, ao lado, o pacote do consolidado.
+    ``progresso(feitas, total, segundos)`` é chamado a cada fonte resumida.
+    """
+    destino = destino or CAMINHO_CONSOLIDADO
+    os.makedirs(os.path.dirname(os.path.abspath(destino)), exist_ok=True)
+    inicio = time.perf_counter()
+    total: Dict[Serie, Resumo] = {}
+    fontes_por_serie: Dict[Serie, int] = {}
+    lidas, erros = [], []
+    segundos_juntar = 0.0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futuros = {pool.submit(resumir_fonte, f): f for f in fontes}
+        for futuro in as_completed(futuros):
+            try:
+                caminho, resumos, segundos = futuro.result()
+            except (OSError, sqlite3.Error, ValueError, KeyError) as e:
+                erros.append({"fonte": futuros[futuro], "erro": str(e)})
+            else:
+                t = time.perf_counter()
+                total = juntar_fontes([total, resumos])
+                segundos_juntar += time.perf_counter() - t
+                for serie in resumos:
+                    fontes_por_serie[serie] = fontes_por_serie.get(serie, 0) + 1
+                lidas.append({"fonte": os.path.basename(caminho), "series": len(resumos),
+                              "ensaios": sum(r.ensaios for r in resumos.values()), "segundos": segundos})
+            if progresso:
+                progresso(len(lidas) + len(erros), len(fontes), time.perf_counter() - inicio)
+
+    _gravar(total, lidas, fontes_por_serie, destino)
+    pacote = gravar_pacote(total, os.path.splitext(destino)[0], "consolidado")
+    return {"fontes": len(lidas), "erros": erros, "series": len(total),
+            "ensaios": sum(r.ensaios for r in total.values()),
+            "duplicados": sum(r.duplicados for r in total.values()),
+            "segundos_juntar": segundos_juntar, "segundos": time.perf_counter() - inicio,
+            "banco": destino, "pacote": pacote}
+
+def painel(origem: Optional[str] = None) -> Optional[Dict[str, List[Dict]]]:
+    """Lê o banco consolidado para o painel (None se ainda não houve consolidação)."""
+    origem = origem or CAMINHO_CONSOLIDADO
+    if not os.path.exists(origem):
+        return None
+    conn = sqlite3.connect(f"file:{origem}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    try:
+        quando = conn.execute("SELECT valor FROM consolidado_meta WHERE chave = 'consolidado_em'").fetchone()
+        series = [dict(r) for r in conn.execute("SELECT * FROM consolidado ORDER BY produto, requisito")]
+        fontes = [dict(r) for r in conn.execute("SELECT * FROM consolidado_fonte ORDER BY fonte")]
+    finally:
+        conn.close()
+    for s in series:
+        s["taxa_validos"] = s["validos"] / s["ensaios"] if s["ensaios"] else None
+    return {"consolidado_em": quando[0] if quando else None, "series": series, "fontes": fontes}
+
+# ======================== 4. LINHA DE COMANDO ========================
+
+def _imprimir_progresso(feitas: int, total: int, segundos: float):
+    print(f"\r[{feitas}/{total}] fontes resumidas em {segundos:.1f} s", end="", file=sys.stderr, flush=True)
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Consolida os resultados de várias fábricas.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p = sub.add_parser("exportar", help="Gera o pacote de resumo desta fábrica")
+    p.add_argument("--fabrica", required=True, help="Nome da fábrica (vai no pacote)")
+    p.add_argument("--banco", default=historico.CAMINHO_BANCO)
+    p.add_argument("--saida", help=f"Arquivo {EXTENSAO_PACOTE} (padrão: <fábrica>{EXTENSAO_PACOTE})")
+    p = sub.add_parser("juntar", help="Consolida bancos e pacotes de várias fábricas")
+    p.add_argument("fontes", nargs="+", help=f"Bancos SQLite (FABRICA=caminho.db) ou pacotes {EXTENSAO_PACOTE}")
+    p.add_argument("--saida", default=CAMINHO_CONSOLIDADO)
+    p.add_argument("--workers", type=int, default=None, help="Processos em paralelo (padrão: nº de CPUs)")
+    args = parser.parse_args(argv)
+
+    if args.comando == "exportar":
+        inicio = time.perf_counter()
+        resumos = resumir_banco(args.banco, args.fabrica)
+        caminho = gravar_pacote(resumos, args.saida or args.fabrica, args.fabrica)
+        print(f"{caminho}: {len(resumos)} séries, {sum(r.ensaios for r in resumos.values())} lotes "
+              f"({os.path.getsize(caminho) / 1024:.0f} KB) em {time.perf_counter() - inicio:.1f} s")
+        return
+
+    resumo = consolidar(args.fontes, args.saida, args.workers, progresso=_imprimir_progresso)
+    print(file=sys.stderr)
+    print(f"Fontes: {resumo['fontes']}/{len(args.fontes)} | Séries: {resumo['series']} | "
+          f"Lotes: {resumo['ensaios']} | Duplicados descartados: {resumo['duplicados']} | "
+          f"Junção: {resumo['segundos_juntar'] * 1000:.0f} ms | Total: {resumo['segundos']:.1f} s")
+    print(f"Banco: {resumo['banco']} | Pacote: {resumo['pacote']}")
+    for erro in resumo["erros"]:
+        print(f"  ⚠ {erro['fonte']}: {erro['erro']}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
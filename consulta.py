@@ -0,0 +1,190 @@
+"""Consulta paginada do histórico de resultados (página "Histórico").
+
+Os filtros (linha de produto, requisito, período, situação e operador) rodam no
+banco e a paginação é por chave (keyset): cada página termina em um cursor
+``(criado_em, id)`` e a seguinte começa logo depois dele, em vez de ``OFFSET`` (que
+lê e descarta todas as linhas anteriores a cada página). Os índices abaixo começam
+pelo filtro de igualdade e seguem a ordem de exibição, com as demais colunas
+filtráveis no próprio índice; assim a página é escolhida só no índice (sem ler as
+linhas descartadas pelo filtro) e virar a página custa o mesmo na primeira ou na
+milésima página: uma busca no índice + as linhas exibidas.
+
+Cada sessão guarda as últimas páginas lidas em um ``Paginador``: voltar e avançar
+entre páginas já vistas não consulta o banco. O cache da sessão é descartado
+quando um resultado novo é gravado (ouvinte do histórico) ou após
+``VALIDADE_PAGINAS`` segundos (o recálculo em lote atualiza linhas sem passar pelos
+ouvintes).
+"""
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import historico
+
+TAMANHO_PAGINA = 25
+MAX_PAGINAS_CACHE = 8
+VALIDADE_PAGINAS = 60.0
+
+# O ``id`` explícito depois de ``criado_em`` deixa o cursor (criado_em, id) inteiro no
+# índice (desempate de resultados gravados no mesmo segundo)
+_ESQUEMA = """
+CREATE INDEX IF NOT EXISTS ix_resultados_consulta_data
+    ON resultados (criado_em, id, valido, produto, requisito, operador);
+CREATE INDEX IF NOT EXISTS ix_resultados_consulta_produto
+    ON resultados (produto, criado_em, id, requisito, valido, operador);
+CREATE INDEX IF NOT EXISTS ix_resultados_consulta_requisito
+    ON resultados (produto, requisito, criado_em, id, valido, operador);
+CREATE INDEX IF NOT EXISTS ix_resultados_consulta_operador
+    ON resultados (operador, criado_em, id, valido, produto, requisito);
+"""
+
+historico.registrar_esquema(_ESQUEMA)
+
+# Colunas exibidas na lista (as entradas completas só ao reabrir um resultado)
+_COLUNAS_LISTA = ("id", "criado_em", "produto", "requisito", "ensaio", "lote", "operador",
+                  "cliente", "resultado", "valido", "alertas")
+
+Cursor = Tuple[str, int]
+
+class Filtros(NamedTuple):
+    """Filtros da consulta (None = sem filtro); datas ISO, período inclusivo."""
+    produto: Optional[str] = None
+    requisito: Optional[str] = None
+    desde: Optional[str] = None
+    ate: Optional[str] = None
+    valido: Optional[bool] = None
+    operador: Optional[str] = None
+
+class Pagina(NamedTuple):
+    linhas: List[Dict]
+    proxima: Optional[Cursor]  # Cursor da página seguinte (None na última)
+
+# ======================== 1. CONSULTA ========================
+
+def _indice(filtros: Filtros) -> str:
+    """Índice cujo prefixo é o filtro de igualdade mais seletivo disponível."""
+    if filtros.produto and filtros.requisito:
+        return "ix_resultados_consulta_requisito"
+    if filtros.produto:
+        return "ix_resultados_consulta_produto"
+    if filtros.operador:
+        return "ix_resultados_consulta_operador"
+    return "ix_resultados_consulta_data"
+
+def _condicoes(filtros: Filtros, depois: Optional[Cursor]) -> Tuple[str, list]:
+    condicoes, params = [], []
+    for coluna in ("produto", "requisito", "operador"):
+        valor = getattr(filtros, coluna)
+        if valor:
+            condicoes.append(f"{coluna} = ?")
+            params.append(valor)
+    if filtros.valido is not None:
+        condicoes.append("valido = ?")
+        params.append(int(filtros.valido))
+    if filtros.desde:
+        condicoes.append("criado_em >= ?")
+        params.append(filtros.desde)
+    if filtros.ate:
+        condicoes.append("criado_em < ?")  # Até o fim do dia
+        params.append((date.fromisoformat(filtros.ate) + timedelta(days=1)).isoformat())
+    if depois is not None:
+        condicoes.append("(criado_em, id) < (?, ?)")
+        params.extend(depois)
+    return (" WHERE " + " AND ".join(condicoes)) if condicoes else "", params
+
+def pagina(filtros: Filtros, depois: Optional[Cursor] = None, tamanho: int = TAMANHO_PAGINA,
+           conn=None) -> Pagina:
+    """Resultados mais recentes primeiro, a partir do cursor ``depois`` (None = início).
+
+    Os ids da página são escolhidos só no índice (``INDEXED BY``: o plano não depende
+    das estatísticas do banco) e só as ``tamanho`` linhas exibidas são lidas da tabela.
+    """
+    conn = conn or historico.conectar()
+    onde, params = _condicoes(filtros, depois)
+    sql = (f"SELECT {', '.join(_COLUNAS_LISTA)} FROM resultados WHERE id IN ("
+           f"SELECT id FROM resultados INDEXED BY {_indice(filtros)}{onde} "
+           f"ORDER BY criado_em DESC, id DESC LIMIT ?) "
+           f"ORDER BY criado_em DESC, id DESC")
+    linhas = [dict(r) for r in conn.execute(sql, params + [tamanho + 1])]
+    if len(linhas) > tamanho:
+        linhas = linhas[:tamanho]
+        return Pagina(linhas, (linhas[-1]["criado_em"], linhas[-1]["id"]))
+    return Pagina(linhas, None)
+
+def resultado(id_: int, conn=None) -> Optional[Dict]:
+    """Linha completa do resultado (com as entradas), usada para reabrir a calculadora."""
+    conn = conn or historico.conectar()
+    linha = conn.execute("SELECT * FROM resultados WHERE id = ?", (id_,)).fetchone()
+    return dict(linha) if linha else None
+
+def plano(filtros: Filtros, conn=None) -> List[str]:
+    """Plano de execução da consulta da página (diagnóstico)."""
+    conn = conn or historico.conectar()
+    onde, params = _condicoes(filtros, ("9999", 0))
+    sql = (f"SELECT id FROM resultados INDEXED BY {_indice(filtros)}{onde} "
+           f"ORDER BY criado_em DESC, id DESC LIMIT ?")
+    return [r["detail"] for r in conn.execute("EXPLAIN QUERY PLAN " + sql, params + [TAMANHO_PAGINA + 1])]
+
+# ======================== 2. PAGINAÇÃO POR SESSÃO ========================
+
+# Incrementada a cada resultado gravado; páginas de gerações anteriores são relidas
+_geracao = 0
+
+def nova_geracao(registro: Dict, id_: int):
+    global _geracao
+    _geracao += 1
+
+
+class Paginador:
+    """Posição da sessão na consulta: cursores das páginas visitadas e cache LRU das páginas lidas."""
+
+    def __init__(self, tamanho: int = TAMANHO_PAGINA, max_paginas: int = MAX_PAGINAS_CACHE,
+                 validade: float = VALIDADE_PAGINAS):
+        self.tamanho, self.max_paginas, self.validade = tamanho, max_paginas, validade
+        self.filtros = Filtros()
+        self.numero = 0  # Página atual (0 = mais recentes)
+        # Cursor de início de cada página já alcançada (_inicios[0] = None)
+        self._inicios: List[Optional[Cursor]] = [None]
+        # (filtros, cursor) -> (geração, lida_em, página); mais recente por último
+        self._cache: "OrderedDict[Tuple[Filtros, Optional[Cursor]], Tuple[int, float, Pagina]]" = OrderedDict()
+        self._contadores = {"do_cache": 0, "do_banco": 0}
+
+    def filtrar(self, filtros: Filtros):
+        """Novos filtros voltam à primeira página (as páginas em cache continuam valendo)."""
+        if filtros != self.filtros:
+            self.filtros, self.numero, self._inicios = filtros, 0, [None]
+
+    def atual(self, conn=None) -> Pagina:
+        chave = (self.filtros, self._inicios[self.numero])
+        item = self._cache.get(chave)
+        agora = time.monotonic()
+        if item is not None and item[0] == _geracao and agora - item[1] <= self.validade:
+            self._cache.move_to_end(chave)
+            self._contadores["do_cache"] += 1
+            return item[2]
+        lida = pagina(self.filtros, chave[1], self.tamanho, conn)
+        self._cache[chave] = (_geracao, agora, lida)
+        self._cache.move_to_end(chave)
+        while len(self._cache) > self.max_paginas:
+            self._cache.popitem(last=False)
+        self._contadores["do_banco"] += 1
+        return lida
+
+    def avancar(self, conn=None):
+        proxima = self.atual(conn).proxima
+        if proxima is None:
+            return
+        del self._inicios[self.numero + 1:]
+        self._inicios.append(proxima)
+        self.numero += 1
+
+    def voltar(self):
+        if self.numero > 0:
+            self.numero -= 1
+
+    def primeira(self):
+        self.numero = 0
+
+    def estatisticas(self) -> Dict:
+        return {**self._contadores, "paginas_em_cache": len(self._cache)}
@@ -0,0 +1,460 @@
+"""Arquivo das curvas brutas dos instrumentos (prensa e arrancamento), compactadas em blocos.
+
+Cada resultado de compressão, flexão ou aderência pode guardar a curva de cada CP
+(ex: carga × deslocamento da prensa, força × tempo do arrancamento). Uma curva tem
+vários canais com o mesmo número de amostras e é dividida em blocos de
+``AMOSTRAS_POR_BLOCO``; cada canal de cada bloco é codificado assim:
+
+    1. quantização na resolução do instrumento (ex: 0,001 kN), ou o próprio padrão de
+       bits do float quando a resolução não é informada (sem perda nenhuma);
+    2. delta entre amostras vizinhas (curvas suaves viram inteiros pequenos), guardado na
+       menor largura que comporta todos os deltas do bloco (8, 16, 32 ou 64 bits);
+    3. bytes embaralhados (byte shuffle: os bytes altos, quase sempre zero, ficam juntos);
+    4. compressão com o codec rápido disponível (zstd ou lz4 se instalados, senão zlib nível 1).
+
+Os blocos são acrescentados a arquivos de segmento (só escrita no fim, um por processo
+gravador) e o índice fica no banco do histórico: ``curvas`` por (lote, requisito, CP) e
+``curvas_blocos`` com arquivo/deslocamento/tamanho/CRC de cada bloco. Ler a curva de um
+CP é uma consulta no índice e uma leitura posicional por bloco, sem tocar no resto do
+arquivo; a varredura para reanálise percorre os segmentos na ordem em que foram escritos.
+
+Uso:
+    python curvas.py importar ensaio.csv --lote 2024-0153 --requisito "COMPRESSÃO ..." --cp 1 \\
+        [--taxa 100] [--resolucao carga=0.001 --resolucao deslocamento=0.0001]
+    python curvas.py benchmark [--curvas 200] [--amostras 100000]
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import random
+import shutil
+import statistics
+import struct
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import historico
+
+if TYPE_CHECKING:
+    import numpy as np
+
+_log = logging.getLogger(__name__)
+
+PASTA_CURVAS = os.environ.get(
+    "CALCULADORA_CURVAS",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "dados", "curvas"),
+)
+
+AMOSTRAS_POR_BLOCO = 65_536
+TAMANHO_SEGMENTO = 256 * 1024 * 1024  # novo arquivo de segmento a cada 256 MB
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS curvas (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    lote         TEXT NOT NULL,
+    requisito    TEXT NOT NULL,
+    cp           INTEGER NOT NULL,
+    resultado_id INTEGER,
+    canais       TEXT NOT NULL,
+    taxa_hz      REAL,
+    amostras     INTEGER NOT NULL,
+    codec        TEXT NOT NULL,
+    bytes_brutos INTEGER NOT NULL,
+    bytes        INTEGER NOT NULL,
+    criado_em    TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_curvas_lote ON curvas (lote, requisito, cp);
+CREATE TABLE IF NOT EXISTS curvas_blocos (
+    curva_id     INTEGER NOT NULL,
+    bloco        INTEGER NOT NULL,
+    arquivo      TEXT NOT NULL,
+    deslocamento INTEGER NOT NULL,
+    tamanho      INTEGER NOT NULL,
+    amostras     INTEGER NOT NULL,
+    crc          INTEGER NOT NULL,
+    PRIMARY KEY (curva_id, bloco)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS ix_curvas_blocos_arquivo ON curvas_blocos (arquivo, deslocamento);
+"""
+
+historico.registrar_esquema(_ESQUEMA)
+
+class CurvaCorrompida(ValueError):
+    """Bloco com CRC diferente do índice (arquivo de segmento alterado ou truncado)."""
+
+# ======================== 1. CODECS ========================
+
+class Codec(NamedTuple):
+    comprimir: object
+    descomprimir: object
+
+def _codec_zstd() -> Codec:
+    import zstandard
+    c, d = zstandard.ZstdCompressor(level=3), zstandard.ZstdDecompressor()
+    return Codec(c.compress, d.decompress)
+
+def _codec_lz4() -> Codec:
+    import lz4.frame
+    return Codec(lz4.frame.compress, lz4.frame.decompress)
+
+_FABRICAS_CODEC = {
+    "zstd": _codec_zstd,
+    "lz4": _codec_lz4,
+    "zlib": lambda: Codec(lambda b: zlib.compress(b, 1), zlib.decompress),
+    "zlib6": lambda: Codec(lambda b: zlib.compress(b, 6), zlib.decompress),
+}
+_codecs: Dict[str, Codec] = {}
+
+def codec(nome: str) -> Codec:
+    """Codec pelo nome gravado no índice (zstd e lz4 exigem os pacotes opcionais)."""
+    if nome not in _codecs:
+        try:
+            _codecs[nome] = _FABRICAS_CODEC[nome]()
+        except ImportError:
+            pacote = {"zstd": "zstandard", "lz4": "lz4"}[nome]
+            raise RuntimeError(f"O codec '{nome}' requer o pacote '{pacote}' (pip install {pacote}).")
+    return _codecs[nome]
+
+def codecs_disponiveis() -> List[str]:
+    disponiveis = []
+    for nome in _FABRICAS_CODEC:
+        try:
+            codec(nome)
+        except RuntimeError:
+            continue
+        disponiveis.append(nome)
+    return disponiveis
+
+def codec_padrao() -> str:
+    """O mais rápido instalado: zstd, lz4 ou zlib nível 1 (biblioteca padrão)."""
+    return next(n for n in ("zstd", "lz4", "zlib") if n in codecs_disponiveis())
+
+# ======================== 2. CODIFICAÇÃO DE UM CANAL ========================
+
+def _inteiros(x: "np.ndarray", resolucao: Optional[float]) -> "np.ndarray":
+    import numpy as np  # só quem grava/lê curvas paga a importação
+
+    if resolucao:
+        return np.rint(x / resolucao).astype(np.int64)
+    x = np.ascontiguousarray(x, dtype=np.float32 if x.dtype == np.float32 else np.float64)
+    return x.view(np.int32 if x.dtype == np.float32 else np.int64)
+
+# Cabeçalho de cada canal em cada bloco: 1º valor e largura dos deltas daquele bloco (cada
+# bloco escolhe a sua). Arquivos antigos têm só o 1º valor e a largura no tipo ("q:16").
+_CANAL = struct.Struct("<qB")
+_PRIMEIRO = struct.Struct("<q")
+_LARGURAS = ((8, "int8"), (16, "int16"), (32, "int32"), (64, "int64"))
+
+def codificar_canal(x: "np.ndarray", resolucao: Optional[float], compactar) -> Tuple[str, bytes]:
+    """(tipo, bytes): 1º valor + deltas na menor largura inteira que os comporta, embaralhados e compactados.
+
+    O tipo ("q", "f32" ou "f64") é o mesmo em todos os blocos do canal; a largura vai nos bytes.
+    """
+    import numpy as np
+
+    q = _inteiros(x, resolucao)
+    delta = np.diff(q)  # aritmética inteira com estouro circular (padrão de bits do float)
+    minimo, maximo = (int(delta.min()), int(delta.max())) if len(delta) else (0, 0)
+    bits, nome = next((b, n) for b, n in _LARGURAS if -2 ** (b - 1) <= minimo and maximo < 2 ** (b - 1))
+    estreito = delta.astype(nome)
+    embaralhado = estreito.view(np.uint8).reshape(-1, bits // 8).T.tobytes()
+    base = "q" if resolucao else f"f{8 * q.dtype.itemsize}"
+    return base, _CANAL.pack(int(q[0]) if len(q) else 0, bits) + compactar(embaralhado)
+
+def decodificar_canal(dados: bytes, tipo: str, amostras: int, resolucao: Optional[float],
+                      descompactar) -> "np.ndarray":
+    import numpy as np
+
+    base, _, bits = tipo.partition(":")
+    if bits:  # Formato antigo: largura única do canal no tipo
+        (primeiro,), inicio = _PRIMEIRO.unpack_from(dados), _PRIMEIRO.size
+    else:
+        (primeiro, bits), inicio = _CANAL.unpack_from(dados), _CANAL.size
+    inteiro = np.int32 if base == "f32" else np.int64
+    largura = int(bits) // 8
+    bruto = np.frombuffer(descompactar(dados[inicio:]), dtype=np.uint8)
+    delta = bruto.reshape(largura, -1).T.copy().view(f"int{bits}").ravel()
+    q = np.empty(amostras, dtype=inteiro)
+    if amostras:
+        q[0] = primeiro
+        np.cumsum(delta, dtype=inteiro, out=q[1:])
+        q[1:] += inteiro(primeiro)
+    if base == "q":
+        return q * resolucao
+    return q.view(np.float32 if base == "f32" else np.float64)
+
+# ======================== 3. ARQUIVO (SEGMENTOS + ÍNDICE) ========================
+
+_CABECALHO = struct.Struct("<H")  # nº de canais; depois um <I (tamanho) por canal
+
+class ArquivoCurvas:
+    """Grava e lê curvas; seguro entre threads (um segmento aberto por processo gravador)."""
+
+    def __init__(self, pasta: Optional[str] = None, banco: Optional[str] = None,
+                 codec_nome: Optional[str] = None, amostras_por_bloco: int = AMOSTRAS_POR_BLOCO):
+        self.pasta = pasta or PASTA_CURVAS
+        self.banco = banco
+        self.codec_nome = codec_nome or codec_padrao()
+        self.amostras_por_bloco = amostras_por_bloco
+        self._lock = threading.Lock()
+        self._segmento: Optional[str] = None
+        self._escrita = None
+        self._leitura: Dict[str, int] = {}  # descritores abertos por segmento (pread)
+
+    # --- escrita ---
+
+    def _abrir_segmento(self):
+        os.makedirs(self.pasta, exist_ok=True)
+        if self._escrita is not None:
+            self._escrita.close()
+        # Nome por processo: dois processos gravando nunca acrescentam no mesmo arquivo
+        self._segmento = f"seg-{datetime.now():%Y%m%d%H%M%S}-{os.getpid()}-{random.getrandbits(32):08x}.bin"
+        self._escrita = open(os.path.join(self.pasta, self._segmento), "ab")
+
+    def gravar(self, lote: str, requisito: str, cp: int, canais: Dict[str, "np.ndarray"],
+               taxa_hz: Optional[float] = None, resolucoes: Optional[Dict[str, float]] = None,
+               unidades: Optional[Dict[str, str]] = None, resultado_id: Optional[int] = None) -> int:
+        """Grava a curva de um CP (canais com o mesmo nº de amostras); retorna o id da curva."""
+        import numpy as np
+
+        colunas = {nome: np.asarray(v) for nome, v in canais.items()}
+        amostras = {len(v) for v in colunas.values()}
+        if len(amostras) != 1:
+            raise ValueError("Todos os canais da curva devem ter o mesmo número de amostras.")
+        n = amostras.pop()
+        resolucoes, unidades = resolucoes or {}, unidades or {}
+        comprimir = codec(self.codec_nome).comprimir
+
+        blocos, tipos = [], {}
+        for inicio in range(0, max(n, 1), self.amostras_por_bloco):
+            partes = []
+            for nome, x in colunas.items():
+                tipos[nome], dados = codificar_canal(x[inicio:inicio + self.amostras_por_bloco],
+                                                     resolucoes.get(nome), comprimir)
+                partes.append(dados)
+            cabecalho = _CABECALHO.pack(len(partes)) + b"".join(struct.pack("<I", len(p)) for p in partes)
+            blocos.append((cabecalho + b"".join(partes), min(self.amostras_por_bloco, n - inicio)))
+
+        descricao = [{"nome": nome, "tipo": tipos.get(nome, "f64"), "resolucao": resolucoes.get(nome),
+                      "unidade": unidades.get(nome)} for nome in colunas]
+        brutos = sum(v.nbytes for v in colunas.values())
+        conn = historico.conectar(self.banco)
+        with self._lock:
+            if self._escrita is None or self._escrita.tell() > TAMANHO_SEGMENTO:
+                self._abrir_segmento()
+            posicoes = []
+            for dados, amostras_bloco in blocos:
+                posicoes.append((self._segmento, self._escrita.tell(), len(dados), amostras_bloco,
+                                 zlib.crc32(dados)))
+                self._escrita.write(dados)
+            # O bloco vai ao disco antes do índice: uma queda deixa só bytes órfãos, nunca índice quebrado
+            self._escrita.flush()
+            os.fsync(self._escrita.fileno())
+            with conn:
+                curva_id = conn.execute(
+                    "INSERT INTO curvas (lote, requisito, cp, resultado_id, canais, taxa_hz, amostras, codec, "
+                    "bytes_brutos, bytes, criado_em) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (lote, requisito, cp, resultado_id, json.dumps(descricao, ensure_ascii=False), taxa_hz, n,
+                     self.codec_nome, brutos, sum(p[2] for p in posicoes),
+                     datetime.now().isoformat(timespec="seconds"))).lastrowid
+                conn.executemany("INSERT INTO curvas_blocos VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                 [(curva_id, i, *p) for i, p in enumerate(posicoes)])
+        return curva_id
+
+    def fechar(self):
+        with self._lock:
+            if self._escrita is not None:
+                self._escrita.close()
+                self._escrita = None
+            for fd in self._leitura.values():
+                os.close(fd)
+            self._leitura.clear()
+
+    # --- leitura ---
+
+    def _ler_bloco(self, arquivo: str, deslocamento: int, tamanho: int, crc: int) -> bytes:
+        fd = self._leitura.get(arquivo)
+        if fd is None:
+            fd = self._leitura.setdefault(arquivo, os.open(os.path.join(self.pasta, arquivo), os.O_RDONLY))
+        dados = os.pread(fd, tamanho, deslocamento)
+        if len(dados) != tamanho or zlib.crc32(dados) != crc:
+            raise CurvaCorrompida(f"Bloco em {arquivo}@{deslocamento} não confere com o índice.")
+        return dados
+
+    @staticmethod
+    def _decodificar(dados: bytes, descricao: List[Dict], amostras: int, descompactar) -> List["np.ndarray"]:
+        (n_canais,) = _CABECALHO.unpack_from(dados)
+        tamanhos = struct.unpack_from(f"<{n_canais}I", dados, _CABECALHO.size)
+        pos = _CABECALHO.size + 4 * n_canais
+        colunas = []
+        for canal, tamanho in zip(descricao, tamanhos):
+            colunas.append(decodificar_canal(dados[pos:pos + tamanho], canal["tipo"], amostras,
+                                             canal["resolucao"], descompactar))
+            pos += tamanho
+        return colunas
+
+    def _montar(self, curva, blocos: Sequence) -> Dict[str, "np.ndarray"]:
+        import numpy as np
+
+        descricao = json.loads(curva["canais"])
+        descompactar = codec(curva["codec"]).descomprimir
+        partes = [self._decodificar(self._ler_bloco(b["arquivo"], b["deslocamento"], b["tamanho"], b["crc"]),
+                                    descricao, b["amostras"], descompactar) for b in blocos]
+        return {c["nome"]: (np.concatenate([p[i] for p in partes]) if len(partes) > 1 else partes[0][i])
+                for i, c in enumerate(descricao)}
+
+    def listar(self, lote: str, requisito: Optional[str] = None) -> List[Dict]:
+        """Curvas gravadas de um lote (só o índice, nada é descompactado)."""
+        conn = historico.conectar(self.banco)
+        sql, params = "SELECT * FROM curvas WHERE lote = ?", [lote]
+        if requisito:
+            sql += " AND requisito = ?"
+            params.append(requisito)
+        return [dict(r) for r in conn.execute(sql + " ORDER BY requisito, cp, id", params)]
+
+    def ler(self, curva_id: int) -> Dict[str, "np.ndarray"]:
+        """Canais da curva (só os blocos dela são lidos e descompactados)."""
+        conn = historico.conectar(self.banco)
+        curva = conn.execute("SELECT * FROM curvas WHERE id = ?", (curva_id,)).fetchone()
+        if curva is None:
+            raise KeyError(curva_id)
+        blocos = conn.execute("SELECT * FROM curvas_blocos WHERE curva_id = ? ORDER BY bloco", (curva_id,)).fetchall()
+        return self._montar(curva, blocos)
+
+    def ler_cp(self, lote: str, requisito: str, cp: int) -> Optional[Dict[str, "np.ndarray"]]:
+        """Curva mais recente de um CP (None se não houver)."""
+        conn = historico.conectar(self.banco)
+        linha = conn.execute("SELECT id FROM curvas WHERE lote = ? AND requisito = ? AND cp = ? "
+                             "ORDER BY id DESC LIMIT 1", (lote, requisito, cp)).fetchone()
+        return self.ler(linha[0]) if linha else None
+
+    def varrer(self, requisito: Optional[str] = None) -> Iterator[Tuple[Dict, Dict[str, "np.ndarray"]]]:
+        """Todas as curvas (ou de um requisito) na ordem dos segmentos, para reanálise em massa."""
+        conn = historico.conectar(self.banco)
+        sql = "SELECT * FROM curvas" + (" WHERE requisito = ?" if requisito else "") + " ORDER BY id"
+        for curva in conn.execute(sql, (requisito,) if requisito else ()).fetchall():
+            blocos = conn.execute("SELECT * FROM curvas_blocos WHERE curva_id = ? ORDER BY bloco",
+                                  (curva["id"],)).fetchall()
+            yield dict(curva), self._montar(curva, blocos)
+
+_arquivo: Optional[ArquivoCurvas] = None
+_arquivo_lock = threading.Lock()
+
+def arquivo() -> ArquivoCurvas:
+    """Arquivo de curvas compartilhado pelo processo (todas as sessões)."""
+    global _arquivo
+    with _arquivo_lock:
+        if _arquivo is None:
+            _arquivo = ArquivoCurvas()
+        return _arquivo
+
+# ======================== 4. IMPORTAÇÃO E BENCHMARK ========================
+
+def ler_csv(caminho: str) -> Dict[str, List[float]]:
+    """Canais de um CSV exportado pelo software do equipamento (uma coluna por canal)."""
+    with open(caminho, newline="", encoding="utf-8-sig") as f:
+        amostra = f.read(4096)
+        f.seek(0)
+        dialeto = csv.Sniffer().sniff(amostra, delimiters=",;\t")
+        leitor = csv.reader(f, dialeto)
+        cabecalho = [c.strip() for c in next(leitor)]
+        colunas: Dict[str, List[float]] = {c: [] for c in cabecalho}
+        for linha in leitor:
+            if len(linha) != len(cabecalho):
+                continue
+            for c, v in zip(cabecalho, linha):
+                colunas[c].append(float(v.replace(",", ".")) if dialeto.delimiter != "," else float(v))
+    return colunas
+
+def _curva_prensa(amostras: int, semente: int) -> Dict[str, "np.ndarray"]:
+    """Curva sintética de prensa: carga sobe até a ruptura e cai; leitura na resolução da célula."""
+    import numpy as np
+
+    rng = np.random.default_rng(semente)
+    t = np.linspace(0.0, 1.0, amostras)
+    pico = rng.uniform(20.0, 60.0)
+    carga = np.where(t < 0.8, pico * np.sin(t / 0.8 * np.pi / 2), pico * np.exp(-(t - 0.8) * 25))
+    carga = np.round(carga + rng.normal(0, 0.004, amostras), 3)           # célula de 0,001 kN
+    deslocamento = np.round(t * rng.uniform(1.5, 3.0) + rng.normal(0, 0.0002, amostras), 4)  # 0,0001 mm
+    return {"carga": carga, "deslocamento": deslocamento}
+
+def benchmark(n_curvas: int = 200, amostras: int = 100_000, leituras: int = 200,
+              codecs: Optional[Sequence[str]] = None) -> List[Dict]:
+    """Taxa de compressão, latência de leitura aleatória de um CP e vazão da varredura por codec."""
+    import numpy as np
+
+    curvas = [_curva_prensa(amostras, i) for i in range(n_curvas)]
+    resultados = []
+    for nome in codecs or codecs_disponiveis():
+        for modo, resolucoes in (("resolução", {"carga": 0.001, "deslocamento": 0.0001}), ("sem perda", None)):
+            pasta = tempfile.mkdtemp(prefix="curvas-")
+            arq = ArquivoCurvas(pasta, os.path.join(pasta, "indice.db"), nome)
+            inicio = time.perf_counter()
+            for i, c in enumerate(curvas):
+                arq.gravar(f"L{i // 6:05d}", "COMPRESSÃO", i % 6 + 1, c, taxa_hz=1000.0, resolucoes=resolucoes)
+            gravacao = time.perf_counter() - inicio
+            brutos = sum(v.nbytes for c in curvas for v in c.values())
+            gravados = sum(os.path.getsize(os.path.join(pasta, f)) for f in os.listdir(pasta) if f.endswith(".bin"))
+
+            sorteio = random.Random(0)
+            latencias = []
+            for _ in range(leituras):
+                i = sorteio.randrange(n_curvas)
+                t = time.perf_counter()
+                lida = arq.ler_cp(f"L{i // 6:05d}", "COMPRESSÃO", i % 6 + 1)
+                latencias.append(time.perf_counter() - t)
+            ok = np.array_equal(lida["carga"], curvas[i]["carga"]) if resolucoes is None else \
+                np.abs(lida["carga"] - curvas[i]["carga"]).max() <= 0.0005
+            inicio = time.perf_counter()
+            varridas = sum(1 for _ in arq.varrer())
+            varredura = time.perf_counter() - inicio
+            arq.fechar()
+            shutil.rmtree(pasta, ignore_errors=True)
+            resultados.append({
+                "codec": nome, "modo": modo, "taxa": brutos / gravados, "conferido": bool(ok),
+                "gravacao_mb_s": brutos / gravacao / 1e6,
+                "leitura_ms": 1000 * statistics.median(latencias),
+                "leitura_p95_ms": 1000 * sorted(latencias)[int(0.95 * len(latencias))],
+                "varredura_mb_s": brutos / varredura / 1e6, "curvas": varridas,
+            })
+    return resultados
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Arquivo compactado das curvas dos instrumentos.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p = sub.add_parser("importar", help="Grava a curva de um CP a partir de um CSV do equipamento")
+    p.add_argument("csv")
+    p.add_argument("--lote", required=True)
+    p.add_argument("--requisito", required=True)
+    p.add_argument("--cp", type=int, required=True)
+    p.add_argument("--taxa", type=float, help="Amostras por segundo")
+    p.add_argument("--resolucao", action="append", default=[], metavar="CANAL=VALOR",
+                   help="Resolução do instrumento por canal (sem ela o canal é gravado sem perda)")
+    p = sub.add_parser("benchmark", help="Compressão, leitura aleatória e varredura por codec")
+    p.add_argument("--curvas", type=int, default=200)
+    p.add_argument("--amostras", type=int, default=100_000)
+    args = parser.parse_args(argv)
+
+    if args.comando == "importar":
+        import numpy as np
+
+        resolucoes = {c: float(v) for c, _, v in (r.partition("=") for r in args.resolucao)}
+        canais = {c: np.asarray(v) for c, v in ler_csv(args.csv).items()}
+        curva_id = arquivo().gravar(args.lote, args.requisito, args.cp, canais, args.taxa, resolucoes)
+        print(f"Curva {curva_id} gravada ({len(canais)} canais, {len(next(iter(canais.values())))} amostras)")
+        return
+    print(f"{args.curvas} curvas x {args.amostras} amostras x 2 canais (float64)", file=sys.stderr)
+    for r in benchmark(args.curvas, args.amostras):
+        print(f"{r['codec']:>6} {r['modo']:>10}: {r['taxa']:5.1f}x | gravação {r['gravacao_mb_s']:6.0f} MB/s | "
+              f"leitura de 1 CP {r['leitura_ms']:.2f} ms (p95 {r['leitura_p95_ms']:.2f}) | "
+              f"varredura {r['varredura_mb_s']:6.0f} MB/s" + ("" if r["conferido"] else " | DIVERGENTE"))
+
+if __name__ == "__main__":
+    main()
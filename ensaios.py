@@ -0,0 +1,889 @@
+"""Definições dos ensaios e regras de cálculo puras (sem Streamlit).
+
+Este módulo concentra as constantes, os limites por produto e as fórmulas usadas
+pelas calculadoras da interface. Como não depende do Streamlit, pode ser usado
+também por rotinas em lote (importação de planilhas, reprocessamentos etc.).
+"""
+import json
+import math
+import os
+import re
+import threading
+import unicodedata
+from collections.abc import Mapping
+from functools import lru_cache
+from itertools import compress
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+# ======================== 1. CONFIGURAÇÃO E CONSTANTES ========================
+LINHAS_PRODUTOS = ("Basecoat", "Graute", "Rejunte", "Revestimento")
+
+# --- DEFINIÇÃO DOS ENSAIOS DISPONÍVEIS ---
+REQ_RETENCAO = "RETENÇÃO DE ÁGUA (%) - ABNT NBR 13277"
+REQ_DENSIDADE = "DENSIDADE NO ESTADO FRESCO (kg/m³) - ABNT NBR 13278"
+REQ_FLEXAO = "FLEXÃO 4x4x16 (MPa) - ABNT NBR 13279:2005"
+REQ_COMPRESSAO_PRISMA = "COMPRESSÃO 4x4x16 (MPa) - ABNT NBR 13279:2005"
+REQ_COMPRESSAO_CILINDRICA = "COMPRESSÃO 5x10 (MPa) - ABNT NBR 7215" # Novo para Graute/Rejunte
+REQ_VAR_DIM = "VARIAÇÃO DIMENSIONAL (mm/m) - ABNT NBR 15261"
+REQ_VAR_MASSA = "VARIAÇÃO DE MASSA (%) - ABNT NBR 15261"
+REQ_CAPILARIDADE = "CAPILARIDADE (g/dm²·min^0,5) - ABNT NBR 15259"
+REQ_ADERENCIA_AUTO = "POTENCIAL DE ADERÊNCIA (MPa) - ABNT NBR 15258 - Automática"
+REQ_ADERENCIA_MANUAL = "POTENCIAL DE ADERÊNCIA (MPa) - ABNT NBR 15258 - Manual"
+REQ_PERMEABILIDADE = "PERMEABILIDADE 48h (mL/cm³) - ABNT NBR 16648 anexo C"
+REQ_RETRACAO = "RETRAÇÃO (%) - Baseado na ABNT NBR 15261"
+
+# --- CONFIGURAÇÃO POR PRODUTO (Baseada nas Planilhas) ---
+REQUISITOS = {
+    "Basecoat": [
+        REQ_RETENCAO,
+        REQ_DENSIDADE,
+        REQ_FLEXAO,
+        REQ_COMPRESSAO_PRISMA, # Basecoat usa Prisma
+        REQ_VAR_DIM,
+        REQ_VAR_MASSA,
+        REQ_CAPILARIDADE,
+        REQ_ADERENCIA_AUTO,
+        REQ_PERMEABILIDADE,
+        REQ_RETRACAO
+    ],
+    "Graute": [
+        # Planilha Graute: Foco em Densidade, Expansão e Compressão
+        REQ_DENSIDADE,
+        REQ_COMPRESSAO_CILINDRICA, # NBR 7215 (5x10)
+        REQ_VAR_DIM,               # Expansão
+        REQ_VAR_MASSA
+    ],
+    "Rejunte": [
+        # Planilha Rejunte: Identificado NBR 7215 (Cilíndrica) e NBR 14992 (Retenção)
+        REQ_RETENCAO,
+        REQ_DENSIDADE,
+        REQ_COMPRESSAO_CILINDRICA, # Rejunte na planilha usa 5x10
+        REQ_VAR_DIM,
+        REQ_CAPILARIDADE,
+        REQ_PERMEABILIDADE,
+        REQ_RETRACAO
+    ],
+    "Revestimento": [
+        # Padrão Argamassa Colante/Revestimento
+        REQ_RETENCAO,
+        REQ_DENSIDADE,
+        REQ_FLEXAO,
+        REQ_COMPRESSAO_PRISMA,
+        REQ_ADERENCIA_MANUAL,
+        REQ_ADERENCIA_AUTO,
+        REQ_CAPILARIDADE,
+        REQ_VAR_DIM
+    ]
+}
+
+# --- LIMITES E TOLERÂNCIAS (Extraídos das Planilhas) ---
+
+# --- Medidas feitas em milimetros.
+#=========================================================//=================================================================
+
+CONFIG_LIMITES = {
+    "padrao": {
+        "flexao_var_max": 0.3,
+        "compressao_var_max": 0.5,
+        "variacao_dim_max": 0.20,
+        "compressao_cilindrica_var_pct": 6.0,
+        "aderencia_var_pct": 30.0,
+        "min_cps_aderencia": 6,
+        "capilaridade_var_pct": 20.0,
+        "retracao_var_pct": 20.0,
+        "permeabilidade_var_pct": 30.0,
+        "comprimento_padrao": 250.0,
+        # Critério de exclusão dos CPs: simples, iterativo, grubbs ou dixon (ver aceitacao.py)
+        "criterio_aceitacao": "simples",
+        "alfa_aceitacao": 0.05
+    },
+    "Basecoat": {
+        "flexao_var_max": 0.3,
+        "compressao_var_max": 0.5,
+        "variacao_dim_max": 0.20,
+        "aderencia_var_pct": 30.0,
+        "permeabilidade_var_pct": 30.0,
+        "comprimento_padrao": 160.0
+    },
+    "Graute": {
+        "compressao_cilindrica_var_pct": 6.0,
+        "variacao_dim_max": 0.20,
+        # Calculado com base na planilha (0.18mm diff -> 1.38 mm/m)
+        "comprimento_padrao": 130.43
+    },
+    "Rejunte": {
+        "compressao_cilindrica_var_pct": 6.0,
+        "variacao_dim_max": 0.20,
+        "comprimento_padrao": 160.0
+    },
+    "Revestimento": {
+        "flexao_var_max": 0.3,
+        "compressao_var_max": 0.5,
+        "variacao_dim_max": 0.20,
+        "capilaridade_var_pct": 20.0,
+        "aderencia_var_pct": 30.0,
+        "comprimento_padrao": 160.0
+    }
+}
+
+# Valores aceitos nas chaves de aceitação (aceitacao.py só tem tabelas críticas para estes níveis)
+CRITERIOS_ACEITACAO = ("simples", "iterativo", "grubbs", "dixon")
+ALFAS_ACEITACAO = (0.10, 0.05, 0.01)
+
+# --- Sobreposições por fábrica e por cliente ---
+# Camadas aplicadas na ordem padrão → produto → fábrica → cliente. Em cada fábrica/cliente,
+# "padrao" vale para todos os produtos e a chave do produto vem por cima. Ex (dados/limites.json):
+#   {"fabricas": {"Jundiai": {"padrao": {"min_cps_aderencia": 8}}},
+#    "clientes": {"Construtora X": {"Revestimento": {"aderencia_var_pct": 25.0}}}}
+CAMINHO_SOBREPOSICOES = os.environ.get(
+    "CALCULADORA_LIMITES",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "dados", "limites.json"),
+)
+# Fábrica desta instalação (cada fábrica roda a sua); vale para todos os cálculos do processo
+FABRICA = os.environ.get("CALCULADORA_FABRICA") or None
+
+_AUSENTE = object()
+
+class Limites(Mapping):
+    """Limites resolvidos de uma combinação produto/fábrica/cliente (somente leitura).
+
+    ``origem`` diz de qual camada veio cada chave e ``camadas`` lista as que mudaram algo.
+    As visões são compartilhadas entre sessões: uma camada que não muda nenhum valor
+    devolve a própria visão de baixo e as demais copiam só o dicionário raso (cópia na escrita).
+    """
+    __slots__ = ("_valores", "origem", "camadas")
+
+    def __init__(self, valores: Dict, origem: Dict, camadas: Tuple[str, ...]):
+        self._valores, self.origem, self.camadas = valores, origem, camadas
+
+    def __getitem__(self, chave):
+        return self._valores[chave]
+
+    def get(self, chave, padrao=None):
+        return self._valores.get(chave, padrao)
+
+    def __iter__(self):
+        return iter(self._valores)
+
+    def __len__(self):
+        return len(self._valores)
+
+    def __repr__(self):
+        return f"Limites({self._valores!r}, camadas={self.camadas!r})"
+
+    def sobrepor(self, camada: Dict, rotulo: str) -> "Limites":
+        mudou = {k: v for k, v in camada.items() if self._valores.get(k, _AUSENTE) != v}
+        if not mudou:
+            return self
+        return Limites({**self._valores, **mudou}, {**self.origem, **dict.fromkeys(mudou, rotulo)},
+                       self.camadas + (rotulo,))
+
+class _Sobreposicoes(NamedTuple):
+    config: Dict
+    fabricas: Dict
+    clientes: Dict
+    visoes: Dict  # (produto, fabrica, cliente) -> Limites, montadas sob demanda
+
+# Trocado inteiro a cada publicação: uma sessão nunca vê camadas de versões diferentes
+_vigentes: Optional[_Sobreposicoes] = None
+_vigentes_lock = threading.Lock()
+
+def _validar_camadas(tipo: str, camadas: Dict):
+    for nome, por_produto in camadas.items():
+        for produto, valores in por_produto.items():
+            if produto != "padrao" and produto not in LINHAS_PRODUTOS:
+                raise ValueError(f"{tipo} {nome}: produto desconhecido '{produto}'")
+            desconhecidas = sorted(set(valores) - set(CONFIG_LIMITES["padrao"]))
+            if desconhecidas:
+                raise ValueError(f"{tipo} {nome} ({produto}): limites desconhecidos {desconhecidas}")
+            criterio = valores.get("criterio_aceitacao", "simples")
+            if criterio not in CRITERIOS_ACEITACAO:
+                raise ValueError(f"{tipo} {nome} ({produto}): criterio_aceitacao '{criterio}' inválido "
+                                 f"(use {', '.join(CRITERIOS_ACEITACAO)})")
+            alfa = valores.get("alfa_aceitacao", 0.05)
+            if isinstance(alfa, bool) or alfa not in ALFAS_ACEITACAO:
+                raise ValueError(f"{tipo} {nome} ({produto}): alfa_aceitacao {alfa!r} inválido "
+                                 f"(use {', '.join(map(str, ALFAS_ACEITACAO))})")
+
+def publicar_sobreposicoes(fabricas: Optional[Dict] = None, clientes: Optional[Dict] = None):
+    """Valida e passa a usar as sobreposições ({nome: {produto|"padrao": {chave: valor}}})."""
+    global _vigentes
+    fabricas, clientes = dict(fabricas or {}), dict(clientes or {})
+    _validar_camadas("Fábrica", fabricas)
+    _validar_camadas("Cliente", clientes)
+    _vigentes = _Sobreposicoes(CONFIG_LIMITES, fabricas, clientes, {})
+
+def carregar_sobreposicoes(caminho: Optional[str] = None):
+    """Lê e publica as sobreposições do arquivo JSON (sem arquivo: nenhuma)."""
+    caminho = caminho or CAMINHO_SOBREPOSICOES
+    try:
+        with open(caminho, encoding="utf-8") as f:
+            dados = json.load(f)
+    except FileNotFoundError:
+        dados = {}
+    try:
+        publicar_sobreposicoes(dados.get("fabricas"), dados.get("clientes"))
+    except ValueError as e:
+        raise ValueError(f"{caminho}: {e}") from e
+
+def _sobreposicoes() -> _Sobreposicoes:
+    vigentes = _vigentes
+    if vigentes is None:
+        with _vigentes_lock:
+            if _vigentes is None:
+                carregar_sobreposicoes()
+            vigentes = _vigentes
+    return vigentes
+
+def clientes_configurados() -> List[str]:
+    """Clientes com limites próprios (para a escolha na interface)."""
+    return sorted(_sobreposicoes().clientes)
+
+def _visao(s: _Sobreposicoes, produto: Optional[str], fabrica: Optional[str], cliente: Optional[str]) -> Limites:
+    chave = (produto, fabrica, cliente)
+    visao = s.visoes.get(chave)
+    if visao is not None:
+        return visao
+    # Cada camada parte da visão (já em cache) da camada de baixo
+    if cliente is not None:
+        camadas, base = s.clientes.get(cliente, {}), _visao(s, produto, fabrica, None)
+        rotulo = f"cliente {cliente}"
+    elif fabrica is not None:
+        camadas, base = s.fabricas.get(fabrica, {}), _visao(s, produto, None, None)
+        rotulo = f"fábrica {fabrica}"
+    else:
+        padrao = s.config["padrao"]
+        base = Limites(dict(padrao), dict.fromkeys(padrao, "padrão"), ("padrão",))
+        camadas, rotulo = {"padrao": s.config.get(produto, {})}, produto
+    visao = base.sobrepor(camadas.get("padrao", {}), rotulo).sobrepor(camadas.get(produto, {}), rotulo)
+    # setdefault: duas sessões montando a mesma visão ao mesmo tempo ficam com o mesmo objeto
+    return s.visoes.setdefault(chave, visao)
+
+def limites_produto(produto: Optional[str], config: Optional[Dict] = None,
+                    cliente: Optional[str] = None, fabrica: Optional[str] = None) -> Limites:
+    """Limites de um produto já mesclados ao padrão e às sobreposições da fábrica e do cliente.
+
+    ``fabrica`` padrão: a desta instalação (``CALCULADORA_FABRICA``). ``config`` substitui
+    CONFIG_LIMITES (simulação de uma alteração); nesse caso a visão não entra no cache.
+    """
+    s = _sobreposicoes()
+    if config is not None:
+        s = _Sobreposicoes(config, s.fabricas, s.clientes, {})
+    return _visao(s, produto, fabrica or FABRICA, cliente)
+
+def limite_produto(produto: Optional[str], chave_limite: str, cliente: Optional[str] = None):
+    """Retorna o valor do limite para um produto (com fallback no padrão e sobreposições)."""
+    return limites_produto(produto, cliente=cliente)[chave_limite]
+
+# ======================== 2. IDENTIFICAÇÃO DOS ENSAIOS ========================
+
+# Chaves técnicas dos ensaios (usadas pelas rotinas em lote e pelo roteador)
+ENS_RETENCAO = "retencao"
+ENS_DENSIDADE = "densidade"
+ENS_FLEXAO = "flexao"
+ENS_COMPRESSAO_4X4X16 = "compressao_4x4x16"
+ENS_COMPRESSAO_5X10 = "compressao_5x10"
+ENS_CAPILARIDADE = "capilaridade"
+ENS_ADERENCIA_AUTO = "aderencia_automatica"
+ENS_ADERENCIA_MANUAL = "aderencia_manual"
+ENS_RETRACAO = "retracao"
+ENS_PERMEABILIDADE = "permeabilidade"
+ENS_VAR_DIM = "variacao_dimensional"
+ENS_VAR_MASSA = "variacao_massa"
+
+def norm(txt: str) -> str:
+    """Normaliza texto para comparação (remove acentos e caracteres especiais)."""
+    s = unicodedata.normalize("NFKD", txt)
+    s = s.encode("ascii", "ignore").decode("ascii").lower()
+    s = re.sub(r"[^a-z0-9]+", " ", s).strip()
+    return s
+
+def slugify(txt: str) -> str:
+    """Cria um slug para IDs de página (ex: Retenção de Água -> retencao-de-agua)."""
+    s = unicodedata.normalize("NFKD", txt)
+    s = s.encode("ascii", "ignore").decode("ascii").lower()
+    s = re.sub(r"[^a-z0-9]+", "-", s).strip("-")
+    return re.sub(r"-+", "-", s)
+
+def identificar_ensaio(linha: str, requisito: str) -> Optional[str]:
+    """Descobre qual ensaio (chave técnica) corresponde a um requisito da linha."""
+    nome_normalizado = norm(requisito)
+
+    if "flexao" in nome_normalizado:
+        return ENS_FLEXAO
+    elif "compressao" in nome_normalizado:
+        # Prioriza detecção de Graute ou NBR 7215 (Cilíndrico 5x10)
+        if "5x10" in nome_normalizado or "7215" in nome_normalizado or linha == "Graute":
+            return ENS_COMPRESSAO_5X10
+        # Caso contrário, assume Prismático (4x4x16) padrão
+        return ENS_COMPRESSAO_4X4X16
+    elif "retencao" in nome_normalizado:
+        return ENS_RETENCAO
+    elif "densidade" in nome_normalizado and "fresco" in nome_normalizado:
+        return ENS_DENSIDADE
+    elif "capilaridade" in nome_normalizado:
+        return ENS_CAPILARIDADE
+    elif "aderencia" in nome_normalizado:
+        if "manual" in nome_normalizado:
+            return ENS_ADERENCIA_MANUAL
+        return ENS_ADERENCIA_AUTO
+    elif "retracao" in nome_normalizado:
+        return ENS_RETRACAO
+    elif "permeabilidade" in nome_normalizado:
+        return ENS_PERMEABILIDADE
+    elif "dimensional" in nome_normalizado:
+        return ENS_VAR_DIM
+    elif "massa" in nome_normalizado and "variacao" in nome_normalizado:
+        return ENS_VAR_MASSA
+    return None
+
+# Páginas das calculadoras, montadas uma vez na importação (e não a cada execução do app):
+# ID da página ("Linha::slug-do-requisito") -> (linha, requisito, ensaio)
+PAGINAS_CALCULO: Dict[str, Tuple[str, str, Optional[str]]] = {
+    f"{linha}::{slugify(req)}": (linha, req, identificar_ensaio(linha, req))
+    for linha, reqs in REQUISITOS.items() for req in reqs
+}
+# IDs das páginas de cada linha, na ordem dos requisitos (botão "Próximo Ensaio")
+PAGINAS_POR_LINHA: Dict[str, List[str]] = {
+    linha: [f"{linha}::{slugify(req)}" for req in reqs] for linha, reqs in REQUISITOS.items()
+}
+
+# ======================== 3. REGRAS DE CÁLCULO ========================
+
+class EntradaIncompleta(ValueError):
+    """Dados insuficientes para calcular (a interface mostra como aviso, não como erro)."""
+
+def _resultado(ensaio: str, unidade: str, valores: List, media_inicial, validos: List,
+               excluidos: List[int], minimo_cps: int, **detalhes) -> Dict:
+    """Monta o dicionário padrão de saída das regras."""
+    valido = len(validos) >= minimo_cps
+    return {
+        "ensaio": ensaio,
+        "unidade": unidade,
+        "valores": valores,
+        "media_inicial": media_inicial,
+        "validos": validos,
+        "excluidos": excluidos,
+        "minimo_cps": minimo_cps,
+        "valido": valido,
+        "resultado": (sum(validos) / len(validos)) if (valido and validos) else None,
+        "detalhes": detalhes,
+    }
+
+def passo(descricao: str, formula: str, substituicao: str, resultado, unidade: str = "",
+          casas: int = 2, **valores) -> Dict:
+    """Um passo da memória de cálculo: fórmula simbólica (LaTeX) e a mesma com os valores.
+
+    ``substituicao`` é um modelo de ``str.format`` preenchido com ``valores`` só na
+    hora de exibir ou exportar (chaves do LaTeX escritas em dobro).
+    """
+    return {"descricao": descricao, "formula": formula, "substituicao": substituicao,
+            "valores": valores, "resultado": resultado, "unidade": unidade, "casas": casas}
+
+def regra_retencao_basecoat(tara: float, massa_ini: float, massa_fim: float, agua_ml_kg: float) -> Dict:
+    """Retenção de água do Basecoat (perda de água sobre a água teórica da pasta)."""
+    if massa_ini == 0 or agua_ml_kg == 0:
+        raise EntradaIncompleta("⚠️ Preencha os dados corretamente.")
+
+    massa_pasta = massa_ini - tara
+    perda_agua = massa_ini - massa_fim
+    # Fator Água: ml/kg / (1000 + ml/kg)
+    fator_agua = agua_ml_kg / (1000 + agua_ml_kg)
+    # Água total teórica na amostra
+    agua_total_amostra = massa_pasta * fator_agua
+
+    # Evita divisão por zero
+    if agua_total_amostra > 0:
+        ra = (1 - (perda_agua / agua_total_amostra)) * 100
+    else:
+        ra = 0
+
+    # Resultado negativo significa perda maior que a água disponível (entrada incoerente)
+    validos = [ra] if ra >= 0 else []
+    memoria = [
+        passo("Massa da pasta", r"M_{pasta} = M_{ini} - M_{tara}", "{massa_ini:.2f} - {tara:.2f}",
+              massa_pasta, "g", massa_ini=massa_ini, tara=tara),
+        passo("Fator água", r"F_{água} = \frac{a}{1000 + a}", r"\frac{{{agua:.1f}}}{{1000 + {agua:.1f}}}",
+              fator_agua, "", 4, agua=agua_ml_kg),
+        passo("Água total", r"M_{água} = M_{pasta} \times F_{água}", r"{massa_pasta:.2f} \times {fator:.4f}",
+              agua_total_amostra, "g", massa_pasta=massa_pasta, fator=fator_agua),
+        passo("Retenção", r"RA = \left( 1 - \frac{M_{perdida}}{M_{pasta} \times F_{água}} \right) \times 100",
+              r"\left( 1 - \frac{{{perda:.2f}}}{{{agua_total:.2f}}} \right) \times 100",
+              ra, "%", perda=perda_agua, agua_total=agua_total_amostra),
+    ]
+    return _resultado(ENS_RETENCAO, "%", [ra], ra, validos, [] if validos else [0], 1,
+                      massa_pasta=massa_pasta, perda_agua=perda_agua,
+                      fator_agua=fator_agua, agua_total_amostra=agua_total_amostra, ra=ra, memoria=memoria)
+
+def regra_retencao_simples(rr: float, rt: float) -> Dict:
+    """Retenção de água pela relação RR/RT."""
+    if rt == 0:
+        raise ValueError("Erro: RT não pode ser zero.")
+    ra = (rr / rt) * 100
+    return _resultado(ENS_RETENCAO, "%", [ra], ra, [ra], [], 1, ra=ra)
+
+def regra_densidade(tara: float, massa_bruta: float, volume: float, dt: float = 0.0) -> Dict:
+    """Densidade de massa no estado fresco (e teor de ar, se a densidade teórica for informada)."""
+    if volume <= 0:
+        raise ValueError("Volume deve ser maior que zero.")
+    if massa_bruta < tara:
+        raise ValueError("A massa bruta não pode ser menor que a tara.")
+
+    massa_amostra = massa_bruta - tara
+    densidade_g_cm3 = massa_amostra / volume
+    densidade_kg_m3 = densidade_g_cm3 * 1000
+    teor_ar = ((dt - densidade_g_cm3) / dt) * 100 if dt > 0 else None
+
+    memoria = [
+        passo("Massa líquida", r"M = M_{bruta} - M_{tara}", "{massa_bruta:.2f} - {tara:.2f}",
+              massa_amostra, "g", massa_bruta=massa_bruta, tara=tara),
+        passo("Densidade", r"d = \frac{M}{V}", r"\frac{{{massa:.2f}}}{{{volume:.2f}}}",
+              densidade_g_cm3, "g/cm³", 4, massa=massa_amostra, volume=volume),
+    ]
+    if teor_ar is not None:
+        memoria.append(passo("Teor de ar incorporado", r"A = \frac{d_t - d}{d_t} \times 100",
+                             r"\frac{{{dt:.4f} - {d:.4f}}}{{{dt:.4f}}} \times 100",
+                             teor_ar, "%", dt=dt, d=densidade_g_cm3))
+    return _resultado(ENS_DENSIDADE, "kg/m³", [densidade_kg_m3], densidade_kg_m3, [densidade_kg_m3], [], 1,
+                      massa_amostra=massa_amostra, densidade_g_cm3=densidade_g_cm3,
+                      densidade_kg_m3=densidade_kg_m3, teor_ar=teor_ar, memoria=memoria)
+
+# --- Aceitação dos CPs (critério por produto, ver aceitacao.py) ---
+# Cada regra com exclusão monta os valores dos CPs, quais participam e a faixa do ensaio
+# (funções _cps_*); quem decide quais CPs ficam é o critério configurado para o produto.
+# No reprocessamento em bloco (calcular_bloco) a regra já recebe o ``preparado``.
+
+def _aceitar(cps: Tuple, criterio: str, alfa: float) -> Tuple:
+    """(valores, participa, aceite) de um lote, a partir do que a função _cps_* montou."""
+    import aceitacao  # numpy só é carregado no primeiro cálculo, não na abertura do app
+    valores, participa, dentro = cps
+    return valores, participa, aceitacao.aceitar_lote(valores, participa, dentro, criterio, alfa)
+
+def _separar(valores: List, participa: List[bool], aceite) -> Tuple[List, List[int]]:
+    """(valores válidos, posições excluídas), na ordem dos CPs."""
+    return list(compress(valores, aceite.mantidos)), list(compress(range(len(valores)), aceite.excluidos))
+
+def _detalhes_aceite(criterio: str, alfa: float, aceite) -> Dict:
+    if criterio == "simples":
+        return {}
+    return {"aceitacao": {"criterio": criterio, "alfa": alfa, "centro": aceite.centro,
+                          "iteracoes": aceite.iteracoes}}
+
+def _faixa_absoluta(limite: float):
+    return lambda v, centro: abs(v - centro) <= limite
+
+def _faixa_percentual_media(limite_pct: float):
+    return lambda v, media: (v >= media * (1 - (limite_pct/100))) & (v <= media * (1 + (limite_pct/100)))
+
+def _cps_flexao(valores: List[float], limite: float):
+    if all(v == 0 for v in valores):
+        raise EntradaIncompleta("Preencha os valores.")
+    return list(valores), [True] * len(valores), _faixa_absoluta(limite)
+
+def regra_flexao(valores: List[float], limite: float, criterio: str = "simples", alfa: float = 0.05,
+                 preparado=None) -> Dict:
+    """Flexão 4x4x16: exclui CPs com variação absoluta acima do limite (média dos 3)."""
+    valores, participa, a = preparado or _aceitar(_cps_flexao(valores, limite), criterio, alfa)
+    validos, excluidos = _separar(valores, participa, a)
+    variacoes = [a.media_inicial - val for val in valores] # Lógica Excel (Média - Valor)
+    return _resultado(ENS_FLEXAO, "MPa", valores, a.media_inicial, validos, excluidos, 2, variacoes=variacoes,
+                      **_detalhes_aceite(criterio, alfa, a))
+
+def _cps_compressao_4x4x16(valores: List[float], limite: float):
+    return list(valores), [True] * len(valores), _faixa_absoluta(limite)
+
+def regra_compressao_4x4x16(valores: List[float], limite: float, criterio: str = "simples", alfa: float = 0.05,
+                            preparado=None) -> Dict:
+    """Compressão 4x4x16: exclui CPs fora de ±limite (MPa) da média dos 6."""
+    valores, participa, a = preparado or _aceitar(_cps_compressao_4x4x16(valores, limite), criterio, alfa)
+    validos, excluidos = _separar(valores, participa, a)
+    return _resultado(ENS_COMPRESSAO_4X4X16, "MPa", valores, a.media_inicial, validos, excluidos, 4,
+                      **_detalhes_aceite(criterio, alfa, a))
+
+def _cps_faixa_percentual(valores: List[float], limite_pct: float):
+    participa = [v > 0 for v in valores]
+    if not any(participa):
+        raise EntradaIncompleta("Preencha os valores.")
+    return list(valores), participa, _faixa_percentual_media(limite_pct)
+
+def _faixa_percentual(ensaio: str, unidade: str, valores: List[float], limite_pct: float, minimo_cps: int,
+                      criterio: str = "simples", alfa: float = 0.05, preparado=None) -> Dict:
+    """Regra comum: ignora zeros e exclui valores fora de ±limite_pct% da média inicial."""
+    valores, participa, a = preparado or _aceitar(_cps_faixa_percentual(valores, limite_pct), criterio, alfa)
+    validos, excluidos = _separar(valores, participa, a)
+    # Faixa em torno da média de referência final (a inicial, no critério simples)
+    lim_inf = a.centro * (1 - (limite_pct/100))
+    lim_sup = a.centro * (1 + (limite_pct/100))
+    return _resultado(ensaio, unidade, valores, a.media_inicial, validos, excluidos, minimo_cps,
+                      limite_inf=lim_inf, limite_sup=lim_sup, **_detalhes_aceite(criterio, alfa, a))
+
+def regra_compressao_5x10(valores: List[float], limite_pct: float, criterio: str = "simples", alfa: float = 0.05,
+                          preparado=None) -> Dict:
+    """Compressão 5x10 (NBR 7215): faixa percentual sobre a média, mínimo 2 CPs."""
+    return _faixa_percentual(ENS_COMPRESSAO_5X10, "MPa", valores, limite_pct, 2, criterio, alfa, preparado)
+
+def regra_aderencia(valores_mpa: List[float], limite_pct: float, min_cps: int,
+                    ensaio: str = ENS_ADERENCIA_AUTO, criterio: str = "simples", alfa: float = 0.05,
+                    preparado=None) -> Dict:
+    """Potencial de aderência: faixa percentual sobre a média, mínimo de CPs configurável."""
+    return _faixa_percentual(ensaio, "MPa", valores_mpa, limite_pct, min_cps, criterio, alfa, preparado)
+
+def _cps_aderencia(valores_mpa: List[float], limite_pct: float, min_cps: int, ensaio: str = ENS_ADERENCIA_AUTO):
+    return _cps_faixa_percentual(valores_mpa, limite_pct)
+
+def converter_kn_mpa(cargas_kn: List[float], diametro: float) -> List[float]:
+    """Converte cargas (kN) em tensões (MPa) pela área da pastilha."""
+    if diametro <= 0:
+        raise ValueError("Diâmetro inválido.")
+    # Área em mm²
+    area = math.pi * ((diametro/2)**2)
+    # (kN * 1000) / mm² = MPa
+    return [(kn * 1000) / area if kn > 0 else 0 for kn in cargas_kn]
+
+def _cps_aderencia_manual(cargas_kn: List[float], diametro: float, limite_pct: float, min_cps: int):
+    try:
+        return _cps_faixa_percentual(converter_kn_mpa(cargas_kn, diametro), limite_pct)
+    except EntradaIncompleta:
+        raise EntradaIncompleta("Sem dados.")
+
+def regra_aderencia_manual(cargas_kn: List[float], diametro: float, limite_pct: float, min_cps: int,
+                           criterio: str = "simples", alfa: float = 0.05, preparado=None) -> Dict:
+    """Aderência manual: converte kN para MPa e aplica a mesma regra da automática."""
+    mpa_values = converter_kn_mpa(cargas_kn, diametro)
+    try:
+        res = regra_aderencia(mpa_values, limite_pct, min_cps, ensaio=ENS_ADERENCIA_MANUAL,
+                              criterio=criterio, alfa=alfa, preparado=preparado)
+    except EntradaIncompleta:
+        raise EntradaIncompleta("Sem dados.")
+    res["detalhes"]["cargas_kn"] = list(cargas_kn)
+    return res
+
+def _cps_capilaridade(area: float, m10: List[float], m90: List[float], limite_pct: float):
+    fator = (90**0.5 - 10**0.5) * (area/100)
+    valores = []
+    for i in range(3):
+        if m10[i] > 0:
+            valores.append((m90[i] - m10[i]) / fator)
+        else:
+            valores.append(0)
+    # Média não positiva: nenhum CP é excluído
+    dentro = lambda v, media: (media <= 0) | (((100 - limite_pct) <= (v / media) * 100)
+                                              & ((v / media) * 100 <= (100 + limite_pct)))
+    return valores, [True] * 3, dentro
+
+def regra_capilaridade(area: float, m10: List[float], m90: List[float], limite_pct: float,
+                       criterio: str = "simples", alfa: float = 0.05, preparado=None) -> Dict:
+    """Coeficiente de capilaridade com exclusão percentual sobre a média dos 3 CPs."""
+    valores, participa, a = preparado or _aceitar(_cps_capilaridade(area, m10, m90, limite_pct), criterio, alfa)
+    validos, excluidos = _separar(valores, participa, a)
+    media = a.media_inicial
+    desvios = [(v / media) * 100 if media > 0 else None for v in valores]
+    return _resultado(ENS_CAPILARIDADE, "g/dm²·min^0,5", valores, media, validos, excluidos, 2,
+                      desvios_pct=desvios, **_detalhes_aceite(criterio, alfa, a))
+
+def _cps_retracao(leituras: List[tuple], limite_pct: float):
+    res = []
+    for ini, fim in leituras:
+        if ini > 0: res.append(((fim-ini)/ini)*100)
+        else: res.append(0)
+    # Média zero: desvio relativo considerado nulo (todos ficam)
+    dentro = lambda r, media: (media == 0) | (abs((r - media) / media) <= (limite_pct/100))
+    return res, [True] * len(res), dentro
+
+def regra_retracao(leituras: List[tuple], limite_pct: float, criterio: str = "simples", alfa: float = 0.05,
+                   preparado=None) -> Dict:
+    """Retração (%) com exclusão relativa à média dos 3 CPs."""
+    res, participa, a = preparado or _aceitar(_cps_retracao(leituras, limite_pct), criterio, alfa)
+    validos, excluidos = _separar(res, participa, a)
+    return _resultado(ENS_RETRACAO, "%", res, a.media_inicial, validos, excluidos, 2,
+                      **_detalhes_aceite(criterio, alfa, a))
+
+def regra_permeabilidade(volume_cp: float, inputs_ini: List[float], inputs_fim: List[float]) -> Dict:
+    """Permeabilidade 48h com correção pela perda de massa do testemunho (índice 3)."""
+    if volume_cp <= 0:
+        raise ValueError("Volume inválido.")
+    if any(v == 0 for v in inputs_ini):
+        raise EntradaIncompleta("Preencha as massas iniciais.")
+
+    # Se testemunho perdeu massa (evaporação), somamos essa perda aos CPs
+    perda_testemunho = inputs_ini[3] - inputs_fim[3]
+    correcao = perda_testemunho if perda_testemunho > 0 else 0
+
+    resultados, absorcoes = [], []
+    for i in range(3):
+        ini = inputs_ini[i]
+        fim = inputs_fim[i]
+        if ini > 0:
+            agua_abs = fim - ini
+            resultados.append((agua_abs + correcao) / volume_cp)
+            absorcoes.append(agua_abs)
+        else:
+            resultados.append(0)
+            absorcoes.append(None)
+
+    media = sum(resultados) / 3
+    res = _resultado(ENS_PERMEABILIDADE, "mL/cm³", resultados, media, resultados, [], 1,
+                     correcao=correcao, absorcoes=absorcoes)
+    res["resultado"] = media
+    return res
+
+def _cps_variacao_dimensional(leituras: List[tuple], comp_padrao: float, limite: float):
+    valores_calculados = []
+    for ini, fim in leituras:
+        # Se ambos forem 0, consideramos vazio. Se tiver valor, calculamos.
+        if ini == 0 and fim == 0:
+            valores_calculados.append(None)
+        else:
+            # Fórmula: (Diferença / Base) * 1000
+            valores_calculados.append(((fim - ini) / comp_padrao) * 1000)
+
+    participa = [v is not None for v in valores_calculados]
+    if not any(participa):
+        raise EntradaIncompleta("Preencha as leituras de pelo menos um CP.")
+    return valores_calculados, participa, _faixa_absoluta(limite)
+
+def regra_variacao_dimensional(leituras: List[tuple], comp_padrao: float, limite: float,
+                               criterio: str = "simples", alfa: float = 0.05, preparado=None) -> Dict:
+    """Variação dimensional (mm/m) com exclusão por desvio absoluto da média."""
+    valores_calculados, participa, a = preparado or _aceitar(
+        _cps_variacao_dimensional(leituras, comp_padrao, limite), criterio, alfa)
+    validos, excluidos = _separar(valores_calculados, participa, a)
+    # Desvio Absoluto (Coluna J da planilha)
+    desvios = [abs(val - a.media_inicial) if val is not None else None for val in valores_calculados]
+    return _resultado(ENS_VAR_DIM, "mm/m", valores_calculados, a.media_inicial, validos, excluidos, 2,
+                      desvios=desvios, comprimento_padrao=comp_padrao, **_detalhes_aceite(criterio, alfa, a))
+
+def regra_variacao_massa(leituras: List[tuple]) -> Dict:
+    """Variação de massa (%) de cada CP e média simples."""
+    resultados = []
+    for ini, fin in leituras:
+        if ini > 0:
+            # Cálculo: ((Final - Inicial) / Inicial) * 100
+            resultados.append(((fin - ini) / ini) * 100)
+        else:
+            resultados.append(0.0)
+    media = sum(resultados) / 3
+    res = _resultado(ENS_VAR_MASSA, "%", resultados, media, resultados, [], 1)
+    res["resultado"] = media
+    return res
+
+# ======================== 4. DESPACHO GENÉRICO ========================
+
+# Campos de entrada de cada ensaio (nomes usados nas planilhas importadas e no histórico)
+CAMPOS_ENSAIO = {
+    ENS_RETENCAO: ["tara", "massa_ini", "massa_fim", "agua_ml_kg", "rr", "rt"],
+    ENS_DENSIDADE: ["tara", "massa_bruta", "volume", "dt"],
+    ENS_FLEXAO: ["cps"],
+    ENS_COMPRESSAO_4X4X16: ["cps"],
+    ENS_COMPRESSAO_5X10: ["cps"],
+    ENS_CAPILARIDADE: ["area", "m10", "m90"],
+    ENS_ADERENCIA_AUTO: ["cps"],
+    ENS_ADERENCIA_MANUAL: ["diametro", "cps"],
+    ENS_RETRACAO: ["ini", "fim"],
+    ENS_PERMEABILIDADE: ["volume", "ini", "fim"],
+    ENS_VAR_DIM: ["ini", "fim"],
+    ENS_VAR_MASSA: ["ini", "fim"],
+}
+
+# Campos que podem ficar em zero (balança tarada com o copo; densidade teórica não informada)
+CAMPOS_OPCIONAIS = ("tara", "dt")
+
+def entradas_preenchidas(ensaio: str, entradas: Dict) -> bool:
+    """Se o formulário tem as entradas obrigatórias (não está vazio nem todo em zero).
+
+    Campos numéricos precisam ser diferentes de zero (exceto ``CAMPOS_OPCIONAIS``) e as
+    listas de CPs, ter ao menos uma leitura. Campos ausentes são de outra variante do
+    ensaio (ex: retenção do Basecoat x demais produtos) e não contam.
+    """
+    for campo in CAMPOS_ENSAIO.get(ensaio, []):
+        if campo not in entradas or campo in CAMPOS_OPCIONAIS:
+            continue
+        valor = entradas[campo]
+        if not (any(valor) if isinstance(valor, (list, tuple)) else valor):
+            return False
+    return True
+
+# Quantidade de CPs (posições) de cada ensaio
+N_CPS = {
+    ENS_RETENCAO: 1,
+    ENS_DENSIDADE: 1,
+    ENS_FLEXAO: 3,
+    ENS_COMPRESSAO_4X4X16: 6,
+    ENS_COMPRESSAO_5X10: 6,
+    ENS_CAPILARIDADE: 3,
+    ENS_ADERENCIA_AUTO: 13,
+    ENS_ADERENCIA_MANUAL: 13,
+    ENS_RETRACAO: 3,
+    ENS_PERMEABILIDADE: 4,  # 3 CPs + Testemunho
+    ENS_VAR_DIM: 3,
+    ENS_VAR_MASSA: 3,
+}
+
+# Chaves de CONFIG_LIMITES usadas por cada ensaio em calcular() (rastreadas no histórico
+# para que uma alteração de limite recalcule só os resultados que dependem dela)
+CHAVES_CONFIG = {
+    ENS_RETENCAO: [],
+    ENS_DENSIDADE: [],
+    ENS_FLEXAO: ["flexao_var_max"],
+    ENS_COMPRESSAO_4X4X16: ["compressao_var_max"],
+    ENS_COMPRESSAO_5X10: ["compressao_cilindrica_var_pct"],
+    ENS_CAPILARIDADE: ["capilaridade_var_pct"],
+    ENS_ADERENCIA_AUTO: ["aderencia_var_pct", "min_cps_aderencia"],
+    ENS_ADERENCIA_MANUAL: ["aderencia_var_pct", "min_cps_aderencia"],
+    ENS_RETRACAO: ["retracao_var_pct"],
+    ENS_PERMEABILIDADE: [],
+    ENS_VAR_DIM: ["comprimento_padrao", "variacao_dim_max"],
+    ENS_VAR_MASSA: [],
+}
+
+# Ensaios que excluem CPs: seguem o critério de aceitação do produto
+ENSAIOS_COM_EXCLUSAO = (ENS_FLEXAO, ENS_COMPRESSAO_4X4X16, ENS_COMPRESSAO_5X10, ENS_CAPILARIDADE,
+                        ENS_ADERENCIA_AUTO, ENS_ADERENCIA_MANUAL, ENS_RETRACAO, ENS_VAR_DIM)
+CHAVES_ACEITACAO = ["criterio_aceitacao", "alfa_aceitacao"]
+for _ensaio in ENSAIOS_COM_EXCLUSAO:
+    CHAVES_CONFIG[_ensaio] = CHAVES_CONFIG[_ensaio] + CHAVES_ACEITACAO
+
+# Versão da fórmula de cada ensaio: incrementar sempre que a regra mudar de forma a
+# alterar resultados já gravados (o recálculo reprocessa as versões anteriores)
+VERSOES_FORMULA = {ens: 1 for ens in CHAVES_CONFIG}
+
+def dependencias(ensaio: str, produto: Optional[str], limites: Optional[Dict] = None) -> Dict:
+    """Valores das chaves de configuração usadas pelo ensaio para o produto ({chave: valor})."""
+    lim = limites if limites is not None else limites_produto(produto)
+    return {chave: lim.get(chave) for chave in CHAVES_CONFIG.get(ensaio, [])}
+
+def origem_limites(ensaio: str, limites: Limites) -> str:
+    """Camadas de onde vieram os limites usados pelo ensaio (ex: "padrão, Revestimento, cliente X")."""
+    usadas = {limites.origem.get(chave) for chave in CHAVES_CONFIG.get(ensaio, [])}
+    return ", ".join(c for c in limites.camadas if c in usadas)
+
+def opcoes_aceitacao(ensaio: str, produto: Optional[str], limites: Optional[Dict] = None) -> Dict:
+    """Argumentos do critério de aceitação para a regra do ensaio ({} se o ensaio não exclui CPs)."""
+    if ensaio not in ENSAIOS_COM_EXCLUSAO:
+        return {}
+    lim = limites if limites is not None else limites_produto(produto)
+    return {"criterio": lim.get("criterio_aceitacao") or "simples", "alfa": lim.get("alfa_aceitacao") or 0.05}
+
+def _lista(entradas: Dict, campo: str, n: int) -> List[float]:
+    """Lê uma lista de CPs das entradas, completando com zeros até n posições."""
+    vals = [float(v or 0) for v in (entradas.get(campo) or [])][:n]
+    return vals + [0.0] * (n - len(vals))
+
+def _chamada(ensaio: str, entradas: Dict, produto: Optional[str], lim: Dict) -> Tuple:
+    """(regra, argumentos) do ensaio a partir de um dicionário de entradas (ver CAMPOS_ENSAIO)."""
+    n = N_CPS[ensaio]
+    e = entradas
+
+    if ensaio == ENS_RETENCAO:
+        if produto == "Basecoat":
+            return regra_retencao_basecoat, (e.get("tara", 0), e.get("massa_ini", 0),
+                                             e.get("massa_fim", 0), e.get("agua_ml_kg", 0))
+        return regra_retencao_simples, (e.get("rr", 0), e.get("rt", 0))
+    if ensaio == ENS_DENSIDADE:
+        return regra_densidade, (e.get("tara", 0), e.get("massa_bruta", 0), e.get("volume", 0), e.get("dt", 0) or 0)
+    if ensaio == ENS_FLEXAO:
+        return regra_flexao, (_lista(e, "cps", n), lim["flexao_var_max"])
+    if ensaio == ENS_COMPRESSAO_4X4X16:
+        return regra_compressao_4x4x16, (_lista(e, "cps", n), lim["compressao_var_max"])
+    if ensaio == ENS_COMPRESSAO_5X10:
+        return regra_compressao_5x10, (_lista(e, "cps", n), lim["compressao_cilindrica_var_pct"] or 6.0)
+    if ensaio == ENS_CAPILARIDADE:
+        return regra_capilaridade, (e.get("area", 16.0), _lista(e, "m10", n), _lista(e, "m90", n),
+                                    lim["capilaridade_var_pct"])
+    if ensaio == ENS_ADERENCIA_AUTO:
+        return regra_aderencia, (_lista(e, "cps", n), lim["aderencia_var_pct"], lim["min_cps_aderencia"])
+    if ensaio == ENS_ADERENCIA_MANUAL:
+        return regra_aderencia_manual, (_lista(e, "cps", n), e.get("diametro", 50.0),
+                                        lim["aderencia_var_pct"], lim["min_cps_aderencia"])
+    if ensaio == ENS_RETRACAO:
+        return regra_retracao, (list(zip(_lista(e, "ini", n), _lista(e, "fim", n))), lim["retracao_var_pct"])
+    if ensaio == ENS_PERMEABILIDADE:
+        return regra_permeabilidade, (e.get("volume", 400.0), _lista(e, "ini", n), _lista(e, "fim", n))
+    if ensaio == ENS_VAR_DIM:
+        return regra_variacao_dimensional, (list(zip(_lista(e, "ini", n), _lista(e, "fim", n))),
+                                            lim["comprimento_padrao"] or 250.0, lim["variacao_dim_max"] or 0.20)
+    if ensaio == ENS_VAR_MASSA:
+        return regra_variacao_massa, (list(zip(_lista(e, "ini", n), _lista(e, "fim", n))),)
+    raise ValueError(f"Ensaio desconhecido: {ensaio}")
+
+def calcular(ensaio: str, entradas: Dict, produto: Optional[str], limites: Optional[Dict] = None) -> Dict:
+    """Executa a regra do ensaio a partir de um dicionário de entradas (ver CAMPOS_ENSAIO)."""
+    lim = limites if limites is not None else limites_produto(produto)
+    regra, args = _chamada(ensaio, entradas, produto, lim)
+    return regra(*args, **opcoes_aceitacao(ensaio, produto, lim))
+
+# Montagem dos CPs de cada regra com exclusão (mesmos argumentos da regra)
+_CPS_DA_REGRA = {
+    regra_flexao: _cps_flexao,
+    regra_compressao_4x4x16: _cps_compressao_4x4x16,
+    regra_compressao_5x10: _cps_faixa_percentual,
+    regra_aderencia: _cps_aderencia,
+    regra_aderencia_manual: _cps_aderencia_manual,
+    regra_capilaridade: _cps_capilaridade,
+    regra_retracao: _cps_retracao,
+    regra_variacao_dimensional: _cps_variacao_dimensional,
+}
+
+# Erros de entrada de um lote (o lote é relatado, o bloco continua)
+ERROS_CALCULO = (ValueError, KeyError, IndexError, ZeroDivisionError)
+
+def calcular_bloco(ensaio: str, lista_entradas: List[Dict], produto: Optional[str],
+                   limites: Optional[Dict] = None) -> List:
+    """``calcular`` para muitos lotes do mesmo produto e ensaio (reprocessamento em bloco).
+
+    O critério de aceitação roda uma única vez, vetorizado sobre todos os lotes; o
+    resto de cada regra é o mesmo da calculadora. Retorna, na ordem das entradas, o
+    resultado de cada lote ou a exceção que ``calcular`` levantaria para ele.
+    """
+    lim = limites if limites is not None else limites_produto(produto)
+    opcoes = opcoes_aceitacao(ensaio, produto, lim)
+    saida: List = [None] * len(lista_entradas)
+    pendentes = []  # (posição, regra, args, valores, participa)
+    dentro = None
+    for i, entradas in enumerate(lista_entradas):
+        try:
+            regra, args = _chamada(ensaio, entradas, produto, lim)
+            if not opcoes:
+                saida[i] = regra(*args)
+                continue
+            valores, participa, dentro = _CPS_DA_REGRA[regra](*args)
+            pendentes.append((i, regra, args, valores, participa))
+        except ERROS_CALCULO as e:
+            saida[i] = e
+    if not pendentes:
+        return saida
+
+    import aceitacao  # numpy
+
+    # Todos os lotes têm N_CPS[ensaio] posições (CP vazio = None -> NaN, fora da máscara);
+    # faixa e critério dependem só dos limites, iguais para todo o bloco
+    aceites = aceitacao.aceitar([p[3] for p in pendentes], [p[4] for p in pendentes], dentro, **opcoes)
+    for (i, regra, args, valores, participa), aceite in zip(pendentes, aceites.linhas()):
+        try:
+            saida[i] = regra(*args, preparado=(valores, participa, aceite), **opcoes)
+        except ERROS_CALCULO as e:
+            saida[i] = e
+    return saida
+
+# ======================== 5. MEMÓRIA DE CÁLCULO ========================
+
+def _linha_latex(p: Dict) -> str:
+    substituida = p["substituicao"].format(**p["valores"])
+    unidade = p["unidade"].replace("%", r"\%")  # % abre comentário no LaTeX
+    unidade = rf"\ \text{{{unidade}}}" if unidade else ""
+    return f"{p['formula']} = {substituida} = {p['resultado']:.{p['casas']}f}{unidade}"
+
+@lru_cache(maxsize=1024)
+def _memoria_formatada(serializada: str) -> Tuple[Tuple[str, str], ...]:
+    return tuple((p["descricao"], _linha_latex(p)) for p in json.loads(serializada))
+
+def memoria_latex(memoria: List[Dict]) -> Tuple[Tuple[str, str], ...]:
+    """(descrição, LaTeX) de cada passo; formatado uma vez por resultado (cache pelo conteúdo)."""
+    return _memoria_formatada(json.dumps(memoria, sort_keys=True))
+
+def memoria_markdown(memoria: List[Dict], titulo: str = "Memória de Cálculo") -> str:
+    """Memória de cálculo em Markdown (fórmulas em $$...$$) para exportação."""
+    linhas = [f"# {titulo}", ""]
+    for descricao, latex in memoria_latex(memoria):
+        linhas += [f"**{descricao}**", "", f"$${latex}$$", ""]
+    return "\n".join(linhas)
@@ -0,0 +1,185 @@
+"""Etiquetas dos corpos de prova (código de barras / QR) e leitura por scanner.
+
+Cada CP moldado recebe um código curto e estável (derivado de lote, requisito,
+idade e posição), impresso como QR ou código de barras. A leitura resolve o código
+por um índice em memória (dicionário, O(1)), carregado em segundo plano; o banco
+só é consultado (pela chave primária) enquanto o índice carrega ou para um código
+gerado por outro processo. O resultado da leitura diz
+qual calculadora abrir (``linha::slugify(requisito)``), o lote e a posição do CP.
+
+A imagem QR usa o pacote opcional ``qrcode``; sem ele, o código em texto continua
+funcionando com leitores de código de barras (Code 128 / Code 39 impressos pela
+própria impressora de etiquetas).
+"""
+import base64
+import hashlib
+import io
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+import ensaios
+import historico
+from agenda import IDADES_ENSAIO
+from ensaios import REQUISITOS, slugify
+
+_log = logging.getLogger(__name__)
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS etiquetas (
+    codigo     TEXT PRIMARY KEY,
+    lote       TEXT NOT NULL,
+    produto    TEXT NOT NULL,
+    requisito  TEXT NOT NULL,
+    ensaio     TEXT NOT NULL,
+    idade_dias INTEGER,
+    posicao    INTEGER NOT NULL,
+    criado_em  TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS ix_etiquetas_lote ON etiquetas (lote);
+"""
+
+historico.registrar_esquema(_ESQUEMA)
+
+PREFIXO = "CP"
+
+# Novos códigos tentados quando o de um CP já pertence a outro (colisão do hash de 48 bits)
+MAX_TENTATIVAS = 8
+
+def codigo_cp(lote: str, requisito: str, idade_dias: Optional[int], posicao: int, tentativa: int = 0) -> str:
+    """Código estável do CP (reimprimir a etiqueta gera o mesmo código).
+
+    ``tentativa`` > 0 gera os códigos alternativos usados em caso de colisão; a sequência
+    é determinística, então a reimpressão chega ao mesmo código.
+    """
+    chave = f"{lote}|{slugify(requisito)}|{idade_dias or 0}|{posicao}"
+    if tentativa:
+        chave += f"|{tentativa}"
+    resumo = hashlib.blake2b(chave.encode("utf-8"), digest_size=6).digest()
+    return PREFIXO + base64.b32encode(resumo).decode("ascii").rstrip("=")
+
+_CP = ("lote", "requisito", "idade_dias", "posicao")
+
+def _gravar(conn, item: Dict) -> Dict:
+    """Grava a etiqueta; se o código já é de outro CP, tenta os alternativos até achar um livre ou o próprio."""
+    for tentativa in range(MAX_TENTATIVAS):
+        if tentativa:
+            item = dict(item, codigo=codigo_cp(item["lote"], item["requisito"], item["idade_dias"],
+                                               item["posicao"], tentativa))
+        cur = conn.execute(
+            "INSERT OR IGNORE INTO etiquetas VALUES "
+            "(:codigo, :lote, :produto, :requisito, :ensaio, :idade_dias, :posicao, :criado_em)", item)
+        if cur.rowcount:
+            return item
+        existente = conn.execute(f"SELECT {', '.join(_CP)} FROM etiquetas WHERE codigo = ?",
+                                 (item["codigo"],)).fetchone()
+        if tuple(existente) == tuple(item[c] for c in _CP):
+            return item  # Reimpressão: a etiqueta já é deste CP
+        _log.warning("Código %s já pertence a outro CP; gerando outro para %s", item["codigo"],
+                     "/".join(str(item[c]) for c in _CP))
+    raise RuntimeError(f"Sem código livre para o CP {item['lote']} {item['requisito']} posição {item['posicao']}.")
+
+def normalizar(codigo: str) -> str:
+    """Remove espaços/quebras que o scanner envia e padroniza maiúsculas."""
+    return "".join(codigo.split()).upper()
+
+# ======================== 1. GERAÇÃO ========================
+
+def etiquetas_do_lote(lote: str, produto: str, requisitos: Optional[Sequence[str]] = None) -> List[Dict]:
+    """Uma etiqueta por CP de cada ensaio com cura (e por idade, já que cada idade usa CPs próprios)."""
+    agora = datetime.now().isoformat(timespec="seconds")
+    saida = []
+    for req in requisitos or REQUISITOS.get(produto, []):
+        ensaio = ensaios.identificar_ensaio(produto, req)
+        for idade in IDADES_ENSAIO.get(ensaio, []):
+            for pos in range(ensaios.N_CPS[ensaio]):
+                saida.append({
+                    "codigo": codigo_cp(lote, req, idade, pos), "lote": lote, "produto": produto,
+                    "requisito": req, "ensaio": ensaio, "idade_dias": idade, "posicao": pos, "criado_em": agora,
+                })
+    return saida
+
+def gerar(lote: str, produto: str, requisitos: Optional[Sequence[str]] = None, conn=None) -> List[Dict]:
+    """Grava (ou reaproveita) as etiquetas do lote e as inclui no índice de leitura."""
+    conn = conn or historico.conectar()
+    itens = etiquetas_do_lote(lote, produto, requisitos)
+    with conn:
+        itens = [_gravar(conn, item) for item in itens]
+    _indice.incluir(itens)
+    return itens
+
+def listar_por_lote(lote: str, conn=None) -> List[Dict]:
+    conn = conn or historico.conectar()
+    return [dict(r) for r in conn.execute(
+        "SELECT * FROM etiquetas WHERE lote = ? ORDER BY requisito, idade_dias, posicao", (lote,))]
+
+# ======================== 2. LEITURA (ÍNDICE EM MEMÓRIA) ========================
+
+class IndiceEtiquetas:
+    """Dicionário código -> etiqueta compartilhado pelo processo (carregado em segundo plano)."""
+
+    def __init__(self):
+        self._por_codigo: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self.pronto = False
+
+    def incluir(self, itens: Sequence[Dict]):
+        with self._lock:
+            for item in itens:
+                self._por_codigo[item["codigo"]] = item
+
+    def carregar(self, conn=None):
+        conn = conn or historico.conectar()
+        itens = [dict(r) for r in conn.execute("SELECT * FROM etiquetas")]
+        with self._lock:
+            for item in itens:
+                self._por_codigo.setdefault(item["codigo"], item)
+        self.pronto = True
+
+    def resolver(self, codigo: str, conn=None) -> Optional[Dict]:
+        codigo = normalizar(codigo)
+        item = self._por_codigo.get(codigo)
+        if item is None:
+            # Ainda não carregada (ou gerada por outro processo): busca pela chave primária
+            linha = (conn or historico.conectar()).execute(
+                "SELECT * FROM etiquetas WHERE codigo = ?", (codigo,)).fetchone()
+            if linha is not None:
+                item = dict(linha)
+                self.incluir([item])
+        return item
+
+_indice = IndiceEtiquetas()
+_carga_iniciada = threading.Lock()
+
+def aquecer():
+    """Carrega o índice em segundo plano na primeira chamada (não bloqueia a página)."""
+    if _indice.pronto or not _carga_iniciada.acquire(blocking=False):
+        return
+    def _carregar():
+        try:
+            _indice.carregar(historico.conectar())
+        except Exception:
+            _log.exception("Falha ao carregar o índice de etiquetas")
+    threading.Thread(target=_carregar, name="etiquetas-carga", daemon=True).start()
+
+def resolver(codigo: str) -> Optional[Dict]:
+    """Etiqueta do código lido (ou None se desconhecido)."""
+    return _indice.resolver(codigo)
+
+def destino(item: Dict) -> str:
+    """ID da página da calculadora do CP (mesmo formato do roteador)."""
+    return f"{item['produto']}::{slugify(item['requisito'])}"
+
+# ======================== 3. IMAGEM QR ========================
+
+def qr_png(codigo: str, tamanho_modulo: int = 4) -> bytes:
+    """Imagem PNG do QR code da etiqueta (requer o pacote opcional ``qrcode``)."""
+    try:
+        import qrcode
+    except ImportError:
+        raise RuntimeError("A imagem QR requer o pacote 'qrcode' (pip install qrcode[pil]).")
+    img = qrcode.make(codigo, box_size=tamanho_modulo, border=2)
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
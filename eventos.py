@@ -0,0 +1,214 @@
+"""Barramento de eventos em memória para o monitor ao vivo do laboratório.
+
+Cada resultado gravado no histórico (ouvinte após o commit) é publicado como um
+evento pequeno. Telas de monitor assinam o barramento e recebem só as novidades,
+sem consultar o banco: a página "Monitor" do app (fragmento que drena a própria
+assinatura) e, opcionalmente, um endpoint SSE (``text/event-stream``) para telas
+de parede fora do Streamlit.
+
+Contrapressão: quem publica nunca espera. Cada assinatura tem uma fila limitada
+que agrupa eventos pela chave (lote, requisito) — um recálculo substitui o
+evento anterior ainda não entregue — e, se mesmo assim encher, descarta os mais
+antigos (contados em ``descartados``). Um laboratório movimentado não trava nem
+afoga uma tela lenta; a tela lenta só vê o estado mais recente de cada ensaio.
+Assinaturas que param de coletar (sessão fechada) são removidas sozinhas.
+
+SSE: com ``CALCULADORA_SSE_PORTA`` definida, o app sobe o servidor na primeira
+execução (``GET /eventos?produto=Graute&reprovados=1``; aceita ``Last-Event-ID``).
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+_log = logging.getLogger(__name__)
+
+CAPACIDADE = 256
+RECENTES = 500
+# Assinatura sem coleta por mais que isso é considerada abandonada
+INATIVA_SEGUNDOS = 120
+
+# ======================== 1. BARRAMENTO ========================
+
+class Assinatura:
+    """Fila limitada de um assinante, com agrupamento por chave e descarte dos mais antigos."""
+
+    def __init__(self, filtro: Optional[Callable[[Dict], bool]] = None, capacidade: int = CAPACIDADE):
+        self.filtro, self.capacidade = filtro, capacidade
+        self._pendentes: "OrderedDict[tuple, Dict]" = OrderedDict()
+        self._cond = threading.Condition()
+        self.ultima_coleta = time.monotonic()
+        self.entregues = self.agrupados = self.descartados = 0
+        self.fechada = False
+
+    def _oferecer(self, evento: Dict):
+        if self.filtro is not None and not self.filtro(evento):
+            return
+        chave = (evento.get("lote") or evento["id"], evento["requisito"])
+        with self._cond:
+            if chave in self._pendentes:
+                del self._pendentes[chave]  # reentra no fim, com o valor mais novo
+                self.agrupados += 1
+            elif len(self._pendentes) >= self.capacidade:
+                self._pendentes.popitem(last=False)
+                self.descartados += 1
+            self._pendentes[chave] = evento
+            self._cond.notify()
+
+    def coletar(self, espera: Optional[float] = 0, maximo: Optional[int] = None) -> List[Dict]:
+        """Retira os eventos pendentes (em ordem de chegada); espera até ``espera`` s se vazia."""
+        with self._cond:
+            self.ultima_coleta = time.monotonic()
+            if not self._pendentes and espera:
+                self._cond.wait(espera)
+            saida = []
+            while self._pendentes and (maximo is None or len(saida) < maximo):
+                saida.append(self._pendentes.popitem(last=False)[1])
+            self.entregues += len(saida)
+            self.ultima_coleta = time.monotonic()
+            return saida
+
+    def fechar(self):
+        with self._cond:
+            self.fechada = True
+            self._cond.notify_all()
+
+    def estatisticas(self) -> Dict:
+        with self._cond:
+            return {"pendentes": len(self._pendentes), "entregues": self.entregues,
+                    "agrupados": self.agrupados, "descartados": self.descartados}
+
+class Barramento:
+    """Publica eventos para todas as assinaturas do processo (sem bloquear quem publica)."""
+
+    def __init__(self, recentes: int = RECENTES, inativa_apos: float = INATIVA_SEGUNDOS):
+        self.inativa_apos = inativa_apos
+        self._assinaturas: List[Assinatura] = []
+        self._recentes: deque = deque(maxlen=recentes)
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def assinar(self, filtro: Optional[Callable[[Dict], bool]] = None, capacidade: int = CAPACIDADE,
+                desde: Optional[int] = None) -> Assinatura:
+        """Nova assinatura; com ``desde``, já recebe os eventos recentes com seq maior."""
+        assinatura = Assinatura(filtro, capacidade)
+        with self._lock:
+            self._assinaturas.append(assinatura)
+            anteriores = [e for e in self._recentes if desde is not None and e["seq"] > desde]
+        for evento in anteriores:
+            assinatura._oferecer(evento)
+        return assinatura
+
+    def publicar(self, evento: Dict) -> Dict:
+        agora = time.monotonic()
+        with self._lock:
+            self._seq += 1
+            evento = dict(evento, seq=self._seq)
+            self._recentes.append(evento)
+            ativas = [a for a in self._assinaturas
+                      if not a.fechada and agora - a.ultima_coleta <= self.inativa_apos]
+            self._assinaturas = ativas
+        for assinatura in ativas:
+            assinatura._oferecer(evento)
+        return evento
+
+    def recentes(self, n: int = 50, filtro: Optional[Callable[[Dict], bool]] = None) -> List[Dict]:
+        """Últimos eventos publicados (mais novos por último), para montar a tela inicial."""
+        with self._lock:
+            eventos = list(self._recentes)
+        if filtro is not None:
+            eventos = [e for e in eventos if filtro(e)]
+        return eventos[-n:]
+
+    def assinantes(self) -> int:
+        with self._lock:
+            return len(self._assinaturas)
+
+_barramento = Barramento()
+
+def barramento() -> Barramento:
+    """Barramento compartilhado pelo processo (todas as sessões e o SSE)."""
+    return _barramento
+
+# ======================== 2. PUBLICAÇÃO DOS RESULTADOS ========================
+
+def evento_do_registro(registro: Dict, id_: int) -> Dict:
+    """Resumo do resultado gravado (só o necessário para as telas)."""
+    return {
+        "id": id_, "lote": registro.get("lote"), "produto": registro["produto"],
+        "requisito": registro["requisito"], "ensaio": registro["ensaio"],
+        "resultado": registro["resultado"], "valido": bool(registro["valido"]),
+        "excluidos": json.loads(registro["excluidos"]), "operador": registro.get("operador"),
+        "criado_em": registro["criado_em"], "limites": json.loads(registro.get("config") or "{}"),
+    }
+
+def ao_gravar(registro: Dict, id_: int):
+    _barramento.publicar(evento_do_registro(registro, id_))
+
+
+def filtro(produto: Optional[str] = None, so_reprovados: bool = False) -> Optional[Callable[[Dict], bool]]:
+    if not produto and not so_reprovados:
+        return None
+    return lambda e: (not produto or e["produto"] == produto) and (not so_reprovados or not e["valido"])
+
+# ======================== 3. ENDPOINT SSE (OPCIONAL) ========================
+
+class _TratadorSSE(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    espera_keepalive = 15.0
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != "/eventos":
+            self.send_error(404)
+            return
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        ultimo = self.headers.get("Last-Event-ID")
+        assinatura = _barramento.assinar(
+            filtro(params.get("produto"), params.get("reprovados") == "1"),
+            desde=int(ultimo) if ultimo and ultimo.isdigit() else None,
+        )
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        try:
+            while True:
+                eventos = assinatura.coletar(espera=self.espera_keepalive, maximo=100)
+                if eventos:
+                    corpo = "".join(f"id: {e['seq']}\nevent: resultado\ndata: {json.dumps(e, ensure_ascii=False)}\n\n"
+                                    for e in eventos)
+                else:
+                    corpo = ": keepalive\n\n"  # mantém proxies abertos e detecta a tela desconectada
+                self.wfile.write(corpo.encode("utf-8"))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            assinatura.fechar()
+
+    def log_message(self, formato, *args):
+        _log.debug("SSE %s - " + formato, self.client_address[0], *args)
+
+_servidor_iniciado = threading.Lock()
+
+def iniciar_sse(porta: Optional[int] = None, endereco: str = "0.0.0.0") -> bool:
+    """Sobe o servidor SSE em segundo plano uma única vez (porta de ``CALCULADORA_SSE_PORTA``)."""
+    porta = porta or int(os.environ.get("CALCULADORA_SSE_PORTA") or 0)
+    if not porta or not _servidor_iniciado.acquire(blocking=False):
+        return False
+    try:
+        servidor = ThreadingHTTPServer((endereco, porta), _TratadorSSE)
+    except OSError:
+        _log.exception("Não foi possível abrir o SSE na porta %s", porta)
+        return False
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, name="eventos-sse", daemon=True).start()
+    _log.info("Monitor SSE em http://%s:%s/eventos", endereco, porta)
+    return True
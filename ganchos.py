@@ -0,0 +1,46 @@
+"""Ganchos de gravação do histórico, registrados em um só lugar e em ordem fixa.
+
+Todo ponto de entrada que grava resultados (app, importador, recálculo, simulação
+do LIMS) chama ``registrar()`` antes de gravar. Assim um resultado tem os mesmos
+efeitos no banco venha de onde vier (indicadores, baixa na agenda, pares da
+previsão, alertas de anomalia, caixa de saída do LIMS), sem depender de quais módulos o ponto de entrada
+importou.
+
+A ordem dos ganchos de transação importa: a previsão lê a idade do resultado no item
+da agenda que a baixa acabou de marcar com o id dele. Os ouvintes após o commit só
+mexem em estado do próprio processo (modelos em memória, remetente do LIMS, índice
+de anomalias, barramento das telas, cache da consulta do histórico).
+"""
+import agenda
+import anomalias
+import consulta
+import eventos
+import historico
+import indicadores
+import lims
+import previsao
+
+# Rodam dentro da transação do resultado, nesta ordem
+GANCHOS_TRANSACAO = (
+    indicadores.acumular,
+    agenda.baixar,
+    previsao.aprender,
+    anomalias.marcar,
+    lims.enfileirar,
+)
+
+# Rodam após o commit
+OUVINTES = (
+    previsao.publicar,
+    lims.acordar,
+    anomalias.ao_gravar,
+    eventos.ao_gravar,
+    consulta.nova_geracao,
+)
+
+def registrar():
+    """Registra todos os ganchos no histórico (idempotente: pode ser chamado a cada execução)."""
+    for gancho in GANCHOS_TRANSACAO:
+        historico.registrar_gancho(gancho, transacao=True)
+    for ouvinte in OUVINTES:
+        historico.registrar_gancho(ouvinte)
@@ -0,0 +1,206 @@
+"""Histórico de resultados dos ensaios (SQLite local).
+
+Guarda cada cálculo (entradas, valores por CP, exclusões e resultado final) para
+consultas posteriores e para as rotinas em lote. O banco fica em
+``dados/historico.db`` (ou no caminho da variável ``CALCULADORA_BANCO``).
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional
+
+import ensaios
+
+_log = logging.getLogger(__name__)
+
+CAMINHO_BANCO = os.environ.get(
+    "CALCULADORA_BANCO",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "dados", "historico.db"),
+)
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS resultados (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    lote          TEXT,
+    produto       TEXT NOT NULL,
+    requisito     TEXT NOT NULL,
+    ensaio        TEXT NOT NULL,
+    entradas      TEXT NOT NULL,
+    valores       TEXT NOT NULL,
+    excluidos     TEXT NOT NULL,
+    media_inicial REAL,
+    resultado     REAL,
+    valido        INTEGER NOT NULL,
+    operador      TEXT,
+    origem        TEXT NOT NULL DEFAULT 'app',
+    criado_em     TEXT NOT NULL,
+    config        TEXT,
+    versao_formula INTEGER,
+    cliente       TEXT,
+    limites_aplicados TEXT,
+    alertas       TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_resultados_produto_ensaio ON resultados (produto, ensaio);
+CREATE INDEX IF NOT EXISTS ix_resultados_lote_ensaio ON resultados (lote, ensaio);
+"""
+
+# Colunas acrescentadas depois da primeira versão do banco (aplicadas em bancos antigos)
+_MIGRACOES = {
+    "config": "ALTER TABLE resultados ADD COLUMN config TEXT",
+    "versao_formula": "ALTER TABLE resultados ADD COLUMN versao_formula INTEGER",
+    "cliente": "ALTER TABLE resultados ADD COLUMN cliente TEXT",
+    "limites_aplicados": "ALTER TABLE resultados ADD COLUMN limites_aplicados TEXT",
+    "alertas": "ALTER TABLE resultados ADD COLUMN alertas TEXT",
+}
+
+def _colunas_faltando(conn: sqlite3.Connection) -> List[str]:
+    existentes = {linha[1] for linha in conn.execute("PRAGMA table_info(resultados)")}
+    return [coluna for coluna in _MIGRACOES if coluna not in existentes]
+
+def _migrar(conn: sqlite3.Connection):
+    """Acrescenta as colunas que faltam; seguro com várias threads abrindo o banco juntas.
+
+    A lista é relida depois de ``BEGIN IMMEDIATE`` (trava de escrita): outra conexão
+    pode ter migrado entre a primeira leitura e a trava.
+    """
+    if not _colunas_faltando(conn):
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for coluna in _colunas_faltando(conn):
+            conn.execute(_MIGRACOES[coluna])
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+# Tabelas de outros módulos (agregados, índices auxiliares) criadas junto com o esquema.
+# Devem ser registradas na importação do módulo, antes da primeira conexão.
+_ESQUEMAS_EXTRAS: List[str] = []
+
+def registrar_esquema(sql: str):
+    """Registra DDL adicional a ser aplicado em cada conexão aberta (idempotente)."""
+    if sql not in _ESQUEMAS_EXTRAS:
+        _ESQUEMAS_EXTRAS.append(sql)
+
+# Uma conexão por thread (o Streamlit atende cada sessão em uma thread própria)
+_local = threading.local()
+
+def conectar(caminho: Optional[str] = None) -> sqlite3.Connection:
+    """Abre (ou reaproveita nesta thread) a conexão com o banco do histórico."""
+    caminho = caminho or CAMINHO_BANCO
+    conexoes = getattr(_local, "conexoes", None)
+    if conexoes is None:
+        conexoes = _local.conexoes = {}
+    conn = conexoes.get(caminho)
+    if conn is None:
+        if caminho != ":memory:":
+            os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+        conn = sqlite3.connect(caminho, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_ESQUEMA)
+        _migrar(conn)
+        for sql in _ESQUEMAS_EXTRAS:
+            conn.executescript(sql)
+        conexoes[caminho] = conn
+    return conn
+
+def montar_registro(produto: str, requisito: str, ensaio: str, entradas: Dict, res: Dict,
+                    lote: Optional[str] = None, operador: Optional[str] = None,
+                    origem: str = "app", criado_em: Optional[str] = None,
+                    cliente: Optional[str] = None) -> Dict:
+    """Converte a saída de uma regra (ver ensaios.calcular) em uma linha do histórico.
+
+    Registra também os limites usados (``config``), as camadas de onde vieram (padrão,
+    produto, fábrica, cliente) e a versão da fórmula, que o recálculo incremental (ver
+    recalculo.py) compara com a configuração atual.
+    """
+    limites = ensaios.limites_produto(produto, cliente=cliente)
+    return {
+        "lote": lote,
+        "produto": produto,
+        "requisito": requisito,
+        "ensaio": ensaio,
+        "entradas": json.dumps(entradas, ensure_ascii=False),
+        "valores": json.dumps(res["valores"]),
+        "excluidos": json.dumps(res["excluidos"]),
+        "media_inicial": res["media_inicial"],
+        "resultado": res["resultado"],
+        "valido": int(bool(res["valido"])),
+        "operador": operador,
+        "origem": origem,
+        "criado_em": criado_em or datetime.now().isoformat(timespec="seconds"),
+        "config": serializar_config(ensaios.dependencias(ensaio, produto, limites)),
+        "versao_formula": ensaios.VERSOES_FORMULA.get(ensaio),
+        "cliente": cliente,
+        "limites_aplicados": ensaios.origem_limites(ensaio, limites),
+    }
+
+def serializar_config(dependencias: Dict) -> str:
+    """Forma canônica (chaves ordenadas) dos limites usados, comparável por igualdade."""
+    return json.dumps(dependencias, sort_keys=True)
+
+_COLUNAS = ("lote", "produto", "requisito", "ensaio", "entradas", "valores", "excluidos",
+            "media_inicial", "resultado", "valido", "operador", "origem", "criado_em",
+            "config", "versao_formula", "cliente", "limites_aplicados")
+_SQL_INSERIR = (f"INSERT INTO resultados ({', '.join(_COLUNAS)}) "
+                f"VALUES ({', '.join(':' + c for c in _COLUNAS)})")
+
+# Ganchos de gravação: os de transação rodam antes do commit (mesma transação do
+# resultado) e recebem (conn, registro, id); os ouvintes rodam após o commit e
+# recebem (registro, id). Usados para índices, agregados e integrações; todos são
+# registrados em ganchos.py, chamado por cada ponto de entrada que grava.
+_GANCHOS_TRANSACAO: List[Callable] = []
+_OUVINTES: List[Callable] = []
+
+def registrar_gancho(funcao: Callable, transacao: bool = False):
+    """Registra uma função a ser chamada a cada resultado gravado (idempotente)."""
+    lista = _GANCHOS_TRANSACAO if transacao else _OUVINTES
+    if funcao not in lista:
+        lista.append(funcao)
+
+def _notificar(gravados: List[tuple]):
+    """Chama os ouvintes após o commit; falha em um ouvinte não desfaz a gravação."""
+    for registro, id_ in gravados:
+        for ouvinte in _OUVINTES:
+            try:
+                ouvinte(registro, id_)
+            except Exception:
+                _log.exception("Falha no ouvinte %r do histórico", ouvinte)
+
+def salvar_resultado(registro: Dict, conn: Optional[sqlite3.Connection] = None) -> int:
+    """Grava um resultado e retorna o id gerado."""
+    conn = conn or conectar()
+    with conn:
+        cur = conn.execute(_SQL_INSERIR, registro)
+        for gancho in _GANCHOS_TRANSACAO:
+            gancho(conn, registro, cur.lastrowid)
+    _notificar([(registro, cur.lastrowid)])
+    return cur.lastrowid
+
+def salvar_resultados(registros: Iterable[Dict], conn: Optional[sqlite3.Connection] = None) -> int:
+    """Grava vários resultados em uma única transação (usado nas importações em lote)."""
+    conn = conn or conectar()
+    registros = list(registros)
+    gravados = []
+    with conn:
+        if not _GANCHOS_TRANSACAO and not _OUVINTES:
+            conn.executemany(_SQL_INSERIR, registros)
+        else:
+            for registro in registros:
+                cur = conn.execute(_SQL_INSERIR, registro)
+                for gancho in _GANCHOS_TRANSACAO:
+                    gancho(conn, registro, cur.lastrowid)
+                gravados.append((registro, cur.lastrowid))
+    _notificar(gravados)
+    return len(registros)
+
+def listar_por_lote(lote: str, conn: Optional[sqlite3.Connection] = None) -> List[sqlite3.Row]:
+    """Retorna os resultados de um lote, do mais antigo para o mais recente."""
+    conn = conn or conectar()
+    return conn.execute("SELECT * FROM resultados WHERE lote = ? ORDER BY id", (lote,)).fetchall()
@@ -0,0 +1,363 @@
+"""Importação em lote das planilhas históricas do laboratório.
+
+Lê as pastas de trabalho (.xlsx) em modo somente leitura, mapeia as colunas de
+cada aba para as entradas dos ensaios do app, recalcula cada lote com as mesmas
+regras das calculadoras (ensaios.py) e aponta as divergências com o valor que
+estava na planilha. As planilhas são processadas em paralelo (ProcessPool).
+
+Uso:
+    python importador.py PASTA_OU_ARQUIVOS... [--workers N] [--salvar] [--relatorio divergencias.csv]
+
+Convenções esperadas nas planilhas:
+    * O produto vem do nome do arquivo ou da pasta (ex: ``Graute/2019.xlsx``).
+    * Cada aba é um ensaio (ex: "Flexão", "Compressão 5x10", "Retenção de Água").
+    * A primeira linha com uma coluna "Lote" é o cabeçalho; colunas como
+      "CP 1".."CP 13", "Tara", "Inicial CP1", "Final CP1", "10min CP1" e
+      "Resultado"/"Média Final" são reconhecidas automaticamente.
+"""
+import argparse
+import csv
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+import ensaios
+import ganchos
+import historico
+from ensaios import EntradaIncompleta, norm
+
+# ======================== 1. MAPEAMENTO DE COLUNAS ========================
+
+# (padrão do cabeçalho normalizado, campo, é lista?) — a ordem importa: o primeiro que casar vence
+PADROES_COLUNAS = [
+    (r"^lote$|^lote n|^n lote", "lote", False),
+    (r"^data", "data", False),
+    (r"^operador|^tecnico|^laboratorista", "operador", False),
+    (r"^resultado|^media final|^resultado final", "resultado_planilha", False),
+    (r"^arg tara inicial|^massa inicial arg|^massa ini$", "massa_ini", False),
+    (r"^arg tara final|^massa final arg|^massa fim$", "massa_fim", False),
+    (r"^agua ml kg|^agua$|^relacao agua", "agua_ml_kg", False),
+    (r"^massa copo amostra|^massa bruta", "massa_bruta", False),
+    (r"^tara", "tara", False),
+    (r"^rr\b", "rr", False),
+    (r"^rt\b", "rt", False),
+    (r"^volume", "volume", False),
+    (r"^area", "area", False),
+    (r"^diametro", "diametro", False),
+    (r"^dt$|^densidade teorica", "dt", False),
+    (r"^10 ?min (?:cp ?)?(\d+)$|^cp ?(\d+) 10 ?min$", "m10", True),
+    (r"^90 ?min (?:cp ?)?(\d+)$|^cp ?(\d+) 90 ?min$", "m90", True),
+    (r"^(?:inicial|ini) (?:cp ?)?(\d+)$|^cp ?(\d+) (?:inicial|ini)$", "ini", True),
+    (r"^(?:final|fim|fin) (?:cp ?)?(\d+)$|^cp ?(\d+) (?:final|fim|fin)$", "fim", True),
+    (r"^testemunho (?:inicial|ini)$", "ini_testemunho", False),
+    (r"^testemunho (?:final|fim)$", "fim_testemunho", False),
+    (r"^cp ?(\d+)(?: kn| mpa)?$", "cps", True),
+]
+_PADROES = [(re.compile(p), campo, lista) for p, campo, lista in PADROES_COLUNAS]
+
+def mapear_cabecalho(celulas) -> Dict[int, Tuple[str, Optional[int]]]:
+    """Associa cada coluna do cabeçalho a um campo de entrada (e à posição do CP, se houver)."""
+    mapa = {}
+    for col, celula in enumerate(celulas):
+        if celula is None:
+            continue
+        nome = norm(str(celula))
+        for padrao, campo, lista in _PADROES:
+            m = padrao.search(nome)
+            if m:
+                if lista:
+                    pos = next(int(g) for g in m.groups() if g)
+                    mapa[col] = (campo, pos - 1)
+                else:
+                    mapa[col] = (campo, None)
+                break
+    return mapa
+
+def _numero(valor) -> Optional[float]:
+    """Converte uma célula em número (aceita vírgula decimal); vazio/texto -> None."""
+    if valor is None or isinstance(valor, bool):
+        return None
+    if isinstance(valor, (int, float)):
+        return float(valor)
+    try:
+        return float(str(valor).strip().replace(",", "."))
+    except ValueError:
+        return None
+
+def montar_entradas(linha, mapa: Dict[int, Tuple[str, Optional[int]]]) -> Dict:
+    """Monta o dicionário de entradas do ensaio a partir de uma linha da planilha."""
+    entradas: Dict = {}
+    for col, (campo, pos) in mapa.items():
+        valor = linha[col] if col < len(linha) else None
+        if campo in ("lote", "operador"):
+            if valor is not None:
+                entradas[campo] = str(valor).strip()
+        elif campo == "data":
+            entradas[campo] = valor
+        elif campo == "resultado_planilha":
+            entradas[campo] = valor
+        elif pos is not None:
+            lista = entradas.setdefault(campo, [])
+            lista.extend([0.0] * (pos + 1 - len(lista)))
+            lista[pos] = _numero(valor) or 0.0
+        else:
+            num = _numero(valor)
+            if num is not None:
+                entradas[campo] = num
+
+    # Permeabilidade: o testemunho é a 4ª posição das listas ini/fim
+    for campo in ("ini", "fim"):
+        extra = entradas.pop(f"{campo}_testemunho", None)
+        if extra is not None:
+            lista = entradas.setdefault(campo, [])
+            lista.extend([0.0] * (4 - len(lista)))
+            lista[3] = extra
+    return entradas
+
+# ======================== 2. IDENTIFICAÇÃO DE PRODUTO E ENSAIO ========================
+
+def produto_do_arquivo(caminho: str) -> Optional[str]:
+    """Descobre a linha de produto pelo nome do arquivo ou das pastas acima dele."""
+    partes = norm(os.path.abspath(caminho).replace(os.sep, " "))
+    # Procura do nome do arquivo para cima (o mais específico vence)
+    for trecho in reversed(partes.split(" ")):
+        for linha in ensaios.LINHAS_PRODUTOS:
+            if trecho == norm(linha):
+                return linha
+    return None
+
+def ensaio_da_aba(produto: str, titulo: str) -> Optional[Tuple[str, str]]:
+    """Retorna (ensaio, requisito) da aba, se for um ensaio existente para o produto."""
+    ensaio = ensaios.identificar_ensaio(produto, titulo)
+    if ensaio is None and "densidade" in norm(titulo):
+        ensaio = ensaios.ENS_DENSIDADE  # Abas costumam se chamar apenas "Densidade"
+    if ensaio is None:
+        return None
+    for req in ensaios.REQUISITOS[produto]:
+        if ensaios.identificar_ensaio(produto, req) == ensaio:
+            return ensaio, req
+    return None
+
+# ======================== 3. RECÁLCULO E COMPARAÇÃO ========================
+
+# Diferença tolerada entre a planilha e o app (planilhas costumam arredondar em 2 casas)
+TOLERANCIA_PADRAO = 0.01
+
+def comparar(valor_planilha, res: Optional[Dict], tolerancia: float) -> Optional[str]:
+    """Descreve a divergência entre o valor da planilha e o recálculo (None se bater)."""
+    if valor_planilha is None or valor_planilha == "":
+        return None
+    num = _numero(valor_planilha)
+    valido_app = bool(res and res["valido"])
+    if num is None:
+        # Texto na célula de resultado: "Inválido", "Repetir ensaio"...
+        texto = norm(str(valor_planilha))
+        invalido_planilha = "invalid" in texto or "repetir" in texto
+        if invalido_planilha and valido_app:
+            return f"planilha: '{valor_planilha}' | app: {res['resultado']:.2f}"
+        return None
+    if not valido_app:
+        return f"planilha: {num:.2f} | app: ENSAIO INVÁLIDO"
+    if abs(num - res["resultado"]) > tolerancia:
+        return f"planilha: {num:.2f} | app: {res['resultado']:.2f}"
+    return None
+
+# Datas digitadas como texto (células sem formato de data)
+_FORMATOS_DATA = ("%d/%m/%Y", "%d/%m/%Y %H:%M", "%d/%m/%Y %H:%M:%S", "%d/%m/%y")
+
+def _data_iso(valor) -> Optional[str]:
+    """Converte a data da planilha para ISO (None se ausente).
+
+    Aceita células de data e textos ISO ou dd/mm/aaaa; qualquer outro valor levanta
+    ValueError e a linha é rejeitada (em vez de gravada com a data da importação).
+    """
+    if valor is None or (isinstance(valor, str) and not valor.strip()):
+        return None
+    if isinstance(valor, datetime):
+        return valor.isoformat(timespec="seconds")
+    if isinstance(valor, date):
+        return datetime(valor.year, valor.month, valor.day).isoformat(timespec="seconds")
+    if isinstance(valor, str):
+        texto = valor.strip()
+        try:
+            return datetime.fromisoformat(texto).isoformat(timespec="seconds")
+        except ValueError:
+            pass
+        for formato in _FORMATOS_DATA:
+            try:
+                return datetime.strptime(texto, formato).isoformat(timespec="seconds")
+            except ValueError:
+                continue
+    raise ValueError(f"data não reconhecida: {valor!r}")
+
+def processar_planilha(caminho: str, tolerancia: float = TOLERANCIA_PADRAO) -> Dict:
+    """Lê uma pasta de trabalho, recalcula cada lote e devolve registros e divergências.
+
+    Roda dentro dos processos do pool: não acessa o banco, só devolve os dados.
+    """
+    try:
+        from openpyxl import load_workbook
+    except ImportError:  # pragma: no cover - depende do ambiente
+        raise RuntimeError("A importação de planilhas requer o pacote 'openpyxl' (pip install openpyxl).")
+
+    saida = {"arquivo": caminho, "produto": None, "registros": [], "divergencias": [], "erros": [], "linhas": 0}
+    produto = produto_do_arquivo(caminho)
+    if produto is None:
+        saida["erros"].append("Produto não identificado pelo nome do arquivo/pasta.")
+        return saida
+    saida["produto"] = produto
+    limites = ensaios.limites_produto(produto)
+
+    wb = load_workbook(caminho, read_only=True, data_only=True)
+    try:
+        for ws in wb.worksheets:
+            alvo = ensaio_da_aba(produto, ws.title)
+            if alvo is None:
+                continue
+            ensaio, requisito = alvo
+            mapa = None
+            for n_linha, linha in enumerate(ws.iter_rows(values_only=True), start=1):
+                if mapa is None:
+                    candidato = mapear_cabecalho(linha)
+                    if any(campo == "lote" for campo, _ in candidato.values()):
+                        mapa = candidato
+                    continue
+                if not any(c not in (None, "") for c in linha):
+                    continue
+
+                entradas = montar_entradas(linha, mapa)
+                lote = entradas.pop("lote", None)
+                operador = entradas.pop("operador", None)
+                data = entradas.pop("data", None)
+                valor_planilha = entradas.pop("resultado_planilha", None)
+                if lote is None:
+                    continue
+                saida["linhas"] += 1
+
+                try:
+                    res = ensaios.calcular(ensaio, entradas, produto, limites)
+                    criado_em = _data_iso(data)
+                except EntradaIncompleta:
+                    continue  # Linha sem leituras (lote planejado e não ensaiado)
+                except ensaios.ERROS_CALCULO as e:  # Ex: área zero; a linha é rejeitada, a planilha segue
+                    saida["erros"].append(f"{ws.title}!{n_linha} (lote {lote}): {type(e).__name__}: {e}")
+                    continue
+
+                divergencia = comparar(valor_planilha, res, tolerancia)
+                if divergencia:
+                    saida["divergencias"].append({
+                        "arquivo": caminho, "aba": ws.title, "linha": n_linha, "lote": lote,
+                        "produto": produto, "requisito": requisito, "detalhe": divergencia,
+                    })
+
+                saida["registros"].append(historico.montar_registro(
+                    produto, requisito, ensaio, entradas, res, lote=lote, operador=operador,
+                    origem=f"planilha:{os.path.basename(caminho)}", criado_em=criado_em,
+                ))
+    finally:
+        wb.close()
+    return saida
+
+# ======================== 4. EXECUÇÃO EM PARALELO ========================
+
+def listar_planilhas(caminhos: List[str]) -> List[str]:
+    """Expande pastas em arquivos .xlsx/.xlsm (ignora temporários do Excel '~$')."""
+    arquivos = []
+    for caminho in caminhos:
+        if os.path.isdir(caminho):
+            for raiz, _, nomes in os.walk(caminho):
+                for nome in sorted(nomes):
+                    if nome.lower().endswith((".xlsx", ".xlsm")) and not nome.startswith("~$"):
+                        arquivos.append(os.path.join(raiz, nome))
+        else:
+            arquivos.append(caminho)
+    return arquivos
+
+def importar(arquivos: List[str], workers: Optional[int] = None, salvar: bool = False,
+             tolerancia: float = TOLERANCIA_PADRAO, progresso=None) -> Dict:
+    """Processa as planilhas no pool de processos e consolida o resultado.
+
+    ``progresso(feitos, total, lotes, segundos)`` é chamado a cada planilha concluída.
+    Com ``salvar=True`` os lotes recalculados são gravados no histórico (em lotes,
+    pelo processo principal, que é o único escritor do banco).
+    """
+    if salvar:
+        ganchos.registrar()
+    total = len(arquivos)
+    resumo = {"arquivos": total, "lotes": 0, "linhas": 0, "divergencias": [], "erros": {}, "segundos": 0.0}
+    pendentes: List[Dict] = []
+    inicio = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futuros = {pool.submit(processar_planilha, arq, tolerancia): arq for arq in arquivos}
+        for feitos, futuro in enumerate(as_completed(futuros), start=1):
+            arq = futuros[futuro]
+            try:
+                saida = futuro.result()
+            except Exception as e:  # Planilha corrompida não derruba a importação inteira
+                resumo["erros"][arq] = [f"{type(e).__name__}: {e}"]
+            else:
+                resumo["lotes"] += len(saida["registros"])
+                resumo["linhas"] += saida["linhas"]
+                resumo["divergencias"].extend(saida["divergencias"])
+                if saida["erros"]:
+                    resumo["erros"][arq] = saida["erros"]
+                if salvar:
+                    pendentes.extend(saida["registros"])
+                    if len(pendentes) >= 5000:
+                        historico.salvar_resultados(pendentes)
+                        pendentes = []
+            if progresso:
+                progresso(feitos, total, resumo["lotes"], time.perf_counter() - inicio)
+
+    if salvar and pendentes:
+        historico.salvar_resultados(pendentes)
+    resumo["segundos"] = time.perf_counter() - inicio
+    return resumo
+
+def _imprimir_progresso(feitos: int, total: int, lotes: int, segundos: float):
+    """Barra de progresso simples no terminal, com vazão em planilhas/s e lotes/s."""
+    seg = max(segundos, 1e-9)
+    print(f"\r[{feitos}/{total}] {feitos / seg:.1f} planilhas/s | {lotes} lotes ({lotes / seg:.0f} lotes/s)",
+          end="", file=sys.stderr, flush=True)
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Importa as planilhas históricas e aponta divergências.")
+    parser.add_argument("caminhos", nargs="+", help="Arquivos .xlsx ou pastas com as planilhas")
+    parser.add_argument("--workers", type=int, default=None, help="Processos em paralelo (padrão: nº de CPUs)")
+    parser.add_argument("--salvar", action="store_true", help="Grava os lotes recalculados no histórico")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA_PADRAO,
+                        help="Diferença aceita entre planilha e app")
+    parser.add_argument("--relatorio", help="Arquivo CSV para as divergências encontradas")
+    args = parser.parse_args(argv)
+
+    arquivos = listar_planilhas(args.caminhos)
+    if not arquivos:
+        parser.error("Nenhuma planilha encontrada.")
+
+    resumo = importar(arquivos, workers=args.workers, salvar=args.salvar,
+                      tolerancia=args.tolerancia, progresso=_imprimir_progresso)
+    print(file=sys.stderr)
+
+    seg = max(resumo["segundos"], 1e-9)
+    print(f"Planilhas: {resumo['arquivos']} | Lotes recalculados: {resumo['lotes']} | "
+          f"Divergências: {len(resumo['divergencias'])} | Arquivos com erro: {len(resumo['erros'])}")
+    print(f"Tempo: {seg:.1f} s | {resumo['arquivos'] / seg:.1f} planilhas/s | {resumo['lotes'] / seg:.0f} lotes/s")
+
+    for arq, erros in resumo["erros"].items():
+        for erro in erros:
+            print(f"  ⚠ {arq}: {erro}", file=sys.stderr)
+
+    if args.relatorio and resumo["divergencias"]:
+        with open(args.relatorio, "w", newline="", encoding="utf-8") as f:
+            escritor = csv.DictWriter(f, fieldnames=list(resumo["divergencias"][0].keys()))
+            escritor.writeheader()
+            escritor.writerows(resumo["divergencias"])
+        print(f"Divergências gravadas em {args.relatorio}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""Indicadores do laboratório (painel) mantidos de forma incremental.
+
+Os agregados ficam em tabelas próprias no banco do histórico e são atualizados
+por um gancho na mesma transação em que cada resultado é gravado: uma gravação
+custa alguns UPSERTs por chave primária, e a leitura do painel consulta só as
+tabelas de agregados (poucas linhas por produto/requisito), nunca o histórico.
+
+Indicadores:
+    * ensaios realizados e válidos por linha de produto
+    * taxa de ensaios válidos/inválidos por requisito
+    * posições de CP mais excluídas por ensaio
+    * tempo médio para concluir um lote (do primeiro ao último requisito da linha;
+      requisitos alternativos, como aderência manual ou automática, contam como um)
+
+``reconstruir()`` remonta os agregados a partir do histórico (primeiro uso em um
+banco já existente e após um recálculo em massa).
+"""
+import argparse
+import json
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import historico
+from ensaios import ENS_ADERENCIA_AUTO, ENS_ADERENCIA_MANUAL, REQUISITOS, identificar_ensaio
+
+_log = logging.getLogger(__name__)
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS kpi_produto (
+    produto   TEXT PRIMARY KEY,
+    ensaios   INTEGER NOT NULL DEFAULT 0,
+    validos   INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS kpi_requisito (
+    produto   TEXT NOT NULL,
+    requisito TEXT NOT NULL,
+    ensaios   INTEGER NOT NULL DEFAULT 0,
+    validos   INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (produto, requisito)
+);
+CREATE TABLE IF NOT EXISTS kpi_exclusao (
+    produto   TEXT NOT NULL,
+    ensaio    TEXT NOT NULL,
+    posicao   INTEGER NOT NULL,
+    excluidos INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (produto, ensaio, posicao)
+);
+CREATE TABLE IF NOT EXISTS kpi_lote (
+    lote         TEXT PRIMARY KEY,
+    produto      TEXT NOT NULL,
+    inicio       TEXT NOT NULL,
+    requisitos   INTEGER NOT NULL DEFAULT 0,
+    concluido_em TEXT
+);
+CREATE TABLE IF NOT EXISTS kpi_lote_requisito (
+    lote      TEXT NOT NULL,
+    requisito TEXT NOT NULL,
+    PRIMARY KEY (lote, requisito)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS kpi_conclusao (
+    produto   TEXT PRIMARY KEY,
+    lotes     INTEGER NOT NULL DEFAULT 0,
+    segundos  REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS kpi_meta (
+    chave     TEXT PRIMARY KEY,
+    valor     TEXT
+);
+"""
+
+historico.registrar_esquema(_ESQUEMA)
+
+# Ensaios alternativos de um mesmo requisito: o lote faz só um deles (ex: a aderência
+# do Revestimento é manual ou automática)
+_ALTERNATIVOS = {ENS_ADERENCIA_MANUAL: "aderencia", ENS_ADERENCIA_AUTO: "aderencia"}
+
+def _etapa(requisito: str, ensaio: Optional[str]) -> str:
+    return _ALTERNATIVOS.get(ensaio, requisito)
+
+# Etapas que concluem um lote de cada linha
+ETAPAS = {produto: frozenset(_etapa(r, identificar_ensaio(produto, r)) for r in requisitos)
+          for produto, requisitos in REQUISITOS.items()}
+
+_TABELAS = ("kpi_produto", "kpi_requisito", "kpi_exclusao", "kpi_lote", "kpi_lote_requisito", "kpi_conclusao")
+
+# ======================== 1. ATUALIZAÇÃO INCREMENTAL ========================
+
+def acumular(conn, registro: Dict, _id: int):
+    """Gancho de transação: soma o resultado gravado aos agregados (O(1) por gravação)."""
+    produto, requisito, valido = registro["produto"], registro["requisito"], int(registro["valido"])
+    conn.execute(
+        "INSERT INTO kpi_produto (produto, ensaios, validos) VALUES (?, 1, ?) "
+        "ON CONFLICT (produto) DO UPDATE SET ensaios = ensaios + 1, validos = validos + excluded.validos",
+        (produto, valido),
+    )
+    conn.execute(
+        "INSERT INTO kpi_requisito (produto, requisito, ensaios, validos) VALUES (?, ?, 1, ?) "
+        "ON CONFLICT (produto, requisito) DO UPDATE SET ensaios = ensaios + 1, validos = validos + excluded.validos",
+        (produto, requisito, valido),
+    )
+    excluidos = json.loads(registro["excluidos"])
+    if excluidos:
+        conn.executemany(
+            "INSERT INTO kpi_exclusao (produto, ensaio, posicao, excluidos) VALUES (?, ?, ?, 1) "
+            "ON CONFLICT (produto, ensaio, posicao) DO UPDATE SET excluidos = excluidos + 1",
+            [(produto, registro["ensaio"], pos) for pos in excluidos],
+        )
+
+    lote = registro.get("lote")
+    if not lote:
+        return
+    conn.execute("INSERT OR IGNORE INTO kpi_lote (lote, produto, inicio) VALUES (?, ?, ?)",
+                 (lote, produto, registro["criado_em"]))
+    # Só o primeiro resultado de cada etapa conta para a conclusão (recálculos e a outra
+    # variante de um requisito alternativo não)
+    etapa = _etapa(requisito, registro["ensaio"])
+    if conn.execute("INSERT OR IGNORE INTO kpi_lote_requisito VALUES (?, ?)", (lote, etapa)).rowcount == 0:
+        return
+    feitos, inicio, concluido, produto_lote = conn.execute(
+        "UPDATE kpi_lote SET requisitos = requisitos + 1 WHERE lote = ? "
+        "RETURNING requisitos, inicio, concluido_em, produto", (lote,)
+    ).fetchone()
+    if concluido is None and feitos >= len(ETAPAS.get(produto_lote, ())):
+        segundos = (datetime.fromisoformat(registro["criado_em"]) - datetime.fromisoformat(inicio)).total_seconds()
+        conn.execute("UPDATE kpi_lote SET concluido_em = ? WHERE lote = ?", (registro["criado_em"], lote))
+        conn.execute(
+            "INSERT INTO kpi_conclusao (produto, lotes, segundos) VALUES (?, 1, ?) "
+            "ON CONFLICT (produto) DO UPDATE SET lotes = lotes + 1, segundos = segundos + excluded.segundos",
+            (produto_lote, max(segundos, 0.0)),
+        )
+
+
+def reconstruir(conn=None) -> int:
+    """Remonta todos os agregados a partir do histórico (varredura única, fora do uso normal)."""
+    conn = conn or historico.conectar()
+    total = 0
+    with conn:
+        for tabela in _TABELAS:
+            conn.execute(f"DELETE FROM {tabela}")
+        cur = conn.execute("SELECT lote, produto, requisito, ensaio, excluidos, valido, criado_em "
+                           "FROM resultados ORDER BY id")
+        for linha in cur:
+            acumular(conn, dict(linha), None)
+            total += 1
+        conn.execute("INSERT OR REPLACE INTO kpi_meta VALUES ('montado_em', ?)",
+                     (datetime.now().isoformat(timespec="seconds"),))
+    return total
+
+# ======================== 2. LEITURA DO PAINEL ========================
+
+def painel(conn=None, top_exclusoes: int = 10) -> Dict[str, List[Dict]]:
+    """Lê os indicadores já agregados (consultas só nas tabelas kpi_*)."""
+    conn = conn or historico.conectar()
+    if conn.execute("SELECT 1 FROM kpi_meta WHERE chave = 'montado_em'").fetchone() is None:
+        _log.info("Montando os indicadores a partir do histórico (primeiro uso)")
+        reconstruir(conn)
+
+    concluidos = {r["produto"]: r for r in conn.execute("SELECT * FROM kpi_conclusao")}
+    produtos = []
+    for r in conn.execute("SELECT * FROM kpi_produto ORDER BY produto"):
+        c = concluidos.get(r["produto"])
+        produtos.append({
+            "produto": r["produto"], "ensaios": r["ensaios"], "validos": r["validos"],
+            "lotes_concluidos": c["lotes"] if c else 0,
+            "horas_por_lote": (c["segundos"] / c["lotes"] / 3600) if c and c["lotes"] else None,
+        })
+    requisitos = [{
+        "produto": r["produto"], "requisito": r["requisito"], "ensaios": r["ensaios"],
+        "validos": r["validos"], "taxa_validos": r["validos"] / r["ensaios"] if r["ensaios"] else None,
+    } for r in conn.execute("SELECT * FROM kpi_requisito ORDER BY produto, requisito")]
+    exclusoes = [dict(r) for r in conn.execute(
+        "SELECT produto, ensaio, posicao, excluidos FROM kpi_exclusao ORDER BY excluidos DESC LIMIT ?",
+        (top_exclusoes,))]
+    return {"produtos": produtos, "requisitos": requisitos, "exclusoes": exclusoes}
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Remonta os indicadores do painel a partir do histórico.")
+    parser.parse_args(argv)
+    print(f"{reconstruir()} resultados agregados")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""Integração com instrumentos (balanças e comparadores) via asyncio.
+
+Cada instrumento é lido por um *driver* assíncrono que produz leituras numéricas.
+Um laço asyncio próprio roda em uma thread de fundo (nunca na thread do script do
+Streamlit) e entrega as leituras na caixa de entrada da sessão que conectou o
+instrumento; a interface só recolhe o que chegou, sem esperar pelo equipamento.
+
+Drivers disponíveis:
+    * DriverSerial  — balanças/comparadores RS-232/USB-serial (requer ``pyserial``)
+    * DriverHID     — equipamentos USB-HID (requer ``hidapi``)
+    * DriverArquivo — arquivo ou pipe nomeado (substituto para bancada/integrações)
+    * DriverSimulado — valores programados, para testes e demonstração
+"""
+import asyncio
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Dict, Iterable, List, NamedTuple, Optional
+
+_log = logging.getLogger(__name__)
+
+class Leitura(NamedTuple):
+    valor: float
+    unidade: Optional[str]
+    instante: float  # time.monotonic() da chegada
+    bruto: str
+
+# Ex: "ST,GS,+  123.45 g", "  0.153mm", "-1,250"
+_RE_VALOR = re.compile(r"([-+]?\s*\d+(?:[.,]\d+)?)\s*([a-zA-Z%]+)?")
+
+def interpretar_linha(linha: str) -> Optional[Leitura]:
+    """Extrai valor/unidade de uma linha do instrumento; ignora leituras instáveis (US)."""
+    texto = linha.strip()
+    if not texto or texto.upper().startswith("US"):
+        return None
+    m = _RE_VALOR.search(texto.split(",")[-1] if texto.upper().startswith("ST,") else texto)
+    if not m:
+        return None
+    valor = float(m.group(1).replace(" ", "").replace(",", "."))
+    return Leitura(valor, m.group(2), time.monotonic(), texto)
+
+# ======================== 1. DRIVERS ========================
+
+class DriverInstrumento(ABC):
+    """Interface dos drivers: abrir, produzir leituras (async) e fechar."""
+    nome = "instrumento"
+
+    async def abrir(self):
+        pass
+
+    async def fechar(self):
+        pass
+
+    @abstractmethod
+    def leituras(self) -> AsyncIterator[Leitura]:
+        """Gerador assíncrono das leituras (termina quando o instrumento não tem mais)."""
+
+class DriverSerial(DriverInstrumento):
+    """Porta serial (a leitura bloqueante roda no executor, fora do laço)."""
+    nome = "serial"
+
+    def __init__(self, porta: str, baudrate: int = 9600, timeout: float = 0.05):
+        self.porta, self.baudrate, self.timeout = porta, baudrate, timeout
+        self._serial = None
+
+    async def abrir(self):
+        try:
+            import serial
+        except ImportError:
+            raise RuntimeError("Leitura serial requer o pacote 'pyserial' (pip install pyserial).")
+        self._serial = serial.Serial(self.porta, self.baudrate, timeout=self.timeout)
+
+    async def fechar(self):
+        if self._serial is not None:
+            self._serial.close()
+
+    async def leituras(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            bruto = await loop.run_in_executor(None, self._serial.readline)
+            if bruto:
+                leitura = interpretar_linha(bruto.decode("ascii", "ignore"))
+                if leitura:
+                    yield leitura
+
+class DriverHID(DriverInstrumento):
+    """Dispositivo USB-HID que envia o valor em ASCII nos relatórios de entrada."""
+    nome = "usb-hid"
+
+    def __init__(self, vendor_id: int, product_id: int, tamanho_relatorio: int = 64):
+        self.vendor_id, self.product_id, self.tamanho = vendor_id, product_id, tamanho_relatorio
+        self._dev = None
+        self._buffer = ""
+
+    async def abrir(self):
+        try:
+            import hid
+        except ImportError:
+            raise RuntimeError("Leitura USB-HID requer o pacote 'hidapi' (pip install hidapi).")
+        self._dev = hid.device()
+        self._dev.open(self.vendor_id, self.product_id)
+
+    async def fechar(self):
+        if self._dev is not None:
+            self._dev.close()
+
+    def _ler(self) -> bytes:
+        return bytes(self._dev.read(self.tamanho, 50))  # timeout de 50 ms
+
+    async def leituras(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            dados = await loop.run_in_executor(None, self._ler)
+            self._buffer += dados.replace(b"\x00", b"").decode("ascii", "ignore")
+            while "\n" in self._buffer or "\r" in self._buffer:
+                linha, _, self._buffer = self._buffer.replace("\r", "\n").partition("\n")
+                leitura = interpretar_linha(linha)
+                if leitura:
+                    yield leitura
+
+class DriverArquivo(DriverInstrumento):
+    """Lê linhas anexadas a um arquivo (como ``tail -f``) ou de um pipe nomeado."""
+    nome = "arquivo"
+
+    def __init__(self, caminho: str, do_inicio: bool = False, espera: float = 0.02):
+        self.caminho, self.do_inicio, self.espera = caminho, do_inicio, espera
+        self._arq = None
+
+    async def abrir(self):
+        loop = asyncio.get_running_loop()
+        # open() de um FIFO bloqueia até existir um escritor: roda no executor
+        self._arq = await loop.run_in_executor(None, lambda: open(self.caminho, "r", encoding="utf-8"))
+        if not self.do_inicio and os.path.isfile(self.caminho):
+            self._arq.seek(0, os.SEEK_END)
+
+    async def fechar(self):
+        if self._arq is not None:
+            self._arq.close()
+
+    async def leituras(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            linha = await loop.run_in_executor(None, self._arq.readline)
+            if not linha:
+                await asyncio.sleep(self.espera)  # Fim do arquivo: espera novas linhas
+                continue
+            leitura = interpretar_linha(linha)
+            if leitura:
+                yield leitura
+
+class DriverSimulado(DriverInstrumento):
+    """Gera leituras programadas (ou aleatórias em torno de um nominal) — para testes."""
+    nome = "simulado"
+
+    def __init__(self, valores: Optional[Iterable[float]] = None, nominal: float = 100.0,
+                 ruido: float = 0.05, intervalo: float = 0.5, unidade: str = "g"):
+        self.valores = list(valores) if valores is not None else None
+        self.nominal, self.ruido, self.intervalo, self.unidade = nominal, ruido, intervalo, unidade
+
+    async def leituras(self):
+        i = 0
+        while self.valores is None or i < len(self.valores):
+            await asyncio.sleep(self.intervalo)
+            valor = self.valores[i] if self.valores is not None else round(random.gauss(self.nominal, self.ruido), 3)
+            i += 1
+            yield Leitura(valor, self.unidade, time.monotonic(), f"{valor} {self.unidade}")
+
+# ======================== 2. GERENCIADOR (LAÇO EM SEGUNDO PLANO) ========================
+
+class GerenciadorInstrumentos:
+    """Mantém o laço asyncio em uma thread de fundo e as caixas de entrada por sessão."""
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._tarefas: Dict[str, "asyncio.Task"] = {}
+        self._caixas: Dict[str, "queue.SimpleQueue[Leitura]"] = {}
+        self._estado: Dict[str, str] = {}
+
+    def _garantir_laco(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="instrumentos", daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def _marcar(self, sessao: str, caixa: "queue.SimpleQueue[Leitura]", estado: str):
+        # Só a conexão atual da sessão escreve o estado (a caixa identifica a conexão): uma
+        # tarefa cancelada não recria a entrada apagada nem sobrescreve a do instrumento novo
+        if self._caixas.get(sessao) is caixa:
+            self._estado[sessao] = estado
+
+    async def _bombear(self, sessao: str, driver: DriverInstrumento, caixa: "queue.SimpleQueue[Leitura]"):
+        try:
+            await driver.abrir()
+            self._marcar(sessao, caixa, f"conectado ({driver.nome})")
+            async for leitura in driver.leituras():
+                caixa.put(leitura)
+            self._marcar(sessao, caixa, "fim das leituras")
+        except Exception as e:  # CancelledError (desconectar) passa direto
+            _log.exception("Falha no instrumento da sessão %s", sessao)
+            self._marcar(sessao, caixa, f"erro: {e}")
+        finally:
+            await driver.fechar()
+
+    def conectar(self, sessao: str, driver: DriverInstrumento):
+        """Inicia a leitura do driver para a sessão (substitui o instrumento anterior)."""
+        self.desconectar(sessao)
+        loop = self._garantir_laco()
+        caixa = self._caixas[sessao] = queue.SimpleQueue()
+        self._estado[sessao] = "conectando"
+        futuro = asyncio.run_coroutine_threadsafe(self._criar_tarefa(sessao, driver, caixa), loop)
+        self._tarefas[sessao] = futuro.result(timeout=5)
+
+    async def _criar_tarefa(self, sessao: str, driver: DriverInstrumento,
+                            caixa: "queue.SimpleQueue[Leitura]") -> "asyncio.Task":
+        return asyncio.create_task(self._bombear(sessao, driver, caixa))
+
+    def desconectar(self, sessao: str):
+        """Cancela a leitura da sessão e descarta a caixa de entrada e o estado dela."""
+        tarefa = self._tarefas.pop(sessao, None)
+        if tarefa is not None and self._loop is not None:
+            self._loop.call_soon_threadsafe(tarefa.cancel)
+        self._caixas.pop(sessao, None)
+        self._estado.pop(sessao, None)
+
+    def coletar(self, sessao: str) -> List[Leitura]:
+        """Retorna (sem bloquear) as leituras que chegaram desde a última coleta."""
+        caixa = self._caixas.get(sessao)
+        leituras = []
+        while caixa is not None:
+            try:
+                leituras.append(caixa.get_nowait())
+            except queue.Empty:
+                break
+        return leituras
+
+    def estado(self, sessao: str) -> Optional[str]:
+        return self._estado.get(sessao) if sessao in self._tarefas else None
+
+_gerenciador = GerenciadorInstrumentos()
+
+def gerenciador() -> GerenciadorInstrumentos:
+    """Gerenciador compartilhado pelo processo (um laço para todas as sessões)."""
+    return _gerenciador
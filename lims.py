@@ -0,0 +1,514 @@
+"""Envio dos resultados ao LIMS por uma caixa de saída durável (outbox).
+
+Cada resultado gravado no histórico entra na tabela ``lims_saida`` pelo gancho de
+transação: ou o resultado e a mensagem são gravados juntos, ou nenhum dos dois
+(nada se perde se o app cair logo depois do cálculo). Um remetente em segundo
+plano (uma thread por processo, conexão própria) lê a caixa em lotes e envia ao
+LIMS:
+
+    * um POST por lote (JSON em gzip), com ``Idempotency-Key`` no cabeçalho e a
+      ``chave`` de cada resultado no corpo (``origem:id``) — um lote repetido após
+      um timeout não duplica nada no LIMS;
+    * resultado alterado pelo recálculo (recalculo.py): nova mensagem com ``revisao``
+      seguinte e chave própria (``origem:id:r2``...), enfileirada na mesma transação
+      da atualização; o LIMS fica com a revisão mais alta;
+    * falha de rede, 5xx, 408 ou 429: espera exponencial com jitter (1 s até 5 min)
+      antes da próxima tentativa; as mensagens continuam na fila, intactas;
+    * recusa definitiva (outros 4xx): o lote é dividido ao meio até isolar as mensagens
+      recusadas, e as demais seguem no mesmo ciclo; cada recusada recebe espera própria
+      crescente e, após ``MAX_RECUSAS`` recusas, vai para ``lims_rejeitadas`` (fila de
+      mensagens mortas, devolvida à fila por ``python lims.py reenviar``);
+    * com fila acumulada (volta da rede), os lotes seguem um após o outro sem pausa.
+
+A gravação no app só insere uma linha na mesma transação e acorda o remetente: o
+rerun da página nunca espera pela rede.
+
+Configuração: ``CALCULADORA_LIMS_URL`` (sem ela nada é enfileirado nem enviado),
+``CALCULADORA_LIMS_TOKEN`` (Bearer) e ``CALCULADORA_LIMS_ORIGEM`` (prefixo das
+chaves; padrão: nome da máquina).
+
+Uso:
+    python lims.py situacao
+    python lims.py reenviar                                   # devolve as rejeitadas à fila
+    python lims.py simular [--resultados 20000] [--queda 10]   # LIMS simulado local
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import os
+import random
+import socket
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence
+
+import historico
+
+_log = logging.getLogger(__name__)
+
+URL_LIMS = os.environ.get("CALCULADORA_LIMS_URL")
+TOKEN_LIMS = os.environ.get("CALCULADORA_LIMS_TOKEN")
+ORIGEM = os.environ.get("CALCULADORA_LIMS_ORIGEM") or socket.gethostname()
+
+LOTE_ENVIO = 200
+TIMEOUT = 15.0
+ESPERA_MIN, ESPERA_MAX = 1.0, 300.0
+# Sem nada a enviar, o remetente confere a fila a cada tanto (acorda antes a cada gravação)
+INTERVALO_OCIOSO = 30.0
+# Recusas definitivas da mesma mensagem antes de ela sair da fila (lims_rejeitadas)
+MAX_RECUSAS = 5
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS lims_saida (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    resultado_id INTEGER NOT NULL,
+    chave        TEXT NOT NULL UNIQUE,
+    corpo        TEXT NOT NULL,
+    criado_em    TEXT NOT NULL,
+    tentativas   INTEGER NOT NULL DEFAULT 0,
+    proxima_em   REAL NOT NULL DEFAULT 0,
+    enviado_em   TEXT,
+    erro         TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_lims_saida_pendentes ON lims_saida (proxima_em, id) WHERE enviado_em IS NULL;
+CREATE INDEX IF NOT EXISTS ix_lims_saida_resultado ON lims_saida (resultado_id);
+CREATE TABLE IF NOT EXISTS lims_rejeitadas (
+    id           INTEGER PRIMARY KEY,
+    resultado_id INTEGER NOT NULL,
+    chave        TEXT NOT NULL UNIQUE,
+    corpo        TEXT NOT NULL,
+    criado_em    TEXT NOT NULL,
+    tentativas   INTEGER NOT NULL,
+    erro         TEXT,
+    rejeitada_em TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_lims_rejeitadas_resultado ON lims_rejeitadas (resultado_id);
+"""
+
+historico.registrar_esquema(_ESQUEMA)
+
+# ======================== 1. ENFILEIRAMENTO (MESMA TRANSAÇÃO) ========================
+
+def chave(id_: int, revisao: int = 1, origem: str = ORIGEM) -> str:
+    """Chave de idempotência; a 1ª revisão mantém a forma ``origem:id`` das mensagens já enviadas."""
+    return f"{origem}:{id_}" if revisao == 1 else f"{origem}:{id_}:r{revisao}"
+
+def mensagem(registro: Dict, id_: int, origem: str = ORIGEM, revisao: int = 1) -> Dict:
+    """Corpo enviado ao LIMS para um resultado gravado (``revisao`` > 1 após recálculo)."""
+    return {
+        "chave": chave(id_, revisao, origem), "origem": origem, "resultado_id": id_, "revisao": revisao,
+        "lote": registro.get("lote"), "produto": registro["produto"], "requisito": registro["requisito"],
+        "ensaio": registro["ensaio"], "resultado": registro["resultado"], "valido": bool(registro["valido"]),
+        "valores": json.loads(registro["valores"]), "excluidos": json.loads(registro["excluidos"]),
+        "operador": registro.get("operador"), "cliente": registro.get("cliente"),
+        "limites": registro.get("limites_aplicados"), "criado_em": registro["criado_em"],
+    }
+
+# Caixa ligada só nesta thread, sem CALCULADORA_LIMS_URL (simulação e testes)
+_local = threading.local()
+
+@contextmanager
+def caixa_ativa():
+    """Enfileira as gravações feitas dentro do bloco nesta thread, mesmo sem URL configurada."""
+    anterior = getattr(_local, "ativa", False)
+    _local.ativa = True
+    try:
+        yield
+    finally:
+        _local.ativa = anterior
+
+def _ativa() -> bool:
+    return bool(URL_LIMS) or getattr(_local, "ativa", False)
+
+def enfileirar(conn, registro: Dict, id_: int):
+    """Gancho de transação: a mensagem é gravada junto com o resultado."""
+    if not _ativa():
+        return
+    _inserir(conn, registro, id_, registro["criado_em"])
+
+def reenfileirar(conn, ids: Sequence[int]) -> int:
+    """Nova revisão da mensagem dos resultados alterados (recálculo), na transação da atualização."""
+    if not _ativa() or not ids:
+        return 0
+    agora = datetime.now().isoformat(timespec="seconds")
+    total = 0
+    for inicio in range(0, len(ids), 500):
+        parte = list(ids[inicio:inicio + 500])
+        linhas = conn.execute(f"SELECT * FROM resultados WHERE id IN ({','.join('?' * len(parte))})",
+                              parte).fetchall()
+        for linha in linhas:
+            _inserir(conn, dict(linha), linha["id"], agora)
+        total += len(linhas)
+    return total
+
+def _inserir(conn, registro: Dict, id_: int, criado_em: str):
+    # Rejeitadas também contam: a chave de uma revisão nunca é reaproveitada
+    revisao = conn.execute("SELECT (SELECT COUNT(*) FROM lims_saida WHERE resultado_id = ?) + "
+                           "(SELECT COUNT(*) FROM lims_rejeitadas WHERE resultado_id = ?)", (id_, id_)).fetchone()[0] + 1
+    corpo = mensagem(registro, id_, revisao=revisao)
+    conn.execute("INSERT OR IGNORE INTO lims_saida (resultado_id, chave, corpo, criado_em) VALUES (?, ?, ?, ?)",
+                 (id_, corpo["chave"], json.dumps(corpo, ensure_ascii=False), criado_em))
+
+def acordar(registro: Dict, id_: int):
+    """Ouvinte após o commit: o remetente envia logo, sem esperar o próximo ciclo."""
+    if _remetente is not None:
+        _remetente.acordar()
+
+
+# ======================== 2. REMETENTE EM SEGUNDO PLANO ========================
+
+def _transitorio(status: Optional[int]) -> bool:
+    """Falha que se resolve sozinha (rede, LIMS fora do ar ou sobrecarregado)."""
+    return status is None or status >= 500 or status in (408, 429)
+
+class Remetente:
+    """Lê a caixa de saída em lotes e envia ao LIMS (uma thread, conexão própria)."""
+
+    def __init__(self, url: str, token: Optional[str] = None, banco: Optional[str] = None,
+                 lote: int = LOTE_ENVIO, timeout: float = TIMEOUT,
+                 espera_min: float = ESPERA_MIN, espera_max: float = ESPERA_MAX):
+        self.url, self.token, self.banco = url, token, banco
+        self.lote, self.timeout = lote, timeout
+        self.espera_min, self.espera_max = espera_min, espera_max
+        self.espera = 0.0  # espera atual da retentativa (0 = rede ok)
+        self.ultimo_erro: Optional[str] = None
+        self.contadores = {"enviados": 0, "lotes": 0, "falhas": 0, "rejeitadas": 0, "bytes": 0, "bytes_json": 0}
+        self._lidas = 0  # mensagens lidas no último ciclo (lote cheio = há mais na fila)
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def iniciar(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._parar.clear()
+            self._thread = threading.Thread(target=self._ciclo, name="lims-remetente", daemon=True)
+            self._thread.start()
+
+    def parar(self, espera: float = 5.0):
+        self._parar.set()
+        self._acordar.set()
+        if self._thread is not None:
+            self._thread.join(espera)
+
+    def acordar(self):
+        self._acordar.set()
+
+    def _ciclo(self):
+        while not self._parar.is_set():
+            try:
+                self.enviar_lote()
+            except Exception:
+                _log.exception("Falha inesperada no envio ao LIMS")
+                self._lidas, self.espera = 0, min(max(self.espera * 2, self.espera_min), self.espera_max)
+            if self._lidas == self.lote and not self.espera:
+                continue  # fila acumulada: próximo lote sem pausa
+            if self.espera:
+                # Em retentativa, novas gravações não antecipam a tentativa (senão cada rerun
+                # bateria no LIMS fora do ar); jitter de ±20% para os processos não baterem juntos
+                self._parar.wait(self.espera * random.uniform(0.8, 1.2))
+            else:
+                self._acordar.wait(INTERVALO_OCIOSO)
+            self._acordar.clear()
+
+    def _post(self, corpo: bytes, chave: str) -> Optional[int]:
+        cabecalhos = {"Content-Type": "application/json", "Content-Encoding": "gzip", "Idempotency-Key": chave}
+        if self.token:
+            cabecalhos["Authorization"] = f"Bearer {self.token}"
+        requisicao = urllib.request.Request(self.url, data=corpo, headers=cabecalhos, method="POST")
+        try:
+            with urllib.request.urlopen(requisicao, timeout=self.timeout) as resposta:
+                resposta.read()
+                return resposta.status
+        except urllib.error.HTTPError as e:
+            self.ultimo_erro = f"HTTP {e.code}: {e.read(200).decode('utf-8', 'replace')}"
+            return e.code
+        except (urllib.error.URLError, OSError) as e:
+            self.ultimo_erro = str(getattr(e, "reason", e))
+            return None
+
+    def enviar_lote(self) -> int:
+        """Envia um lote das mensagens vencidas; retorna quantas foram aceitas."""
+        conn = historico.conectar(self.banco)
+        agora = time.time()
+        linhas = conn.execute(
+            "SELECT id, resultado_id, chave, corpo, criado_em, tentativas FROM lims_saida "
+            "WHERE enviado_em IS NULL AND proxima_em <= ? ORDER BY proxima_em, id LIMIT ?",
+            (agora, self.lote)).fetchall()
+        self._lidas = len(linhas)
+        if not linhas:
+            self.espera = 0.0
+            return 0
+        return self._enviar(conn, linhas, agora)
+
+    def _enviar(self, conn, linhas: List, agora: float) -> int:
+        """POST das mensagens; numa recusa do LIMS divide o lote ao meio até isolar as recusadas."""
+        json_lote = ("[" + ",".join(l["corpo"] for l in linhas) + "]").encode("utf-8")
+        corpo = gzip.compress(json_lote, compresslevel=6)
+        chave = hashlib.sha256("\n".join(l["chave"] for l in linhas).encode("utf-8")).hexdigest()[:32]
+        ids = [l["id"] for l in linhas]
+        marcas = ",".join("?" * len(ids))
+
+        status = self._post(corpo, chave)
+        if status is not None and 200 <= status < 300:
+            with conn:
+                conn.execute(f"UPDATE lims_saida SET enviado_em = ?, erro = NULL WHERE id IN ({marcas})",
+                             (datetime.now().isoformat(timespec="seconds"), *ids))
+            self.espera = 0.0
+            self.contadores["enviados"] += len(ids)
+            self.contadores["lotes"] += 1
+            self.contadores["bytes"] += len(corpo)
+            self.contadores["bytes_json"] += len(json_lote)
+            return len(ids)
+
+        self.contadores["falhas"] += 1
+        if _transitorio(status):
+            # A fila fica como está (sem contar tentativa); o remetente inteiro espera antes de tentar de novo
+            self.espera = min(max(self.espera * 2, self.espera_min), self.espera_max)
+            with conn:
+                conn.execute(f"UPDATE lims_saida SET erro = ? WHERE id IN ({marcas})", (self.ultimo_erro, *ids))
+            _log.warning("Envio ao LIMS falhou (%s): %s", status, self.ultimo_erro)
+            return 0
+
+        # Recusa do LIMS (que respondeu: a rede está ok): metades em separado, até a mensagem recusada
+        self.espera = 0.0
+        if len(linhas) > 1:
+            meio = len(linhas) // 2
+            aceitas = self._enviar(conn, linhas[:meio], agora)
+            if self.espera:
+                return aceitas  # a rede caiu no meio da divisão: o resto fica para a retentativa
+            return aceitas + self._enviar(conn, linhas[meio:], agora)
+        self._recusar(conn, linhas[0], agora)
+        return 0
+
+    def _recusar(self, conn, linha, agora: float):
+        """Mensagem recusada sozinha: espera própria crescente ou, após MAX_RECUSAS, fila de rejeitadas."""
+        tentativas = linha["tentativas"] + 1
+        with conn:
+            if tentativas >= MAX_RECUSAS:
+                conn.execute("INSERT INTO lims_rejeitadas VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                             (linha["id"], linha["resultado_id"], linha["chave"], linha["corpo"], linha["criado_em"],
+                              tentativas, self.ultimo_erro, datetime.now().isoformat(timespec="seconds")))
+                conn.execute("DELETE FROM lims_saida WHERE id = ?", (linha["id"],))
+                self.contadores["rejeitadas"] += 1
+                _log.error("Mensagem %s rejeitada pelo LIMS %d vezes, retirada da fila: %s",
+                           linha["chave"], tentativas, self.ultimo_erro)
+                return
+            conn.execute("UPDATE lims_saida SET tentativas = ?, proxima_em = ?, erro = ? WHERE id = ?",
+                         (tentativas, agora + min(self.espera_min * 2 ** tentativas, self.espera_max),
+                          self.ultimo_erro, linha["id"]))
+        _log.warning("Mensagem %s recusada pelo LIMS: %s", linha["chave"], self.ultimo_erro)
+
+_remetente: Optional[Remetente] = None
+_remetente_lock = threading.Lock()
+
+def iniciar(url: Optional[str] = None) -> Optional[Remetente]:
+    """Sobe o remetente do processo uma única vez (só com ``CALCULADORA_LIMS_URL`` definida)."""
+    global _remetente
+    url = url or URL_LIMS
+    if not url:
+        return None
+    with _remetente_lock:
+        if _remetente is None:
+            _remetente = Remetente(url, TOKEN_LIMS)
+            _remetente.iniciar()
+    return _remetente
+
+def situacao(conn=None) -> Dict:
+    """Pendentes, enviados e o erro mais recente da caixa de saída (para o painel)."""
+    conn = conn or historico.conectar()
+    pendentes, mais_antiga = conn.execute(
+        "SELECT COUNT(*), MIN(criado_em) FROM lims_saida WHERE enviado_em IS NULL").fetchone()
+    enviados = conn.execute("SELECT COUNT(*) FROM lims_saida WHERE enviado_em IS NOT NULL").fetchone()[0]
+    rejeitadas = conn.execute("SELECT COUNT(*) FROM lims_rejeitadas").fetchone()[0]
+    erro = conn.execute("SELECT erro FROM lims_saida WHERE enviado_em IS NULL AND erro IS NOT NULL "
+                        "ORDER BY id DESC LIMIT 1").fetchone()
+    r = _remetente
+    return {"ativo": bool(URL_LIMS), "pendentes": pendentes, "mais_antiga": mais_antiga, "enviados": enviados,
+            "rejeitadas": rejeitadas, "erro": erro[0] if erro else None, "espera": r.espera if r else None,
+            "contadores": dict(r.contadores) if r else None}
+
+def reenviar(conn=None) -> int:
+    """Devolve as mensagens rejeitadas à fila (após corrigir o LIMS ou o resultado); retorna quantas."""
+    conn = conn or historico.conectar()
+    with conn:
+        n = conn.execute("INSERT INTO lims_saida (resultado_id, chave, corpo, criado_em) "
+                         "SELECT resultado_id, chave, corpo, criado_em FROM lims_rejeitadas ORDER BY id").rowcount
+        conn.execute("DELETE FROM lims_rejeitadas")
+    if _remetente is not None:
+        _remetente.acordar()
+    return n
+
+# ======================== 3. LIMS SIMULADO (TESTES LOCAIS) ========================
+
+class _TratadorSimulado(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        lims: "LIMSSimulado" = self.server.lims
+        corpo = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if lims.latencia:
+            time.sleep(lims.latencia)
+        if lims.fora_do_ar:
+            self._responder(503, {"erro": "fora do ar"})
+            return
+        chave = self.headers.get("Idempotency-Key")
+        with lims.lock:
+            if chave and chave in lims.lotes:
+                self._responder(200, lims.lotes[chave])  # repetição: mesma resposta, nada gravado
+                return
+        if self.headers.get("Content-Encoding") == "gzip":
+            corpo = gzip.decompress(corpo)
+        try:
+            itens = json.loads(corpo)
+        except ValueError:
+            self._responder(400, {"erro": "JSON inválido"})
+            return
+        if not isinstance(itens, list) or not all(isinstance(i, dict) and i.get("chave") for i in itens):
+            self._responder(422, {"erro": "item sem chave de idempotência"})
+            return
+        recusados = [i["chave"] for i in itens if i["chave"] in lims.recusar]
+        if recusados:
+            self._responder(422, {"erro": f"itens inválidos: {', '.join(recusados)}"})
+            return
+        with lims.lock:
+            novos = [i for i in itens if i["chave"] not in lims.recebidos]
+            lims.primeiro_aceite = lims.primeiro_aceite or time.perf_counter()
+            lims.recebidos.update((i["chave"], i) for i in novos)
+            lims.duplicados += len(itens) - len(novos)
+            resposta = {"aceitos": len(novos), "duplicados": len(itens) - len(novos)}
+            if chave:
+                lims.lotes[chave] = resposta
+        self._responder(200, resposta)
+
+    def _responder(self, status: int, dados: Dict):
+        corpo = json.dumps(dados).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        try:
+            self.wfile.write(corpo)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # o remetente desistiu (timeout): a repetição virá com a mesma chave
+
+    def log_message(self, formato, *args):
+        pass
+
+class LIMSSimulado:
+    """LIMS local para testes: aceita os lotes, deduplica pela chave e simula quedas e recusas.
+
+    Com ``fora_do_ar`` responde 503; um lote com alguma chave em ``recusar`` é recusado
+    inteiro com 422 (validação do LIMS).
+    """
+
+    def __init__(self, porta: int = 0, latencia: float = 0.0):
+        self.recebidos: Dict[str, Dict] = {}
+        self.recusar: set = set()
+        self.lotes: Dict[str, Dict] = {}
+        self.duplicados = 0
+        self.primeiro_aceite: Optional[float] = None
+        self.fora_do_ar = False
+        self.latencia = latencia
+        self.lock = threading.Lock()
+        self._servidor = ThreadingHTTPServer(("127.0.0.1", porta), _TratadorSimulado)
+        self._servidor.daemon_threads = True
+        self._servidor.lims = self
+        threading.Thread(target=self._servidor.serve_forever, name="lims-simulado", daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._servidor.server_port}/resultados"
+
+    def fechar(self):
+        self._servidor.shutdown()
+        self._servidor.server_close()
+
+def simular(resultados: int = 20_000, queda: float = 10.0, rajadas: int = 20, lote: int = LOTE_ENVIO) -> Dict:
+    """Queda da rede com gravações em rajadas e, na volta, a vazão até esvaziar a fila."""
+    if __name__ == "__main__":
+        # Como script este arquivo é ``__main__``, mas os ganchos registrados são os do
+        # módulo ``lims``: a simulação roda nele para usar a mesma caixa de saída
+        import lims
+        return lims.simular(resultados, queda, rajadas, lote)
+    import ganchos  # aqui para não importar em ciclo (ganchos importa este módulo)
+
+    ganchos.registrar()
+    banco = os.path.join(tempfile.mkdtemp(prefix="lims-"), "historico.db")
+    lims = LIMSSimulado()
+    remetente = Remetente(lims.url, banco=banco, lote=lote)
+    remetente.iniciar()
+
+    base = {"produto": "Revestimento", "requisito": "POTENCIAL DE ADERÊNCIA (MPa) - ABNT NBR 15258 - Automática",
+            "ensaio": "aderencia_automatica", "entradas": "{}", "valores": json.dumps([0.31] * 13),
+            "excluidos": "[2, 7]", "media_inicial": 0.31, "resultado": 0.32, "valido": 1, "operador": "simulacao",
+            "origem": "simulacao", "config": None, "versao_formula": 1, "cliente": None,
+            "limites_aplicados": None}
+    lims.fora_do_ar = True
+    inicio = time.perf_counter()
+    gravacao = []
+    for r in range(rajadas):
+        n = resultados // rajadas
+        registros = [dict(base, lote=f"SIM{r:03d}-{i:05d}", criado_em=datetime.now().isoformat(timespec="seconds"))
+                     for i in range(n)]
+        t = time.perf_counter()
+        with caixa_ativa():
+            historico.salvar_resultados(registros, historico.conectar(banco))
+        gravacao.append((time.perf_counter() - t) / n)
+        remetente.acordar()
+        time.sleep(queda / rajadas)
+    lims.fora_do_ar = False
+    volta = time.perf_counter()  # a drenagem inclui o resto da espera de retentativa em curso
+    total = (resultados // rajadas) * rajadas
+    while len(lims.recebidos) < total and time.perf_counter() - volta < 120:
+        time.sleep(0.05)
+    drenagem = time.perf_counter() - volta
+    espera = (lims.primeiro_aceite or volta) - volta
+    remetente.parar()
+    lims.fechar()
+    c = remetente.contadores
+    return {"resultados": total, "recebidos": len(lims.recebidos), "duplicados": lims.duplicados,
+            "falhas": c["falhas"], "lotes": c["lotes"], "drenagem_s": drenagem, "espera_s": espera,
+            "vazao": len(lims.recebidos) / (drenagem - espera) if drenagem > espera else None,
+            "compressao": c["bytes_json"] / c["bytes"] if c["bytes"] else None,
+            "gravacao_ms": 1000 * sum(gravacao) / len(gravacao), "segundos": time.perf_counter() - inicio}
+
+# ======================== 4. LINHA DE COMANDO ========================
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Caixa de saída de resultados para o LIMS.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    sub.add_parser("situacao", help="Mensagens pendentes e enviadas")
+    sub.add_parser("reenviar", help="Devolve as mensagens rejeitadas pelo LIMS à fila")
+    p = sub.add_parser("simular", help="Queda de rede e recuperação contra um LIMS simulado local")
+    p.add_argument("--resultados", type=int, default=20_000)
+    p.add_argument("--queda", type=float, default=10.0, help="Segundos com o LIMS fora do ar")
+    p.add_argument("--lote", type=int, default=LOTE_ENVIO)
+    args = parser.parse_args(argv)
+
+    if args.comando == "situacao":
+        s = situacao()
+        print(f"Pendentes: {s['pendentes']} (mais antiga: {s['mais_antiga'] or '-'}) | Enviadas: {s['enviados']} | "
+              f"Rejeitadas: {s['rejeitadas']}")
+        if s["erro"]:
+            print(f"Último erro: {s['erro']}")
+        return
+    if args.comando == "reenviar":
+        print(f"{reenviar()} mensagem(ns) devolvida(s) à fila.")
+        return
+    r = simular(args.resultados, args.queda, lote=args.lote)
+    print(f"Recebidos: {r['recebidos']}/{r['resultados']} | Duplicados no LIMS: {r['duplicados']} | "
+          f"Falhas durante a queda: {r['falhas']}")
+    print(f"Fila drenada em {r['drenagem_s']:.2f} s após a volta, {r['espera_s']:.1f} s deles na espera de retentativa "
+          f"({r['vazao'] or 0:.0f} resultados/s enviando, "
+          f"{r['lotes']} lotes, gzip {r['compressao'] or 0:.1f}x) | Gravação: {r['gravacao_ms']:.3f} ms/resultado")
+
+if __name__ == "__main__":
+    main()
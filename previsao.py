@@ -0,0 +1,291 @@
+"""Previsão da resistência aos 28 dias a partir dos ensaios em idade precoce.
+
+Para cada linha de produto há um modelo por (requisito alvo aos 28 dias, requisito e
+idade de origem): ex, compressão 5x10 aos 28 dias a partir da compressão 5x10 aos
+7 dias, ou flexão aos 28 dias a partir da compressão 4x4x16 aos 3 dias. O modelo é
+log-log, ln(y28) = a + b·ln(x), como a curva de ganho de resistência do cimento,
+e é ajustado por mínimos quadrados recursivos (RLS) com fator de esquecimento:
+cada par (resultado precoce, resultado aos 28 dias) de um lote atualiza o modelo
+em O(1), no gancho da mesma transação em que o resultado é gravado, sem nunca
+reajustar do zero. O esquecimento (~500 lotes de memória) acompanha mudanças
+lentas de matéria-prima.
+
+A idade de cada resultado vem do item da agenda que ele baixou (ver agenda.py);
+resultados sem agenda não entram. O intervalo é de previsão (95%), com a variância
+residual estimada a partir dos erros a priori de cada atualização.
+
+Os modelos ficam na tabela ``previsao_modelos`` e em memória no processo: a previsão
+nas páginas das calculadoras é só aritmética sobre uma tupla (microssegundos).
+
+Uso:
+    python previsao.py reconstruir     # primeiro uso em um banco que já tem histórico
+    python previsao.py modelos
+"""
+import argparse
+import logging
+import math
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional
+
+import agenda  # noqa: F401 (tabela da agenda, lida pelo gancho; a ordem dos ganchos fica em ganchos.py)
+import ensaios
+import historico
+
+_log = logging.getLogger(__name__)
+
+IDADE_ALVO = 28
+# Ensaios previstos aos 28 dias e ensaios precoces usados como origem
+ALVOS = (ensaios.ENS_COMPRESSAO_4X4X16, ensaios.ENS_COMPRESSAO_5X10, ensaios.ENS_FLEXAO)
+ORIGENS = (ensaios.ENS_COMPRESSAO_4X4X16, ensaios.ENS_COMPRESSAO_5X10, ensaios.ENS_FLEXAO)
+
+FATOR_ESQUECIMENTO = 0.998
+P_INICIAL = 1e3          # covariância inicial (sem informação); parte de a = 0, b = 1 (y28 = x)
+N_MINIMO = 8             # lotes pareados antes de o modelo ser usado
+# Modelos gravados por outro processo (importação) chegam aqui no máximo após este tempo
+VALIDADE_MEMORIA = 300.0
+
+# t de Student bilateral 95% por graus de liberdade (acima de 30: normal)
+_T95 = {1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447, 7: 2.365, 8: 2.306, 9: 2.262,
+        10: 2.228, 12: 2.179, 15: 2.131, 20: 2.086, 25: 2.060, 30: 2.042}
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS previsao_modelos (
+    produto   TEXT NOT NULL,
+    alvo      TEXT NOT NULL,
+    origem    TEXT NOT NULL,
+    idade     INTEGER NOT NULL,
+    n         INTEGER NOT NULL,
+    a         REAL NOT NULL,
+    b         REAL NOT NULL,
+    p11       REAL NOT NULL,
+    p12       REAL NOT NULL,
+    p22       REAL NOT NULL,
+    peso      REAL NOT NULL,
+    s2        REAL NOT NULL,
+    atualizado_em TEXT NOT NULL,
+    PRIMARY KEY (produto, alvo, origem, idade)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS previsao_pares (
+    lote      TEXT NOT NULL,
+    alvo      TEXT NOT NULL,
+    origem    TEXT NOT NULL,
+    idade     INTEGER NOT NULL,
+    PRIMARY KEY (lote, alvo, origem, idade)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS previsao_meta (
+    chave     TEXT PRIMARY KEY,
+    valor     TEXT
+);
+"""
+
+historico.registrar_esquema(_ESQUEMA)
+
+class Modelo(NamedTuple):
+    n: int
+    a: float
+    b: float
+    p11: float
+    p12: float
+    p22: float
+    peso: float   # soma dos pesos com esquecimento (média da variância residual)
+    s2: float     # variância residual (escala log)
+
+MODELO_INICIAL = Modelo(0, 0.0, 1.0, P_INICIAL, 0.0, P_INICIAL, 0.0, 0.0)
+
+class Previsao(NamedTuple):
+    alvo: str
+    origem: str
+    idade: int
+    valor: float
+    minimo: float
+    maximo: float
+    n: int
+
+# ======================== 1. RLS ========================
+
+def atualizar(m: Modelo, x: float, y: float, esquecimento: float = FATOR_ESQUECIMENTO) -> Modelo:
+    """Um passo de RLS com o par (x precoce, y aos 28 dias), ambos positivos."""
+    u, z = math.log(x), math.log(y)
+    # P·φ com φ = (1, u)
+    g1, g2 = m.p11 + m.p12 * u, m.p12 + m.p22 * u
+    h = g1 + u * g2                          # φᵀ·P·φ
+    erro = z - (m.a + m.b * u)               # erro a priori
+    den = esquecimento + h
+    k1, k2 = g1 / den, g2 / den
+    peso = esquecimento * m.peso + 1.0
+    # Var(erro a priori) = σ²·(1 + φᵀPφ): a média ponderada estima σ²
+    s2 = m.s2 + (erro * erro / (1.0 + h) - m.s2) / peso
+    return Modelo(m.n + 1, m.a + k1 * erro, m.b + k2 * erro,
+                  (m.p11 - k1 * g1) / esquecimento, (m.p12 - k1 * g2) / esquecimento,
+                  (m.p22 - k2 * g2) / esquecimento, peso, s2)
+
+def _t95(graus: int) -> float:
+    if graus > 30:
+        return 1.96
+    return _T95[max(g for g in _T95 if g <= max(graus, 1))]
+
+def estimar(m: Modelo, x: float) -> tuple:
+    """(mediana, mínimo, máximo) da previsão aos 28 dias para o resultado precoce x."""
+    u = math.log(x)
+    centro = m.a + m.b * u
+    h = m.p11 + 2.0 * m.p12 * u + m.p22 * u * u
+    meia = _t95(m.n - 2) * math.sqrt(m.s2 * (1.0 + h))
+    return math.exp(centro), math.exp(centro - meia), math.exp(centro + meia)
+
+# ======================== 2. APRENDIZADO INCREMENTAL (GANCHO) ========================
+
+_MARCAS = ",".join("?" * len(ORIGENS))
+_SQL_PRECOCES = f"""
+SELECT r.requisito, a.idade_dias, r.resultado FROM agenda a JOIN resultados r ON r.id = a.resultado_id
+WHERE a.lote = ? AND a.idade_dias < ? AND r.valido = 1 AND r.resultado > 0 AND r.ensaio IN ({_MARCAS})
+"""
+_SQL_ALVOS = f"""
+SELECT r.requisito, r.resultado FROM agenda a JOIN resultados r ON r.id = a.resultado_id
+WHERE a.lote = ? AND a.idade_dias = ? AND r.valido = 1 AND r.resultado > 0 AND r.ensaio IN ({_MARCAS})
+"""
+
+_local = threading.local()
+
+def aprender(conn, registro: Dict, id_: int):
+    """Gancho de transação: pareia o resultado com os do mesmo lote em outra idade e atualiza os modelos."""
+    lote, ensaio = registro.get("lote"), registro["ensaio"]
+    if not lote or ensaio not in ORIGENS + ALVOS or not registro["valido"] or not (registro["resultado"] or 0) > 0:
+        return
+    linha = conn.execute("SELECT idade_dias FROM agenda WHERE lote = ? AND requisito = ? AND resultado_id = ?",
+                         (lote, registro["requisito"], id_)).fetchone()
+    if linha is None:
+        return
+    idade, requisito, valor = linha[0], registro["requisito"], registro["resultado"]
+    if idade == IDADE_ALVO and ensaio in ALVOS:
+        pares = [(requisito, origem, idade_origem, x, valor)
+                 for origem, idade_origem, x in conn.execute(_SQL_PRECOCES, (lote, IDADE_ALVO, *ORIGENS))]
+    elif idade < IDADE_ALVO and ensaio in ORIGENS:
+        # Resultado precoce digitado depois do de 28 dias (lançamento atrasado)
+        pares = [(alvo, requisito, idade, valor, y)
+                 for alvo, y in conn.execute(_SQL_ALVOS, (lote, IDADE_ALVO, *ALVOS))]
+    else:
+        return
+    agora = registro["criado_em"]
+    for alvo, origem, idade_origem, x, y in pares:
+        # Cada par entra uma vez (regravar o mesmo ensaio não pesa em dobro)
+        if conn.execute("INSERT OR IGNORE INTO previsao_pares VALUES (?, ?, ?, ?)",
+                        (lote, alvo, origem, idade_origem)).rowcount == 0:
+            continue
+        chave = (registro["produto"], alvo, origem, idade_origem)
+        atual = conn.execute("SELECT n, a, b, p11, p12, p22, peso, s2 FROM previsao_modelos "
+                             "WHERE produto = ? AND alvo = ? AND origem = ? AND idade = ?", chave).fetchone()
+        m = atualizar(Modelo(*atual) if atual else MODELO_INICIAL, x, y)
+        conn.execute("INSERT OR REPLACE INTO previsao_modelos VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                     (*chave, *m, agora))
+        _local.mudou = True
+
+def publicar(registro: Dict, id_: int):
+    """Ouvinte após o commit: a próxima previsão relê os modelos atualizados."""
+    if getattr(_local, "mudou", False):
+        _local.mudou = False
+        _memoria.modelos = None
+
+
+def reconstruir(conn=None) -> int:
+    """Refaz os modelos percorrendo o histórico na ordem de gravação (primeiro uso)."""
+    conn = conn or historico.conectar()
+    total = 0
+    with conn:
+        conn.execute("DELETE FROM previsao_modelos")
+        conn.execute("DELETE FROM previsao_pares")
+        cur = conn.execute(
+            f"SELECT r.id, r.lote, r.produto, r.requisito, r.ensaio, r.resultado, r.valido, r.criado_em "
+            f"FROM resultados r WHERE r.lote IS NOT NULL AND r.ensaio IN ({_MARCAS}) ORDER BY r.id", ORIGENS)
+        for linha in cur.fetchall():
+            aprender(conn, dict(linha), linha["id"])
+            total += 1
+        conn.execute("INSERT OR REPLACE INTO previsao_meta VALUES ('montado_em', ?)",
+                     (datetime.now().isoformat(timespec="seconds"),))
+    _memoria.modelos = None
+    return total
+
+# ======================== 3. PREVISÃO (EM MEMÓRIA) ========================
+
+class _Memoria:
+    modelos: Optional[Dict[tuple, Modelo]] = None
+    lido_em: float = 0.0
+
+_memoria = _Memoria()
+_memoria_lock = threading.Lock()
+
+def modelos(conn=None) -> Dict[tuple, Modelo]:
+    """Modelos do processo {(produto, alvo, origem, idade): Modelo}, lidos do banco uma vez."""
+    atuais = _memoria.modelos
+    if atuais is not None and time.monotonic() - _memoria.lido_em < VALIDADE_MEMORIA:
+        return atuais
+    with _memoria_lock:
+        if _memoria.modelos is None or time.monotonic() - _memoria.lido_em >= VALIDADE_MEMORIA:
+            conn = conn or historico.conectar()
+            if conn.execute("SELECT 1 FROM previsao_meta WHERE chave = 'montado_em'").fetchone() is None:
+                _log.info("Montando os modelos de previsão a partir do histórico (primeiro uso)")
+                reconstruir(conn)
+            _memoria.modelos = {
+                (r["produto"], r["alvo"], r["origem"], r["idade"]): Modelo(*tuple(r)[4:12])
+                for r in conn.execute("SELECT * FROM previsao_modelos")}
+            _memoria.lido_em = time.monotonic()
+        return _memoria.modelos
+
+def prever(produto: str, alvo: str, origem: str, idade: int, valor: float) -> Optional[Previsao]:
+    """Previsão do alvo aos 28 dias a partir do resultado de ``origem`` na ``idade`` (None sem modelo)."""
+    m = modelos().get((produto, alvo, origem, idade))
+    if m is None or m.n < N_MINIMO or not valor > 0:
+        return None
+    return Previsao(alvo, origem, idade, *estimar(m, valor), m.n)
+
+def alvos(produto: str) -> List[str]:
+    return [r for r in ensaios.REQUISITOS.get(produto, []) if ensaios.identificar_ensaio(produto, r) in ALVOS]
+
+def prever_resultado(produto: str, requisito: str, idade: int, valor: float) -> List[Previsao]:
+    """Previsões aos 28 dias de cada alvo da linha a partir de um resultado precoce."""
+    if idade >= IDADE_ALVO:
+        return []
+    return [p for p in (prever(produto, alvo, requisito, idade, valor) for alvo in alvos(produto)) if p]
+
+def idade_do_resultado(lote: str, requisito: str, id_: int, conn=None) -> Optional[int]:
+    """Idade (dias) do item da agenda baixado pelo resultado; None se não havia agenda."""
+    conn = conn or historico.conectar()
+    linha = conn.execute("SELECT idade_dias FROM agenda WHERE lote = ? AND requisito = ? AND resultado_id = ?",
+                         (lote, requisito, id_)).fetchone()
+    return linha[0] if linha else None
+
+def prever_lote(lote: str, produto: str, conn=None) -> List[Previsao]:
+    """Para cada alvo ainda sem resultado aos 28 dias, a previsão pelo resultado precoce mais tardio."""
+    conn = conn or historico.conectar()
+    feitos = {r for r, _ in conn.execute(_SQL_ALVOS, (lote, IDADE_ALVO, *ALVOS))}
+    precoces = sorted(conn.execute(_SQL_PRECOCES, (lote, IDADE_ALVO, *ORIGENS)), key=lambda r: r[1])
+    previsoes = {}
+    for origem, idade, valor in precoces:  # idades crescentes: a mais tardia prevalece
+        for alvo in alvos(produto):
+            p = None if alvo in feitos else prever(produto, alvo, origem, idade, valor)
+            if p:
+                previsoes[alvo] = p
+    return list(previsoes.values())
+
+# ======================== 4. LINHA DE COMANDO ========================
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Modelos de previsão da resistência aos 28 dias.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    sub.add_parser("reconstruir", help="Refaz os modelos a partir do histórico")
+    sub.add_parser("modelos", help="Lista os modelos e seus coeficientes")
+    args = parser.parse_args(argv)
+
+    if args.comando == "reconstruir":
+        inicio = time.perf_counter()
+        n = reconstruir()
+        print(f"{n} resultados percorridos, {len(modelos())} modelos em {time.perf_counter() - inicio:.1f} s")
+        return
+    for (produto, alvo, origem, idade), m in sorted(modelos().items()):
+        print(f"{produto} | {ensaios.identificar_ensaio(produto, alvo)} 28d <- "
+              f"{ensaios.identificar_ensaio(produto, origem)} {idade}d: n={m.n} "
+              f"ln(y) = {m.a:.3f} + {m.b:.3f}·ln(x), s = {math.sqrt(m.s2):.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+"""Ensaios de proficiência (interlaboratoriais) segundo a ISO 13528.
+
+Em cada rodada, vários laboratórios ensaiam a mesma amostra (Rejunte,
+Revestimento...) em capilaridade, aderência, compressão etc. Este módulo importa
+os resultados de todos os participantes e calcula, por rodada e ensaio:
+
+    * valor designado x_pt e desvio robusto s* pelo Algoritmo A (ISO 13528, C.3);
+    * desvio-padrão para avaliação σ_pt: o s* robusto ou, quando configurado em
+      SIGMA_PT_PCT, um percentual fixo de x_pt ("adequação ao propósito");
+    * incerteza do valor designado u(x_pt) = 1,25·s*/√p;
+    * escores z, z' (quando u(x_pt) > 0,3·σ_pt) e ζ (com a incerteza declarada
+      pelo participante) e a avaliação (satisfatório |z| ≤ 2, questionável, insatisfatório ≥ 3).
+
+Tudo é vetorizado: os resultados de todas as rodadas e ensaios formam uma matriz
+(grupos x laboratórios, NaN onde o laboratório não participou) e o Algoritmo A
+itera todas as linhas de uma vez. Reanalisar anos de rodadas leva frações de segundo.
+
+Os resultados do nosso laboratório (``CALCULADORA_LABORATORIO``) são ligados ao
+cálculo gravado no histórico: a amostra da rodada é registrada como lote no app,
+e o escore guarda o id do resultado correspondente. Se o arquivo da rodada não
+trouxer o nosso resultado, ele é completado com o do histórico.
+
+Uso:
+    python proficiencia.py importar rodada_2024_1.csv [...]
+    python proficiencia.py analisar
+    python proficiencia.py escores [--laboratorio LAB] [--ensaio capilaridade]
+
+CSV (separador vírgula ou ponto e vírgula): rodada, produto, amostra, ensaio,
+laboratorio, resultado e, opcionalmente, data e incerteza (incerteza-padrão).
+O ensaio pode vir pela chave (``capilaridade``) ou pelo nome do requisito.
+"""
+import argparse
+import csv
+import math
+import os
+import time
+import warnings
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence
+
+import ensaios
+import historico
+from ensaios import norm
+
+if TYPE_CHECKING:
+    import numpy as np
+
+LABORATORIO_PROPRIO = os.environ.get("CALCULADORA_LABORATORIO", "PROPRIO")
+
+# σ_pt como percentual de x_pt por ensaio (ausente = s* robusto da própria rodada)
+SIGMA_PT_PCT: Dict[str, float] = {}
+
+# Algoritmo A: convergência na terceira algarismo significativo (ISO 13528, C.3.1)
+TOLERANCIA_ALGORITMO_A = 1e-3
+MAX_ITERACOES = 100
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS prof_rodadas (
+    rodada     TEXT PRIMARY KEY,
+    produto    TEXT NOT NULL,
+    amostra    TEXT,
+    data       TEXT,
+    importado_em TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS prof_resultados (
+    rodada       TEXT NOT NULL,
+    ensaio       TEXT NOT NULL,
+    laboratorio  TEXT NOT NULL,
+    resultado    REAL NOT NULL,
+    incerteza    REAL,
+    resultado_id INTEGER,
+    PRIMARY KEY (rodada, ensaio, laboratorio)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS prof_escores (
+    rodada       TEXT NOT NULL,
+    ensaio       TEXT NOT NULL,
+    laboratorio  TEXT NOT NULL,
+    resultado    REAL NOT NULL,
+    x_pt         REAL,
+    sigma_pt     REAL,
+    u_xpt        REAL,
+    participantes INTEGER NOT NULL,
+    z            REAL,
+    z_linha      REAL,
+    zeta         REAL,
+    avaliacao    TEXT,
+    resultado_id INTEGER,
+    PRIMARY KEY (rodada, ensaio, laboratorio)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS ix_prof_escores_lab ON prof_escores (laboratorio, ensaio);
+"""
+
+historico.registrar_esquema(_ESQUEMA)
+
+# ======================== 1. ESTATÍSTICA ROBUSTA (VETORIZADA) ========================
+
+def algoritmo_a(x: "np.ndarray", tolerancia: float = TOLERANCIA_ALGORITMO_A,
+                max_iteracoes: int = MAX_ITERACOES) -> Dict[str, "np.ndarray"]:
+    """Algoritmo A da ISO 13528 (C.3) em cada linha de ``x`` (NaN = sem resultado).
+
+    Começa com x* = mediana e s* = 1,483·MAD; a cada iteração os valores fora de
+    x* ± 1,5·s* são trazidos para os limites e x*, s* recalculados (s* = 1,134·desvio).
+    Para quando x* e s* variam menos que ``tolerancia`` (relativa) em todas as linhas.
+    """
+    import numpy as np  # só na análise: o app abre sem numpy
+
+    x = np.asarray(x, dtype=float)
+    p = np.sum(np.isfinite(x), axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # nanmedian/nanmean de linha sem resultados
+        centro = np.nanmedian(x, axis=1)
+        desvio = 1.483 * np.nanmedian(np.abs(x - centro[:, None]), axis=1)
+        iteracoes = np.zeros(len(x), dtype=int)
+        ativos = (p >= 2) & (desvio > 0)
+        for _ in range(max_iteracoes):
+            if not ativos.any():
+                break
+            delta = 1.5 * desvio[ativos, None]
+            recortado = np.clip(x[ativos], centro[ativos, None] - delta, centro[ativos, None] + delta)
+            novo_centro = np.nanmean(recortado, axis=1)
+            novo_desvio = 1.134 * np.nanstd(recortado, axis=1, ddof=1)
+            parado = ((np.abs(novo_centro - centro[ativos]) <= tolerancia * np.abs(novo_centro))
+                      & (np.abs(novo_desvio - desvio[ativos]) <= tolerancia * novo_desvio))
+            centro[ativos], desvio[ativos] = novo_centro, novo_desvio
+            iteracoes[ativos] += 1
+            ativos[np.flatnonzero(ativos)[parado]] = False
+    return {"x_pt": centro, "s_robusto": desvio, "participantes": p, "iteracoes": iteracoes,
+            "u_xpt": 1.25 * desvio / np.sqrt(np.maximum(p, 1))}
+
+def _real(v: float) -> Optional[float]:
+    return v if math.isfinite(v) else None
+
+def avaliar(z: "np.ndarray") -> "np.ndarray":
+    """Avaliação pelo escore: satisfatório (|z| ≤ 2), questionável (2 < |z| < 3), insatisfatório."""
+    import numpy as np
+
+    a = np.abs(z)
+    return np.select([a <= 2, a < 3, a >= 3], ["satisfatorio", "questionavel", "insatisfatorio"], default="")
+
+def escores(x: "np.ndarray", u_x: "np.ndarray", ensaios_grupo: Sequence[str]) -> Dict[str, "np.ndarray"]:
+    """Consenso e escores de todos os grupos (linhas) e laboratórios (colunas) de uma vez."""
+    import numpy as np
+
+    a = algoritmo_a(x)
+    pct = np.array([SIGMA_PT_PCT.get(e, np.nan) for e in ensaios_grupo], dtype=float)
+    sigma_pt = np.where(np.isfinite(pct), pct / 100 * np.abs(a["x_pt"]), a["s_robusto"])
+    sigma_pt = np.where(sigma_pt > 0, sigma_pt, np.nan)  # rodada sem dispersão: sem escore z
+    with np.errstate(invalid="ignore", divide="ignore"):
+        desvio = x - a["x_pt"][:, None]
+        z = desvio / sigma_pt[:, None]
+        z_linha = desvio / np.sqrt(sigma_pt ** 2 + a["u_xpt"] ** 2)[:, None]
+        zeta = desvio / np.sqrt(u_x ** 2 + (a["u_xpt"] ** 2)[:, None])
+    # ISO 13528, 9.5: com u(x_pt) > 0,3·σ_pt a avaliação passa a usar z'
+    incerteza_alta = a["u_xpt"] > 0.3 * sigma_pt
+    criterio = np.where(incerteza_alta[:, None], z_linha, z)
+    return dict(a, sigma_pt=sigma_pt, z=z, z_linha=z_linha, zeta=zeta, incerteza_alta=incerteza_alta,
+                avaliacao=np.where(np.isfinite(criterio), avaliar(criterio), ""))
+
+# ======================== 2. IMPORTAÇÃO DAS RODADAS ========================
+
+def _ensaio(valor: str, produto: str) -> str:
+    chave = valor.strip()
+    if chave in ensaios.CAMPOS_ENSAIO:
+        return chave
+    requisito = next((r for r in ensaios.REQUISITOS.get(produto, []) if norm(r).startswith(norm(chave))), None)
+    ensaio = ensaios.identificar_ensaio(produto, requisito) if requisito else None
+    if ensaio is None:
+        raise ValueError(f"Ensaio não reconhecido para {produto}: {valor}")
+    return ensaio
+
+def _numero(valor: Optional[str]) -> Optional[float]:
+    valor = (valor or "").strip().replace(",", ".")
+    return float(valor) if valor else None
+
+def ler_csv(caminho: str) -> List[Dict]:
+    """Linhas do arquivo da rodada, com o ensaio já identificado."""
+    with open(caminho, newline="", encoding="utf-8-sig") as f:
+        amostra = f.read(4096)
+        f.seek(0)
+        leitor = csv.DictReader(f, dialect=csv.Sniffer().sniff(amostra, delimiters=",;"))
+        linhas = []
+        for n, linha in enumerate(leitor, start=2):
+            linha = {norm(k).replace(" ", "_"): (v or "").strip() for k, v in linha.items() if k}
+            try:
+                resultado = _numero(linha.get("resultado"))
+                if resultado is None:
+                    continue
+                linhas.append({
+                    "rodada": linha["rodada"], "produto": linha["produto"], "amostra": linha.get("amostra") or None,
+                    "data": linha.get("data") or None, "ensaio": _ensaio(linha["ensaio"], linha["produto"]),
+                    "laboratorio": linha["laboratorio"], "resultado": resultado,
+                    "incerteza": _numero(linha.get("incerteza")),
+                })
+            except (KeyError, ValueError) as e:
+                raise ValueError(f"{caminho}, linha {n}: {e}") from e
+    return linhas
+
+# Cálculo gravado pelo nosso laboratório para a amostra da rodada (último válido)
+_SQL_PROPRIO = """
+SELECT id, resultado FROM resultados
+WHERE lote = ? AND ensaio = ? AND valido = 1 AND resultado IS NOT NULL
+ORDER BY id DESC LIMIT 1
+"""
+
+def importar(caminhos: Sequence[str], conn=None) -> Dict:
+    """Grava os resultados das rodadas (substitui os da mesma rodada/ensaio/laboratório)."""
+    conn = conn or historico.conectar()
+    linhas = [l for c in caminhos for l in ler_csv(c)]
+    agora = datetime.now().isoformat(timespec="seconds")
+    rodadas = {l["rodada"]: l for l in linhas}
+    ligados = 0
+    with conn:
+        conn.executemany(
+            "INSERT INTO prof_rodadas (rodada, produto, amostra, data, importado_em) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (rodada) DO UPDATE SET produto = excluded.produto, "
+            "amostra = COALESCE(excluded.amostra, amostra), data = COALESCE(excluded.data, data), "
+            "importado_em = excluded.importado_em",
+            [(r, l["produto"], l["amostra"], l["data"], agora) for r, l in rodadas.items()])
+        conn.executemany(
+            "INSERT OR REPLACE INTO prof_resultados (rodada, ensaio, laboratorio, resultado, incerteza) "
+            "VALUES (:rodada, :ensaio, :laboratorio, :resultado, :incerteza)", linhas)
+        # Nosso resultado: liga ao cálculo gravado (ou completa a rodada com ele)
+        for rodada, ensaio in {(l["rodada"], l["ensaio"]) for l in linhas}:
+            amostra = conn.execute("SELECT amostra FROM prof_rodadas WHERE rodada = ?", (rodada,)).fetchone()[0]
+            proprio = conn.execute(_SQL_PROPRIO, (amostra, ensaio)).fetchone() if amostra else None
+            if proprio is None:
+                continue
+            ligados += conn.execute(
+                "INSERT INTO prof_resultados (rodada, ensaio, laboratorio, resultado, resultado_id) "
+                "VALUES (?, ?, ?, ?, ?) ON CONFLICT (rodada, ensaio, laboratorio) "
+                "DO UPDATE SET resultado_id = excluded.resultado_id",
+                (rodada, ensaio, LABORATORIO_PROPRIO, proprio["resultado"], proprio["id"])).rowcount
+    return {"rodadas": len(rodadas), "resultados": len(linhas), "ligados": ligados}
+
+# ======================== 3. ANÁLISE (TODAS AS RODADAS DE UMA VEZ) ========================
+
+def analisar(rodadas: Optional[Sequence[str]] = None, conn=None) -> Dict:
+    """Recalcula consenso e escores das rodadas (todas, por padrão) e grava em ``prof_escores``."""
+    import numpy as np
+
+    conn = conn or historico.conectar()
+    inicio = time.perf_counter()
+    sql = "SELECT rodada, ensaio, laboratorio, resultado, incerteza, resultado_id FROM prof_resultados"
+    params: tuple = ()
+    if rodadas:
+        sql += f" WHERE rodada IN ({','.join('?' * len(rodadas))})"
+        params = tuple(rodadas)
+    linhas = conn.execute(sql, params).fetchall()
+    if not linhas:
+        return {"grupos": 0, "resultados": 0, "segundos": time.perf_counter() - inicio}
+
+    rodada, ensaio, lab, resultado, incerteza, resultado_id = (np.array(c, dtype=object) for c in zip(*linhas))
+    chaves = np.char.add(np.char.add(rodada.astype(str), "\x1f"), ensaio.astype(str))
+    grupos, linha = np.unique(chaves, return_inverse=True)
+    labs, coluna = np.unique(lab.astype(str), return_inverse=True)
+    x = np.full((len(grupos), len(labs)), np.nan)
+    u_x = np.full_like(x, np.nan)
+    x[linha, coluna] = resultado.astype(float)
+    u_x[linha, coluna] = np.array([np.nan if u is None else u for u in incerteza], dtype=float)
+    ensaio_do_grupo = [g.split("\x1f", 1)[1] for g in grupos]
+
+    e = escores(x, u_x, ensaio_do_grupo)
+    # De volta às linhas importadas: valores do grupo (rodada, ensaio) e da célula (grupo, laboratório)
+    grupo = [e[k][linha].tolist() for k in ("x_pt", "sigma_pt", "u_xpt", "participantes")]
+    celula = [e[k][linha, coluna].tolist() for k in ("z", "z_linha", "zeta", "avaliacao")]
+    registros = zip(rodada, ensaio, lab, resultado, *grupo, *celula, resultado_id)
+    with conn:
+        if rodadas:
+            conn.execute(f"DELETE FROM prof_escores WHERE rodada IN ({','.join('?' * len(rodadas))})", params)
+        else:
+            conn.execute("DELETE FROM prof_escores")
+        conn.executemany(
+            "INSERT INTO prof_escores VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(r, en, la, res, _real(xpt), _real(s), _real(u), p, _real(z), _real(zl), _real(zt),
+              av or None, rid) for r, en, la, res, xpt, s, u, p, z, zl, zt, av, rid in registros])
+    return {"grupos": len(grupos), "laboratorios": len(labs), "resultados": len(linhas),
+            "segundos": time.perf_counter() - inicio}
+
+def escores_do_laboratorio(laboratorio: Optional[str] = None, ensaio: Optional[str] = None,
+                           conn=None) -> List[Dict]:
+    """Histórico de escores de um laboratório (o nosso, por padrão), com o lote do cálculo ligado."""
+    conn = conn or historico.conectar()
+    sql = ("SELECT e.*, r.produto, r.amostra, r.data, h.lote, h.criado_em AS calculado_em "
+           "FROM prof_escores e JOIN prof_rodadas r ON r.rodada = e.rodada "
+           "LEFT JOIN resultados h ON h.id = e.resultado_id WHERE e.laboratorio = ?")
+    params = [laboratorio or LABORATORIO_PROPRIO]
+    if ensaio:
+        sql += " AND e.ensaio = ?"
+        params.append(ensaio)
+    return [dict(r) for r in conn.execute(sql + " ORDER BY r.data, e.rodada, e.ensaio", params)]
+
+def escores_da_amostra(amostra: str, conn=None) -> List[Dict]:
+    """Escores do nosso laboratório nas rodadas cuja amostra é este lote."""
+    conn = conn or historico.conectar()
+    return [dict(r) for r in conn.execute(
+        "SELECT e.* FROM prof_escores e JOIN prof_rodadas r ON r.rodada = e.rodada "
+        "WHERE r.amostra = ? AND e.laboratorio = ? ORDER BY e.rodada, e.ensaio", (amostra, LABORATORIO_PROPRIO))]
+
+# ======================== 4. LINHA DE COMANDO ========================
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Ensaios de proficiência (ISO 13528): consenso e escores z/ζ.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p = sub.add_parser("importar", help="Importa os resultados dos participantes (CSV) e reanalisa as rodadas")
+    p.add_argument("arquivos", nargs="+")
+    p = sub.add_parser("analisar", help="Recalcula consenso e escores de todas as rodadas")
+    p.add_argument("--rodada", action="append", help="Só estas rodadas (pode repetir)")
+    p = sub.add_parser("escores", help="Escores de um laboratório")
+    p.add_argument("--laboratorio", default=LABORATORIO_PROPRIO)
+    p.add_argument("--ensaio")
+    args = parser.parse_args(argv)
+
+    if args.comando == "importar":
+        r = importar(args.arquivos)
+        print(f"{r['resultados']} resultados de {r['rodadas']} rodadas importados "
+              f"({r['ligados']} ligados ao histórico)")
+        args.rodada = None
+    if args.comando in ("importar", "analisar"):
+        r = analisar(args.rodada)
+        print(f"{r['grupos']} rodadas x ensaios, {r['resultados']} resultados analisados "
+              f"em {r['segundos'] * 1000:.0f} ms")
+        return
+    for e in escores_do_laboratorio(args.laboratorio, args.ensaio):
+        z = "-" if e["z"] is None else f"{e['z']:+.2f}"
+        zeta = "-" if e["zeta"] is None else f"{e['zeta']:+.2f}"
+        ligado = f"  lote {e['lote']} ({e['calculado_em']})" if e["lote"] else ""
+        print(f"{e['rodada']:<14} {e['ensaio']:<22} x={e['resultado']:<10.4g} x_pt={e['x_pt'] or float('nan'):<10.4g} "
+              f"z={z:>6} ζ={zeta:>6}  {e['avaliacao'] or '-'}{ligado}")
+
+if __name__ == "__main__":
+    main()
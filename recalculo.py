@@ -0,0 +1,228 @@
+"""Recálculo incremental do histórico quando limites ou fórmulas mudam.
+
+Cada resultado gravado guarda os limites de CONFIG_LIMITES que a regra usou
+(coluna ``config``) e a versão da fórmula (``versao_formula``). Ao alterar um
+limite (ex: ``aderencia_var_pct`` do Revestimento) ou incrementar a versão de uma
+fórmula em ensaios.VERSOES_FORMULA, só os resultados cujo registro difere da
+configuração atual são recalculados — os demais produtos/ensaios nem são lidos.
+Resultados de um cliente com limites próprios (coluna ``cliente``) são comparados
+com a camada desse cliente (ver ensaios.limites_produto).
+O recálculo roda em blocos no pool de processos e gera o relatório dos resultados
+que mudaram de situação (válido <-> inválido); os indicadores do painel são
+remontados ao final quando algum resultado mudou, e cada resultado alterado ganha
+uma nova revisão na caixa de saída do LIMS (ver lims.py).
+
+Uso:
+    python recalculo.py [--simular] [--workers N] [--relatorio mudancas.csv]
+
+Resultados gravados antes do rastreamento (sem ``config``) são recalculados uma
+vez e passam a ser rastreados.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import ensaios
+import ganchos
+import historico
+import indicadores
+import lims
+
+# Resultados por tarefa enviada ao pool; abaixo de um bloco o recálculo roda no próprio processo
+TAMANHO_BLOCO = 20_000
+# Diferença no resultado abaixo disso não é considerada mudança (arredondamento)
+TOLERANCIA = 1e-9
+
+# Paginação por id (keyset): cada bloco é uma consulta nova, então o processo principal
+# pode gravar entre um bloco e outro sem manter um cursor aberto sobre a tabela
+_SQL_PENDENTES = """
+SELECT id, lote, entradas, resultado, valido FROM resultados
+WHERE produto = ? AND ensaio = ? AND cliente IS ? AND id > ? AND (config IS NOT ? OR versao_formula IS NOT ?)
+ORDER BY id LIMIT ?
+"""
+
+_SQL_ATUALIZAR = """
+UPDATE resultados SET valores = ?, excluidos = ?, media_inicial = ?, resultado = ?, valido = ?,
+       config = ?, versao_formula = ?, limites_aplicados = ?
+WHERE id = ?
+"""
+
+# ======================== 1. SELEÇÃO DOS AFETADOS ========================
+
+def grupos_afetados(conn=None, config: Optional[Dict] = None) -> List[Dict]:
+    """Lista os (produto, ensaio, cliente) com resultados gravados sob outra configuração/fórmula."""
+    conn = conn or historico.conectar()
+    grupos = []
+    # Cada cliente com limites próprios é um grupo: seus resultados seguem a própria camada
+    trios = conn.execute("SELECT DISTINCT produto, ensaio, cliente FROM resultados").fetchall()
+    for produto, ensaio, cliente in trios:
+        if ensaio not in ensaios.CHAVES_CONFIG:
+            continue
+        limites = ensaios.limites_produto(produto, config, cliente=cliente)
+        atual = historico.serializar_config(ensaios.dependencias(ensaio, produto, limites))
+        versao = ensaios.VERSOES_FORMULA[ensaio]
+        n = conn.execute(
+            "SELECT COUNT(*) FROM resultados WHERE produto = ? AND ensaio = ? AND cliente IS ? "
+            "AND (config IS NOT ? OR versao_formula IS NOT ?)",
+            (produto, ensaio, cliente, atual, versao),
+        ).fetchone()[0]
+        if n:
+            grupos.append({"produto": produto, "ensaio": ensaio, "cliente": cliente, "limites": limites,
+                           "config": atual, "versao": versao, "resultados": n})
+    return grupos
+
+def _blocos(conn, grupo: Dict, tamanho: int) -> Iterator[List[tuple]]:
+    """Lê os resultados afetados de um grupo em blocos (sem carregar tudo na memória)."""
+    ultimo = 0
+    while True:
+        linhas = conn.execute(_SQL_PENDENTES, (grupo["produto"], grupo["ensaio"], grupo["cliente"], ultimo,
+                                               grupo["config"], grupo["versao"], tamanho)).fetchall()
+        if not linhas:
+            return
+        ultimo = linhas[-1][0]
+        yield [tuple(linha) for linha in linhas]
+
+# ======================== 2. RECÁLCULO DE UM BLOCO ========================
+
+def _mudou(antes: Optional[float], depois: Optional[float]) -> bool:
+    if antes is None or depois is None:
+        return (antes is None) != (depois is None)
+    return abs(antes - depois) > TOLERANCIA
+
+def recalcular_bloco(produto: str, ensaio: str, limites: Dict, config: str, versao: int,
+                     linhas: List[tuple]) -> Dict:
+    """Reaplica a regra do ensaio às linhas (id, lote, entradas, resultado, valido).
+
+    Roda nos processos do pool: não acessa o banco, só devolve as atualizações e as
+    mudanças de situação para o processo principal gravar.
+    """
+    atualizacoes, mudancas, erros, alterados = [], [], [], []
+    aplicados = ensaios.origem_limites(ensaio, limites)
+    # Todos os lotes do bloco de uma vez: o critério de aceitação do produto roda vetorizado
+    calculados = ensaios.calcular_bloco(ensaio, [json.loads(linha[2]) for linha in linhas], produto, limites)
+    for (id_, lote, _, resultado_antes, valido_antes), res in zip(linhas, calculados):
+        if isinstance(res, Exception):
+            erros.append({"id": id_, "lote": lote, "erro": f"{type(res).__name__}: {res}"})
+            continue
+        valido = int(bool(res["valido"]))
+        atualizacoes.append((json.dumps(res["valores"]), json.dumps(res["excluidos"]), res["media_inicial"],
+                             res["resultado"], valido, config, versao, aplicados, id_))
+        if _mudou(resultado_antes, res["resultado"]) or valido != valido_antes:
+            alterados.append(id_)
+        if valido != valido_antes:
+            mudancas.append({
+                "id": id_, "lote": lote, "produto": produto, "ensaio": ensaio,
+                "situacao_antes": "válido" if valido_antes else "inválido",
+                "situacao_depois": "válido" if valido else "inválido",
+                "resultado_antes": resultado_antes, "resultado_depois": res["resultado"],
+            })
+    return {"atualizacoes": atualizacoes, "mudancas": mudancas, "erros": erros, "alterados": alterados}
+
+# ======================== 3. EXECUÇÃO ========================
+
+def _tarefas(conn, grupos: List[Dict], tamanho: int) -> Iterator[Tuple]:
+    for g in grupos:
+        for linhas in _blocos(conn, g, tamanho):
+            yield (g["produto"], g["ensaio"], g["limites"], g["config"], g["versao"], linhas)
+
+def recalcular(config: Optional[Dict] = None, workers: Optional[int] = None, aplicar: Optional[bool] = None,
+               tamanho_bloco: int = TAMANHO_BLOCO, conn=None, progresso=None) -> Dict:
+    """Recalcula só os resultados afetados pela configuração/fórmulas atuais.
+
+    ``config`` substitui CONFIG_LIMITES (simulação de uma alteração antes de publicá-la):
+    nesse caso nada é gravado. Com ``aplicar=False`` também só o relatório é montado;
+    padrão: grava quando não há ``config``. ``progresso(feitos, total, segundos)`` é
+    chamado a cada bloco concluído.
+    """
+    if aplicar is None:
+        aplicar = config is None
+    elif aplicar and config is not None:
+        raise ValueError("Configuração simulada não é gravada: publique a alteração antes de aplicar.")
+    ganchos.registrar()
+    conn = conn or historico.conectar()
+    inicio = time.perf_counter()
+    grupos = grupos_afetados(conn, config)
+    total = sum(g["resultados"] for g in grupos)
+    resumo = {"grupos": [(g["produto"] + (f" ({g['cliente']})" if g["cliente"] else ""), g["ensaio"],
+                          g["resultados"]) for g in grupos],
+              "afetados": total, "recalculados": 0, "alterados": 0,
+              "mudancas": [], "erros": [], "segundos": 0.0}
+    if not total:
+        resumo["segundos"] = time.perf_counter() - inicio
+        return resumo
+
+    def _consolidar(saida: Dict):
+        if aplicar and saida["atualizacoes"]:
+            with conn:
+                conn.executemany(_SQL_ATUALIZAR, saida["atualizacoes"])
+                # O LIMS recebe a nova revisão dos que mudaram (mesma transação da atualização)
+                lims.reenfileirar(conn, saida["alterados"])
+        resumo["recalculados"] += len(saida["atualizacoes"])
+        resumo["alterados"] += len(saida["alterados"])
+        resumo["mudancas"].extend(saida["mudancas"])
+        resumo["erros"].extend(saida["erros"])
+        if progresso:
+            progresso(resumo["recalculados"] + len(resumo["erros"]), total, time.perf_counter() - inicio)
+
+    # A leitura dos blocos e a gravação ficam no processo principal (único escritor do banco)
+    tarefas = _tarefas(conn, grupos, tamanho_bloco)
+    if total <= tamanho_bloco or workers == 1:
+        for tarefa in tarefas:
+            _consolidar(recalcular_bloco(*tarefa))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # Poucos blocos em voo por processo: a memória fica limitada mesmo com milhões de linhas
+            limite_voo = 2 * (workers or os.cpu_count() or 1)
+            em_voo = set()
+            for tarefa in tarefas:
+                em_voo.add(pool.submit(recalcular_bloco, *tarefa))
+                if len(em_voo) >= limite_voo:
+                    feitos, em_voo = wait(em_voo, return_when=FIRST_COMPLETED)
+                    for futuro in feitos:
+                        _consolidar(futuro.result())
+            for futuro in wait(em_voo).done:
+                _consolidar(futuro.result())
+
+    # Os agregados do painel somam gravações; uma alteração em massa é remontada de uma vez
+    if aplicar and resumo["alterados"]:
+        indicadores.reconstruir(conn)
+    resumo["segundos"] = time.perf_counter() - inicio
+    return resumo
+
+def _imprimir_progresso(feitos: int, total: int, segundos: float):
+    print(f"\r[{feitos}/{total}] {feitos / max(segundos, 1e-9):.0f} resultados/s",
+          end="", file=sys.stderr, flush=True)
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Recalcula os resultados afetados por mudanças de limites/fórmulas.")
+    parser.add_argument("--simular", action="store_true", help="Só gera o relatório, sem gravar")
+    parser.add_argument("--workers", type=int, default=None, help="Processos em paralelo (padrão: nº de CPUs)")
+    parser.add_argument("--relatorio", help="Arquivo CSV para os resultados que mudaram de situação")
+    args = parser.parse_args(argv)
+
+    resumo = recalcular(workers=args.workers, aplicar=not args.simular, progresso=_imprimir_progresso)
+    print(file=sys.stderr)
+
+    for produto, ensaio, n in resumo["grupos"]:
+        print(f"  {produto} / {ensaio}: {n} resultados afetados")
+    print(f"Recalculados: {resumo['recalculados']} | Resultado alterado: {resumo['alterados']} | "
+          f"Mudaram de situação: {len(resumo['mudancas'])} | Erros: {len(resumo['erros'])} | "
+          f"Tempo: {resumo['segundos']:.1f} s" + (" (simulação, nada gravado)" if args.simular else ""))
+
+    for erro in resumo["erros"][:20]:
+        print(f"  ⚠ id {erro['id']} (lote {erro['lote']}): {erro['erro']}", file=sys.stderr)
+
+    if args.relatorio and resumo["mudancas"]:
+        with open(args.relatorio, "w", newline="", encoding="utf-8") as f:
+            escritor = csv.DictWriter(f, fieldnames=list(resumo["mudancas"][0].keys()))
+            escritor.writeheader()
+            escritor.writerows(resumo["mudancas"])
+        print(f"Mudanças gravadas em {args.relatorio}")
+
+if __name__ == "__main__":
+    main()
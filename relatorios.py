@@ -0,0 +1,407 @@
+"""Certificados de ensaio em PDF gerados em segundo plano (pool de processos).
+
+O certificado de um lote traz, para o último resultado de cada requisito: a norma,
+as entradas, os valores por CP (com os excluídos marcados), a média inicial, o
+resultado, a situação e a memória de cálculo, além da classificação NBR 13281.
+Tudo é montado a partir do histórico gravado; nada depende da sessão do Streamlit.
+
+A geração roda em processos separados: a interface só enfileira o pedido
+(``fila().enviar(lote)``) e consulta a situação (``fila().estado(id)``) a cada
+poucos segundos, sem travar o rerun. O modo em lote gera os certificados de um
+mês para todas as linhas de produto em paralelo:
+
+    python relatorios.py lote 2024-0153
+    python relatorios.py mes 2024-10 [--workers N] [--saida pasta]
+
+O PDF é escrito diretamente (texto em Helvetica, codificação WinAnsi), sem
+dependências externas.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+import classificacao
+import ensaios
+import historico
+from ensaios import LINHAS_PRODUTOS
+
+_log = logging.getLogger(__name__)
+
+PASTA_RELATORIOS = os.environ.get(
+    "CALCULADORA_RELATORIOS",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "dados", "relatorios"),
+)
+
+# ======================== 1. ESCRITA DO PDF ========================
+
+class DocumentoPDF:
+    """PDF de texto simples (A4, Helvetica), com quebra de linha e de página automáticas."""
+
+    LARGURA, ALTURA, MARGEM = 595, 842, 50
+
+    def __init__(self, titulo: str = ""):
+        self.titulo = titulo
+        self._paginas: List[List[str]] = []
+        self._y = 0.0
+        self._nova_pagina()
+
+    def _nova_pagina(self):
+        self._paginas.append([])
+        self._y = self.ALTURA - self.MARGEM
+
+    @staticmethod
+    def _escapar(texto: str) -> str:
+        texto = texto.encode("cp1252", errors="replace").decode("latin-1")
+        return texto.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+    def texto(self, texto: str, tamanho: float = 10, negrito: bool = False, recuo: float = 0):
+        """Escreve um parágrafo, quebrando as linhas pela largura útil (aprox. 0,5 em por caractere)."""
+        largura = self.LARGURA - 2 * self.MARGEM - recuo
+        por_linha = max(10, int(largura / (0.5 * tamanho)))
+        linhas = []
+        for paragrafo in str(texto).split("\n"):
+            while len(paragrafo) > por_linha:
+                corte = paragrafo.rfind(" ", 0, por_linha)
+                corte = corte if corte > 0 else por_linha
+                linhas.append(paragrafo[:corte])
+                paragrafo = paragrafo[corte:].lstrip()
+            linhas.append(paragrafo)
+        fonte = "F2" if negrito else "F1"
+        for linha in linhas:
+            if self._y - tamanho < self.MARGEM + 20:
+                self._nova_pagina()
+            self._y -= tamanho * 1.35
+            self._paginas[-1].append(
+                f"BT /{fonte} {tamanho} Tf {self.MARGEM + recuo:.1f} {self._y:.1f} Td ({self._escapar(linha)}) Tj ET")
+
+    def espaco(self, altura: float = 6):
+        self._y -= altura
+
+    def regua(self):
+        """Linha horizontal separadora."""
+        self.espaco(4)
+        self._paginas[-1].append(f"0.6 w {self.MARGEM} {self._y:.1f} m {self.LARGURA - self.MARGEM} {self._y:.1f} l S")
+        self.espaco(4)
+
+    @property
+    def paginas(self) -> int:
+        return len(self._paginas)
+
+    def bytes(self) -> bytes:
+        """Monta o arquivo (objetos, xref e trailer), com rodapé "Página i de n"."""
+        objetos: List[bytes] = []
+
+        def novo(conteudo: bytes) -> int:
+            objetos.append(conteudo)
+            return len(objetos)
+
+        catalogo = novo(b"")  # preenchido depois (precisa do número do /Pages)
+        fonte1 = novo(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+        fonte2 = novo(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>")
+        paginas = novo(b"")
+        filhos = []
+        total = len(self._paginas)
+        for i, comandos in enumerate(self._paginas, 1):
+            rodape = f"BT /F1 8 Tf {self.MARGEM} 30 Td ({self._escapar(f'{self.titulo} - Página {i} de {total}')}) Tj ET"
+            fluxo = zlib.compress("\n".join(comandos + [rodape]).encode("latin-1"))
+            conteudo = novo(b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(fluxo) + fluxo + b"\nendstream")
+            filhos.append(novo(
+                b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] /Contents %d 0 R "
+                b"/Resources << /Font << /F1 %d 0 R /F2 %d 0 R >> >> >>"
+                % (paginas, self.LARGURA, self.ALTURA, conteudo, fonte1, fonte2)))
+        objetos[paginas - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+            b" ".join(b"%d 0 R" % f for f in filhos), len(filhos))
+        objetos[catalogo - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % paginas
+
+        saida = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        posicoes = []
+        for n, conteudo in enumerate(objetos, 1):
+            posicoes.append(len(saida))
+            saida += b"%d 0 obj\n" % n + conteudo + b"\nendobj\n"
+        xref = len(saida)
+        saida += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objetos) + 1)
+        saida += b"".join(b"%010d 00000 n \n" % p for p in posicoes)
+        saida += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objetos) + 1, catalogo, xref)
+        return bytes(saida)
+
+# ======================== 2. CONTEÚDO DO CERTIFICADO ========================
+
+_NORMA = re.compile(r"(ABNT\s+)?NBR\s+[\d.\-]+(\s+anexo\s+\w+)?", re.IGNORECASE)
+
+def norma(requisito: str) -> str:
+    """Norma citada no requisito (ex: "ABNT NBR 15258"), ou o próprio requisito."""
+    achada = _NORMA.search(requisito)
+    return achada.group(0) if achada else requisito
+
+def _grupo(termo: str) -> str:
+    return f"({termo})" if " " in termo.strip() else termo.strip()
+
+def _latex_para_texto(latex: str) -> str:
+    """Converte as fórmulas da memória de cálculo para texto corrido."""
+    texto = latex.replace(r"\left", "").replace(r"\right", "").replace(r"\times", "×").replace(r"\%", "%")
+    anterior = None
+    while anterior != texto:
+        anterior = texto
+        texto = re.sub(r"\\frac\{([^{}]*)\}\{([^{}]*)\}", lambda m: f"{_grupo(m[1])} / {_grupo(m[2])}", texto)
+        texto = re.sub(r"\\text\{([^{}]*)\}", r"\1", texto)
+        texto = re.sub(r"_\{([^{}]*)\}", r"_\1", texto)
+    return texto.replace("\\ ", " ").replace("\\", "")
+
+def memoria_texto(produto: str, ensaio: str, entradas: Dict, config: Optional[str]) -> List[str]:
+    """Refaz o cálculo com os limites gravados e devolve a memória de cálculo em linhas de texto."""
+    limites = ensaios.limites_produto(produto)
+    if config:
+        limites = {**limites, **json.loads(config)}
+    try:
+        res = ensaios.calcular(ensaio, entradas, produto, limites)
+    except ValueError:  # inclui EntradaIncompleta
+        return []
+    return [f"{descricao}: {_latex_para_texto(latex)}"
+            for descricao, latex in ensaios.memoria_latex(res["detalhes"].get("memoria") or [])]
+
+def _numero(valor, casas: int = 3) -> str:
+    return "-" if valor is None else f"{valor:.{casas}f}"
+
+def montar_certificado(lote: str, linhas: Sequence) -> DocumentoPDF:
+    """Certificado do lote com o último resultado de cada requisito."""
+    ultimos = {}
+    for r in linhas:
+        ultimos[r["requisito"]] = r
+    produto = next(iter(ultimos.values()))["produto"]
+
+    doc = DocumentoPDF(f"Certificado {lote}")
+    doc.texto("Certificado de Ensaios Físicos", 16, negrito=True)
+    clientes = sorted({r["cliente"] for r in ultimos.values() if r["cliente"]})
+    doc.texto(f"Lote: {lote}    Produto: {produto}" + (f"    Cliente: {', '.join(clientes)}" if clientes else ""), 11)
+    doc.texto(f"Emitido em: {datetime.now():%d/%m/%Y %H:%M}", 9)
+    doc.regua()
+
+    for req, r in ultimos.items():
+        entradas = json.loads(r["entradas"])
+        valores, excluidos = json.loads(r["valores"]), set(json.loads(r["excluidos"]))
+        doc.texto(req, 11, negrito=True)
+        doc.texto(f"Norma: {norma(req)}    Data: {r['criado_em']}    Operador: {r['operador'] or '-'}", 9)
+        doc.texto("Entradas: " + ", ".join(f"{k} = {v}" for k, v in entradas.items()), 9, recuo=10)
+        doc.texto("Valores por CP: " + ", ".join(
+            f"CP{i + 1} = {_numero(v)}" + (" (excluído)" if i in excluidos else "") for i, v in enumerate(valores)),
+            9, recuo=10)
+        doc.texto(f"Média inicial: {_numero(r['media_inicial'])}    Resultado: {_numero(r['resultado'])}    "
+                  f"Situação: {'VÁLIDO' if r['valido'] else 'ENSAIO INVÁLIDO'}", 9, recuo=10)
+        if r["limites_aplicados"]:
+            doc.texto(f"Limites aplicados: {r['limites_aplicados']}", 9, recuo=10)
+        memoria = memoria_texto(produto, r["ensaio"], entradas, r["config"])
+        if memoria:
+            doc.texto("Memória de cálculo:", 9, negrito=True, recuo=10)
+            for linha in memoria:
+                doc.texto(linha, 8, recuo=20)
+        doc.espaco()
+
+    finais = {r["ensaio"]: r["resultado"] for r in ultimos.values() if r["valido"]}
+    classes = classificacao.classificar_lote(finais)
+    doc.regua()
+    doc.texto(f"Classificação — {classificacao.ESPECIFICACAO_NBR13281['versao']}", 11, negrito=True)
+    doc.texto(classificacao.designacao(classes) if any(classes.values())
+              else "Nenhum ensaio classificável pela NBR 13281 neste lote.", 10)
+    return doc
+
+def _nome_arquivo(lote: str) -> str:
+    return re.sub(r"[^\w.-]", "_", lote) + ".pdf"
+
+def gerar_certificado(lote: str, pasta: str, banco: Optional[str] = None) -> Dict:
+    """Gera o PDF do lote em ``pasta`` (executado nos processos do pool)."""
+    inicio = time.perf_counter()
+    linhas = historico.listar_por_lote(lote, historico.conectar(banco))
+    if not linhas:
+        raise ValueError(f"Nenhum resultado gravado para o lote {lote}.")
+    doc = montar_certificado(lote, linhas)
+    conteudo = doc.bytes()
+    os.makedirs(pasta, exist_ok=True)
+    arquivo = os.path.join(pasta, _nome_arquivo(lote))
+    with open(arquivo + ".tmp", "wb") as f:
+        f.write(conteudo)
+    os.replace(arquivo + ".tmp", arquivo)  # quem consulta nunca vê um PDF pela metade
+    return {"lote": lote, "produto": linhas[0]["produto"], "arquivo": arquivo, "paginas": doc.paginas,
+            "bytes": len(conteudo), "segundos": time.perf_counter() - inicio}
+
+# ======================== 3. FILA DE PEDIDOS (INTERFACE) ========================
+
+class FilaRelatorios:
+    """Pedidos de certificado atendidos por um pool de processos, com consulta de situação."""
+
+    MAX_HISTORICO = 200
+
+    def __init__(self, workers: Optional[int] = None, pasta: str = PASTA_RELATORIOS, banco: Optional[str] = None):
+        self.workers, self.pasta, self.banco = workers, pasta, banco
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._trabalhos: "OrderedDict[str, Dict]" = OrderedDict()
+        self._futuros: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # "spawn": os processos não herdam as threads do servidor do Streamlit
+            self._pool = ProcessPoolExecutor(max_workers=self.workers or max(1, (os.cpu_count() or 2) // 2),
+                                             mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def enviar(self, lote: str) -> str:
+        """Enfileira o certificado do lote; um pedido ainda em aberto do mesmo lote é reaproveitado."""
+        with self._lock:
+            for id_, t in reversed(self._trabalhos.items()):
+                if t["lote"] == lote and t["estado"] in ("na fila", "gerando"):
+                    return id_
+            id_ = uuid.uuid4().hex
+            self._trabalhos[id_] = {"id": id_, "lote": lote, "estado": "na fila", "enviado_em": time.time(),
+                                    "arquivo": None, "erro": None, "segundos": None}
+            args = (gerar_certificado, lote, self.pasta, self.banco or historico.CAMINHO_BANCO)
+            try:
+                futuro = self._executor().submit(*args)
+            except BrokenProcessPool:
+                # Um processo do pool morreu (ex: falta de memória): recria o pool e tenta de novo
+                _log.warning("Pool de certificados reiniciado")
+                self._pool = None
+                futuro = self._executor().submit(*args)
+            self._futuros[id_] = futuro
+            self._descartar_antigos()
+        futuro.add_done_callback(lambda f, id_=id_: self._concluir(id_, f))
+        return id_
+
+    def _concluir(self, id_: str, futuro):
+        with self._lock:
+            trabalho = self._trabalhos.get(id_)
+            self._futuros.pop(id_, None)
+            if trabalho is None:
+                return
+            trabalho["segundos"] = time.time() - trabalho["enviado_em"]
+            erro = futuro.exception()
+            if erro is not None:
+                trabalho.update(estado="erro", erro=str(erro))
+                _log.warning("Falha ao gerar o certificado do lote %s: %s", trabalho["lote"], erro)
+            else:
+                saida = futuro.result()
+                trabalho.update(estado="pronto", arquivo=saida["arquivo"], paginas=saida["paginas"])
+
+    def _descartar_antigos(self):
+        while len(self._trabalhos) > self.MAX_HISTORICO:
+            id_, t = next(iter(self._trabalhos.items()))
+            if t["estado"] in ("na fila", "gerando"):
+                break
+            del self._trabalhos[id_]
+
+    def estado(self, id_: str) -> Optional[Dict]:
+        """Situação do pedido: na fila, gerando, pronto (com ``arquivo``) ou erro."""
+        with self._lock:
+            trabalho = self._trabalhos.get(id_)
+            if trabalho is None:
+                return None
+            futuro = self._futuros.get(id_)
+            if futuro is not None and trabalho["estado"] == "na fila" and futuro.running():
+                trabalho["estado"] = "gerando"
+            return dict(trabalho)
+
+    def trabalhos(self) -> List[Dict]:
+        with self._lock:
+            return [dict(t) for t in self._trabalhos.values()]
+
+_fila: Optional[FilaRelatorios] = None
+_fila_lock = threading.Lock()
+
+def fila() -> FilaRelatorios:
+    """Fila de certificados compartilhada pelo processo (todas as sessões)."""
+    global _fila
+    with _fila_lock:
+        if _fila is None:
+            _fila = FilaRelatorios()
+        return _fila
+
+# ======================== 4. GERAÇÃO MENSAL EM LOTE ========================
+
+def lotes_do_mes(ano: int, mes: int, produtos: Sequence[str] = LINHAS_PRODUTOS, conn=None) -> List[Dict]:
+    """Lotes com resultados gravados no mês, por linha de produto."""
+    conn = conn or historico.conectar()
+    inicio = f"{ano:04d}-{mes:02d}-01"
+    fim = f"{ano + mes // 12:04d}-{mes % 12 + 1:02d}-01"
+    marcas = ",".join("?" * len(produtos))
+    return [dict(r) for r in conn.execute(
+        f"SELECT produto, lote, COUNT(*) AS resultados FROM resultados "
+        f"WHERE lote IS NOT NULL AND criado_em >= ? AND criado_em < ? AND produto IN ({marcas}) "
+        f"GROUP BY produto, lote ORDER BY produto, lote", (inicio, fim, *produtos))]
+
+def gerar_mes(ano: int, mes: int, pasta: Optional[str] = None, workers: Optional[int] = None,
+              produtos: Sequence[str] = LINHAS_PRODUTOS, progresso=None) -> Dict:
+    """Gera em paralelo os certificados do mês (``pasta/AAAA-MM/produto/lote.pdf``).
+
+    ``progresso(feitos, total, segundos)`` é chamado a cada certificado concluído.
+    """
+    pasta = os.path.join(pasta or PASTA_RELATORIOS, f"{ano:04d}-{mes:02d}")
+    banco = historico.CAMINHO_BANCO
+    lotes = lotes_do_mes(ano, mes, produtos)
+    resumo = {"lotes": len(lotes), "gerados": 0, "paginas": 0, "bytes": 0, "erros": [],
+              "por_produto": {p: 0 for p in produtos}, "segundos": 0.0}
+    inicio = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futuros = {pool.submit(gerar_certificado, l["lote"], os.path.join(pasta, l["produto"]), banco): l
+                   for l in lotes}
+        for futuro in as_completed(futuros):
+            try:
+                saida = futuro.result()
+            except Exception as e:
+                resumo["erros"].append({"lote": futuros[futuro]["lote"], "erro": str(e)})
+            else:
+                resumo["gerados"] += 1
+                resumo["paginas"] += saida["paginas"]
+                resumo["bytes"] += saida["bytes"]
+                resumo["por_produto"][futuros[futuro]["produto"]] += 1
+            if progresso:
+                progresso(resumo["gerados"] + len(resumo["erros"]), len(lotes), time.perf_counter() - inicio)
+    resumo["segundos"] = time.perf_counter() - inicio
+    resumo["certificados_por_s"] = resumo["gerados"] / resumo["segundos"] if resumo["segundos"] else None
+    return resumo
+
+def _imprimir_progresso(feitos: int, total: int, segundos: float):
+    print(f"\r[{feitos}/{total}] {feitos / max(segundos, 1e-9):.1f} certificados/s",
+          end="", file=sys.stderr, flush=True)
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Gera certificados de ensaio em PDF a partir do histórico.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p_lote = sub.add_parser("lote", help="Certificado de um lote")
+    p_lote.add_argument("lote")
+    p_lote.add_argument("--saida", default=PASTA_RELATORIOS)
+    p_mes = sub.add_parser("mes", help="Certificados de todos os lotes do mês (AAAA-MM), em paralelo")
+    p_mes.add_argument("mes")
+    p_mes.add_argument("--saida", default=PASTA_RELATORIOS)
+    p_mes.add_argument("--workers", type=int, default=None, help="Processos em paralelo (padrão: nº de CPUs)")
+    args = parser.parse_args(argv)
+
+    if args.comando == "lote":
+        saida = gerar_certificado(args.lote, args.saida)
+        print(f"{saida['arquivo']} ({saida['paginas']} páginas, {saida['segundos'] * 1000:.0f} ms)")
+        return
+
+    ano, mes = (int(x) for x in args.mes.split("-"))
+    resumo = gerar_mes(ano, mes, args.saida, args.workers, progresso=_imprimir_progresso)
+    print(file=sys.stderr)
+    for produto, n in resumo["por_produto"].items():
+        print(f"  {produto}: {n} certificados")
+    taxa = resumo["certificados_por_s"] or 0
+    print(f"Gerados: {resumo['gerados']}/{resumo['lotes']} | Páginas: {resumo['paginas']} | "
+          f"{resumo['bytes'] / 2**20:.1f} MB | Tempo: {resumo['segundos']:.1f} s | {taxa:.1f} certificados/s")
+    for erro in resumo["erros"][:20]:
+        print(f"  ⚠ lote {erro['lote']}: {erro['erro']}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""Estado das calculadoras por sessão: valores separados por lote, com memória limitada.
+
+O Streamlit descarta as chaves de um widget quando a página dele deixa de ser
+desenhada, e mantém as da página atual mesmo quando o técnico troca de lote. Este
+módulo guarda os campos de cada calculadora em um espaço próprio por (lote, página):
+ao sair da página (ou trocar o lote) os valores preenchidos são guardados e
+retirados do ``st.session_state``; ao voltar, são devolvidos aos widgets.
+
+Para que um turno longo com muitos lotes não faça a sessão crescer sem limite,
+as páginas guardadas são compactadas (só campos preenchidos) e despejadas quando
+ficam ociosas por mais que ``ociosidade`` segundos ou quando passam de
+``max_paginas`` / ``max_bytes`` (as menos usadas primeiro). Com ``rascunhos``
+ligado, o que é despejado de um lote vai para a tabela ``rascunhos`` do banco do
+histórico e volta de lá quando a página do lote é reaberta (em qualquer sessão).
+"""
+import json
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, MutableMapping, Optional, Pattern, Tuple
+
+import historico
+
+MAX_PAGINAS = 12
+MAX_BYTES = 64 * 1024
+OCIOSIDADE_SEGUNDOS = 30 * 60
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS rascunhos (
+    lote      TEXT NOT NULL,
+    pagina    TEXT NOT NULL,
+    valores   TEXT NOT NULL,
+    sessao    TEXT,
+    salvo_em  TEXT NOT NULL,
+    PRIMARY KEY (lote, pagina)
+) WITHOUT ROWID;
+"""
+
+historico.registrar_esquema(_ESQUEMA)
+
+def tamanho_estado(estado: MutableMapping) -> int:
+    """Bytes do estado serializado (valores não serializáveis pelo repr)."""
+    total = 0
+    for chave, valor in estado.items():
+        try:
+            total += len(pickle.dumps((chave, valor), protocol=pickle.HIGHEST_PROTOCOL))
+        except Exception:
+            total += len(repr((chave, valor)).encode("utf-8"))
+    return total
+
+def _preenchido(valor) -> bool:
+    return valor not in (None, "", 0, 0.0)
+
+# ======================== 1. RASCUNHOS (BANCO) ========================
+
+def gravar_rascunho(lote: str, pagina: str, valores: Dict, sessao: Optional[str] = None, conn=None):
+    conn = conn or historico.conectar()
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO rascunhos VALUES (?, ?, ?, ?, ?)",
+                     (lote, pagina, json.dumps(valores), sessao, datetime.now().isoformat(timespec="seconds")))
+
+def retirar_rascunho(lote: str, pagina: str, conn=None) -> Optional[Dict]:
+    """Lê e apaga o rascunho da página do lote (ou None se não houver)."""
+    conn = conn or historico.conectar()
+    with conn:
+        linha = conn.execute("DELETE FROM rascunhos WHERE lote = ? AND pagina = ? RETURNING valores",
+                             (lote, pagina)).fetchone()
+    return json.loads(linha[0]) if linha else None
+
+# ======================== 2. GERENCIADOR POR SESSÃO ========================
+
+class EstadoCalculadoras:
+    """Valores das calculadoras de uma sessão, por (lote, página), com despejo LRU/ociosidade."""
+
+    def __init__(self, chaves: Pattern, sessao: Optional[str] = None, max_paginas: int = MAX_PAGINAS,
+                 max_bytes: int = MAX_BYTES, ociosidade: float = OCIOSIDADE_SEGUNDOS, rascunhos: bool = False):
+        self.chaves, self.sessao = chaves, sessao
+        self.max_paginas, self.max_bytes, self.ociosidade, self.rascunhos = max_paginas, max_bytes, ociosidade, rascunhos
+        # (lote, página) -> (visto_em, bytes, valores preenchidos); ordem = uso mais recente por último
+        self._paginas: "OrderedDict[Tuple[str, str], Tuple[float, int, Dict]]" = OrderedDict()
+        self._atual: Optional[Tuple[str, str]] = None
+        self._lock = threading.Lock()
+        self._contadores = {"guardadas": 0, "restauradas": 0, "despejadas": 0, "em_rascunho": 0, "de_rascunho": 0}
+
+    def __getstate__(self):
+        estado = self.__dict__.copy()
+        del estado["_lock"]
+        return estado
+
+    def __setstate__(self, estado):
+        self.__dict__.update(estado)
+        self._lock = threading.Lock()
+
+    def entrar(self, estado: MutableMapping, lote: str, pagina: str, agora: Optional[float] = None):
+        """Chamado no início de cada execução: troca os campos se a página ou o lote mudaram."""
+        agora = time.monotonic() if agora is None else agora
+        contexto = (lote or "", pagina)
+        with self._lock:
+            if contexto != self._atual:
+                if self._atual is not None:
+                    self._guardar(estado, self._atual, agora)
+                self._restaurar(estado, contexto)
+                self._atual = contexto
+            self._compactar(agora)
+
+    def preencher(self, estado: MutableMapping, lote: str, pagina: str, valores: Dict,
+                  agora: Optional[float] = None):
+        """Substitui os campos da página do lote (ex: reabrir um resultado do histórico).
+
+        Os valores entram no lugar dos guardados (e de um rascunho no banco) e vão para os
+        widgets quando a página for aberta; ``valores`` vazio abre a página em branco.
+        """
+        agora = time.monotonic() if agora is None else agora
+        contexto = (lote or "", pagina)
+        with self._lock:
+            if contexto == self._atual:
+                for k in [k for k in list(estado.keys()) if isinstance(k, str) and self.chaves.match(k)]:
+                    del estado[k]
+                estado.update(valores)
+                return
+            self._paginas.pop(contexto, None)
+            self._paginas[contexto] = (agora, tamanho_estado(valores), dict(valores))
+
+    def _guardar(self, estado: MutableMapping, contexto: Tuple[str, str], agora: float):
+        chaves = [k for k in list(estado.keys()) if isinstance(k, str) and self.chaves.match(k)]
+        valores = {k: estado[k] for k in chaves if _preenchido(estado[k])}
+        for k in chaves:
+            del estado[k]
+        self._paginas.pop(contexto, None)
+        if valores:
+            self._paginas[contexto] = (agora, tamanho_estado(valores), valores)
+            self._contadores["guardadas"] += 1
+
+    def _restaurar(self, estado: MutableMapping, contexto: Tuple[str, str]):
+        item = self._paginas.pop(contexto, None)
+        valores = item[2] if item else None
+        if valores is None and self.rascunhos and contexto[0]:
+            valores = retirar_rascunho(*contexto)
+            if valores:
+                self._contadores["de_rascunho"] += 1
+        if valores:
+            for k, v in valores.items():
+                estado[k] = v
+            self._contadores["restauradas"] += 1
+
+    def _compactar(self, agora: float):
+        """Despeja páginas ociosas e, depois, as menos usadas até caber nos limites."""
+        ociosas = [c for c, (visto, _, _) in self._paginas.items() if agora - visto > self.ociosidade]
+        for contexto in ociosas:
+            self._despejar(contexto)
+        total = sum(b for _, b, _ in self._paginas.values())
+        while self._paginas and (len(self._paginas) > self.max_paginas or total > self.max_bytes):
+            contexto = next(iter(self._paginas))
+            total -= self._paginas[contexto][1]
+            self._despejar(contexto)
+
+    def _despejar(self, contexto: Tuple[str, str]):
+        _, _, valores = self._paginas.pop(contexto)
+        self._contadores["despejadas"] += 1
+        if self.rascunhos and contexto[0]:
+            gravar_rascunho(contexto[0], contexto[1], valores, self.sessao)
+            self._contadores["em_rascunho"] += 1
+
+    def estatisticas(self, estado: Optional[MutableMapping] = None) -> Dict:
+        """Páginas guardadas, bytes usados e contadores; com ``estado``, também o tamanho da sessão."""
+        with self._lock:
+            stats = dict(self._contadores)
+            stats["paginas"] = len(self._paginas)
+            stats["bytes_guardados"] = sum(b for _, b, _ in self._paginas.values())
+        if estado is not None:
+            proprias = {k: v for k, v in estado.items() if v is not self}
+            stats["chaves_sessao"] = len(proprias)
+            stats["bytes_sessao"] = tamanho_estado(proprias)
+        return stats
+
+_CHAVE_SESSAO = "_estado_calculadoras"
+
+def da_sessao(estado: MutableMapping, chaves: Pattern, **opcoes) -> EstadoCalculadoras:
+    """Gerenciador guardado no próprio ``st.session_state`` (criado na primeira execução)."""
+    gerente = estado.get(_CHAVE_SESSAO)
+    if gerente is None:
+        gerente = estado[_CHAVE_SESSAO] = EstadoCalculadoras(chaves, **opcoes)
+    return gerente
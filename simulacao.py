@@ -0,0 +1,218 @@
+"""Simulação "e se" dos ensaios: varredura de parâmetros para decisões de formulação.
+
+Para os ensaios cujo resultado depende de um parâmetro de formulação ou de
+configuração — retenção do Basecoat (``agua_ml_kg``, pelo fator água), densidade
+e teor de ar (densidade teórica) e variação dimensional (``comprimento_padrao`` e
+o limite de exclusão) —, o P&D escolhe um ou dois parâmetros e as faixas, e o
+ensaio é avaliado na grade inteira de uma vez.
+
+As fórmulas aqui são as mesmas de ensaios.py reescritas sobre vetores numpy (a
+grade é uma matriz; os demais valores entram como escalares e são propagados), e
+a exclusão de CPs usa o critério de aceitação do produto (aceitacao.py, já
+vetorizado). 10⁶ pontos levam dezenas de ms nas fórmulas diretas e poucas décimas
+de segundo com exclusão de CPs: a página recalcula a grade inteira a cada
+alteração, sem uma execução por ponto. Entradas que as regras
+recusam (ex: volume zero) viram NaN/inválido no ponto, em vez de erro.
+"""
+import time
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+import aceitacao
+import ensaios
+from ensaios import ENS_DENSIDADE, ENS_RETENCAO, ENS_VAR_DIM
+
+# Pontos por eixo sugeridos na interface (1 eixo: curva; 2 eixos: mapa)
+PONTOS_CURVA = 2_000
+PONTOS_MAPA = 400
+MAXIMO_PONTOS = 2_000_000
+
+class Parametro(NamedTuple):
+    chave: str          # campo das entradas (CAMPOS_ENSAIO) ou chave de CONFIG_LIMITES
+    rotulo: str
+    unidade: str
+    limite: bool        # True: vem de CONFIG_LIMITES do produto; False: das entradas
+
+# ======================== 1. MOTORES VETORIZADOS ========================
+
+def _retencao_basecoat(e: Dict, lim: Dict) -> Dict[str, np.ndarray]:
+    """regra_retencao_basecoat sobre vetores."""
+    massa_ini, agua = e["massa_ini"], e["agua_ml_kg"]
+    massa_pasta = massa_ini - e["tara"]
+    perda_agua = massa_ini - e["massa_fim"]
+    fator_agua = agua / (1000 + agua)
+    agua_total = massa_pasta * fator_agua
+    ra = np.where(agua_total > 0, (1 - perda_agua / agua_total) * 100, 0.0)
+    valido = (ra >= 0) & (massa_ini != 0) & (agua != 0)
+    return {"resultado": np.where(valido, ra, np.nan), "valido": valido, "fator_agua": fator_agua}
+
+def _densidade(e: Dict, lim: Dict) -> Dict[str, np.ndarray]:
+    """regra_densidade sobre vetores (teor de ar só onde a densidade teórica é informada)."""
+    volume, tara, massa_bruta, dt = e["volume"], e["tara"], e["massa_bruta"], e["dt"]
+    valido = (volume > 0) & (massa_bruta >= tara)
+    densidade_g_cm3 = (massa_bruta - tara) / volume
+    teor_ar = np.where(dt > 0, (dt - densidade_g_cm3) / dt * 100, np.nan)
+    return {"resultado": np.where(valido, densidade_g_cm3 * 1000, np.nan), "valido": valido,
+            "teor_ar": np.where(valido, teor_ar, np.nan)}
+
+def _variacao_dimensional(e: Dict, lim: Dict) -> Dict[str, np.ndarray]:
+    """regra_variacao_dimensional sobre vetores: uma linha da matriz de CPs por ponto da grade."""
+    n = ensaios.N_CPS[ENS_VAR_DIM]
+    ini = np.asarray(e["ini"], dtype=float)[..., :n]
+    fim = np.asarray(e["fim"], dtype=float)[..., :n]
+    comp = np.asarray(lim["comprimento_padrao"], dtype=float)
+    limite = np.asarray(lim["variacao_dim_max"], dtype=float)
+    forma = np.broadcast_shapes(comp.shape, limite.shape)
+    participa = ~((ini == 0) & (fim == 0))
+    valores = np.where(participa, (fim - ini) / comp[..., None] * 1000, np.nan).reshape(-1, n)
+    valores = np.broadcast_to(valores, (int(np.prod(forma, dtype=int)), n))
+    faixa = np.broadcast_to(limite, forma).reshape(-1, 1)
+    aceite = aceitacao.aceitar(valores, np.broadcast_to(participa, valores.shape),
+                               lambda v, centro: np.abs(v - centro) <= faixa,
+                               lim.get("criterio_aceitacao") or "simples", lim.get("alfa_aceitacao") or 0.05)
+    mantidos = aceite.mantidos.sum(axis=1)
+    valido = mantidos >= 2
+    soma = np.where(aceite.mantidos, valores, 0.0).sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        resultado = np.where(valido, soma / mantidos, np.nan)
+    return {"resultado": resultado.reshape(forma), "valido": valido.reshape(forma),
+            "excluidos": aceite.excluidos.sum(axis=1).reshape(forma).astype(float)}
+
+# Parâmetros que podem ser varridos e saídas de cada ensaio simulável
+ESPACOS: Dict[str, Dict] = {
+    ENS_RETENCAO: {
+        "motor": _retencao_basecoat,
+        "produtos": ("Basecoat",),  # nas demais linhas a retenção é RR/RT (sem parâmetro de formulação)
+        "parametros": [
+            Parametro("agua_ml_kg", "Água", "mL/kg", False),
+            Parametro("massa_fim", "Arg. + tara final", "g", False),
+            Parametro("massa_ini", "Arg. + tara inicial", "g", False),
+            Parametro("tara", "Tara", "g", False),
+        ],
+        "saidas": {"resultado": "Retenção (%)", "fator_agua": "Fator água"},
+        "base": {"tara": 0.0, "massa_ini": 0.0, "massa_fim": 0.0, "agua_ml_kg": 0.0},
+    },
+    ENS_DENSIDADE: {
+        "motor": _densidade,
+        "produtos": None,
+        "parametros": [
+            Parametro("dt", "Densidade teórica", "g/cm³", False),
+            Parametro("massa_bruta", "Massa bruta", "g", False),
+            Parametro("volume", "Volume do recipiente", "cm³", False),
+            Parametro("tara", "Tara", "g", False),
+        ],
+        "saidas": {"resultado": "Densidade (kg/m³)", "teor_ar": "Teor de ar (%)"},
+        "base": {"tara": 0.0, "massa_bruta": 0.0, "volume": 0.0, "dt": 0.0},
+    },
+    ENS_VAR_DIM: {
+        "motor": _variacao_dimensional,
+        "produtos": None,
+        "parametros": [
+            Parametro("comprimento_padrao", "Comprimento padrão", "mm", True),
+            Parametro("variacao_dim_max", "Limite de exclusão", "mm/m", True),
+        ],
+        "saidas": {"resultado": "Variação dimensional (mm/m)", "excluidos": "CPs excluídos"},
+        "base": {"ini": [0.0] * ensaios.N_CPS[ENS_VAR_DIM], "fim": [0.0] * ensaios.N_CPS[ENS_VAR_DIM]},
+    },
+}
+
+def ensaios_simulaveis(produto: Optional[str]) -> List[str]:
+    return [ens for ens, esp in ESPACOS.items() if esp["produtos"] is None or produto in esp["produtos"]]
+
+def parametro(ensaio: str, chave: str) -> Parametro:
+    return next(p for p in ESPACOS[ensaio]["parametros"] if p.chave == chave)
+
+def valor_base(ensaio: str, chave: str, entradas: Dict, limites: Dict) -> float:
+    """Valor atual do parâmetro (das entradas ou dos limites do produto)."""
+    if parametro(ensaio, chave).limite:
+        return float(limites.get(chave) or 0.0)
+    return float(entradas.get(chave, ESPACOS[ensaio]["base"].get(chave)) or 0.0)
+
+# ======================== 2. VARREDURA ========================
+
+class Varredura(NamedTuple):
+    eixos: List[Tuple[Parametro, np.ndarray]]   # 1 ou 2 eixos (x, y)
+    saidas: Dict[str, np.ndarray]               # forma (len(x),) ou (len(y), len(x))
+    aprovado: np.ndarray                        # válido e dentro da faixa pedida
+    segundos: float
+
+def varrer(ensaio: str, produto: Optional[str], entradas: Dict, eixos: Sequence[Tuple[str, np.ndarray]],
+           limites: Optional[Dict] = None, faixa: Tuple[Optional[float], Optional[float]] = (None, None)) -> Varredura:
+    """Avalia o ensaio na grade dos eixos (1 ou 2) com o resto das entradas fixo.
+
+    ``faixa`` (mínimo, máximo) é a especificação desejada para o resultado; ``aprovado``
+    marca os pontos válidos dentro dela.
+    """
+    if ensaio not in ESPACOS:
+        raise ValueError(f"Ensaio sem simulação: {ensaio}")
+    if not 1 <= len(eixos) <= 2:
+        raise ValueError("Escolha um ou dois parâmetros para a varredura.")
+    pontos = int(np.prod([len(v) for _, v in eixos]))
+    if pontos > MAXIMO_PONTOS:
+        raise ValueError(f"Grade grande demais ({pontos:,} pontos; máximo {MAXIMO_PONTOS:,}).")
+
+    espaco = ESPACOS[ensaio]
+    e = dict(espaco["base"], **{k: v for k, v in entradas.items() if v is not None})
+    lim = dict(limites if limites is not None else ensaios.limites_produto(produto))
+    # x varia nas colunas e y nas linhas: saídas com forma (len(y), len(x)), como um mapa
+    grades = np.meshgrid(*(np.asarray(v, dtype=float) for _, v in eixos))
+    for (chave, _), grade in zip(eixos, grades):
+        (lim if parametro(ensaio, chave).limite else e)[chave] = grade
+    for chave, valor in e.items():
+        if not isinstance(valor, np.ndarray):
+            e[chave] = np.asarray(valor, dtype=float)
+
+    inicio = time.perf_counter()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        saidas = espaco["motor"](e, lim)
+    forma = grades[0].shape
+    saidas = {k: np.broadcast_to(v, forma) for k, v in saidas.items()}
+    aprovado = saidas["valido"].copy()
+    minimo, maximo = faixa
+    if minimo is not None:
+        aprovado &= saidas["resultado"] >= minimo
+    if maximo is not None:
+        aprovado &= saidas["resultado"] <= maximo
+    return Varredura([(parametro(ensaio, c), np.asarray(v, dtype=float)) for c, v in eixos], saidas, aprovado,
+                     time.perf_counter() - inicio)
+
+def sensibilidade(x: np.ndarray, y: np.ndarray, em: float) -> Optional[float]:
+    """Derivada numérica dy/dx no ponto da curva mais próximo de ``em``."""
+    if len(x) < 2:
+        return None
+    with np.errstate(invalid="ignore", divide="ignore"):
+        derivada = np.gradient(y, x)
+    valor = derivada[int(np.abs(x - em).argmin())]
+    return float(valor) if np.isfinite(valor) else None
+
+# ======================== 3. MAPA DE CALOR (IMAGEM) ========================
+
+# Paleta viridis resumida (interpolada); NaN em cinza
+_PALETA = np.array([[68, 1, 84], [59, 82, 139], [33, 145, 140], [94, 201, 98], [253, 231, 37]], dtype=float)
+_SEM_VALOR = np.array([200, 200, 200], dtype=np.uint8)
+
+def colorir(matriz: np.ndarray, contorno: Optional[np.ndarray] = None,
+            vmin: Optional[float] = None, vmax: Optional[float] = None) -> np.ndarray:
+    """Converte a matriz (y, x) em imagem RGB (uint8), y crescendo para cima.
+
+    Com ``contorno`` (máscara booleana, ex: aprovado), a fronteira da região é
+    desenhada em branco. Uma imagem mostra 10⁵–10⁶ pontos sem pesar no navegador.
+    """
+    m = np.asarray(matriz, dtype=float)
+    finito = np.isfinite(m)
+    vmin = np.nanmin(m) if vmin is None and finito.any() else (vmin or 0.0)
+    vmax = np.nanmax(m) if vmax is None and finito.any() else (vmax or 1.0)
+    t = np.clip((m - vmin) / ((vmax - vmin) or 1.0), 0, 1)
+    posicao = np.nan_to_num(t) * (len(_PALETA) - 1)
+    i = np.minimum(posicao.astype(int), len(_PALETA) - 2)
+    frac = (posicao - i)[..., None]
+    rgb = (_PALETA[i] * (1 - frac) + _PALETA[i + 1] * frac).astype(np.uint8)
+    rgb[~finito] = _SEM_VALOR
+    if contorno is not None:
+        c = np.asarray(contorno, dtype=bool)
+        borda = np.zeros_like(c)
+        borda[:, 1:] |= c[:, 1:] != c[:, :-1]
+        borda[1:, :] |= c[1:, :] != c[:-1, :]
+        rgb[borda] = 255
+    return rgb[::-1]
@@ -0,0 +1,26 @@
+"""Configuração comum dos testes: módulos da raiz no path e banco do histórico temporário."""
+import os
+import sys
+import tempfile
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+# Antes de qualquer importação do histórico (o caminho do banco é lido na importação)
+_PASTA = tempfile.mkdtemp(prefix="calculadora-testes-")
+os.environ.setdefault("CALCULADORA_BANCO", os.path.join(_PASTA, "historico.db"))
+os.environ.setdefault("CALCULADORA_CURVAS", os.path.join(_PASTA, "curvas"))
+
+import pytest
+
+@pytest.fixture
+def publicar_limite(monkeypatch):
+    """Publica uma alteração de CONFIG_LIMITES durante o teste (desfeita ao final)."""
+    import ensaios
+
+    def _publicar(produto: str, chave: str, valor):
+        monkeypatch.setitem(ensaios.CONFIG_LIMITES[produto], chave, valor)
+        ensaios.publicar_sobreposicoes()
+    yield _publicar
+    monkeypatch.undo()
+    ensaios.publicar_sobreposicoes()
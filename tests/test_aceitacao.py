@@ -0,0 +1,84 @@
+import math
+
+import numpy as np
+import pytest
+
+import aceitacao
+
+VALORES = [10.0, 10.1, 9.9, 10.05, 15.0]
+TODOS = [True] * 5
+
+def _faixa_absoluta(limite):
+    return lambda v, centro: np.abs(v - centro) <= limite
+
+def _faixa_percentual(limite_pct):
+    return lambda v, centro: np.abs(v - centro) / centro * 100 <= limite_pct
+
+def test_simples_exclui_tudo_com_um_valor_espurio():
+    aceite = aceitacao.aceitar_lote(VALORES, TODOS, _faixa_absoluta(0.5), "simples")
+    assert aceite.mantidos == [False] * 5
+    assert aceite.media_inicial == pytest.approx(11.01)
+
+@pytest.mark.parametrize("criterio", ["iterativo", "grubbs", "dixon"])
+def test_criterios_excluem_so_o_valor_espurio(criterio):
+    aceite = aceitacao.aceitar_lote(VALORES, TODOS, _faixa_absoluta(0.5), criterio)
+    assert aceite.excluidos == [False, False, False, False, True]
+    assert aceite.centro == pytest.approx(10.0125)
+
+def test_iterativo_exclui_um_cp_por_passada():
+    # Dois espúrios: o mais afastado sai primeiro e o segundo só depois de recalcular a média
+    aceite = aceitacao.aceitar_lote([10.0, 10.2, 9.8, 12.0, 16.0], TODOS, _faixa_absoluta(0.5), "iterativo")
+    assert aceite.excluidos == [False, False, False, True, True]
+    assert aceite.centro == pytest.approx(10.0)
+    assert aceite.iteracoes == 3
+
+def test_iterativo_ignora_cps_que_nao_participam():
+    aceite = aceitacao.aceitar_lote(VALORES + [0.0], TODOS + [False], _faixa_absoluta(0.5), "iterativo")
+    assert aceite.mantidos == [True, True, True, True, False, False]
+    assert aceite.excluidos == [False, False, False, False, True, False]
+
+def test_lote_sem_espurio_nao_muda_com_nenhum_criterio():
+    lote = [10.0, 10.1, 9.9, 10.05, 10.02]
+    for criterio in aceitacao.CRITERIOS:
+        assert not any(aceitacao.aceitar_lote(lote, TODOS, _faixa_absoluta(0.5), criterio).excluidos), criterio
+
+# Valores publicados: Grubbs bilateral (ASTM E178, tabela 1 com α/2) e Dixon r10
+# bilateral (Rorabacher, Anal. Chem. 63, 1991)
+@pytest.mark.parametrize("alfa, n, publicado", [
+    (0.10, 3, 1.153), (0.10, 5, 1.672), (0.10, 10, 2.176),
+    (0.05, 3, 1.155), (0.05, 5, 1.715), (0.05, 7, 2.020), (0.05, 10, 2.290), (0.05, 13, 2.462),
+    (0.01, 3, 1.155), (0.01, 5, 1.764), (0.01, 10, 2.482),
+])
+def test_tabela_grubbs(alfa, n, publicado):
+    assert aceitacao.GRUBBS_CRITICO[alfa][n] == pytest.approx(publicado, abs=1e-3)
+
+@pytest.mark.parametrize("alfa, n, publicado", [
+    (0.10, 3, 0.941), (0.10, 6, 0.560),
+    (0.05, 3, 0.970), (0.05, 4, 0.829), (0.05, 5, 0.710), (0.05, 10, 0.466),
+    (0.01, 3, 0.994), (0.01, 7, 0.680),
+])
+def test_tabela_dixon(alfa, n, publicado):
+    assert aceitacao.DIXON_CRITICO[alfa][n] == pytest.approx(publicado, abs=1e-3)
+
+def test_poucos_cps_nunca_excluem():
+    assert math.isinf(aceitacao.GRUBBS_CRITICO[0.05][2])
+    assert not any(aceitacao.aceitar_lote([10.0, 30.0], [True, True], _faixa_absoluta(0.5), "grubbs").excluidos)
+
+def test_alfa_sem_tabela():
+    with pytest.raises(ValueError):
+        aceitacao.aceitar_lote(VALORES, TODOS, _faixa_absoluta(0.5), "grubbs", alfa=0.02)
+
+def test_caminho_rapido_do_simples_igual_a_versao_matricial():
+    rng = np.random.default_rng(7)
+    dentro = _faixa_percentual(6.0)
+    for _ in range(200):
+        n = int(rng.integers(1, 14))
+        valores = rng.normal(30.0, 2.0, n).round(2).tolist()
+        participa = (rng.random(n) > 0.2).tolist()
+        rapido = aceitacao.aceitar_lote(valores, participa, dentro, "simples")
+        matricial = aceitacao.aceitar([valores], [participa], dentro, "simples").linha(0)
+        assert rapido.mantidos == matricial.mantidos
+        assert rapido.excluidos == matricial.excluidos
+        assert rapido.iteracoes == matricial.iteracoes
+        for a, b in ((rapido.media_inicial, matricial.media_inicial), (rapido.centro, matricial.centro)):
+            assert (math.isnan(a) and math.isnan(b)) or a == b
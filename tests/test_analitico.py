@@ -0,0 +1,32 @@
+import json
+
+import pytest
+
+pytest.importorskip("pyarrow")
+import analitico
+import ensaios
+
+def _linha(id_, ensaio, valores, entradas, excluidos=()):
+    return (id_, "L1", "Graute", ensaio, json.dumps(valores), json.dumps(list(excluidos)), None, 0.0, 1,
+            None, "app", "2025-03-01T10:00:00", json.dumps(entradas) if entradas is not None else None)
+
+def test_zero_calculado_e_leitura_e_zero_de_cp_vazio_nao():
+    cps = [30.0, 31.0, 29.5, 40.0, 0.0, 0.0]
+    resultados, leituras = analitico._converter([
+        _linha(1, ensaios.ENS_VAR_MASSA, [0.0, -1.0, 0.0], {"ini": [100.0] * 3, "fim": [100.0, 99.0, 100.0]}),
+        _linha(2, ensaios.ENS_COMPRESSAO_5X10, cps, {"cps": cps}, excluidos=[3]),
+        # Retração: o 3º CP tem leituras iguais (0 calculado); o 1º e o 2º não foram ensaiados
+        _linha(3, ensaios.ENS_RETRACAO, [0, 0, 0.0], {"ini": [0.0, 0.0, 250.0], "fim": [0.0, 0.0, 250.0]}),
+        _linha(4, ensaios.ENS_CAPILARIDADE, [1.2, 0, 1.1], {"area": 16.0, "m10": [500.0, 0.0, 510.0],
+                                                           "m90": [520.0, 0.0, 528.0]}),
+    ])
+    assert dict(zip(resultados.column("id").to_pylist(), resultados.column("n_cps").to_pylist())) == {
+        1: 3, 2: 4, 3: 1, 4: 2}
+    por_id = {}
+    for id_, valor in zip(leituras.column("id").to_pylist(), leituras.column("valor").to_pylist()):
+        por_id.setdefault(id_, []).append(valor)
+    assert por_id == {1: [0.0, -1.0, 0.0], 2: [30.0, 31.0, 29.5, 40.0], 3: [0.0], 4: [1.2, 1.1]}
+
+def test_sem_entradas_gravadas_zero_e_cp_vazio():
+    resultados, _ = analitico._converter([_linha(1, ensaios.ENS_RETRACAO, [None, -0.05, 0.0], None)])
+    assert resultados.column("n_cps").to_pylist() == [1]
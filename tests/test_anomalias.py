@@ -0,0 +1,79 @@
+import json
+import threading
+
+import anomalias
+import ensaios
+import ganchos
+import historico
+
+REQ_5X10 = next(r for r in ensaios.REQUISITOS["Graute"]
+                if ensaios.identificar_ensaio("Graute", r) == ensaios.ENS_COMPRESSAO_5X10)
+
+def _registro(cps):
+    entradas = {"cps": cps}
+    res = ensaios.calcular(ensaios.ENS_COMPRESSAO_5X10, entradas, "Graute")
+    return historico.montar_registro("Graute", REQ_5X10, ensaios.ENS_COMPRESSAO_5X10, entradas, res, lote="A1")
+
+def test_alerta_fica_gravado_no_resultado(tmp_path, monkeypatch):
+    indice = anomalias.IndiceEstatistico()
+    for i in range(20):
+        indice.atualizar("Graute", ensaios.ENS_COMPRESSAO_5X10, {"cps": [30.0 + 0.1 * (i % 5)] * 6})
+    indice.pronto = True
+    monkeypatch.setattr(anomalias, "_indice", indice)
+    ganchos.registrar()
+    conn = historico.conectar(str(tmp_path / "h.db"))
+
+    normal = historico.salvar_resultado(_registro([30.1, 30.2, 30.0, 30.3, 30.1, 30.2]), conn)
+    digitado = historico.salvar_resultado(_registro([30.1, 302.0, 30.0, 30.3, 30.1, 30.2]), conn)
+
+    alertas = dict(conn.execute("SELECT id, alertas FROM resultados").fetchall())
+    assert alertas[normal] is None
+    assert json.loads(alertas[digitado]) == [{"campo": "cps", "posicao": 1, "valor": 302.0, "sugestao": 30.2}]
+
+def test_ouvinte_espera_a_carga_inicial(tmp_path, monkeypatch):
+    conn = historico.conectar(str(tmp_path / "h.db"))
+    ja_gravado = historico.salvar_resultado(_registro([30.0] * 6), conn)
+    indice, iniciada, concluida = anomalias.IndiceEstatistico(), threading.Lock(), threading.Event()
+    monkeypatch.setattr(anomalias, "_indice", indice)
+    monkeypatch.setattr(anomalias, "_carga_iniciada", iniciada)
+    monkeypatch.setattr(anomalias, "_carga_concluida", concluida)
+    iniciada.acquire()  # Carga em andamento
+
+    novo = _registro([31.0] * 6)
+    ouvintes = [threading.Thread(target=anomalias.ao_gravar, args=(_registro([30.0] * 6), ja_gravado)),
+                threading.Thread(target=anomalias.ao_gravar, args=(novo, ja_gravado + 1))]
+    for t in ouvintes:
+        t.start()
+    ouvintes[0].join(0.1)
+    assert ouvintes[0].is_alive()  # Esperando a carga
+
+    indice.carregar(conn)
+    concluida.set()
+    for t in ouvintes:
+        t.join(5)
+    # O resultado lido pela carga não é contado de novo; o gravado depois dela entra
+    assert indice.estatisticas("Graute", ensaios.ENS_COMPRESSAO_5X10, "cps", 0)[2] == 2
+
+def test_importacao_sem_aquecer_confere_contra_o_historico(tmp_path, monkeypatch):
+    conn = historico.conectar(str(tmp_path / "h.db"))
+    with conn:  # Histórico gravado antes, por outro processo
+        conn.executemany(historico._SQL_INSERIR,
+                         [_registro([30.0 + 0.1 * (i % 5)] * 6) for i in range(20)])
+    monkeypatch.setattr(anomalias, "_indice", anomalias.IndiceEstatistico())
+    monkeypatch.setattr(anomalias, "_carga_iniciada", threading.Lock())
+    monkeypatch.setattr(anomalias, "_carga_concluida", threading.Event())
+    ganchos.registrar()
+
+    # Importador: nenhum aquecer, um lote inteiro deslocado em uma só transação
+    historico.salvar_resultados([_registro([300.0] * 6) for _ in range(12)], conn)
+    alertas = [a for (a,) in conn.execute("SELECT alertas FROM resultados WHERE id > 20")]
+    assert len(alertas) == 12 and all(a is not None for a in alertas)
+    # O índice montado na primeira gravação tem só o histórico; o lote entrou pelo ouvinte
+    assert anomalias.indice().estatisticas("Graute", ensaios.ENS_COMPRESSAO_5X10, "cps", 0)[2] == 32
+
+def test_sem_indice_pronto_so_regras_estruturais(monkeypatch):
+    indice = anomalias.IndiceEstatistico()
+    for _ in range(20):
+        indice.atualizar("Graute", ensaios.ENS_COMPRESSAO_5X10, {"cps": [30.0] * 6})
+    monkeypatch.setattr(anomalias, "_indice", indice)
+    assert anomalias.verificar("Graute", ensaios.ENS_COMPRESSAO_5X10, {"cps": [300.0] * 6}) == []
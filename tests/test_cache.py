@@ -0,0 +1,95 @@
+import types
+
+import pytest
+
+import cache
+import ensaios
+
+ENSAIO = ensaios.ENS_COMPRESSAO_5X10
+
+@pytest.fixture
+def relogio(monkeypatch):
+    agora = types.SimpleNamespace(valor=0.0)
+    monkeypatch.setattr(cache, "time", types.SimpleNamespace(monotonic=lambda: agora.valor))
+    return agora
+
+def _contadora():
+    chamadas = []
+
+    def regra(*args):
+        chamadas.append(args)
+        return {"resultado": sum(args[0])}
+    return regra, chamadas
+
+def test_mesmas_entradas_acertam(relogio):
+    c = cache.CacheResultados()
+    regra, chamadas = _contadora()
+    primeiro = c.executar(ENSAIO, "Graute", regra, [30, 31.0])
+    # 30 e 30.0 normalizam para a mesma chave
+    assert c.executar(ENSAIO, "Graute", regra, [30.0, 31.0]) is primeiro
+    c.executar(ENSAIO, "Graute", regra, [30.0, 32.0])
+    assert len(chamadas) == 2
+    assert c.estatisticas()["acertos"] == 1 and c.estatisticas()["faltas"] == 2
+
+def test_alteracao_de_config_limites_invalida(relogio, publicar_limite):
+    c = cache.CacheResultados()
+    regra, chamadas = _contadora()
+    c.executar(ENSAIO, "Graute", regra, [30.0])
+    c.executar(ensaios.ENS_VAR_MASSA, "Graute", regra, [30.0])
+
+    publicar_limite("Graute", "compressao_cilindrica_var_pct", 8.0)
+    c.executar(ENSAIO, "Graute", regra, [30.0])
+    c.executar(ensaios.ENS_VAR_MASSA, "Graute", regra, [30.0])  # Não usa a chave alterada
+    assert len(chamadas) == 3
+    assert c.estatisticas()["invalidados"] == 1
+
+def test_alteracao_da_sobreposicao_do_cliente_invalida(relogio):
+    c = cache.CacheResultados()
+    regra, chamadas = _contadora()
+    try:
+        for limite in (10.0, 12.0):
+            ensaios.publicar_sobreposicoes(clientes={"X": {"Graute": {"compressao_cilindrica_var_pct": limite}}})
+            visao = ensaios.limites_produto("Graute", cliente="X")
+            c.executar(ENSAIO, "Graute", regra, [30.0], limites=visao)
+            c.executar(ENSAIO, "Graute", regra, [30.0], limites=visao)
+            c.executar(ENSAIO, "Graute", regra, [30.0])  # Sem o cliente: outra camada, não é afetada
+    finally:
+        ensaios.publicar_sobreposicoes()
+    assert len(chamadas) == 3
+    assert c.estatisticas()["invalidados"] == 1
+
+def test_validade_por_tempo(relogio):
+    c = cache.CacheResultados(ttl=60)
+    regra, chamadas = _contadora()
+    c.executar(ENSAIO, "Graute", regra, [30.0])
+    relogio.valor = 60.0
+    c.executar(ENSAIO, "Graute", regra, [30.0])
+    assert len(chamadas) == 1
+    relogio.valor = 120.5  # Guardado em 0: vencido (o acerto não renova a validade)
+    c.executar(ENSAIO, "Graute", regra, [30.0])
+    assert len(chamadas) == 2
+    assert c.estatisticas()["expirados"] == 1
+
+def test_lru_respeita_o_limite(relogio):
+    c = cache.CacheResultados(max_itens=3)
+    regra, chamadas = _contadora()
+    for v in (1.0, 2.0, 3.0):
+        c.executar(ENSAIO, "Graute", regra, [v])
+    c.executar(ENSAIO, "Graute", regra, [1.0])  # Mais recente: o 2.0 passa a ser o mais antigo
+    c.executar(ENSAIO, "Graute", regra, [4.0])
+    assert c.estatisticas()["itens"] == 3 and c.estatisticas()["remocoes_lru"] == 1
+    c.executar(ENSAIO, "Graute", regra, [1.0])
+    c.executar(ENSAIO, "Graute", regra, [3.0])
+    assert len(chamadas) == 4
+    c.executar(ENSAIO, "Graute", regra, [2.0])
+    assert len(chamadas) == 5
+
+def test_erro_nao_e_guardado(relogio):
+    c = cache.CacheResultados()
+
+    def regra(valores):
+        raise ensaios.EntradaIncompleta("Sem dados.")
+    for _ in range(2):
+        with pytest.raises(ensaios.EntradaIncompleta):
+            c.executar(ENSAIO, "Graute", regra, [0.0])
+    assert c.estatisticas()["itens"] == 0
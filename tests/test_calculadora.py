@@ -0,0 +1,54 @@
+import json
+import os
+
+import pytest
+
+import ensaios
+import historico
+
+AppTest = pytest.importorskip("streamlit.testing.v1").AppTest
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "calculadora.py")
+
+def _gravados() -> int:
+    return historico.conectar().execute("SELECT COUNT(*) FROM resultados").fetchone()[0]
+
+def _calcular(valores):
+    at = AppTest.from_file(APP, default_timeout=30)
+    at.session_state["produto"] = "Graute"
+    at.session_state["pagina"] = f"Graute::{ensaios.slugify(ensaios.REQ_VAR_MASSA)}"
+    at.run()
+    for campo, valor in zip(at.number_input, valores):
+        campo.set_value(valor)
+    at.button[0].click().run()
+    assert not at.exception
+    return at
+
+def test_formulario_em_branco_nao_e_gravado():
+    antes = _gravados()
+    at = _calcular([0.0] * 6)  # A regra aceita (variação zero), mas não há ensaio
+    assert _gravados() == antes
+    assert any("não gravado" in c.value for c in at.caption)
+
+def test_calculo_preenchido_e_gravado():
+    antes = _gravados()
+    _calcular([100.0, 101.0, 100.0, 99.0, 200.0, 202.0])
+    assert _gravados() == antes + 1
+
+def test_densidade_grava_e_reabre_densidade_teorica():
+    import calculadora
+
+    at = AppTest.from_file(APP, default_timeout=30)
+    at.session_state["produto"] = "Graute"
+    at.session_state["pagina"] = f"Graute::{ensaios.slugify(ensaios.REQ_DENSIDADE)}"
+    at.session_state["dt_input"] = 2.5
+    at.run()
+    for campo, valor in zip([n for n in at.number_input if n.key != "dt_input"], [100.0, 900.0, 400.0]):
+        campo.set_value(valor)
+    at.button[0].click().run()
+    assert not at.exception
+
+    entradas = json.loads(historico.conectar().execute(
+        "SELECT entradas FROM resultados WHERE ensaio = ? ORDER BY id DESC LIMIT 1",
+        (ensaios.ENS_DENSIDADE,)).fetchone()[0])
+    assert entradas == {"tara": 100.0, "massa_bruta": 900.0, "volume": 400.0, "dt": 2.5}
+    assert calculadora.campos_das_entradas(ensaios.ENS_DENSIDADE, entradas)["dt_input"] == 2.5
@@ -0,0 +1,78 @@
+import copy
+import math
+
+import pytest
+
+import classificacao
+import ensaios
+import historico
+
+PROPS = classificacao.ESPECIFICACAO_NBR13281["propriedades"]
+
+def _classe(prop, valor):
+    idx = int(classificacao.classificar_valores([valor], PROPS[prop]["classes"])[0])
+    return PROPS[prop]["classes"][idx][0] if idx >= 0 else None
+
+@pytest.mark.parametrize("prop, valor, classe", [
+    ("P", 0.0, "P1"), ("P", 1.4, "P1"), ("P", 8.0, "P5"), ("P", 8.01, "P6"), ("P", 40.0, "P6"),
+    ("R", 1.49, "R2"), ("R", 3.5, "R5"), ("R", 3.51, "R6"),
+    ("D", 1199, "D1"), ("D", 2200, "D6"),
+    ("U", 71.9, "U1"), ("U", 100, "U6"), ("U", 100.5, None),
+    ("C", 0.5, "C1"), ("C", 12.0, "C6"),
+    ("A", 0.19, "A1"), ("A", 0.20, "A2"), ("A", 0.29, "A2"), ("A", 0.30, "A3"),
+])
+def test_limites_das_classes(prop, valor, classe):
+    assert _classe(prop, valor) == classe
+
+@pytest.mark.parametrize("prop, valor, classe", [
+    # Faixas sobrepostas: vale a classe mais alta que contém o valor
+    ("P", 2.0, "P2"), ("P", 3.0, "P3"), ("P", 4.5, "P4"), ("P", 6.0, "P5"),
+    ("R", 1.0, "R2"), ("R", 2.7, "R5"),
+    ("D", 1400, "D3"), ("D", 1700, "D4"),
+    ("U", 78, "U2"), ("U", 96, "U6"),
+    ("C", 2.5, "C3"), ("C", 11.0, "C6"),
+])
+def test_sobreposicao_fica_com_a_classe_mais_alta(prop, valor, classe):
+    assert _classe(prop, valor) == classe
+
+def test_valor_ausente_nao_classifica():
+    assert int(classificacao.classificar_valores([math.nan], PROPS["P"]["classes"])[0]) == -1
+    classes = classificacao.classificar_lote({ensaios.ENS_COMPRESSAO_4X4X16: 5.0, ensaios.ENS_FLEXAO: None,
+                                              ensaios.ENS_ADERENCIA_MANUAL: 0.35})
+    assert classes == {"P": "P4", "R": None, "D": None, "U": None, "C": None, "A": "A3"}
+    assert classificacao.designacao(classes) == "P4-A3"
+
+def _gravar(conn, lote, ensaio, resultado, valido=True):
+    res = {"valores": [resultado], "excluidos": [], "media_inicial": resultado, "resultado": resultado,
+           "valido": valido}
+    requisito = next(r for r in ensaios.REQUISITOS["Revestimento"]
+                     if ensaios.identificar_ensaio("Revestimento", r) == ensaio)
+    conn.execute(historico._SQL_INSERIR,
+                 historico.montar_registro("Revestimento", requisito, ensaio, {}, res, lote=lote))
+
+def test_reclassificar_historico(tmp_path):
+    conn = historico.conectar(str(tmp_path / "h.db"))
+    with conn:
+        _gravar(conn, "R1", ensaios.ENS_COMPRESSAO_4X4X16, 3.5)
+        _gravar(conn, "R1", ensaios.ENS_COMPRESSAO_4X4X16, 7.0)  # Refeito: vale o último válido
+        _gravar(conn, "R1", ensaios.ENS_COMPRESSAO_4X4X16, 1.0, valido=False)
+        _gravar(conn, "R1", ensaios.ENS_ADERENCIA_AUTO, 0.25)
+        _gravar(conn, "R2", ensaios.ENS_FLEXAO, 1.2)
+        _gravar(conn, "R2", ensaios.ENS_DENSIDADE, 1500)
+
+    assert classificacao.reclassificar_historico(conn=conn)["lotes"] == 2
+    classes = dict(conn.execute("SELECT lote, classes FROM classificacoes WHERE versao = ?",
+                                (classificacao.ESPECIFICACAO_NBR13281["versao"],)).fetchall())
+    assert classes == {"R1": "P5-A2", "R2": "R2-D3"}
+
+    # Uma revisão da especificação grava ao lado da anterior
+    revisao = copy.deepcopy(classificacao.ESPECIFICACAO_NBR13281)
+    revisao["versao"] = "revisão de teste"
+    revisao["propriedades"]["A"]["classes"] = [("A1", None, 0.30), ("A2", 0.30, None)]
+    classificacao.reclassificar_historico(revisao, conn=conn)
+    assert conn.execute("SELECT classes FROM classificacoes WHERE lote = 'R1' AND versao = ?",
+                        ("revisão de teste",)).fetchone()[0] == "P5-A1"
+    assert conn.execute("SELECT COUNT(*) FROM classificacoes").fetchone()[0] == 4
+
+def test_historico_vazio(tmp_path):
+    assert classificacao.reclassificar_historico(conn=historico.conectar(str(tmp_path / "h.db")))["lotes"] == 0
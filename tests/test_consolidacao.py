@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+import consolidacao
+import historico
+
+REQ = "COMPRESSÃO 5x10 (MPa) - ABNT NBR 7215"
+
+def _banco(caminho, resultados, dia="2025-01-10T08:00:00"):
+    base = {"produto": "Graute", "requisito": REQ, "ensaio": "compressao_5x10", "entradas": "{}",
+            "valores": "[]", "excluidos": "[]", "media_inicial": None, "valido": 1, "operador": None,
+            "origem": "teste", "config": None, "versao_formula": 1, "cliente": None, "limites_aplicados": None}
+    historico.salvar_resultados([dict(base, lote=lote, resultado=valor, criado_em=dia)
+                                 for lote, valor in resultados], historico.conectar(str(caminho)))
+    return str(caminho)
+
+def test_mesmo_lote_em_fabricas_diferentes_nao_e_duplicado(tmp_path):
+    a = _banco(tmp_path / "a.db", [("L1", 30.0), ("L2", 32.0)])
+    b = _banco(tmp_path / "b.db", [("L1", 40.0), ("L3", 42.0)], dia="2025-01-11T08:00:00")
+    _, ra, _ = consolidacao.resumir_fonte(f"Jundiai={a}")
+    _, rb, _ = consolidacao.resumir_fonte(f"Betim={b}")
+    r = consolidacao.juntar_fontes([ra, rb])[("Graute", REQ)]
+    assert (r.ensaios, r.duplicados) == (4, 0)
+    assert r.media == pytest.approx(36.0)
+    assert r.variancia == pytest.approx(np.var([30.0, 32.0, 40.0, 42.0], ddof=1))
+    assert np.all(np.diff(r.ids.astype(np.float64)) > 0)
+
+def test_mesma_fabrica_em_duas_fontes_fica_com_o_mais_recente(tmp_path):
+    antigo = _banco(tmp_path / "antigo.db", [("L1", 30.0), ("L2", 32.0)])
+    novo = _banco(tmp_path / "novo.db", [("L2", 35.0), ("L4", 31.0)], dia="2025-01-12T08:00:00")
+    pacote = consolidacao.gravar_pacote(consolidacao.resumir_banco(novo, "Jundiai"),
+                                        str(tmp_path / "jundiai"), "Jundiai")
+    _, ra, _ = consolidacao.resumir_fonte(f"Jundiai={antigo}")
+    _, rb, _ = consolidacao.resumir_fonte(pacote)
+    r = consolidacao.juntar_fontes([ra, rb])[("Graute", REQ)]
+    assert (r.ensaios, r.duplicados) == (3, 1)
+    assert sorted(r.valores) == [30.0, 31.0, 35.0]
+    assert r.media == pytest.approx(32.0)
@@ -0,0 +1,100 @@
+import pytest
+
+import consulta
+import ensaios
+import historico
+
+RES = {"valores": [1.0], "excluidos": [], "media_inicial": 1.0, "resultado": 1.0, "valido": True}
+REQ = ensaios.REQUISITOS["Graute"][0]
+
+def _gravar(conn, criado_em, produto="Graute", valido=True, operador=None):
+    registro = historico.montar_registro(produto, REQ, ensaios.identificar_ensaio("Graute", REQ), {},
+                                         {**RES, "valido": valido}, operador=operador, criado_em=criado_em)
+    return conn.execute(historico._SQL_INSERIR, registro).lastrowid
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = historico.conectar(str(tmp_path / "h.db"))
+    with conn:
+        _gravar(conn, "2025-03-01T08:00:00")
+        for _ in range(7):  # Gravados no mesmo segundo (importação): só o id desempata
+            _gravar(conn, "2025-03-02T10:00:00")
+        _gravar(conn, "2025-03-02T10:00:00", valido=False)
+        _gravar(conn, "2025-03-03T09:00:00", produto="Basecoat", operador="ana")
+    return conn
+
+def _todas(conn, filtros=consulta.Filtros(), tamanho=3):
+    ids, depois = [], None
+    while True:
+        p = consulta.pagina(filtros, depois, tamanho, conn)
+        assert len(p.linhas) <= tamanho
+        ids += [l["id"] for l in p.linhas]
+        if p.proxima is None:
+            return ids
+        depois = p.proxima
+
+def test_paginas_com_mesmo_criado_em_nao_repetem_nem_pulam(conn):
+    esperado = [r[0] for r in conn.execute("SELECT id FROM resultados ORDER BY criado_em DESC, id DESC")]
+    for tamanho in (1, 2, 3, 4, 10):
+        assert _todas(conn, tamanho=tamanho) == esperado
+    # Uma página que termina no meio dos gravados no mesmo segundo
+    primeira = consulta.pagina(consulta.Filtros(), None, 3, conn)
+    assert primeira.proxima == ("2025-03-02T10:00:00", primeira.linhas[-1]["id"])
+    assert len({l["criado_em"] for l in primeira.linhas[1:]}) == 1
+
+def test_filtros(conn):
+    assert len(_todas(conn, consulta.Filtros(produto="Graute"))) == 9
+    assert len(_todas(conn, consulta.Filtros(valido=False))) == 1
+    assert len(_todas(conn, consulta.Filtros(operador="ana"))) == 1
+    assert len(_todas(conn, consulta.Filtros(desde="2025-03-02", ate="2025-03-02"))) == 8  # Período inclusivo
+    assert len(_todas(conn, consulta.Filtros(produto="Graute", requisito=REQ, valido=True))) == 8
+
+def test_pagina_escolhida_no_indice(conn):
+    for filtros, indice in ((consulta.Filtros(), "ix_resultados_consulta_data"),
+                            (consulta.Filtros(produto="Graute"), "ix_resultados_consulta_produto"),
+                            (consulta.Filtros(produto="Graute", requisito=REQ), "ix_resultados_consulta_requisito"),
+                            (consulta.Filtros(operador="ana"), "ix_resultados_consulta_operador")):
+        plano = " ".join(consulta.plano(filtros, conn))
+        assert indice in plano and "TEMP B-TREE" not in plano
+
+def test_paginador_usa_o_cache_e_descarta_na_nova_geracao(conn):
+    paginador = consulta.Paginador(tamanho=3)
+    primeira = paginador.atual(conn)
+    paginador.avancar(conn)
+    segunda = paginador.atual(conn)
+    paginador.voltar()
+    assert paginador.atual(conn) is primeira
+    assert paginador.estatisticas() == {"do_cache": 2, "do_banco": 2, "paginas_em_cache": 2}
+
+    with conn:
+        novo = _gravar(conn, "2025-03-04T07:00:00")
+    assert paginador.atual(conn) is primeira  # Sem aviso do histórico: ainda a página em cache
+    consulta.nova_geracao({}, novo)            # Ouvinte do histórico
+    relida = paginador.atual(conn)
+    assert relida is not primeira and relida.linhas[0]["id"] == novo
+    assert paginador.estatisticas()["do_banco"] == 3
+    paginador.avancar(conn)
+    assert paginador.atual(conn).linhas != segunda.linhas  # A página 2 também foi relida
+
+def test_paginador_validade_e_limite_do_cache(conn, monkeypatch):
+    agora = [0.0]
+    monkeypatch.setattr(consulta.time, "monotonic", lambda: agora[0])
+    paginador = consulta.Paginador(tamanho=1, max_paginas=2, validade=60)
+    primeira = paginador.atual(conn)
+    agora[0] = 61.0
+    assert paginador.atual(conn) is not primeira
+    for _ in range(3):
+        paginador.avancar(conn)  # Lê as páginas 1 e 2; a 0 sai do cache
+    assert paginador.estatisticas()["paginas_em_cache"] == 2
+    paginador.primeira()
+    paginador.atual(conn)
+    assert paginador.estatisticas()["do_banco"] == 5
+
+def test_novos_filtros_voltam_a_primeira_pagina(conn):
+    paginador = consulta.Paginador(tamanho=2)
+    paginador.avancar(conn)
+    assert paginador.numero == 1
+    paginador.filtrar(consulta.Filtros(produto="Basecoat"))
+    assert paginador.numero == 0 and [l["produto"] for l in paginador.atual(conn).linhas] == ["Basecoat"]
+    paginador.avancar(conn)  # Última página: não avança
+    assert paginador.numero == 0
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+import curvas
+
+@pytest.fixture
+def arquivo(tmp_path):
+    arq = curvas.ArquivoCurvas(pasta=str(tmp_path / "curvas"), banco=str(tmp_path / "h.db"),
+                               codec_nome="zlib", amostras_por_bloco=1000)
+    yield arq
+    arq.fechar()
+
+def test_blocos_com_larguras_diferentes(arquivo):
+    # 1º bloco com deltas grandes (64/32 bits), depois cauda plana (deltas de 8 bits)
+    rng = np.random.default_rng(1)
+    carga = np.concatenate([rng.uniform(-1e6, 1e6, 1000), np.full(2500, 3.25)])
+    desloc = np.concatenate([np.full(1500, 0.5), np.cumsum(rng.integers(-40000, 40000, 2000)) * 0.001])
+    curva_id = arquivo.gravar("L1", "COMPRESSÃO", 1, {"carga": carga, "deslocamento": desloc},
+                              resolucoes={"deslocamento": 0.001})
+    lida = arquivo.ler(curva_id)
+    np.testing.assert_array_equal(lida["carga"], carga)
+    np.testing.assert_allclose(lida["deslocamento"], desloc, atol=5e-4)
+
+def test_float32_e_curva_vazia(arquivo):
+    x = np.linspace(0, 1, 2345, dtype=np.float32)
+    lida = arquivo.ler(arquivo.gravar("L2", "FLEXÃO", 1, {"carga": x}))
+    assert lida["carga"].dtype == np.float32
+    np.testing.assert_array_equal(lida["carga"], x)
+    assert len(arquivo.ler(arquivo.gravar("L2", "FLEXÃO", 2, {"carga": np.array([])}))["carga"]) == 0
+
+def test_formato_antigo_com_largura_no_tipo():
+    q = np.array([5, 7, 6, 10], dtype=np.int64)
+    embaralhado = np.diff(q).astype(np.int8).view(np.uint8).tobytes()
+    dados = curvas._PRIMEIRO.pack(5) + curvas.codec("zlib").comprimir(embaralhado)
+    lido = curvas.decodificar_canal(dados, "q:8", 4, 0.5, curvas.codec("zlib").descomprimir)
+    np.testing.assert_allclose(lido, q * 0.5)
+
+def test_crc_corrompido(arquivo, tmp_path):
+    curva_id = arquivo.gravar("L3", "COMPRESSÃO", 1, {"carga": np.arange(10.0)})
+    arquivo.fechar()
+    segmento = next((tmp_path / "curvas").iterdir())
+    dados = bytearray(segmento.read_bytes())
+    dados[-1] ^= 0xFF
+    segmento.write_bytes(bytes(dados))
+    with pytest.raises(curvas.CurvaCorrompida):
+        arquivo.ler(curva_id)
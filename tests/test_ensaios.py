@@ -0,0 +1,28 @@
+import json
+
+import pytest
+
+import ensaios
+
+@pytest.mark.parametrize("valores, mensagem", [
+    ({"criterio_aceitacao": "chauvenet"}, "criterio_aceitacao 'chauvenet'"),
+    ({"criterio_aceitacao": "grubbs", "alfa_aceitacao": 0.02}, "alfa_aceitacao 0.02"),
+])
+def test_sobreposicao_com_aceitacao_invalida_aponta_arquivo_e_chave(tmp_path, valores, mensagem):
+    arquivo = tmp_path / "limites.json"
+    arquivo.write_text(json.dumps({"clientes": {"Construtora X": {"Revestimento": valores}}}), encoding="utf-8")
+    with pytest.raises(ValueError) as erro:
+        ensaios.carregar_sobreposicoes(str(arquivo))
+    assert str(arquivo) in str(erro.value)
+    assert "Cliente Construtora X (Revestimento)" in str(erro.value)
+    assert mensagem in str(erro.value)
+
+def test_sobreposicao_com_aceitacao_valida(tmp_path):
+    arquivo = tmp_path / "limites.json"
+    arquivo.write_text(json.dumps({"fabricas": {"Jundiai": {"padrao": {
+        "criterio_aceitacao": "dixon", "alfa_aceitacao": 0.10}}}}), encoding="utf-8")
+    try:
+        ensaios.carregar_sobreposicoes(str(arquivo))
+        assert ensaios.limites_produto("Graute", fabrica="Jundiai")["criterio_aceitacao"] == "dixon"
+    finally:
+        ensaios.publicar_sobreposicoes()
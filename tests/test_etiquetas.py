@@ -0,0 +1,22 @@
+import etiquetas
+import historico
+
+def test_colisao_de_codigo_gera_outro_em_vez_de_perder_a_etiqueta(tmp_path):
+    conn = historico.conectar(str(tmp_path / "h.db"))
+    itens = etiquetas.etiquetas_do_lote("L7", "Graute")
+    alvo = itens[0]
+    # Outro CP que, por colisão do hash, já ocupa o código do primeiro CP do lote
+    with conn:
+        conn.execute("INSERT INTO etiquetas VALUES (?, 'OUTRO', 'Graute', ?, ?, 28, 0, '2025-01-01T00:00:00')",
+                     (alvo["codigo"], alvo["requisito"], alvo["ensaio"]))
+
+    gerados = etiquetas.gerar("L7", "Graute", conn=conn)
+    codigos = {(g["requisito"], g["idade_dias"], g["posicao"]): g["codigo"] for g in gerados}
+    novo = codigos[(alvo["requisito"], alvo["idade_dias"], alvo["posicao"])]
+    assert novo != alvo["codigo"]
+    assert len(etiquetas.listar_por_lote("L7", conn)) == len(itens)
+    assert conn.execute("SELECT lote FROM etiquetas WHERE codigo = ?", (novo,)).fetchone()[0] == "L7"
+
+    # Reimpressão chega aos mesmos códigos, sem duplicar
+    assert [g["codigo"] for g in etiquetas.gerar("L7", "Graute", conn=conn)] == [g["codigo"] for g in gerados]
+    assert len(etiquetas.listar_por_lote("L7", conn)) == len(itens)
@@ -0,0 +1,33 @@
+from datetime import date, datetime, timedelta
+
+import agenda
+import ensaios
+import ganchos
+import historico
+
+def _registro(lote, requisito, cps, criado_em):
+    ensaio = ensaios.ENS_COMPRESSAO_5X10
+    res = ensaios.calcular(ensaio, {"cps": cps}, "Graute")
+    return historico.montar_registro("Graute", requisito, ensaio, {"cps": cps}, res, lote=lote,
+                                     origem="planilha:teste.xlsx", criado_em=criado_em)
+
+def test_gravacao_fora_do_app_baixa_agenda_e_treina_previsao(tmp_path):
+    ganchos.registrar()
+    conn = historico.conectar(str(tmp_path / "h.db"))
+    requisito = next(r for r in ensaios.REQUISITOS["Graute"]
+                     if ensaios.identificar_ensaio("Graute", r) == ensaios.ENS_COMPRESSAO_5X10)
+    moldado = date(2025, 1, 1)
+    agenda.moldar("G1", "Graute", moldado, requisitos=[requisito], conn=conn)
+    for idade, valor in ((1, 12.0), (3, 17.0), (7, 20.0), (28, 30.0)):
+        dia = datetime.combine(moldado + timedelta(days=idade), datetime.min.time()).isoformat()
+        historico.salvar_resultado(_registro("G1", requisito, [valor] * 6, dia), conn)
+
+    baixados = conn.execute("SELECT idade_dias FROM agenda WHERE lote = 'G1' AND resultado_id IS NOT NULL "
+                            "ORDER BY idade_dias").fetchall()
+    assert [b[0] for b in baixados] == [1, 3, 7, 28]
+    assert conn.execute("SELECT COUNT(*) FROM previsao_pares WHERE lote = 'G1'").fetchone()[0] == 3
+    assert conn.execute("SELECT COUNT(*) FROM kpi_lote WHERE lote = 'G1'").fetchone()[0] == 1
+
+def test_ordem_agenda_antes_da_previsao():
+    ordem = list(ganchos.GANCHOS_TRANSACAO)
+    assert ordem.index(agenda.baixar) < ordem.index(ganchos.previsao.aprender)
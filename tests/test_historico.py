@@ -0,0 +1,35 @@
+import sqlite3
+import threading
+
+import historico
+
+def test_migracao_com_varias_threads_abrindo_banco_antigo(tmp_path):
+    caminho = str(tmp_path / "antigo.db")
+    antigo = sqlite3.connect(caminho)
+    # Primeira versão do banco: sem as colunas de _MIGRACOES
+    antigo.executescript("""
+        CREATE TABLE resultados (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, lote TEXT, produto TEXT NOT NULL,
+            requisito TEXT NOT NULL, ensaio TEXT NOT NULL, entradas TEXT NOT NULL,
+            valores TEXT NOT NULL, excluidos TEXT NOT NULL, media_inicial REAL, resultado REAL,
+            valido INTEGER NOT NULL, operador TEXT, origem TEXT NOT NULL DEFAULT 'app',
+            criado_em TEXT NOT NULL);
+    """)
+    antigo.close()
+
+    largada, erros = threading.Barrier(8), []
+    def abrir():
+        largada.wait()
+        try:
+            historico.conectar(caminho)
+        except Exception as exc:
+            erros.append(exc)
+    threads = [threading.Thread(target=abrir) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert erros == []
+    colunas = {l[1] for l in historico.conectar(caminho).execute("PRAGMA table_info(resultados)")}
+    assert set(historico._MIGRACOES) <= colunas
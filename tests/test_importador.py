@@ -0,0 +1,24 @@
+import pytest
+
+import importador
+
+def test_linhas_com_erro_sao_rejeitadas_e_a_planilha_segue(tmp_path):
+    openpyxl = pytest.importorskip("openpyxl")
+    pasta = tmp_path / "Revestimento"
+    pasta.mkdir()
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Capilaridade"
+    ws.append(["Lote", "Data", "Área", "10min CP1", "10min CP2", "10min CP3", "90min CP1", "90min CP2", "90min CP3"])
+    leituras = [1.0, 1.1, 1.0, 3.0, 3.1, 3.0]
+    ws.append(["L1", "05/03/2020", 16] + leituras)
+    ws.append(["L2", "2020-03-06", 0] + leituras)  # área zero: divisão por zero no cálculo
+    ws.append(["L3", "ontem", 16] + leituras)
+    ws.append(["L4", "2020-03-07T08:30:00", 16] + leituras)
+    wb.save(pasta / "2020.xlsx")
+
+    saida = importador.processar_planilha(str(pasta / "2020.xlsx"))
+
+    assert [(r["lote"], r["criado_em"]) for r in saida["registros"]] == [
+        ("L1", "2020-03-05T00:00:00"), ("L4", "2020-03-07T08:30:00")]
+    assert [e.split(":")[0] for e in saida["erros"]] == ["Capilaridade!3 (lote L2)", "Capilaridade!4 (lote L3)"]
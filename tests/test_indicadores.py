@@ -0,0 +1,53 @@
+import pytest
+
+import ensaios
+import ganchos
+import historico
+import indicadores
+import lims
+
+RES = {"valores": [1.0], "excluidos": [], "media_inicial": 1.0, "resultado": 1.0, "valido": True}
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    monkeypatch.setattr(lims, "URL_LIMS", "http://lims.invalido/resultados")
+    ganchos.registrar()
+    return historico.conectar(str(tmp_path / "h.db"))
+
+def _gravar(conn, lote, produto, requisitos, hora=8):
+    for i, requisito in enumerate(requisitos):
+        registro = historico.montar_registro(produto, requisito, ensaios.identificar_ensaio(produto, requisito),
+                                             {}, RES, lote=lote, criado_em=f"2025-03-01T{hora + i:02d}:00:00")
+        historico.salvar_resultado(registro, conn)
+
+def _revestimento(sem):
+    return [r for r in ensaios.REQUISITOS["Revestimento"]
+            if ensaios.identificar_ensaio("Revestimento", r) != sem]
+
+def _produto(conn, produto):
+    return next(p for p in indicadores.painel(conn)["produtos"] if p["produto"] == produto)
+
+@pytest.mark.parametrize("sem", [ensaios.ENS_ADERENCIA_MANUAL, ensaios.ENS_ADERENCIA_AUTO])
+def test_lote_com_uma_das_aderencias_conclui(conn, sem):
+    requisitos = _revestimento(sem)
+    _gravar(conn, "R1", "Revestimento", requisitos[:-1])
+    assert _produto(conn, "Revestimento")["lotes_concluidos"] == 0
+    _gravar(conn, "R1", "Revestimento", requisitos[-1:], hora=8 + len(requisitos) - 1)
+    revestimento = _produto(conn, "Revestimento")
+    assert revestimento["lotes_concluidos"] == 1
+    assert revestimento["horas_por_lote"] == pytest.approx(len(requisitos) - 1)
+
+def test_as_duas_aderencias_contam_como_um_requisito(conn):
+    automatica = [r for r in ensaios.REQUISITOS["Revestimento"]
+                  if ensaios.identificar_ensaio("Revestimento", r) == ensaios.ENS_ADERENCIA_AUTO]
+    # Lote com as duas aderências e sem o último requisito da linha: não conclui
+    _gravar(conn, "R2", "Revestimento", _revestimento(ensaios.ENS_ADERENCIA_AUTO)[:-1] + automatica)
+    assert _produto(conn, "Revestimento")["lotes_concluidos"] == 0
+
+def test_reconstruir_chega_aos_mesmos_indicadores(conn):
+    _gravar(conn, "R3", "Revestimento", _revestimento(ensaios.ENS_ADERENCIA_AUTO))
+    _gravar(conn, "G1", "Graute", ensaios.REQUISITOS["Graute"][:2])
+    antes = indicadores.painel(conn)
+    assert indicadores.reconstruir(conn) == len(ensaios.REQUISITOS["Revestimento"]) - 1 + 2
+    assert indicadores.painel(conn) == antes
+    assert _produto(conn, "Graute")["lotes_concluidos"] == 0
@@ -0,0 +1,41 @@
+import time
+
+import pytest
+
+import instrumentos
+
+def _esperar(condicao, limite=5.0):
+    fim = time.monotonic() + limite
+    while not condicao():
+        assert time.monotonic() < fim, "tempo esgotado"
+        time.sleep(0.01)
+
+def test_driver_sem_leituras_nao_instancia():
+    class Incompleto(instrumentos.DriverInstrumento):
+        pass
+    with pytest.raises(TypeError):
+        Incompleto()
+
+def test_leituras_do_driver_simulado_chegam_na_sessao():
+    ger = instrumentos.GerenciadorInstrumentos()
+    ger.conectar("s1", instrumentos.DriverSimulado([1.5, 2.5, 3.5], intervalo=0.01))
+    lidas = []
+    _esperar(lambda: lidas.extend(ger.coletar("s1")) or len(lidas) == 3)
+    assert [l.valor for l in lidas] == [1.5, 2.5, 3.5]
+    assert {l.unidade for l in lidas} == {"g"}
+    _esperar(lambda: ger.estado("s1") == "fim das leituras")
+
+    ger.desconectar("s1")
+    assert ger.estado("s1") is None
+    assert "s1" not in ger._estado and "s1" not in ger._caixas
+
+def test_reconectar_nao_herda_estado_da_conexao_anterior():
+    ger = instrumentos.GerenciadorInstrumentos()
+    ger.conectar("s1", instrumentos.DriverSimulado(intervalo=0.01))
+    _esperar(lambda: ger.coletar("s1") != [])
+    ger.conectar("s1", instrumentos.DriverSimulado([7.0], intervalo=0.05, unidade="mm"))
+    _esperar(lambda: ger.estado("s1") == "fim das leituras")
+    assert [l.valor for l in ger.coletar("s1")] == [7.0]
+    ger.desconectar("s1")
+    time.sleep(0.05)  # cancelamento da tarefa roda no laço de fundo
+    assert "s1" not in ger._estado
@@ -0,0 +1,99 @@
+import json
+import time
+
+import pytest
+
+import ensaios
+import ganchos
+import historico
+import lims
+import recalculo
+
+REQ_5X10 = next(r for r in ensaios.REQUISITOS["Graute"]
+                if ensaios.identificar_ensaio("Graute", r) == ensaios.ENS_COMPRESSAO_5X10)
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    monkeypatch.setattr(lims, "URL_LIMS", "http://lims.invalido/resultados")
+    ganchos.registrar()
+    return historico.conectar(str(tmp_path / "h.db"))
+
+def _salvar(conn, cps, lote="G1"):
+    entradas = {"cps": cps}
+    res = ensaios.calcular(ensaios.ENS_COMPRESSAO_5X10, entradas, "Graute")
+    return historico.salvar_resultado(historico.montar_registro(
+        "Graute", REQ_5X10, ensaios.ENS_COMPRESSAO_5X10, entradas, res, lote=lote), conn)
+
+def test_recalculo_enfileira_nova_revisao(conn, publicar_limite):
+    id_ = _salvar(conn, [30.0, 30.2, 29.8, 30.1, 29.9, 36.0])
+    _salvar(conn, [30.0] * 6, lote="G2")  # não muda com o novo limite: nenhuma revisão
+    publicar_limite("Graute", "compressao_cilindrica_var_pct", 50.0)
+    resumo = recalculo.recalcular(workers=1, conn=conn)
+    assert resumo["alterados"] == 1
+
+    linhas = conn.execute("SELECT chave, corpo FROM lims_saida WHERE resultado_id = ? ORDER BY id", (id_,)).fetchall()
+    assert [l["chave"] for l in linhas] == [lims.chave(id_), lims.chave(id_, 2)]
+    antes, depois = (json.loads(l["corpo"]) for l in linhas)
+    assert depois["revisao"] == 2 and depois["resultado"] != antes["resultado"]
+    assert depois["resultado"] == pytest.approx(conn.execute(
+        "SELECT resultado FROM resultados WHERE id = ?", (id_,)).fetchone()[0])
+    assert conn.execute("SELECT COUNT(*) FROM lims_saida").fetchone()[0] == 3
+
+# ======================== Remetente contra o LIMS simulado ========================
+
+@pytest.fixture
+def simulado():
+    servidor = lims.LIMSSimulado()
+    yield servidor
+    servidor.fechar()
+
+def _caixa(tmp_path, n):
+    """Banco com ``n`` resultados na caixa de saída (sem URL configurada)."""
+    ganchos.registrar()
+    conn = historico.conectar(str(tmp_path / "h.db"))
+    with lims.caixa_ativa():
+        ids = [_salvar(conn, [30.0] * 6, lote=f"G{i}") for i in range(n)]
+    return conn, ids
+
+def _remetente(tmp_path, url, **opcoes):
+    return lims.Remetente(url, banco=str(tmp_path / "h.db"), timeout=5, espera_min=0.001, **opcoes)
+
+def test_sem_url_nada_e_enfileirado(tmp_path):
+    ganchos.registrar()
+    conn = historico.conectar(str(tmp_path / "h.db"))
+    _salvar(conn, [30.0] * 6)
+    assert conn.execute("SELECT COUNT(*) FROM lims_saida").fetchone()[0] == 0
+
+def test_queda_e_volta_sem_duplicar(tmp_path, simulado):
+    conn, ids = _caixa(tmp_path, 25)
+    remetente = _remetente(tmp_path, simulado.url, lote=10)
+    simulado.fora_do_ar = True
+    assert remetente.enviar_lote() == 0 and remetente.espera > 0
+    assert conn.execute("SELECT COUNT(*) FROM lims_saida WHERE enviado_em IS NULL").fetchone()[0] == 25
+    simulado.fora_do_ar = False
+    assert [remetente.enviar_lote() for _ in range(4)] == [10, 10, 5, 0]
+    assert set(simulado.recebidos) == {lims.chave(i) for i in ids} and simulado.duplicados == 0
+    # Lote repetido (ex: resposta perdida no timeout) não grava nada de novo
+    with lims.caixa_ativa():
+        conn.execute("UPDATE lims_saida SET enviado_em = NULL WHERE id <= 10")
+        conn.commit()
+    assert remetente.enviar_lote() == 10
+    assert len(simulado.recebidos) == 25
+
+def test_mensagem_recusada_nao_trava_o_lote(tmp_path, simulado):
+    conn, ids = _caixa(tmp_path, 40)
+    veneno = lims.chave(ids[17])
+    simulado.recusar.add(veneno)
+    remetente = _remetente(tmp_path, simulado.url, lote=40)
+    assert remetente.enviar_lote() == 39
+    assert veneno not in simulado.recebidos and len(simulado.recebidos) == 39
+    for _ in range(lims.MAX_RECUSAS - 1):
+        time.sleep(0.05)  # espera própria da mensagem recusada (espera_min * 2^tentativas)
+        assert remetente.enviar_lote() == 0
+    assert conn.execute("SELECT COUNT(*) FROM lims_saida WHERE enviado_em IS NULL").fetchone()[0] == 0
+    assert tuple(conn.execute("SELECT chave, tentativas FROM lims_rejeitadas").fetchone()) == (veneno, lims.MAX_RECUSAS)
+    assert lims.situacao(conn)["rejeitadas"] == 1
+
+    simulado.recusar.clear()
+    assert lims.reenviar(conn) == 1
+    assert remetente.enviar_lote() == 1 and veneno in simulado.recebidos
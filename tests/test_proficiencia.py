@@ -0,0 +1,59 @@
+import math
+import statistics
+
+import numpy as np
+import pytest
+
+import proficiencia
+
+RESULTADOS = [9.8, 10.0, 10.1, 10.2, 10.3, 10.4, 10.5, 12.0, 15.0]
+
+def _referencia(x, iteracoes):
+    """Algoritmo A (ISO 13528, C.3.1) passo a passo, sem numpy."""
+    centro = statistics.median(x)
+    desvio = 1.483 * statistics.median(abs(v - centro) for v in x)
+    for _ in range(iteracoes):
+        delta = 1.5 * desvio
+        recortado = [min(max(v, centro - delta), centro + delta) for v in x]
+        centro, desvio = statistics.fmean(recortado), 1.134 * statistics.stdev(recortado)
+    return centro, desvio
+
+def test_valores_iniciais_e_primeira_iteracao():
+    # Mediana 10,3 e MAD 0,2: s* = 1,483 · 0,2 = 0,2966; limites 10,3 ± 0,4449
+    inicio = proficiencia.algoritmo_a([RESULTADOS], max_iteracoes=0)
+    assert inicio["x_pt"][0] == pytest.approx(10.3)
+    assert inicio["s_robusto"][0] == pytest.approx(0.2966)
+
+    recortado = [10.3 - 0.4449, 10.0, 10.1, 10.2, 10.3, 10.4, 10.5, 10.3 + 0.4449, 10.3 + 0.4449]
+    primeira = proficiencia.algoritmo_a([RESULTADOS], max_iteracoes=1)
+    assert primeira["x_pt"][0] == pytest.approx(sum(recortado) / 9)
+    assert primeira["s_robusto"][0] == pytest.approx(1.134 * statistics.stdev(recortado))
+    assert primeira["iteracoes"][0] == 1
+
+def test_convergencia_igual_a_referencia_e_ponto_fixo():
+    res = proficiencia.algoritmo_a([RESULTADOS], tolerancia=1e-12, max_iteracoes=500)
+    centro, desvio = _referencia(RESULTADOS, int(res["iteracoes"][0]))
+    assert res["x_pt"][0] == pytest.approx(centro, rel=1e-12)
+    assert res["s_robusto"][0] == pytest.approx(desvio, rel=1e-12)
+    # Convergido: recortar com x*, s* devolve os mesmos x*, s*
+    delta = 1.5 * desvio
+    recortado = [min(max(v, centro - delta), centro + delta) for v in RESULTADOS]
+    assert statistics.fmean(recortado) == pytest.approx(centro, rel=1e-9)
+    assert 1.134 * statistics.stdev(recortado) == pytest.approx(desvio, rel=1e-9)
+    assert res["u_xpt"][0] == pytest.approx(1.25 * desvio / 3)
+    # Os dois valores espúrios pesam só até o limite x* + 1,5·s* (média simples: 10,92)
+    assert 10.3 < centro < 10.6 < statistics.fmean(RESULTADOS)
+
+def test_linhas_independentes_e_sem_resultado():
+    x = np.full((4, 10), np.nan)
+    x[0, :9] = RESULTADOS
+    x[1, :5] = [30.0, 31.0, 29.5, 30.5, 45.0]
+    x[2, :3] = [5.0, 5.0, 5.0]  # MAD zero: fica na mediana
+    x[3, 0] = 7.0                # Um participante só
+    res = proficiencia.algoritmo_a(x)
+    sozinha = proficiencia.algoritmo_a([RESULTADOS])
+    assert res["x_pt"][0] == sozinha["x_pt"][0] and res["s_robusto"][0] == sozinha["s_robusto"][0]
+    assert list(res["participantes"]) == [9, 5, 3, 1]
+    assert res["x_pt"][2] == 5.0 and res["s_robusto"][2] == 0.0 and res["iteracoes"][2] == 0
+    assert res["x_pt"][3] == 7.0 and res["iteracoes"][3] == 0
+    assert math.isnan(proficiencia.algoritmo_a([[math.nan, math.nan]])["x_pt"][0])
@@ -0,0 +1,63 @@
+import copy
+
+import pytest
+
+import ensaios
+import ganchos
+import historico
+import lims
+import recalculo
+
+def _requisito(ensaio):
+    return next(r for r in ensaios.REQUISITOS["Graute"] if ensaios.identificar_ensaio("Graute", r) == ensaio)
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    monkeypatch.setattr(lims, "URL_LIMS", "http://lims.invalido/resultados")
+    ganchos.registrar()
+    return historico.conectar(str(tmp_path / "h.db"))
+
+def _salvar(conn, ensaio, entradas, lote):
+    res = ensaios.calcular(ensaio, entradas, "Graute")
+    return historico.salvar_resultado(historico.montar_registro(
+        "Graute", _requisito(ensaio), ensaio, entradas, res, lote=lote), conn)
+
+def _historico(conn):
+    # Um 5x10 que só fica com 1 CP na faixa de 6% (inválido), um 5x10 estável e dois
+    # ensaios que não dependem do limite de compressão
+    espalhado = _salvar(conn, ensaios.ENS_COMPRESSAO_5X10, {"cps": [30.0, 20.0, 40.0, 34.0, 25.0, 35.0]}, "G1")
+    _salvar(conn, ensaios.ENS_COMPRESSAO_5X10, {"cps": [30.0] * 6}, "G2")
+    _salvar(conn, ensaios.ENS_VAR_MASSA, {"ini": [100.0] * 3, "fim": [99.0] * 3}, "G3")
+    _salvar(conn, ensaios.ENS_VAR_DIM, {"ini": [1.0] * 3, "fim": [1.01] * 3}, "G4")
+    return espalhado
+
+def test_mudanca_de_um_limite_recalcula_so_os_grupos_que_dependem_dele(conn, publicar_limite):
+    espalhado = _historico(conn)
+    assert recalculo.grupos_afetados(conn) == []
+
+    publicar_limite("Graute", "compressao_cilindrica_var_pct", 50.0)
+    assert [(g["produto"], g["ensaio"], g["resultados"]) for g in recalculo.grupos_afetados(conn)] == [
+        ("Graute", ensaios.ENS_COMPRESSAO_5X10, 2)]
+
+    resumo = recalculo.recalcular(workers=1, conn=conn)
+    assert resumo["recalculados"] == 2 and resumo["alterados"] == 1
+    assert [(m["id"], m["situacao_antes"], m["situacao_depois"]) for m in resumo["mudancas"]] == [
+        (espalhado, "inválido", "válido")]
+    assert conn.execute("SELECT valido FROM resultados WHERE id = ?", (espalhado,)).fetchone()[0] == 1
+    # Já rastreados com a configuração nova: nada mais a recalcular
+    assert recalculo.recalcular(workers=1, conn=conn)["afetados"] == 0
+
+def test_configuracao_simulada_nao_grava(conn):
+    espalhado = _historico(conn)
+    config = copy.deepcopy(ensaios.CONFIG_LIMITES)
+    config["Graute"]["compressao_cilindrica_var_pct"] = 50.0
+    saida = conn.execute("SELECT COUNT(*) FROM lims_saida").fetchone()[0]
+
+    resumo = recalculo.recalcular(config=config, workers=1, conn=conn)
+    assert [m["id"] for m in resumo["mudancas"]] == [espalhado]
+    assert conn.execute("SELECT valido FROM resultados WHERE id = ?", (espalhado,)).fetchone()[0] == 0
+    assert conn.execute("SELECT COUNT(*) FROM lims_saida").fetchone()[0] == saida
+    assert len(recalculo.grupos_afetados(conn, config)) == 1
+
+    with pytest.raises(ValueError):
+        recalculo.recalcular(config=config, aplicar=True, conn=conn)
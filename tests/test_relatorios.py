@@ -0,0 +1,104 @@
+import re
+import time
+import zlib
+
+import pytest
+
+import ensaios
+import historico
+import relatorios
+
+def _requisito(ensaio):
+    return next(r for r in ensaios.REQUISITOS["Graute"] if ensaios.identificar_ensaio("Graute", r) == ensaio)
+
+REQ_5X10 = _requisito(ensaios.ENS_COMPRESSAO_5X10)
+
+def _gravar(conn, lote, cps, criado_em="2025-03-10T10:00:00", ensaio=ensaios.ENS_COMPRESSAO_5X10, entradas=None):
+    entradas = entradas or {"cps": cps}
+    res = ensaios.calcular(ensaio, entradas, "Graute")
+    conn.execute(historico._SQL_INSERIR, historico.montar_registro(
+        "Graute", _requisito(ensaio), ensaio, entradas, res, lote=lote, criado_em=criado_em))
+
+def _textos(pdf: bytes) -> str:
+    fluxos = re.findall(rb"stream\n(.*?)\nendstream", pdf, re.S)
+    return "\n".join(zlib.decompress(f).decode("latin-1") for f in fluxos)
+
+def test_pdf_com_xref_valida_e_quebra_de_pagina():
+    doc = relatorios.DocumentoPDF("Teste (1)")
+    for i in range(120):
+        doc.texto(f"Linha {i} com (parênteses) e barra \\")
+    pdf = doc.bytes()
+    assert pdf.startswith(b"%PDF-1.4") and pdf.rstrip().endswith(b"%%EOF")
+    assert doc.paginas > 1
+    assert b"/Count %d" % doc.paginas in pdf
+
+    # Cada posição da xref aponta para o início do objeto correspondente
+    inicio_xref = int(re.search(rb"startxref\n(\d+)", pdf)[1])
+    linhas = pdf[inicio_xref:].split(b"\n")
+    n = int(linhas[1].split()[1])
+    for numero, linha in enumerate(linhas[3:3 + n - 1], 1):
+        posicao = int(linha.split()[0])
+        assert pdf[posicao:].startswith(b"%d 0 obj" % numero)
+
+    textos = _textos(pdf)
+    assert "(Linha 0 com \\(parênteses\\) e barra \\\\) Tj" in textos
+    assert f"Página {doc.paginas} de {doc.paginas}" in textos
+
+def test_norma_e_formulas_em_texto():
+    assert relatorios.norma(REQ_5X10) == "ABNT NBR 7215"
+    assert relatorios.norma("Requisito sem norma") == "Requisito sem norma"
+    assert relatorios._latex_para_texto(r"d = \frac{M}{V_{rec}}") == "d = M / V_rec"
+    assert relatorios._latex_para_texto(r"\frac{a - b}{c} \times 100") == "(a - b) / c × 100"
+
+def test_certificado_do_lote(tmp_path):
+    banco = str(tmp_path / "h.db")
+    conn = historico.conectar(banco)
+    with conn:
+        _gravar(conn, "G-7", [30.0] * 6)
+        _gravar(conn, "G-7", [30.1, 30.2, 30.0, 30.3, 30.1, 36.0])  # Refeito: vale o último
+        _gravar(conn, "G-7", None, ensaio=ensaios.ENS_DENSIDADE,
+                entradas={"tara": 100.0, "massa_bruta": 900.0, "volume": 400.0})
+
+    saida = relatorios.gerar_certificado("G-7", str(tmp_path / "pdf"), banco)
+    assert saida["produto"] == "Graute" and saida["paginas"] == 1
+    with open(saida["arquivo"], "rb") as f:
+        textos = _textos(f.read())
+    assert "Lote: G-7" in textos
+    assert "CP6 = 36.000" in textos and "\\(excluído\\)" in textos  # A marca vai para a linha seguinte
+    assert textos.count("Valores por CP") == 2 and "CP6 = 30.000" not in textos  # Um bloco por requisito
+    assert "Memória de cálculo" in textos and "Densidade: d = M / V" in textos
+    assert "(D5) Tj" in textos  # Classificação NBR 13281 da densidade de 2000 kg/m³
+
+    with pytest.raises(ValueError):
+        relatorios.gerar_certificado("NAO-EXISTE", str(tmp_path / "pdf"), banco)
+
+def test_lotes_do_mes_inclui_virada_do_ano(tmp_path):
+    conn = historico.conectar(str(tmp_path / "h.db"))
+    with conn:
+        _gravar(conn, "D1", [30.0] * 6, "2024-12-01T00:00:00")
+        _gravar(conn, "D1", [30.0] * 6, "2024-12-31T23:59:59")
+        _gravar(conn, "J1", [30.0] * 6, "2025-01-01T00:00:00")
+    assert relatorios.lotes_do_mes(2024, 12, conn=conn) == [{"produto": "Graute", "lote": "D1", "resultados": 2}]
+    assert [l["lote"] for l in relatorios.lotes_do_mes(2025, 1, conn=conn)] == ["J1"]
+    assert relatorios.lotes_do_mes(2024, 12, produtos=("Basecoat",), conn=conn) == []
+
+def test_fila_reaproveita_pedido_aberto_e_conclui(tmp_path):
+    banco = str(tmp_path / "h.db")
+    conn = historico.conectar(banco)
+    with conn:
+        _gravar(conn, "F1", [30.0] * 6)
+    fila = relatorios.FilaRelatorios(workers=1, pasta=str(tmp_path / "pdf"), banco=banco)
+    try:
+        pedido = fila.enviar("F1")
+        assert fila.enviar("F1") == pedido
+        erro = fila.enviar("SEM-RESULTADOS")
+        limite = time.monotonic() + 60
+        while any(fila.estado(i)["estado"] in ("na fila", "gerando") for i in (pedido, erro)):
+            assert time.monotonic() < limite
+            time.sleep(0.05)
+        estado = fila.estado(pedido)
+        assert estado["estado"] == "pronto" and estado["arquivo"].endswith("F1.pdf")
+        assert fila.estado(erro)["estado"] == "erro"
+        assert fila.enviar("F1") != pedido  # Já concluído: novo pedido
+    finally:
+        fila._pool.shutdown(wait=True)
@@ -0,0 +1,88 @@
+import re
+
+import historico
+import sessao
+
+CHAVES = re.compile(r"cp_\d+$")
+PAGINA = "Graute::compressao"
+
+def _gerente(**opcoes):
+    return sessao.EstadoCalculadoras(CHAVES, **opcoes)
+
+def test_troca_de_lote_separa_os_valores():
+    estado, gerente = {"produto": "Graute"}, _gerente()
+    gerente.entrar(estado, "L1", PAGINA, agora=0)
+    estado.update(cp_1=30.0, cp_2=0.0)
+    gerente.entrar(estado, "L2", PAGINA, agora=1)
+    assert estado == {"produto": "Graute"}  # Só as chaves das calculadoras saem
+    estado["cp_1"] = 31.0
+    gerente.entrar(estado, "L2", "Graute::densidade", agora=2)
+    assert "cp_1" not in estado
+
+    gerente.entrar(estado, "L1", PAGINA, agora=3)
+    assert estado == {"produto": "Graute", "cp_1": 30.0}  # Campo em zero não é guardado
+    gerente.entrar(estado, "L2", PAGINA, agora=4)
+    assert estado["cp_1"] == 31.0
+    assert gerente.estatisticas()["restauradas"] == 2
+
+def test_preencher_outra_pagina_entra_ao_abrir():
+    estado, gerente = {}, _gerente()
+    gerente.entrar(estado, "L1", PAGINA, agora=0)
+    gerente.preencher(estado, "L9", PAGINA, {"cp_1": 28.0}, agora=0)
+    assert estado == {}
+    gerente.entrar(estado, "L9", PAGINA, agora=1)
+    assert estado == {"cp_1": 28.0}
+
+def test_pagina_ociosa_e_despejada():
+    estado, gerente = {}, _gerente(ociosidade=100)
+    gerente.entrar(estado, "L1", PAGINA, agora=0)
+    estado["cp_1"] = 30.0
+    gerente.entrar(estado, "L2", PAGINA, agora=10)
+    gerente.entrar(estado, "L2", PAGINA, agora=110)
+    assert gerente.estatisticas()["paginas"] == 1
+    gerente.entrar(estado, "L2", PAGINA, agora=111)
+    assert gerente.estatisticas()["paginas"] == 0 and gerente.estatisticas()["despejadas"] == 1
+    gerente.entrar(estado, "L1", PAGINA, agora=112)
+    assert estado == {}
+
+def test_menos_usada_e_despejada_acima_do_limite():
+    estado, gerente = {}, _gerente(max_paginas=2)
+    for i, lote in enumerate(["L1", "L2", "L3", "L4"]):
+        gerente.entrar(estado, lote, PAGINA, agora=i)
+        estado["cp_1"] = float(i + 1)
+    stats = gerente.estatisticas()
+    assert stats["paginas"] == 2 and stats["despejadas"] == 1  # L2 e L3; L1 foi despejada
+    gerente.entrar(estado, "L2", PAGINA, agora=10)
+    assert estado["cp_1"] == 2.0
+    gerente.entrar(estado, "L1", PAGINA, agora=11)
+    assert "cp_1" not in estado
+
+def test_limite_de_bytes():
+    estado, gerente = {}, _gerente(max_bytes=sessao.tamanho_estado({"cp_1": "x" * 100}) + 10)
+    gerente.entrar(estado, "L1", PAGINA, agora=0)
+    estado["cp_1"] = "x" * 100
+    gerente.entrar(estado, "L2", PAGINA, agora=1)
+    estado["cp_1"] = "y" * 100
+    gerente.entrar(estado, "L3", PAGINA, agora=2)
+    stats = gerente.estatisticas()
+    assert stats["paginas"] == 1 and stats["bytes_guardados"] <= gerente.max_bytes
+    gerente.entrar(estado, "L2", PAGINA, agora=3)
+    assert estado["cp_1"] == "y" * 100
+
+def test_despejo_vira_rascunho_e_volta_em_outra_sessao():
+    estado, gerente = {}, _gerente(sessao="s1", max_paginas=0, rascunhos=True)
+    gerente.entrar(estado, "R-100", PAGINA, agora=0)
+    estado["cp_1"] = 30.5
+    gerente.entrar(estado, "", PAGINA, agora=1)  # Sem lote: despejada sem rascunho
+    estado["cp_1"] = 12.0
+    gerente.entrar(estado, "R-101", PAGINA, agora=2)
+    assert gerente.estatisticas()["em_rascunho"] == 1
+    assert historico.conectar().execute(
+        "SELECT sessao FROM rascunhos WHERE lote = 'R-100'").fetchone()[0] == "s1"
+
+    outro, outra_sessao = {}, _gerente(sessao="s2", rascunhos=True)
+    outra_sessao.entrar(outro, "R-100", PAGINA, agora=5)
+    assert outro == {"cp_1": 30.5}
+    assert outra_sessao.estatisticas()["de_rascunho"] == 1
+    # Retirado do banco ao voltar: a outra sessão não o recebe de novo
+    assert sessao.retirar_rascunho("R-100", PAGINA) is None
@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+import ensaios
+import simulacao
+
+def _ponto(ensaio, entradas, produto, limites=None):
+    """Resultado da regra de ensaios.py em um ponto (None se a regra recusa as entradas)."""
+    try:
+        return ensaios.calcular(ensaio, entradas, produto, limites)
+    except ValueError:
+        return None
+
+def test_densidade_igual_a_regra_em_cada_ponto():
+    dt = np.array([0.0, 1.8, 2.0, 2.2])
+    massa = np.array([50.0, 100.0, 700.0, 900.0])
+    entradas = {"tara": 100.0, "volume": 400.0}
+    v = simulacao.varrer(ensaios.ENS_DENSIDADE, "Graute", entradas, [("dt", dt), ("massa_bruta", massa)])
+    assert v.saidas["resultado"].shape == (len(massa), len(dt))
+    for i, m in enumerate(massa):
+        for j, d in enumerate(dt):
+            res = _ponto(ensaios.ENS_DENSIDADE, {**entradas, "massa_bruta": m, "dt": d}, "Graute")
+            if res is None:  # Massa bruta menor que a tara
+                assert not v.saidas["valido"][i, j] and np.isnan(v.saidas["resultado"][i, j])
+                continue
+            assert v.saidas["resultado"][i, j] == pytest.approx(res["resultado"])
+            teor_ar = res["detalhes"]["teor_ar"]
+            assert (np.isnan(v.saidas["teor_ar"][i, j]) if teor_ar is None
+                    else v.saidas["teor_ar"][i, j] == pytest.approx(teor_ar))
+
+def test_retencao_basecoat_igual_a_regra():
+    agua = np.linspace(0.0, 250.0, 11)
+    entradas = {"tara": 200.0, "massa_ini": 700.0, "massa_fim": 690.0}
+    v = simulacao.varrer(ensaios.ENS_RETENCAO, "Basecoat", entradas, [("agua_ml_kg", agua)])
+    for j, a in enumerate(agua):
+        res = _ponto(ensaios.ENS_RETENCAO, {**entradas, "agua_ml_kg": a}, "Basecoat")
+        if res is None or not res["valido"]:
+            assert not v.saidas["valido"][j]
+        else:
+            assert v.saidas["resultado"][j] == pytest.approx(res["resultado"])
+
+def test_variacao_dimensional_com_exclusao_igual_a_regra():
+    comprimentos = np.array([200.0, 250.0, 300.0])
+    limites_exclusao = np.array([0.05, 0.20, 1.0])
+    entradas = {"ini": [1.00, 1.00, 1.00], "fim": [1.05, 1.06, 1.15]}
+    v = simulacao.varrer(ensaios.ENS_VAR_DIM, "Graute", entradas,
+                         [("comprimento_padrao", comprimentos), ("variacao_dim_max", limites_exclusao)])
+    base = ensaios.limites_produto("Graute")
+    for i, limite in enumerate(limites_exclusao):
+        for j, comp in enumerate(comprimentos):
+            res = ensaios.calcular(ensaios.ENS_VAR_DIM, entradas, "Graute",
+                                   {**base, "comprimento_padrao": comp, "variacao_dim_max": limite})
+            assert bool(v.saidas["valido"][i, j]) == bool(res["valido"])
+            assert v.saidas["excluidos"][i, j] == len(res["excluidos"])
+            if res["valido"]:
+                assert v.saidas["resultado"][i, j] == pytest.approx(res["resultado"])
+
+def test_faixa_marca_os_aprovados():
+    massa = np.linspace(600.0, 1000.0, 5)
+    v = simulacao.varrer(ensaios.ENS_DENSIDADE, None, {"tara": 100.0, "volume": 400.0}, [("massa_bruta", massa)],
+                         faixa=(1400.0, 2000.0))
+    assert v.aprovado.tolist() == [False, True, True, True, False]
+
+@pytest.mark.parametrize("ensaio, eixos", [
+    (ensaios.ENS_FLEXAO, [("cps", np.arange(3.0))]),
+    (ensaios.ENS_DENSIDADE, []),
+    (ensaios.ENS_DENSIDADE, [("dt", np.arange(3.0))] * 3),
+    (ensaios.ENS_DENSIDADE, [("dt", np.arange(2000.0)), ("volume", np.arange(2000.0))]),
+])
+def test_varredura_recusada(ensaio, eixos):
+    with pytest.raises(ValueError):
+        simulacao.varrer(ensaio, "Graute", {}, eixos)
+
+def test_sensibilidade_e_mapa():
+    x = np.linspace(0.0, 10.0, 101)
+    assert simulacao.sensibilidade(x, 3 * x + 1, 4.2) == pytest.approx(3.0)
+    assert simulacao.sensibilidade(x[:1], x[:1], 0.0) is None
+
+    matriz = np.array([[0.0, 1.0], [np.nan, 0.5]])
+    imagem = simulacao.colorir(matriz)
+    assert imagem.shape == (2, 2, 3) and imagem.dtype == np.uint8
+    # y cresce para cima: a linha 0 da matriz é a última da imagem
+    assert imagem[0, 0].tolist() == [200, 200, 200]
+    assert imagem[1, 0].tolist() == [68, 1, 84] and imagem[1, 1].tolist() == [253, 231, 37]